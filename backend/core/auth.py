@@ -7,15 +7,27 @@ from fastapi import Depends, HTTPException, status, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import JWTError, jwt
 from typing import Dict, Any, Optional, List
+from core.cache import TTLCache
 from core.config import get_settings, Settings
 from enum import Enum
+import hashlib
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
 # Esquema de autenticação Bearer
 security = HTTPBearer()
 
+# Tokens já verificados: chave = SHA-256 do token → payload.
+# Cada entrada expira no `exp` do token (ou antes, pelo TTL do cache).
+_settings = get_settings()
+tokens_verificados_cache = TTLCache(
+    "tokens_verificados",
+    maxsize=_settings.jwt_cache_max_tokens,
+    ttl_seconds=_settings.jwt_cache_ttl_seconds
+)
+
 
 class PerfilUsuario(str, Enum):
     """Enum dos perfis de usuário no sistema"""
@@ -65,6 +77,8 @@ def decode_jwt_token(token: str, settings: Settings) -> Dict[str, Any]:
         
         return payload
         
+    except AuthException:
+        raise
     except JWTError as e:
         logger.warning(f"Token JWT inválido: {e}")
         raise AuthException("Token inválido ou expirado")
@@ -73,13 +87,58 @@ def decode_jwt_token(token: str, settings: Settings) -> Dict[str, Any]:
         raise AuthException("Erro interno de autenticação")
 
 
+def verificar_token(token: str, settings: Optional[Settings] = None) -> Dict[str, Any]:
+    """
+    Valida o token usando o cache de tokens já verificados.
+    
+    Só tokens válidos entram no cache, com validade limitada ao `exp`; um token
+    expirado nunca é servido do cache e volta a passar por decode_jwt_token.
+    
+    Raises:
+        AuthException: Se o token for inválido
+    """
+    chave = hashlib.sha256(token.encode()).hexdigest()
+    payload = tokens_verificados_cache.get(chave)
+    if payload is not None:
+        return payload
+    
+    payload = decode_jwt_token(token, settings or get_settings())
+    
+    restante = float(payload["exp"]) - time.time()
+    if restante > 0:
+        tokens_verificados_cache.set(chave, payload, ttl_seconds=restante)
+    
+    return payload
+
+
+def usuario_do_token(token: str, settings: Optional[Settings] = None) -> Dict[str, Any]:
+    """
+    Valida o token e monta os dados do usuário usados pelas dependencies.
+    
+    Returns:
+        Dict novo a cada chamada (o payload em cache nunca é exposto para alteração)
+    """
+    payload = verificar_token(token, settings)
+    
+    return {
+        "user_id": payload.get("sub"),
+        "loja_id": payload.get("loja_id"),
+        "perfil": payload.get("perfil"),
+        "email": payload.get("email"),
+        "nome": payload.get("nome", ""),
+        "token": token  # Mantém token para operações com Supabase
+    }
+
+
 async def get_current_user(
+    request: Request,
     credentials: HTTPAuthorizationCredentials = Depends(security),
     settings: Settings = Depends(get_settings)
 ) -> Dict[str, Any]:
     """
     Dependency injection para obter o usuário autenticado.
-    Valida o token JWT e retorna os dados do usuário.
+    Reaproveita o usuário já validado pelo AuthMiddleware (scope["user"]);
+    sem o middleware, valida o token aqui.
     
     Returns:
         Dados do usuário autenticado incluindo:
@@ -93,17 +152,12 @@ async def get_current_user(
     """
     try:
         token = credentials.credentials
-        payload = decode_jwt_token(token, settings)
+        user_data = request.scope.get("user")
         
-        # Extrai dados essenciais do payload
-        user_data = {
-            "user_id": payload.get("sub"),
-            "loja_id": payload.get("loja_id"),
-            "perfil": payload.get("perfil"),
-            "email": payload.get("email"),
-            "nome": payload.get("nome", ""),
-            "token": token  # Mantém token para operações com Supabase
-        }
+        if user_data is None or user_data.get("token") != token:
+            if request.scope.get("auth_error"):
+                raise AuthException(request.scope["auth_error"])
+            user_data = usuario_do_token(token, settings)
         
         # Validações obrigatórias
         if not user_data["loja_id"]:
@@ -173,10 +227,25 @@ def require_vendedor_ou_superior():
     ])
 
 
+def _extrair_bearer(scope) -> Optional[str]:
+    """Token Bearer direto dos headers ASGI (sem construir um Request)"""
+    for nome, valor in scope.get("headers", ()):
+        if nome == b"authorization":
+            valor = valor.decode("latin-1")
+            if valor.startswith("Bearer "):
+                return valor.split(" ")[1]
+            return None
+    return None
+
+
 class AuthMiddleware:
     """
     Middleware de autenticação para configurar contexto de usuário.
     Prepara dados necessários para RLS automático.
+    
+    O token é validado uma única vez por requisição: o resultado fica em
+    scope["user"] (ou a mensagem de erro em scope["auth_error"]) e é
+    reaproveitado por get_current_user e get_optional_user.
     """
     
     def __init__(self, app):
@@ -184,28 +253,14 @@ class AuthMiddleware:
     
     async def __call__(self, scope, receive, send):
         if scope["type"] == "http":
-            request = Request(scope, receive)
-            
-            # Extrai token se presente
-            auth_header = request.headers.get("authorization")
-            if auth_header and auth_header.startswith("Bearer "):
-                token = auth_header.split(" ")[1]
-                
+            token = _extrair_bearer(scope)
+            if token:
                 try:
-                    settings = get_settings()
-                    payload = decode_jwt_token(token, settings)
-                    
-                    # Adiciona dados do usuário ao escopo da requisição
-                    scope["user"] = {
-                        "user_id": payload.get("sub"),
-                        "loja_id": payload.get("loja_id"),
-                        "perfil": payload.get("perfil"),
-                        "token": token
-                    }
-                    
-                except AuthException:
+                    scope["user"] = usuario_do_token(token)
+                except AuthException as e:
                     # Token inválido - continua sem usuário
                     scope["user"] = None
+                    scope["auth_error"] = e.message
         
         await self.app(scope, receive, send)
 
@@ -215,7 +270,7 @@ def get_optional_user(request: Request) -> Optional[Dict[str, Any]]:
     Obtém usuário opcional (não obrigatório).
     Útil para endpoints que funcionam com ou sem autenticação.
     """
-    return getattr(request.scope, "user", None)
+    return request.scope.get("user")
 
 
 def create_access_token(user_data: Dict[str, Any], settings: Settings) -> str:
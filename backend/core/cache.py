@@ -0,0 +1,179 @@
+"""
+Cache em memória (TTL + LRU) para dados de configuração por loja.
+Evita round trips ao Supabase para dados que mudam poucas vezes por mês.
+
+O cache é de cada processo: invalidar_cache_loja() só limpa o worker que
+atendeu a alteração. Com vários workers (uvicorn/gunicorn --workers N), os
+demais continuam com a configuração anterior por até CACHE_CONFIG_TTL_SECONDS;
+quem precisa da configuração atual com certeza (recálculo em lote) invalida e
+relê a loja antes de começar.
+"""
+
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional
+from core.config import get_settings
+import threading
+import time
+import logging
+import weakref
+
+logger = logging.getLogger(__name__)
+
+# Todos os caches criados (para /metrics); referência fraca, não impede coleta
+_caches: "weakref.WeakSet[TTLCache]" = weakref.WeakSet()
+
+
+def caches_registrados() -> List["TTLCache"]:
+    """Caches TTL vivos no processo (config, regras, tokens, ...)"""
+    return list(_caches)
+
+
+class TTLCache:
+    """
+    Cache LRU com expiração por tempo e limite de entradas.
+
+    - Entradas expiram após `ttl_seconds`
+    - Ao atingir `maxsize`, a entrada menos usada recentemente é descartada
+    - Contadores de hit/miss/eviction para monitoramento
+    """
+
+    def __init__(self, nome: str, maxsize: int, ttl_seconds: float):
+        self.nome = nome
+        self.maxsize = max(1, maxsize)
+        self.ttl_seconds = ttl_seconds
+        self._dados: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+        _caches.add(self)
+
+    def get(self, chave: Hashable, default: Any = None) -> Any:
+        """Retorna o valor em cache ou `default` (conta hit/miss)"""
+        with self._lock:
+            item = self._dados.get(chave)
+
+            if item is None:
+                self.misses += 1
+                return default
+
+            expira_em, valor = item
+            if expira_em <= time.monotonic():
+                del self._dados[chave]
+                self.expirations += 1
+                self.misses += 1
+                return default
+
+            self._dados.move_to_end(chave)
+            self.hits += 1
+            return valor
+
+    def set(self, chave: Hashable, valor: Any, ttl_seconds: Optional[float] = None) -> None:
+        """
+        Armazena um valor, descartando o LRU se o limite for atingido
+
+        Args:
+            ttl_seconds: Validade desta entrada (limitada ao TTL do cache)
+        """
+        ttl = self.ttl_seconds if ttl_seconds is None else min(ttl_seconds, self.ttl_seconds)
+        with self._lock:
+            self._dados[chave] = (time.monotonic() + ttl, valor)
+            self._dados.move_to_end(chave)
+
+            while len(self._dados) > self.maxsize:
+                self._dados.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, chave: Hashable) -> None:
+        """Remove uma chave específica"""
+        with self._lock:
+            self._dados.pop(chave, None)
+
+    def invalidate_where(self, predicado: Callable[[Hashable], bool]) -> int:
+        """Remove todas as chaves que satisfazem o predicado. Retorna quantas foram removidas"""
+        with self._lock:
+            chaves = [chave for chave in self._dados if predicado(chave)]
+            for chave in chaves:
+                del self._dados[chave]
+            return len(chaves)
+
+    def clear(self) -> None:
+        """Esvazia o cache (mantém os contadores)"""
+        with self._lock:
+            self._dados.clear()
+
+    def __len__(self) -> int:
+        return len(self._dados)
+
+    def stats(self) -> Dict[str, Any]:
+        """Estatísticas de uso do cache"""
+        total = self.hits + self.misses
+        return {
+            "nome": self.nome,
+            "entradas": len(self._dados),
+            "maxsize": self.maxsize,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0
+        }
+
+
+# ===== CACHES DE CONFIGURAÇÃO POR LOJA =====
+
+_settings = get_settings()
+
+# config_loja: chave = loja_id
+config_loja_cache = TTLCache(
+    "config_loja",
+    maxsize=_settings.cache_config_max_lojas,
+    ttl_seconds=_settings.cache_config_ttl_seconds
+)
+
+# config_regras_comissao_faixa: chave = (loja_id, tipo_comissao) → DataFrame de regras
+regras_comissao_cache = TTLCache(
+    "config_regras_comissao_faixa",
+    maxsize=_settings.cache_config_max_lojas * 2,
+    ttl_seconds=_settings.cache_config_ttl_seconds
+)
+
+# Tabelas de comissão compiladas: chave = (loja_id, tipo_comissao) → TabelaComissao
+tabelas_comissao_cache = TTLCache(
+    "tabelas_comissao",
+    maxsize=_settings.cache_config_max_lojas * 2,
+    ttl_seconds=_settings.cache_config_ttl_seconds
+)
+
+_caches_por_loja = (config_loja_cache, regras_comissao_cache, tabelas_comissao_cache)
+
+
+def _chave_da_loja(loja_id: str) -> Callable[[Hashable], bool]:
+    loja_id = str(loja_id)
+    return lambda chave: chave == loja_id or (isinstance(chave, tuple) and chave[0] == loja_id)
+
+
+def invalidar_cache_loja(loja_id: Optional[str] = None) -> None:
+    """
+    Invalida configurações e regras de comissão em cache (apenas neste processo).
+    Deve ser chamado sempre que config_loja ou config_regras_comissao_faixa forem alterados.
+
+    Args:
+        loja_id: Loja alterada. Se None, invalida todas as lojas.
+    """
+    for cache in _caches_por_loja:
+        if loja_id is None:
+            cache.clear()
+        else:
+            cache.invalidate_where(_chave_da_loja(loja_id))
+
+    logger.info(f"Cache de configuração invalidado: {'todas as lojas' if loja_id is None else f'loja {loja_id}'}")
+
+
+def estatisticas_cache() -> Dict[str, Dict[str, Any]]:
+    """Estatísticas de todos os caches de configuração"""
+    return {cache.nome: cache.stats() for cache in _caches_por_loja}
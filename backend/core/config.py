@@ -18,6 +18,12 @@ class Settings(BaseSettings):
     environment: str = Field(default="development", env="ENVIRONMENT")
     debug: bool = Field(default=True, env="DEBUG")
     log_level: str = Field(default="INFO", env="LOG_LEVEL")
+    log_format: str = Field(default="text", env="LOG_FORMAT")  # text | json
+    log_async: bool = Field(default=True, env="LOG_ASYNC")
+    log_request_sample_rate: float = Field(default=1.0, ge=0, le=1, env="LOG_REQUEST_SAMPLE_RATE")
+    log_slow_request_ms: float = Field(default=1000, env="LOG_SLOW_REQUEST_MS")
+    metrics_habilitado: bool = Field(default=False, env="METRICS_HABILITADO")
+    metrics_token: str = Field(default="", env="METRICS_TOKEN")  # Bearer exigido em /metrics (obrigatório em produção)
     
     # ===== SUPABASE =====
     supabase_url: str = Field(default="", env="SUPABASE_URL")
@@ -28,6 +34,8 @@ class Settings(BaseSettings):
     jwt_secret_key: str = Field(default="development-secret-key", env="JWT_SECRET_KEY")
     jwt_algorithm: str = Field(default="HS256", env="JWT_ALGORITHM")
     jwt_access_token_expire_minutes: int = Field(default=60, env="JWT_ACCESS_TOKEN_EXPIRE_MINUTES")
+    jwt_cache_max_tokens: int = Field(default=10000, env="JWT_CACHE_MAX_TOKENS")
+    jwt_cache_ttl_seconds: int = Field(default=300, env="JWT_CACHE_TTL_SECONDS")
     
     # ===== CORS =====
     cors_origins: str = Field(
@@ -38,10 +46,37 @@ class Settings(BaseSettings):
     # ===== FILE UPLOAD =====
     max_file_size_mb: int = Field(default=10, env="MAX_FILE_SIZE_MB")
     allowed_file_extensions: str = Field(default=".xml", env="ALLOWED_FILE_EXTENSIONS")
+    xml_max_arquivos_lote: int = Field(default=50, env="XML_MAX_ARQUIVOS_LOTE")
+    xml_max_mb_lote: int = Field(default=100, env="XML_MAX_MB_LOTE")  # soma dos arquivos mantidos em memória por lote
+    xml_process_workers: int = Field(default=0, env="XML_PROCESS_WORKERS")  # 0 = nº de CPUs
+    xml_cache_habilitado: bool = Field(default=False, env="XML_CACHE_HABILITADO")  # ligar após a migration 20261018040000
+    clientes_importacao_lote: int = Field(default=500, env="CLIENTES_IMPORTACAO_LOTE")  # linhas por chamada ao banco
+    clientes_importacao_max_linhas: int = Field(default=50000, env="CLIENTES_IMPORTACAO_MAX_LINHAS")
     
     # ===== DATABASE =====
     db_pool_size: int = Field(default=10, env="DB_POOL_SIZE")
     db_max_overflow: int = Field(default=0, env="DB_MAX_OVERFLOW")
+    db_instrumentacao_habilitada: bool = Field(default=True, env="DB_INSTRUMENTACAO_HABILITADA")
+    db_query_budget: int = Field(default=10, env="DB_QUERY_BUDGET")  # consultas por requisição
+    db_query_repeticoes_alerta: int = Field(default=3, env="DB_QUERY_REPETICOES_ALERTA")
+    numeracao_bloco_tamanho: int = Field(default=1, env="NUMERACAO_BLOCO_TAMANHO")  # modos em orcamentos/numeracao.py
+    orcamento_rpc_habilitado: bool = Field(default=False, env="ORCAMENTO_RPC_HABILITADO")  # ligar após as migrations 20261018050000, 060000 e 140000
+    clientes_busca_indexada: bool = Field(default=False, env="CLIENTES_BUSCA_INDEXADA")  # ligar após a migration das colunas *_busca em c_clientes
+    
+    # ===== CACHE =====
+    cache_config_ttl_seconds: int = Field(default=300, env="CACHE_CONFIG_TTL_SECONDS")
+    cache_config_max_lojas: int = Field(default=1000, env="CACHE_CONFIG_MAX_LOJAS")
+    autocomplete_max_lojas: int = Field(default=50, env="AUTOCOMPLETE_MAX_LOJAS")  # índices em memória (LRU)
+    autocomplete_max_clientes_loja: int = Field(default=200000, env="AUTOCOMPLETE_MAX_CLIENTES_LOJA")  # acima: busca no banco
+    autocomplete_ttl_seconds: int = Field(default=900, env="AUTOCOMPLETE_TTL_SECONDS")
+    
+    # ===== JOBS =====
+    recalculo_tamanho_lote: int = Field(default=500, env="RECALCULO_TAMANHO_LOTE")
+    recalculo_max_jobs_historico: int = Field(default=100, env="RECALCULO_MAX_JOBS_HISTORICO")
+    
+    # ===== RELATÓRIOS =====
+    relatorio_tamanho_pagina: int = Field(default=1000, env="RELATORIO_TAMANHO_PAGINA")  # ≤ max-rows do PostgREST
+    dashboard_agregados_habilitado: bool = Field(default=False, env="DASHBOARD_AGREGADOS_HABILITADO")  # ligar após as migrations de c_orcamentos_agregados_diarios
     
     @field_validator('cors_origins')
     @classmethod
@@ -84,6 +119,11 @@ class Settings(BaseSettings):
     def max_file_size_bytes(self) -> int:
         """Retorna o tamanho máximo de arquivo em bytes"""
         return self.max_file_size_mb * 1024 * 1024
+    
+    @property
+    def xml_max_bytes_lote(self) -> int:
+        """Retorna o total de bytes lidos por importação em lote"""
+        return self.xml_max_mb_lote * 1024 * 1024
 
     @property
     def cors_origins_list(self) -> List[str]:
@@ -0,0 +1,146 @@
+"""
+Registro das consultas ao Supabase feitas em cada requisição.
+
+execute_async (core.database) é o ponto único por onde os repositories falam
+com o PostgREST. Quando há um coletor ativo no contexto da requisição, cada
+chamada é registrada com tabela, método HTTP, forma da consulta e duração.
+
+No fim da requisição o RequestContextMiddleware:
+- adiciona o header Server-Timing (total e por tabela)
+- avisa quando o total passa de DB_QUERY_BUDGET
+- avisa quando a mesma forma de consulta se repete DB_QUERY_REPETICOES_ALERTA
+  vezes ou mais (padrão N+1)
+
+Em testes, `with coletar_consultas() as coletor:` dá acesso às mesmas
+informações para travar regressões no número de round trips.
+"""
+
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ConsultaRegistrada:
+    """Uma chamada ao PostgREST"""
+    tabela: str
+    metodo: str
+    forma: str
+    duracao_ms: float
+
+
+def forma_consulta(query, tabela: str, metodo: str) -> str:
+    """
+    Forma da consulta: tabela, método, colunas do select e filtros sem os valores
+
+    Ex: "GET c_orcamentos select=id,numero&id=eq&loja_id=eq"
+    """
+    params = getattr(query, 'params', None)
+    if params is None or not hasattr(params, 'multi_items'):
+        return f'{metodo} {tabela}'
+
+    partes = []
+    for chave, valor in params.multi_items():
+        if chave in ('select', 'order', 'on_conflict', 'columns'):
+            partes.append(f'{chave}={"".join(valor.split())}')
+        elif chave in ('limit', 'offset', 'or', 'and'):
+            partes.append(chave)
+        else:
+            # "eq.123" → "eq", "not.in.(a,b)" → "not.in"
+            operador = valor.split('.', 2)
+            partes.append(f"{chave}={'.'.join(operador[:2]) if operador[0] == 'not' else operador[0]}")
+
+    return f'{metodo} {tabela} ' + '&'.join(sorted(partes))
+
+
+class ColetorConsultas:
+    """Consultas de uma requisição (ou de um bloco de teste)"""
+
+    def __init__(self):
+        self.consultas: List[ConsultaRegistrada] = []
+
+    def registrar(self, tabela: str, metodo: str, forma: str, duracao_ms: float) -> None:
+        self.consultas.append(ConsultaRegistrada(tabela, metodo, forma, duracao_ms))
+
+    @property
+    def total(self) -> int:
+        return len(self.consultas)
+
+    @property
+    def duracao_total_ms(self) -> float:
+        return sum(consulta.duracao_ms for consulta in self.consultas)
+
+    def por_tabela(self) -> Dict[str, List[ConsultaRegistrada]]:
+        """Consultas agrupadas por tabela, na ordem da primeira chamada"""
+        grupos: Dict[str, List[ConsultaRegistrada]] = {}
+        for consulta in self.consultas:
+            grupos.setdefault(consulta.tabela, []).append(consulta)
+        return grupos
+
+    def repeticoes(self, minimo: int) -> Dict[str, int]:
+        """Formas de consulta executadas `minimo` vezes ou mais"""
+        contagem: Dict[str, int] = {}
+        for consulta in self.consultas:
+            contagem[consulta.forma] = contagem.get(consulta.forma, 0) + 1
+        return {forma: vezes for forma, vezes in contagem.items() if vezes >= minimo}
+
+    def server_timing(self) -> str:
+        """Valor do header Server-Timing: total do banco + uma métrica por tabela"""
+        metricas = [f'db;dur={self.duracao_total_ms:.1f};desc="{self.total} consultas"']
+        for tabela, consultas in self.por_tabela().items():
+            duracao = sum(consulta.duracao_ms for consulta in consultas)
+            nome = ''.join(c if c.isalnum() or c in '-_' else '-' for c in tabela)
+            metricas.append(f'db-{nome};dur={duracao:.1f};desc="{len(consultas)}x"')
+        return ', '.join(metricas)
+
+    def avaliar(self, descricao: str, budget: int, repeticoes_alerta: int) -> List[str]:
+        """
+        Registra avisos de orçamento de consultas e de possíveis N+1
+
+        Returns:
+            Lista de avisos (vazia se dentro dos limites)
+        """
+        avisos = []
+
+        if budget and self.total > budget:
+            avisos.append(f"{self.total} consultas (budget {budget})")
+
+        for forma, vezes in self.repeticoes(repeticoes_alerta).items():
+            avisos.append(f"possível N+1: {vezes}x {forma}")
+
+        for aviso in avisos:
+            logger.warning(f"⚠️ {descricao}: {aviso}")
+
+        return avisos
+
+
+_coletor_atual: ContextVar[Optional[ColetorConsultas]] = ContextVar('coletor_consultas', default=None)
+
+
+def coletor_atual() -> Optional[ColetorConsultas]:
+    """Coletor da requisição em andamento (None fora de uma requisição)"""
+    return _coletor_atual.get()
+
+
+def iniciar_coleta():
+    """Ativa um coletor novo no contexto atual. Retorna (coletor, token para encerrar)"""
+    coletor = ColetorConsultas()
+    return coletor, _coletor_atual.set(coletor)
+
+
+def encerrar_coleta(token) -> None:
+    _coletor_atual.reset(token)
+
+
+@contextmanager
+def coletar_consultas() -> Iterator[ColetorConsultas]:
+    """Coleta as consultas feitas dentro do bloco (testes e benchmarks)"""
+    coletor, token = iniciar_coleta()
+    try:
+        yield coletor
+    finally:
+        encerrar_coleta(token)
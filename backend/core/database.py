@@ -8,9 +8,13 @@ from typing import Optional, Dict, Any
 from fastapi import Depends, HTTPException, status
 from core.config import get_settings, Settings
 from core.auth import get_current_user
+from core.consultas import coletor_atual, forma_consulta
+from core.metrics import supabase_chamadas, supabase_duracao
+from concurrent.futures import ThreadPoolExecutor
 import asyncio
 from functools import wraps
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
@@ -131,10 +135,96 @@ def get_service_database(
     return supabase_client.service_client
 
 
+# ===== EXECUÇÃO NÃO-BLOQUEANTE =====
+# O supabase-py usa httpx síncrono: chamar .execute() dentro de um endpoint async
+# trava o event loop durante todo o round trip. As queries são despachadas para
+# um thread pool dedicado e limitado (db_pool_size + db_max_overflow), que
+# funciona como o "pool de conexões" da API.
+
+_db_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_db_executor() -> ThreadPoolExecutor:
+    """
+    Retorna o thread pool usado para as chamadas ao Supabase.
+    Criado sob demanda com o tamanho definido nas configurações.
+    """
+    global _db_executor
+
+    if _db_executor is None:
+        settings = get_settings()
+        _db_executor = ThreadPoolExecutor(
+            max_workers=max(1, settings.db_pool_size + settings.db_max_overflow),
+            thread_name_prefix="supabase-io"
+        )
+
+    return _db_executor
+
+
+async def execute_async(query) -> Any:
+    """
+    Executa uma query do supabase-py sem bloquear o event loop.
+
+    Args:
+        query: Query builder pronto (ex: client.table('x').select('*').eq(...))
+
+    Returns:
+        APIResponse do postgrest, exatamente como query.execute()
+    """
+    loop = asyncio.get_running_loop()
+    coletor = coletor_atual()
+    if coletor is None:
+        return await loop.run_in_executor(get_db_executor(), _executar_medindo, query)
+
+    # Requisição instrumentada: registra tabela, forma e duração (inclui espera no pool)
+    inicio = time.perf_counter()
+    try:
+        return await loop.run_in_executor(get_db_executor(), _executar_medindo, query)
+    finally:
+        tabela, metodo = _identificar_consulta(query)
+        coletor.registrar(tabela, metodo, forma_consulta(query, tabela, metodo), (time.perf_counter() - inicio) * 1000)
+
+
+def _identificar_consulta(query):
+    """(tabela, método HTTP) de um request builder do postgrest"""
+    caminho = getattr(query, 'path', None)
+    tabela = caminho.lstrip('/') if isinstance(caminho, str) and caminho else 'desconhecida'
+    metodo = getattr(query, 'http_method', '')
+    return tabela, metodo if isinstance(metodo, str) else ''
+
+
+def _executar_medindo(query) -> Any:
+    """Executa a query na thread do pool registrando contagem e duração por tabela"""
+    tabela, metodo = _identificar_consulta(query)
+    inicio = time.perf_counter()
+    resultado = 'erro'
+    try:
+        resposta = query.execute()
+        resultado = 'ok'
+        return resposta
+    finally:
+        supabase_duracao.observar(time.perf_counter() - inicio, tabela, metodo)
+        supabase_chamadas.inc(tabela, metodo, resultado)
+
+
+def shutdown_db_executor() -> None:
+    """Finaliza o thread pool de queries (chamado no shutdown da aplicação)"""
+    global _db_executor
+
+    if _db_executor is not None:
+        _db_executor.shutdown(wait=True)
+        _db_executor = None
+
+
 def with_transaction(func):
     """
     Decorator para executar operações em transação.
     Rollback automático em caso de erro.
+
+    Atenção: o cliente HTTP do Supabase não abre transações; cada chamada é
+    confirmada isoladamente. Gravações em várias tabelas que precisam ser
+    atômicas devem ir para uma função Postgres chamada via rpc (ex:
+    criar_orcamento_atomico).
     """
     @wraps(func)
     async def wrapper(*args, **kwargs):
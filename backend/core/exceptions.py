@@ -294,17 +294,21 @@ async def general_exception_handler(request: Request, exc: Exception) -> JSONRes
             "traceback": traceback.format_exc().split('\n')
         }
     
+    request_id = getattr(request.state, 'request_id', None)
     response = create_error_response(
         message=message,
         code="INTERNAL_SERVER_ERROR",
         status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
         details=details,
-        request_id=getattr(request.state, 'request_id', None)
+        request_id=request_id
     )
     
+    # Este handler roda no ServerErrorMiddleware, por fora do RequestContextMiddleware:
+    # o X-Request-ID precisa vir daqui
     return JSONResponse(
         status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-        content=response
+        content=response,
+        headers={"X-Request-ID": request_id} if request_id else None
     )
 
 
@@ -0,0 +1,111 @@
+"""
+Configuração de logging da aplicação.
+
+- LOG_FORMAT=text mantém o formato legível de sempre; LOG_FORMAT=json emite
+  uma linha JSON por registro (campos de `extra` incluídos), para agregadores
+- LOG_ASYNC=true troca o handler bloqueante por QueueHandler + QueueListener:
+  o event loop só enfileira o registro; formatação e escrita acontecem na
+  thread do listener
+- A amostragem de requisições bem-sucedidas fica no RequestContextMiddleware
+  (LOG_REQUEST_SAMPLE_RATE / LOG_SLOW_REQUEST_MS)
+"""
+
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+from datetime import datetime, timezone
+from typing import Optional
+
+from core.config import Settings
+
+FORMATO_TEXTO = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Atributos padrão do LogRecord (o restante veio de `extra`)
+_ATRIBUTOS_PADRAO = frozenset(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Uma linha JSON por registro, com os campos de `extra`"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        dados = {
+            'timestamp': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+
+        for chave, valor in record.__dict__.items():
+            if chave not in _ATRIBUTOS_PADRAO and not chave.startswith('_'):
+                dados[chave] = valor
+
+        if record.exc_info:
+            dados['exception'] = self.formatException(record.exc_info)
+
+        return json.dumps(dados, ensure_ascii=False, default=str)
+
+
+class _QueueHandlerSemFormatacao(logging.handlers.QueueHandler):
+    """
+    Enfileira o registro sem formatá-lo.
+
+    O QueueHandler padrão chama format() em prepare(), ou seja, na thread que
+    loga (o event loop). Como a fila é em memória do mesmo processo, o registro
+    pode seguir intacto e ser formatado pelo handler do listener.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def configurar_logging(settings: Settings) -> None:
+    """
+    Configura o logger raiz conforme Settings (chamada única no import do main)
+
+    Args:
+        settings: log_level, log_format ('text' ou 'json') e log_async
+    """
+    global _listener
+
+    encerrar_logging()
+
+    handler = logging.StreamHandler(sys.stdout)
+    if settings.log_format.lower() == 'json':
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter(FORMATO_TEXTO))
+
+    raiz = logging.getLogger()
+    for existente in list(raiz.handlers):
+        raiz.removeHandler(existente)
+    raiz.setLevel(settings.log_level.upper())
+
+    if settings.log_async:
+        fila: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+        raiz.addHandler(_QueueHandlerSemFormatacao(fila))
+        _listener = logging.handlers.QueueListener(fila, handler, respect_handler_level=True)
+        _listener.start()
+    else:
+        raiz.addHandler(handler)
+
+
+def encerrar_logging() -> None:
+    """Descarrega a fila e para o listener (shutdown da aplicação)"""
+    global _listener
+
+    if _listener is not None:
+        _listener.stop()
+
+        # Logs emitidos depois do shutdown vão direto para o handler final
+        raiz = logging.getLogger()
+        for existente in list(raiz.handlers):
+            if isinstance(existente, _QueueHandlerSemFormatacao):
+                raiz.removeHandler(existente)
+        for handler in _listener.handlers:
+            raiz.addHandler(handler)
+
+        _listener = None
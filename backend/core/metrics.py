@@ -0,0 +1,212 @@
+"""
+Métricas no formato de exposição do Prometheus (texto 0.0.4), sem dependências.
+
+Cada métrica guarda os valores em shards por thread: quem observa só escreve
+no shard da própria thread (event loop, threads do pool de queries), sem lock.
+O /metrics soma os shards no momento da coleta. Assim o custo por observação
+é um bisect + dois incrementos, baixo o bastante para ficar ligado em produção.
+
+Métricas expostas:
+- fluyt_http_requests_total / fluyt_http_request_duration_seconds (por rota)
+- fluyt_supabase_calls_total / fluyt_supabase_call_duration_seconds (por tabela)
+- fluyt_comissao_duration_seconds (engine de comissão)
+- fluyt_cache_* (coletadas dos TTLCache registrados)
+"""
+
+import threading
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Tuple
+
+# Buckets padrão (segundos) do cliente oficial do Prometheus
+BUCKETS_PADRAO = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+
+# Engine de comissão roda em microssegundos
+BUCKETS_MICRO = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05, 0.1)
+
+
+def _escapar(valor: str) -> str:
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _formatar_rotulos(nomes: Tuple[str, ...], valores: Tuple[str, ...], extra: str = '') -> str:
+    pares = [f'{nome}="{_escapar(valor)}"' for nome, valor in zip(nomes, valores)]
+    if extra:
+        pares.append(extra)
+    return '{' + ','.join(pares) + '}' if pares else ''
+
+
+def _formatar_numero(valor: float) -> str:
+    if valor == float('inf'):
+        return '+Inf'
+    return repr(float(valor)) if not float(valor).is_integer() else str(int(valor))
+
+
+class _MetricaPorThread:
+    """Base: um dict de séries por thread, somado na coleta"""
+
+    tipo = ''
+
+    def __init__(self, nome: str, descricao: str, rotulos: Tuple[str, ...] = ()):
+        self.nome = nome
+        self.descricao = descricao
+        self.rotulos = tuple(rotulos)
+        self._local = threading.local()
+        self._shards: List[Dict[Tuple[str, ...], list]] = []
+
+    def _shard(self) -> Dict[Tuple[str, ...], list]:
+        shard = getattr(self._local, 'series', None)
+        if shard is None:
+            shard = self._local.series = {}
+            self._shards.append(shard)  # list.append é atômico no CPython
+        return shard
+
+    def limpar(self) -> None:
+        """Zera todas as séries (uso em testes)"""
+        for shard in list(self._shards):
+            shard.clear()
+
+
+class Contador(_MetricaPorThread):
+    """Contador monotônico com rótulos"""
+
+    tipo = 'counter'
+
+    def inc(self, *valores_rotulos: str, valor: float = 1.0) -> None:
+        shard = self._shard()
+        serie = shard.get(valores_rotulos)
+        if serie is None:
+            shard[valores_rotulos] = [valor]
+        else:
+            serie[0] += valor
+
+    def valores(self) -> Dict[Tuple[str, ...], float]:
+        total: Dict[Tuple[str, ...], float] = {}
+        for shard in list(self._shards):
+            for rotulos, serie in list(shard.items()):
+                total[rotulos] = total.get(rotulos, 0.0) + serie[0]
+        return total
+
+    def expor(self) -> Iterable[str]:
+        for rotulos, valor in sorted(self.valores().items()):
+            yield f'{self.nome}{_formatar_rotulos(self.rotulos, rotulos)} {_formatar_numero(valor)}'
+
+
+class Histograma(_MetricaPorThread):
+    """Histograma com buckets fixos e rótulos"""
+
+    tipo = 'histogram'
+
+    def __init__(self, nome: str, descricao: str, rotulos: Tuple[str, ...] = (), buckets: Tuple[float, ...] = BUCKETS_PADRAO):
+        super().__init__(nome, descricao, rotulos)
+        self.buckets = tuple(sorted(buckets))
+
+    def observar(self, valor: float, *valores_rotulos: str) -> None:
+        shard = self._shard()
+        serie = shard.get(valores_rotulos)
+        if serie is None:
+            # [contagem por bucket (não cumulativa) + bucket +Inf, soma]
+            serie = shard[valores_rotulos] = [[0] * (len(self.buckets) + 1), 0.0]
+        serie[0][bisect_left(self.buckets, valor)] += 1
+        serie[1] += valor
+
+    def valores(self) -> Dict[Tuple[str, ...], Tuple[List[int], float]]:
+        total: Dict[Tuple[str, ...], Tuple[List[int], float]] = {}
+        for shard in list(self._shards):
+            for rotulos, (contagens, soma) in list(shard.items()):
+                acumulado = total.get(rotulos)
+                if acumulado is None:
+                    total[rotulos] = (list(contagens), soma)
+                else:
+                    total[rotulos] = ([a + b for a, b in zip(acumulado[0], contagens)], acumulado[1] + soma)
+        return total
+
+    def expor(self) -> Iterable[str]:
+        for rotulos, (contagens, soma) in sorted(self.valores().items()):
+            cumulativo = 0
+            for limite, contagem in zip(self.buckets + (float('inf'),), contagens):
+                cumulativo += contagem
+                le = f'le="{_formatar_numero(limite)}"'
+                yield f'{self.nome}_bucket{_formatar_rotulos(self.rotulos, rotulos, le)} {cumulativo}'
+            yield f'{self.nome}_sum{_formatar_rotulos(self.rotulos, rotulos)} {_formatar_numero(soma)}'
+            yield f'{self.nome}_count{_formatar_rotulos(self.rotulos, rotulos)} {cumulativo}'
+
+
+class RegistroMetricas:
+    """Conjunto de métricas + coletores chamados no momento do scrape"""
+
+    def __init__(self):
+        self._metricas: List[_MetricaPorThread] = []
+        self._coletores: List[Callable[[], Iterable[str]]] = []
+
+    def contador(self, nome: str, descricao: str, rotulos: Tuple[str, ...] = ()) -> Contador:
+        metrica = Contador(nome, descricao, rotulos)
+        self._metricas.append(metrica)
+        return metrica
+
+    def histograma(self, nome: str, descricao: str, rotulos: Tuple[str, ...] = (), buckets: Tuple[float, ...] = BUCKETS_PADRAO) -> Histograma:
+        metrica = Histograma(nome, descricao, rotulos, buckets)
+        self._metricas.append(metrica)
+        return metrica
+
+    def registrar_coletor(self, coletor: Callable[[], Iterable[str]]) -> None:
+        """Coletor devolve linhas já no formato de exposição (com # HELP/# TYPE)"""
+        self._coletores.append(coletor)
+
+    def expor(self) -> str:
+        """Texto completo para o GET /metrics"""
+        linhas: List[str] = []
+        for metrica in self._metricas:
+            linhas.append(f'# HELP {metrica.nome} {metrica.descricao}')
+            linhas.append(f'# TYPE {metrica.nome} {metrica.tipo}')
+            linhas.extend(metrica.expor())
+        for coletor in self._coletores:
+            linhas.extend(coletor())
+        return '\n'.join(linhas) + '\n'
+
+
+# ===== MÉTRICAS DA APLICAÇÃO =====
+
+registro = RegistroMetricas()
+
+http_requisicoes = registro.contador(
+    'fluyt_http_requests_total', 'Requisições HTTP por rota, método e status',
+    ('method', 'route', 'status')
+)
+http_duracao = registro.histograma(
+    'fluyt_http_request_duration_seconds', 'Latência até o início da resposta, por rota e método',
+    ('method', 'route')
+)
+supabase_chamadas = registro.contador(
+    'fluyt_supabase_calls_total', 'Chamadas ao PostgREST por tabela, método e resultado',
+    ('tabela', 'metodo', 'resultado')
+)
+supabase_duracao = registro.histograma(
+    'fluyt_supabase_call_duration_seconds', 'Duração das chamadas ao PostgREST por tabela e método',
+    ('tabela', 'metodo')
+)
+comissao_duracao = registro.histograma(
+    'fluyt_comissao_duration_seconds', 'Duração dos cálculos da engine de comissão',
+    ('operacao',), BUCKETS_MICRO
+)
+
+
+def _coletar_caches() -> Iterable[str]:
+    """Hits, misses, evictions, entradas e hit ratio de todos os TTLCache"""
+    from core.cache import caches_registrados
+
+    estatisticas = [cache.stats() for cache in caches_registrados()]
+    series = (
+        ('fluyt_cache_hits_total', 'counter', 'Acertos do cache', 'hits'),
+        ('fluyt_cache_misses_total', 'counter', 'Faltas do cache (inclui expiradas)', 'misses'),
+        ('fluyt_cache_evictions_total', 'counter', 'Entradas descartadas por LRU', 'evictions'),
+        ('fluyt_cache_entries', 'gauge', 'Entradas atuais', 'entradas'),
+        ('fluyt_cache_hit_ratio', 'gauge', 'hits / (hits + misses)', 'hit_ratio'),
+    )
+    for nome, tipo, descricao, chave in series:
+        yield f'# HELP {nome} {descricao}'
+        yield f'# TYPE {nome} {tipo}'
+        for stats in sorted(estatisticas, key=lambda item: item['nome']):
+            yield f'{nome}{{cache="{_escapar(stats["nome"])}"}} {_formatar_numero(stats[chave])}'
+
+
+registro.registrar_coletor(_coletar_caches)
@@ -0,0 +1,174 @@
+"""
+Middleware ASGI de contexto da requisição.
+
+Substitui os antigos @app.middleware("http") (request id, log de requisições e
+headers de debug). Aqueles são BaseHTTPMiddleware: cada um cria uma task e um
+stream intermediário para a resposta, custando tempo por requisição e
+atrapalhando respostas em streaming. Aqui é um único middleware ASGI puro que
+só intercepta a mensagem `http.response.start` para injetar os headers; o
+corpo da resposta passa direto, sem buffer.
+"""
+
+import logging
+import random
+import time
+import uuid
+from typing import Callable, Dict
+
+from starlette.datastructures import MutableHeaders
+
+from core.consultas import encerrar_coleta, iniciar_coleta
+from core.metrics import http_duracao, http_requisicoes
+
+logger = logging.getLogger(__name__)
+
+# Rótulo de rota para requisições que não casaram com nenhuma rota (404, OPTIONS do CORS)
+ROTA_NAO_ENCONTRADA = "__nao_encontrada__"
+
+
+def _header(scope, nome: bytes) -> str:
+    """Valor de um header da requisição direto do scope ASGI"""
+    for chave, valor in scope.get("headers", ()):
+        if chave == nome:
+            return valor.decode("latin-1")
+    return ""
+
+
+class RequestContextMiddleware:
+    """
+    Request ID, log de requisição e tempo de processamento.
+
+    - request_id fica em request.state.request_id (usado pelos handlers de exceção)
+    - X-Request-ID e X-Process-Time são adicionados na resposta
+    - debug_headers=True adiciona X-Environment/X-Debug (desenvolvimento)
+    - Contador e histograma de latência por rota (template, ex: /api/v1/orcamentos/{orcamento_id})
+    - Consultas ao Supabase da requisição (core.consultas): header Server-Timing e
+      avisos de budget (`budget_consultas`) e de N+1 (`repeticoes_alerta`)
+    - Um registro por requisição, emitido no início da resposta:
+        5xx → ERROR, 4xx ou acima de `lento_ms` → WARNING (sempre registrados)
+        demais → INFO, amostrados por `taxa_amostragem` (0.0 a 1.0)
+    """
+
+    def __init__(
+        self,
+        app,
+        debug_headers: bool = False,
+        taxa_amostragem: float = 1.0,
+        lento_ms: float = 1000.0,
+        instrumentar_consultas: bool = True,
+        budget_consultas: int = 10,
+        repeticoes_alerta: int = 3
+    ):
+        self.app = app
+        self.debug_headers = debug_headers
+        self.taxa_amostragem = taxa_amostragem
+        self.lento_ms = lento_ms
+        self.instrumentar_consultas = instrumentar_consultas
+        self.budget_consultas = budget_consultas
+        self.repeticoes_alerta = repeticoes_alerta
+        self._rotas: Dict[Callable, str] = {}
+
+    def _rota(self, scope) -> str:
+        """Template da rota atendida (o router grava o endpoint no scope)"""
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return ROTA_NAO_ENCONTRADA
+
+        rota = self._rotas.get(endpoint)
+        if rota is None:
+            rota = next(
+                (r.path for r in getattr(scope.get("app"), "routes", ()) if getattr(r, "endpoint", None) is endpoint),
+                getattr(endpoint, "__name__", ROTA_NAO_ENCONTRADA)
+            )
+            self._rotas[endpoint] = rota
+        return rota
+
+    def _nivel_log(self, status_code: int, duracao_ms: float) -> int:
+        """Nível do registro da requisição ou 0 para não registrar"""
+        if status_code >= 500:
+            return logging.ERROR
+        if status_code >= 400 or duracao_ms >= self.lento_ms:
+            return logging.WARNING
+        if self.taxa_amostragem >= 1.0 or random.random() < self.taxa_amostragem:
+            return logging.INFO
+        return 0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = str(uuid.uuid4())
+        scope.setdefault("state", {})["request_id"] = request_id
+        start_time = time.perf_counter()
+        coletor, token_coleta = iniciar_coleta() if self.instrumentar_consultas else (None, None)
+
+        resposta_iniciada = False
+
+        async def send_com_headers(message):
+            nonlocal resposta_iniciada
+            if message["type"] == "http.response.start":
+                resposta_iniciada = True
+                process_time = time.perf_counter() - start_time
+
+                headers = MutableHeaders(scope=message)
+                headers.append("X-Request-ID", request_id)
+                headers.append("X-Process-Time", str(process_time))
+                if self.debug_headers:
+                    headers.append("X-Environment", "development")
+                    headers.append("X-Debug", "true")
+                if coletor is not None and coletor.total:
+                    headers.append("Server-Timing", coletor.server_timing())
+
+                self._contabilizar(scope, message["status"], process_time, request_id, coletor)
+
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_com_headers)
+        except Exception:
+            # Exceção não tratada: o 500 é enviado pelo ServerErrorMiddleware, que fica
+            # por fora deste middleware e não passa pelo send_com_headers. Contabiliza
+            # aqui (o X-Request-ID vem do general_exception_handler).
+            if not resposta_iniciada:
+                self._contabilizar(scope, 500, time.perf_counter() - start_time, request_id, coletor)
+            raise
+        finally:
+            if token_coleta is not None:
+                encerrar_coleta(token_coleta)
+
+    def _contabilizar(self, scope, status_code: int, process_time: float, request_id: str, coletor) -> None:
+        """Métricas, avaliação das consultas e registro da requisição"""
+        rota = self._rota(scope)
+        http_requisicoes.inc(scope["method"], rota, str(status_code))
+        http_duracao.observar(process_time, scope["method"], rota)
+
+        if coletor is not None and coletor.total:
+            coletor.avaliar(f"{scope['method']} {rota}", self.budget_consultas, self.repeticoes_alerta)
+
+        self._registrar(scope, status_code, process_time, request_id)
+
+    def _registrar(self, scope, status_code: int, process_time: float, request_id: str) -> None:
+        """Registra a requisição (sem montar nada se o nível estiver desabilitado)"""
+        duracao_ms = process_time * 1000
+        nivel = self._nivel_log(status_code, duracao_ms)
+        if not nivel or not logger.isEnabledFor(nivel):
+            return
+
+        client = scope.get("client")
+        # Mensagem com argumentos: a formatação fica para o handler (thread do listener)
+        logger.log(
+            nivel,
+            "🌐 %s %s %s - %.1fms",
+            scope["method"], scope["path"], status_code, duracao_ms,
+            extra={
+                "method": scope["method"],
+                "path": scope["path"],
+                "query_params": scope.get("query_string", b"").decode("latin-1"),
+                "status_code": status_code,
+                "process_time": process_time,
+                "request_id": request_id,
+                "user_agent": _header(scope, b"user-agent"),
+                "client_ip": client[0] if client else ""
+            }
+        )
@@ -0,0 +1,142 @@
+"""
+Paginação por cursor (keyset) para listagens ordenadas por created_at.
+
+O cursor é opaco para o cliente: base64 de (created_at, id) do último item
+da página. A próxima página é buscada com
+    created_at <= c AND (created_at < c OR (created_at = c AND id < i))
+ordenada por (created_at desc, id desc), usando o índice em vez de OFFSET.
+Assim o custo não cresce com a profundidade da página e inserts concorrentes
+não duplicam nem pulam registros.
+"""
+
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+from datetime import datetime
+import asyncio
+import base64
+import json
+import uuid
+
+from core.database import execute_async
+from core.exceptions import ValidationException
+
+
+def codificar_cursor(created_at: str, registro_id: str) -> str:
+    """Gera o cursor opaco a partir do último registro da página"""
+    bruto = json.dumps([created_at, str(registro_id)], separators=(',', ':'))
+    return base64.urlsafe_b64encode(bruto.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor: str) -> Tuple[str, str]:
+    """
+    Decodifica o cursor recebido do cliente
+
+    Os valores vão para a expressão `or=(...)` do PostgREST: só passam uma
+    data ISO-8601 e um UUID (um cursor forjado com `)` ou `,` vira 400, não 500).
+
+    Raises:
+        ValidationException: cursor malformado
+    """
+    try:
+        preenchimento = '=' * (-len(cursor) % 4)
+        created_at, registro_id = json.loads(base64.urlsafe_b64decode(cursor + preenchimento))
+        datetime.fromisoformat(created_at)
+        return created_at, str(uuid.UUID(registro_id))
+    except Exception:
+        raise ValidationException("Cursor de paginação inválido", field="cursor")
+
+
+def _filtro_or(query, expressao: str):
+    """Aplica um filtro `or=(...)` do PostgREST (postgrest-py 0.13 ainda não expõe or_())"""
+    if hasattr(query, 'or_'):
+        return query.or_(expressao)
+
+    query.params = query.params.add('or', f'({expressao})')
+    return query
+
+
+def aplicar_keyset(query, cursor: Optional[str], limit: int, coluna_data: str = 'created_at'):
+    """
+    Aplica filtro keyset + ordenação estável + limite à query PostgREST.
+
+    Busca `limit + 1` linhas: a linha extra só indica se existe próxima página.
+
+    Args:
+        query: Query builder do supabase-py (já com filtros de negócio)
+        cursor: Cursor recebido (vazio ou None = primeira página)
+        limit: Tamanho da página
+        coluna_data: Coluna temporal da ordenação
+    """
+    if cursor:
+        created_at, registro_id = decodificar_cursor(cursor)
+        # O lte delimita a faixa do índice; o OR desempata pelo id
+        query = _filtro_or(
+            query.lte(coluna_data, created_at),
+            f'{coluna_data}.lt."{created_at}",'
+            f'and({coluna_data}.eq."{created_at}",id.lt.{registro_id})'
+        )
+
+    # Um único parâmetro order com as duas colunas (order=created_at.desc,id.desc)
+    return (
+        query
+        .order(f'{coluna_data}.desc,id', desc=True)
+        .limit(limit + 1)
+    )
+
+
+def montar_pagina(
+    registros: List[Dict[str, Any]],
+    limit: int,
+    coluna_data: str = 'created_at'
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Separa a página e calcula o next_cursor
+
+    Returns:
+        (registros da página, next_cursor ou None se for a última página)
+    """
+    if len(registros) <= limit:
+        return registros, None
+
+    pagina = registros[:limit]
+    ultimo = pagina[-1]
+    return pagina, codificar_cursor(ultimo[coluna_data], ultimo['id'])
+
+
+async def percorrer_keyset(
+    montar_query: Callable[[], Any],
+    tamanho_pagina: int,
+    coluna_data: str = 'created_at'
+) -> AsyncIterator[List[Dict[str, Any]]]:
+    """
+    Percorre todas as páginas de uma listagem por cursor, uma página por vez
+
+    A próxima página é pedida enquanto a atual é consumida; além dela, só a
+    página em voo fica em memória. Encerrar o gerador cancela a requisição
+    pendente (ex: download interrompido).
+
+    Args:
+        montar_query: Cria a query com os filtros de negócio. O builder do PostgREST
+            é mutável, então cada página parte de uma query nova
+        tamanho_pagina: Linhas por requisição (≤ max-rows do PostgREST)
+        coluna_data: Coluna temporal da ordenação
+    """
+    def pedir(cursor: Optional[str]):
+        return asyncio.ensure_future(
+            execute_async(aplicar_keyset(montar_query(), cursor, tamanho_pagina, coluna_data))
+        )
+
+    pendente = pedir(None)
+    try:
+        while pendente is not None:
+            result = await pendente
+            pagina, cursor = montar_pagina(result.data, tamanho_pagina, coluna_data)
+
+            # Próxima página já em voo enquanto esta é processada
+            pendente = pedir(cursor) if cursor else None
+            if pendente is not None:
+                await asyncio.sleep(0)  # deixa a task despachar a requisição antes do processamento (síncrono)
+            if pagina:
+                yield pagina
+    finally:
+        if pendente is not None:
+            pendente.cancel()
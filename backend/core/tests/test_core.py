@@ -0,0 +1,356 @@
+# Tests for core (autenticação, middleware, métricas)
+import hashlib
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from jose import jwt
+
+import core.auth as auth
+from core.auth import (
+    AuthException,
+    AuthMiddleware,
+    create_access_token,
+    get_current_user,
+    get_optional_user,
+    tokens_verificados_cache,
+    usuario_do_token,
+    verificar_token,
+)
+from core.config import get_settings
+
+
+# ===== CACHE DE TOKENS VERIFICADOS =====
+
+USUARIO = {'user_id': 'u-1', 'loja_id': 'loja-1', 'perfil': 'VENDEDOR', 'email': 'ana@fluyt.com'}
+
+
+def _token(minutos=30, **extras):
+    settings = get_settings()
+    payload = {
+        'sub': 'u-1', 'loja_id': 'loja-1', 'perfil': 'VENDEDOR', 'email': 'ana@fluyt.com',
+        'exp': datetime.utcnow() + timedelta(minutes=minutos), **extras
+    }
+    return jwt.encode(payload, settings.jwt_secret_key, algorithm=settings.jwt_algorithm)
+
+
+@pytest.fixture
+def decodificacoes(monkeypatch):
+    """Conta as chamadas a decode_jwt_token (cache limpo antes de cada teste)"""
+    tokens_verificados_cache.clear()
+    chamadas = []
+    original = auth.decode_jwt_token
+
+    def contar(token, settings):
+        chamadas.append(token)
+        return original(token, settings)
+
+    monkeypatch.setattr(auth, 'decode_jwt_token', contar)
+    yield chamadas
+    tokens_verificados_cache.clear()
+
+
+def test_token_verificado_uma_vez(decodificacoes):
+    token = create_access_token(USUARIO, get_settings())
+
+    primeiro = usuario_do_token(token)
+    segundo = usuario_do_token(token)
+
+    assert len(decodificacoes) == 1
+    assert primeiro == segundo and primeiro['user_id'] == 'u-1'
+    # Cada chamada devolve um dict novo: alterar um não contamina o cache
+    primeiro['perfil'] = 'ADMIN_MASTER'
+    assert usuario_do_token(token)['perfil'] == 'VENDEDOR'
+
+
+def test_validade_no_cache_limitada_ao_exp(decodificacoes):
+    token = _token(minutos=1)  # exp antes do TTL do cache (300s)
+
+    verificar_token(token)
+
+    expira_em, _ = tokens_verificados_cache._dados[hashlib.sha256(token.encode()).hexdigest()]
+    assert expira_em - time.monotonic() <= 61
+    assert tokens_verificados_cache.ttl_seconds > 61
+
+
+def test_token_expirado_ou_invalido_rejeitado(decodificacoes):
+    expirado = _token(minutos=-1)
+    outra_chave = jwt.encode({'sub': 'u-1', 'exp': datetime.utcnow() + timedelta(minutes=5)}, 'outra', algorithm='HS256')
+    sem_usuario = _token(sub=None)
+
+    for token in (expirado, outra_chave, sem_usuario, 'nao-e-um-jwt'):
+        with pytest.raises(AuthException):
+            verificar_token(token)
+        with pytest.raises(AuthException):
+            verificar_token(token)  # nunca servido do cache
+
+    assert len(decodificacoes) == 8
+    assert len(tokens_verificados_cache) == 0
+
+
+def _app_autenticado():
+    app = FastAPI()
+    app.add_middleware(AuthMiddleware)
+
+    @app.get('/privado')
+    async def privado(current_user=Depends(get_current_user)):
+        return {'user_id': current_user['user_id']}
+
+    @app.get('/publico')
+    async def publico(usuario=Depends(get_optional_user)):
+        return {'usuario': usuario}
+
+    return TestClient(app)
+
+
+def test_middleware_valida_uma_vez_e_repassa_erro(decodificacoes):
+    cliente = _app_autenticado()
+
+    resposta = cliente.get('/privado', headers={'Authorization': f'Bearer {_token()}'})
+    assert resposta.status_code == 200 and resposta.json() == {'user_id': 'u-1'}
+    assert len(decodificacoes) == 1  # middleware valida; a dependency reaproveita scope["user"]
+
+    # Token inválido: o erro do middleware (scope["auth_error"]) vira 401 sem nova validação
+    resposta = cliente.get('/privado', headers={'Authorization': f'Bearer {_token(minutos=-1)}'})
+    assert resposta.status_code == 401
+    assert resposta.json()['detail'] == 'Token inválido ou expirado'
+    assert len(decodificacoes) == 2
+
+
+def test_usuario_opcional_sem_token(decodificacoes):
+    cliente = _app_autenticado()
+
+    assert cliente.get('/publico').json() == {'usuario': None}
+    assert cliente.get('/publico', headers={'Authorization': f'Bearer {_token()}'}).json()['usuario']['user_id'] == 'u-1'
+    assert len(decodificacoes) == 1
+
+
+# ===== CONTEXTO DA REQUISIÇÃO =====
+
+import logging
+
+from core.exceptions import register_exception_handlers
+from core.metrics import http_requisicoes
+from core.middleware import RequestContextMiddleware
+
+
+def _app_com_erro():
+    app = FastAPI()
+    register_exception_handlers(app)
+    app.add_middleware(RequestContextMiddleware, instrumentar_consultas=False)
+
+    @app.get('/ok')
+    async def ok():
+        return {'ok': True}
+
+    @app.get('/quebra')
+    async def quebra():
+        raise RuntimeError('falha inesperada')
+
+    return TestClient(app, raise_server_exceptions=False)
+
+
+def test_excecao_nao_tratada_registra_500(caplog):
+    cliente = _app_com_erro()
+    http_requisicoes.limpar()
+
+    with caplog.at_level(logging.ERROR, logger='core.middleware'):
+        resposta = cliente.get('/quebra')
+
+    assert resposta.status_code == 500
+    assert resposta.headers['X-Request-ID'] == resposta.json()['error']['request_id']
+    assert http_requisicoes.valores()[('GET', '/quebra', '500')] == 1
+    registros = [r for r in caplog.records if r.name == 'core.middleware']
+    assert len(registros) == 1 and registros[0].status_code == 500
+    assert registros[0].request_id == resposta.headers['X-Request-ID']
+
+
+def test_nivel_log_erros_e_lentas_fora_da_amostragem(monkeypatch):
+    middleware = RequestContextMiddleware(None, taxa_amostragem=0.0, lento_ms=100.0)
+
+    assert middleware._nivel_log(500, 5.0) == logging.ERROR
+    assert middleware._nivel_log(404, 5.0) == logging.WARNING
+    assert middleware._nivel_log(200, 150.0) == logging.WARNING
+    assert middleware._nivel_log(200, 5.0) == 0  # taxa 0: nenhuma requisição rápida registrada
+
+    assert RequestContextMiddleware(None, taxa_amostragem=1.0)._nivel_log(200, 5.0) == logging.INFO
+
+    amostrado = RequestContextMiddleware(None, taxa_amostragem=0.5)
+    monkeypatch.setattr('core.middleware.random.random', lambda: 0.4)
+    assert amostrado._nivel_log(200, 5.0) == logging.INFO
+    monkeypatch.setattr('core.middleware.random.random', lambda: 0.6)
+    assert amostrado._nivel_log(200, 5.0) == 0
+
+
+# ===== LOGGING =====
+
+import json
+import sys
+
+import core.logging_config as logging_config
+from core.logging_config import JsonFormatter, _QueueHandlerSemFormatacao, configurar_logging, encerrar_logging
+
+
+@pytest.fixture
+def logger_raiz():
+    """Restaura handlers e nível do logger raiz (configurar_logging os substitui)"""
+    raiz = logging.getLogger()
+    handlers, nivel = list(raiz.handlers), raiz.level
+    yield raiz
+    encerrar_logging()
+    for handler in list(raiz.handlers):
+        raiz.removeHandler(handler)
+    for handler in handlers:
+        raiz.addHandler(handler)
+    raiz.setLevel(nivel)
+
+
+def test_json_formatter_inclui_campos_extra():
+    registro_log = logging.getLogger('teste').makeRecord(
+        'teste', logging.WARNING, __file__, 1, '🌐 %s %s', ('GET', '/ok'), None,
+        extra={'status_code': 404, 'request_id': 'r-1', 'process_time': 0.5, '_interno': 'x'}
+    )
+
+    dados = json.loads(JsonFormatter().format(registro_log))
+
+    assert dados['message'] == '🌐 GET /ok'
+    assert (dados['level'], dados['logger']) == ('WARNING', 'teste')
+    assert (dados['status_code'], dados['request_id'], dados['process_time']) == (404, 'r-1', 0.5)
+    assert '_interno' not in dados and 'args' not in dados and 'msg' not in dados
+
+
+def test_json_formatter_inclui_excecao():
+    try:
+        raise ValueError('quebrou')
+    except ValueError:
+        registro_log = logging.getLogger('teste').makeRecord(
+            'teste', logging.ERROR, __file__, 1, 'falha', (), sys.exc_info()
+        )
+
+    dados = json.loads(JsonFormatter().format(registro_log))
+    assert 'ValueError: quebrou' in dados['exception']
+
+
+def test_queue_handler_enfileira_sem_formatar():
+    registro_log = logging.getLogger('teste').makeRecord('teste', logging.INFO, __file__, 1, 'valor %s de %s', ('x', 2), None)
+
+    preparado = _QueueHandlerSemFormatacao(None).prepare(registro_log)
+
+    assert preparado is registro_log
+    assert preparado.args == ('x', 2) and not hasattr(preparado, 'message')
+
+
+def test_listener_descarrega_fila_no_encerramento(logger_raiz, capsys):
+    configuracao = get_settings().model_copy(update={'log_format': 'json', 'log_async': True, 'log_level': 'INFO'})
+    configurar_logging(configuracao)
+
+    assert any(isinstance(h, _QueueHandlerSemFormatacao) for h in logger_raiz.handlers)
+    assert logging_config._listener is not None
+
+    for indice in range(50):
+        logging.getLogger('teste').info('registro %s', indice, extra={'request_id': f'r-{indice}'})
+    encerrar_logging()
+
+    linhas = [json.loads(linha) for linha in capsys.readouterr().out.splitlines()]
+    assert [linha['request_id'] for linha in linhas] == [f'r-{indice}' for indice in range(50)]
+
+    # Depois do shutdown: sem fila, direto no handler final
+    assert logging_config._listener is None
+    assert not any(isinstance(h, _QueueHandlerSemFormatacao) for h in logger_raiz.handlers)
+    logging.getLogger('teste').warning('depois do encerramento')
+    assert json.loads(capsys.readouterr().out)['message'] == 'depois do encerramento'
+
+
+# ===== MÉTRICAS =====
+
+import threading
+
+from core.metrics import RegistroMetricas, registro
+
+
+def test_metrics_formato_de_exposicao(monkeypatch):
+    import main
+
+    monkeypatch.setattr(main, 'settings', main.settings.model_copy(update={'metrics_habilitado': True, 'metrics_token': ''}))
+    http_requisicoes.limpar()
+    cliente = TestClient(main.app)
+    assert cliente.get('/health').status_code == 200
+
+    resposta = cliente.get('/metrics')
+    assert resposta.status_code == 200
+    assert resposta.headers['content-type'].startswith('text/plain; version=0.0.4')
+
+    linhas = resposta.text.splitlines()
+    assert '# TYPE fluyt_http_requests_total counter' in linhas
+    assert '# TYPE fluyt_http_request_duration_seconds histogram' in linhas
+    assert 'fluyt_http_requests_total{method="GET",route="/health",status="200"} 1' in linhas
+    assert 'fluyt_http_request_duration_seconds_count{method="GET",route="/health"} 1' in linhas
+    assert any(l.startswith('fluyt_http_request_duration_seconds_bucket{method="GET",route="/health",le="+Inf"} 1') for l in linhas)
+    assert '# TYPE fluyt_cache_hit_ratio gauge' in linhas
+    # Toda linha de amostra é "nome{rótulos} valor"
+    for linha in linhas:
+        if linha and not linha.startswith('#'):
+            nome, valor = linha.rsplit(' ', 1)
+            float(valor.replace('+Inf', 'inf'))
+
+
+def test_metrics_desligado_ou_protegido_por_token(monkeypatch):
+    import main
+
+    cliente = TestClient(main.app)
+    monkeypatch.setattr(main, 'settings', main.settings.model_copy(update={'metrics_habilitado': False}))
+    assert cliente.get('/metrics').status_code == 404
+
+    monkeypatch.setattr(main, 'settings', main.settings.model_copy(update={'metrics_habilitado': True, 'metrics_token': 's3gredo'}))
+    assert cliente.get('/metrics').status_code == 401
+    assert cliente.get('/metrics', headers={'Authorization': 'Bearer outro'}).status_code == 401
+    assert cliente.get('/metrics', headers={'Authorization': 'Bearer s3gredo'}).status_code == 200
+
+
+def test_metrics_conta_500_e_404():
+    cliente = _app_com_erro()
+    http_requisicoes.limpar()
+
+    cliente.get('/ok')
+    cliente.get('/quebra')
+    cliente.get('/nao-existe')
+
+    linhas = registro.expor().splitlines()
+    assert 'fluyt_http_requests_total{method="GET",route="/ok",status="200"} 1' in linhas
+    assert 'fluyt_http_requests_total{method="GET",route="/quebra",status="500"} 1' in linhas
+    assert 'fluyt_http_requests_total{method="GET",route="__nao_encontrada__",status="404"} 1' in linhas
+
+
+def test_metrics_soma_shards_das_threads():
+    metricas = RegistroMetricas()
+    contador = metricas.contador('teste_total', 'Contador de teste', ('tipo',))
+    histograma = metricas.histograma('teste_seconds', 'Histograma de teste', ('tipo',), buckets=(0.5, 1.0))
+
+    def observar():
+        for _ in range(100):
+            contador.inc('a')
+            histograma.observar(0.25, 'a')
+        contador.inc('b"x', valor=2.5)
+        histograma.observar(4.0, 'a')
+
+    threads = [threading.Thread(target=observar) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    observar()  # shard da thread principal
+
+    assert len(contador._shards) == 5
+    assert contador.valores() == {('a',): 500.0, ('b"x',): 12.5}
+
+    linhas = metricas.expor().splitlines()
+    assert linhas[:2] == ['# HELP teste_total Contador de teste', '# TYPE teste_total counter']
+    assert 'teste_total{tipo="a"} 500' in linhas
+    assert 'teste_total{tipo="b\\"x"} 12.5' in linhas  # aspas escapadas no rótulo
+    assert 'teste_seconds_bucket{tipo="a",le="0.5"} 500' in linhas
+    assert 'teste_seconds_bucket{tipo="a",le="1"} 500' in linhas
+    assert 'teste_seconds_bucket{tipo="a",le="+Inf"} 505' in linhas
+    assert 'teste_seconds_count{tipo="a"} 505' in linhas
+    assert 'teste_seconds_sum{tipo="a"} 145' in linhas
@@ -6,22 +6,23 @@ Configura middleware, routers, documentação e segurança.
 from fastapi import FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.gzip import GZipMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from contextlib import asynccontextmanager
+import hmac
 import logging
 import time
-import uuid
 
 # Core imports
 from core.config import get_settings
 from core.auth import AuthMiddleware
+from core.middleware import RequestContextMiddleware
 from core.exceptions import register_exception_handlers
+from core.database import shutdown_db_executor
+from core.logging_config import configurar_logging, encerrar_logging
+from core.metrics import registro as registro_metricas
 
-# Configuração de logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# Configuração de logging (LOG_LEVEL, LOG_FORMAT, LOG_ASYNC)
+configurar_logging(get_settings())
 logger = logging.getLogger(__name__)
 
 
@@ -41,6 +42,8 @@ async def lifespan(app: FastAPI):
             raise ValueError("SUPABASE_URL não configurada")
         if not settings.jwt_secret_key:
             raise ValueError("JWT_SECRET_KEY não configurada")
+        if settings.metrics_habilitado and settings.is_production and not settings.metrics_token:
+            raise ValueError("METRICS_TOKEN não configurado (obrigatório com METRICS_HABILITADO em produção)")
         
         logger.info(f"✅ Configurações validadas - Ambiente: {settings.environment}")
         logger.info(f"📊 Supabase URL: {settings.supabase_url}")
@@ -54,6 +57,12 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     logger.info("🛑 Finalizando Fluyt Comercial API...")
+    shutdown_db_executor()
+    
+    from modules.ambientes.parser_xml import shutdown_xml_executor
+    shutdown_xml_executor()
+    
+    encerrar_logging()
 
 
 # Configuração da aplicação FastAPI
@@ -95,69 +104,32 @@ app = FastAPI(
 
 # ===== MIDDLEWARES =====
 
-# 1. Request ID para rastreamento
-@app.middleware("http")
-async def add_request_id(request: Request, call_next):
-    """Adiciona ID único para cada requisição para rastreamento de logs"""
-    request_id = str(uuid.uuid4())
-    request.state.request_id = request_id
-    
-    # Adiciona no header de resposta
-    response = await call_next(request)
-    response.headers["X-Request-ID"] = request_id
-    return response
-
-# 2. Logging de requisições
-@app.middleware("http")
-async def log_requests(request: Request, call_next):
-    """Log detalhado de todas as requisições"""
-    start_time = time.time()
-    
-    # Log da requisição
-    logger.info(
-        f"🔵 REQUEST: {request.method} {request.url.path}",
-        extra={
-            "method": request.method,
-            "path": request.url.path,
-            "query_params": str(request.query_params),
-            "request_id": getattr(request.state, 'request_id', None),
-            "user_agent": request.headers.get("user-agent", ""),
-            "client_ip": request.client.host if request.client else ""
-        }
-    )
-    
-    # Processa requisição
-    response = await call_next(request)
-    
-    # Log da resposta
-    process_time = time.time() - start_time
-    logger.info(
-        f"🟢 RESPONSE: {response.status_code} - {process_time:.3f}s",
-        extra={
-            "status_code": response.status_code,
-            "process_time": process_time,
-            "request_id": getattr(request.state, 'request_id', None)
-        }
-    )
-    
-    # Adiciona tempo de processamento no header
-    response.headers["X-Process-Time"] = str(process_time)
-    return response
-
-# 3. Middleware de autenticação customizado
+# 1. Middleware de autenticação customizado
 app.add_middleware(AuthMiddleware)
 
-# 4. Compressão GZIP para respostas grandes
+# 2. Compressão GZIP para respostas grandes
 app.add_middleware(GZipMiddleware, minimum_size=1000)
 
-# 5. CORS - configurado dinamicamente
+# 3. CORS - configurado dinamicamente
 app.add_middleware(
     CORSMiddleware,
     allow_origins=settings.cors_origins_list,
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE", "PATCH", "OPTIONS"],
     allow_headers=["*"],
-    expose_headers=["X-Request-ID", "X-Process-Time"]
+    expose_headers=["X-Request-ID", "X-Process-Time", "Server-Timing"]
+)
+
+# 4. Request ID, log (amostrado), métricas e consultas por requisição (ASGI puro, mais externo)
+#    Headers de debug (X-Environment/X-Debug) apenas em desenvolvimento
+app.add_middleware(
+    RequestContextMiddleware,
+    debug_headers=settings.is_development,
+    taxa_amostragem=settings.log_request_sample_rate,
+    lento_ms=settings.log_slow_request_ms,
+    instrumentar_consultas=settings.db_instrumentacao_habilitada,
+    budget_consultas=settings.db_query_budget,
+    repeticoes_alerta=settings.db_query_repeticoes_alerta
 )
 
 # ===== HANDLERS DE EXCEÇÃO =====
@@ -180,6 +152,25 @@ async def health_check():
         "timestamp": time.time()
     }
 
+# Métricas no formato Prometheus para scrape interno: desligadas por padrão
+# (METRICS_HABILITADO); com METRICS_TOKEN exigem "Authorization: Bearer <token>"
+@app.get("/metrics", include_in_schema=False)
+async def metrics(request: Request):
+    """Contadores e histogramas de HTTP, Supabase, engine de comissão e caches"""
+    if not settings.metrics_habilitado:
+        return JSONResponse(status_code=status.HTTP_404_NOT_FOUND, content={"detail": "Not Found"})
+    
+    if settings.metrics_token:
+        esperado = f"Bearer {settings.metrics_token}".encode()
+        if not hmac.compare_digest(request.headers.get("authorization", "").encode(), esperado):
+            return JSONResponse(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                content={"detail": "Token de métricas inválido"},
+                headers={"WWW-Authenticate": "Bearer"}
+            )
+    
+    return PlainTextResponse(registro_metricas.expor(), media_type="text/plain; version=0.0.4")
+
 # Root endpoint com informações básicas
 @app.get("/", tags=["Sistema"], summary="Informações da API")
 async def root():
@@ -188,7 +179,8 @@ async def root():
         "message": "Fluyt Comercial API",
         "version": settings.api_version,
         "docs": f"/api/{settings.api_version}/docs" if not settings.is_production else None,
-        "health": "/health"
+        "health": "/health",
+        "metrics": "/metrics" if settings.metrics_habilitado else None
     }
 
 # Registro de routers modulares
@@ -251,16 +243,6 @@ except ImportError as e:
     logger.warning(f"⚠️ Alguns módulos ainda não implementados: {e}")
     # Em desenvolvimento, alguns módulos podem não existir ainda
 
-# ===== MIDDLEWARE DE DESENVOLVIMENTO =====
-if settings.is_development:
-    @app.middleware("http")
-    async def debug_headers(request: Request, call_next):
-        """Adiciona headers de debug em desenvolvimento"""
-        response = await call_next(request)
-        response.headers["X-Environment"] = "development"
-        response.headers["X-Debug"] = "true"
-        return response
-
 # ===== EVENTOS DE STARTUP ADICIONAIS =====
 @app.on_event("startup")
 async def startup_event():
@@ -1,11 +1,76 @@
+"""
+Controller (rotas) para o módulo de Ambientes.
+Define endpoints REST para ambientes e importação de XML Promob.
+"""
 
-# FastAPI routes for ambientes
-from fastapi import APIRouter, Depends
-from .schemas import *
-from .repository import *
+from fastapi import APIRouter, Depends, File, Query, UploadFile
+from typing import List, Dict, Any
+from core.auth import get_current_user, require_vendedor_ou_superior
+from core.database import get_database
+from supabase import Client
 
-router = APIRouter(prefix='/ambientes', tags=['ambientes'])
+from .schemas import AmbienteResponse, ImportacaoXMLResponse, ImportacaoXMLLoteResponse
+from .services import AmbienteService
 
-@router.get('/', response_model=list[dict])
-async def list_ambientes():
-    return await repo_list_ambientes()
+# Router para o módulo de ambientes
+router = APIRouter()
+
+
+@router.get("/",
+    response_model=List[AmbienteResponse],
+    summary="Listar ambientes",
+    description="Lista ambientes importados da loja"
+)
+async def listar_ambientes(
+    skip: int = Query(0, ge=0, description="Registros a pular"),
+    limit: int = Query(50, ge=1, le=200, description="Limite de registros"),
+    current_user: Dict[str, Any] = Depends(get_current_user),
+    db: Client = Depends(get_database)
+):
+    """Lista ambientes da loja do usuário (mais recentes primeiro)."""
+    service = AmbienteService(db)
+    return await service.listar_ambientes(current_user, skip, limit)
+
+
+@router.post("/upload-xml",
+    response_model=ImportacaoXMLResponse,
+    summary="Importar XML do Promob",
+    description="Extrai ambientes, itens e dados do cliente de um XML Promob"
+)
+async def upload_xml(
+    arquivo: UploadFile = File(..., description="Arquivo XML exportado do Promob"),
+    current_user: Dict[str, Any] = Depends(require_vendedor_ou_superior()),
+    db: Client = Depends(get_database)
+):
+    """
+    Importa um XML do Promob.
+    
+    - **Parse em streaming** (iterparse): memória constante mesmo em arquivos grandes
+    - **Limite de tamanho** aplicado durante a leitura (MAX_FILE_SIZE_MB)
+    - **Gravação em lote** dos ambientes em uma única chamada
+    - **Métricas** de tempo de parse e pico de memória na resposta e em xml_processing_logs
+    """
+    service = AmbienteService(db)
+    return await service.importar_xml(arquivo, current_user)
+
+
+@router.post("/upload-xml-lote",
+    response_model=ImportacaoXMLLoteResponse,
+    summary="Importar vários XMLs do Promob",
+    description="Importa uma pasta de projeto inteira: parse paralelo e gravação em lote"
+)
+async def upload_xml_lote(
+    arquivos: List[UploadFile] = File(..., description="Arquivos XML exportados do Promob"),
+    current_user: Dict[str, Any] = Depends(require_vendedor_ou_superior()),
+    db: Client = Depends(get_database)
+):
+    """
+    Importa vários XMLs do Promob de uma vez.
+    
+    - **Parse paralelo** em pool de processos (XML_PROCESS_WORKERS)
+    - **Uma inserção por tabela** (c_ambientes e xml_processing_logs)
+    - **Resultado por arquivo**: erro em um arquivo não bloqueia os demais
+    - **valor_total** soma os ambientes criados (base para o orçamento)
+    """
+    service = AmbienteService(db)
+    return await service.importar_xml_lote(arquivos, current_user)
@@ -0,0 +1,262 @@
+"""
+Deduplicação de XMLs Promob reenviados.
+
+Vendedores reenviam o mesmo export várias vezes ao longo da negociação. Antes
+do parse, o arquivo é lido uma vez em blocos para calcular:
+
+- hash SHA-256 do conteúdo inteiro (reenvio idêntico → reaproveita o resultado)
+- hash de cada bloco <AMBIENT>...</AMBIENT> e do "esqueleto" (todo o resto,
+  incluindo CUSTOMERSDATA)
+
+O resultado do parse fica gravado em xml_processing_logs.resultado_parse junto
+com esses hashes. Num reenvio com o mesmo esqueleto, só os ambientes cujo hash
+mudou são reprocessados; os demais vêm do resultado anterior.
+"""
+
+import hashlib
+import io
+import re
+import time
+from typing import Any, BinaryIO, Dict, List, Optional, Set
+
+from .parser_xml import TAMANHO_BLOCO_LEITURA, _LeitorLimitado, extrair_ambientes_xml
+
+# Abertura e fechamento de ambiente (não casa com <AMBIENTS>)
+_INICIO_AMBIENTE = re.compile(rb'<ambient[\s>/]', re.IGNORECASE)
+_FIM_AMBIENTE = re.compile(rb'</ambient\s*>', re.IGNORECASE)
+
+# Bytes mantidos no buffer entre blocos para não partir uma tag ao meio
+_MARGEM_TAG = 64
+
+# Bytes iniciais guardados para extrair a declaração <?xml ...?>
+_TAMANHO_PROLOGO = 256
+
+# Status gravados em xml_processing_logs.cache_status
+CACHE_HIT = 'HIT'
+CACHE_PARCIAL = 'PARCIAL'
+CACHE_MISS = 'MISS'
+
+
+def _declaracao_xml(bloco: bytes) -> bytes:
+    """Declaração <?xml ...?> do arquivo (preserva o encoding ao reprocessar trechos)"""
+    inicio = 3 if bloco.startswith(b'\xef\xbb\xbf') else 0
+    if bloco.startswith(b'<?xml', inicio):
+        fim = bloco.find(b'?>', inicio)
+        if fim >= 0:
+            return bloco[inicio:fim + 2]
+    return b''
+
+
+def indexar_xml(
+    arquivo: BinaryIO,
+    nome_arquivo: str,
+    max_bytes: int,
+    coletar: Optional[Set[int]] = None
+) -> Dict[str, Any]:
+    """
+    Calcula os hashes do arquivo em uma leitura em blocos (sem montar árvore)
+
+    Args:
+        arquivo: Arquivo binário posicionado no início (volta ao início no final)
+        nome_arquivo: Nome para mensagens de erro
+        max_bytes: Tamanho máximo aceito
+        coletar: Posições de ambientes cujos bytes devem ser devolvidos
+
+    Returns:
+        Dict com 'hash', 'esqueleto', 'segmentos' (hash por ambiente, na ordem),
+        'tamanho_bytes', 'declaracao' e 'coletados' ({posição: bytes})
+
+    Raises:
+        ValidationException: arquivo acima do tamanho máximo
+    """
+    leitor = _LeitorLimitado(arquivo, max_bytes, nome_arquivo)
+    hash_total = hashlib.sha256()
+    hash_esqueleto = hashlib.sha256()
+    segmentos: List[str] = []
+    coletados: Dict[int, bytes] = {}
+    inicio_arquivo = b''
+
+    buffer = b''
+    hash_segmento = None
+    partes: Optional[List[bytes]] = None
+
+    while True:
+        bloco = leitor.read(TAMANHO_BLOCO_LEITURA)
+        if len(inicio_arquivo) < _TAMANHO_PROLOGO:
+            inicio_arquivo += bloco[:_TAMANHO_PROLOGO]
+        hash_total.update(bloco)
+        buffer += bloco
+        final = not bloco
+
+        while buffer:
+            if hash_segmento is None:
+                achado = _INICIO_AMBIENTE.search(buffer)
+                if achado is None:
+                    corte = len(buffer) if final else max(0, len(buffer) - _MARGEM_TAG)
+                    hash_esqueleto.update(buffer[:corte])
+                    buffer = buffer[corte:]
+                    break
+
+                hash_esqueleto.update(buffer[:achado.start()])
+                buffer = buffer[achado.start():]
+                hash_segmento = hashlib.sha256()
+                partes = [] if coletar and len(segmentos) in coletar else None
+                continue
+
+            achado = _FIM_AMBIENTE.search(buffer)
+            if achado is not None:
+                corte = achado.end()
+            else:
+                corte = len(buffer) if final else max(0, len(buffer) - _MARGEM_TAG)
+
+            trecho = buffer[:corte]
+            hash_segmento.update(trecho)
+            if partes is not None:
+                partes.append(trecho)
+            buffer = buffer[corte:]
+
+            if achado is None:
+                break
+
+            if partes is not None:
+                coletados[len(segmentos)] = b''.join(partes)
+            segmentos.append(hash_segmento.hexdigest())
+            hash_segmento = None
+
+        if final:
+            break
+
+    if hasattr(arquivo, 'seek'):
+        arquivo.seek(0)
+
+    return {
+        'hash': hash_total.hexdigest(),
+        'esqueleto': hash_esqueleto.hexdigest(),
+        # Ambiente sem fechamento: índice inválido para reprocessamento parcial
+        'segmentos': segmentos if hash_segmento is None else None,
+        'tamanho_bytes': leitor.bytes_lidos,
+        'declaracao': _declaracao_xml(inicio_arquivo),
+        'coletados': coletados
+    }
+
+
+def indice_persistivel(indice: Dict[str, Any], extracao: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Parte do índice gravada junto ao resultado do parse
+
+    Só guarda os hashes por ambiente quando casam 1:1 com os ambientes extraídos
+    (ex: <AMBIENT/> vazio ou tags fora do padrão desalinham a segmentação).
+    """
+    segmentos = indice['segmentos']
+    if segmentos is not None and len(segmentos) != len(extracao['ambientes']):
+        segmentos = None
+
+    return {'esqueleto': indice['esqueleto'], 'segmentos': segmentos}
+
+
+def diferenca_ambientes(
+    anteriores: List[Dict[str, Any]],
+    atuais: List[Dict[str, Any]],
+    reprocessados: Set[int]
+) -> Dict[str, Any]:
+    """
+    Diferença por nome de ambiente entre o envio anterior e o atual
+
+    Returns:
+        {'adicionados': [...], 'removidos': [...], 'alterados': [...], 'inalterados': int}
+    """
+    nomes_anteriores = {ambiente['nome_ambiente'] for ambiente in anteriores}
+    nomes_atuais = {ambiente['nome_ambiente'] for ambiente in atuais}
+
+    adicionados, alterados = [], []
+    for posicao in sorted(reprocessados):
+        nome = atuais[posicao]['nome_ambiente']
+        (alterados if nome in nomes_anteriores else adicionados).append(nome)
+
+    return {
+        'adicionados': adicionados,
+        'removidos': [a['nome_ambiente'] for a in anteriores if a['nome_ambiente'] not in nomes_atuais],
+        'alterados': alterados,
+        'inalterados': len(atuais) - len(reprocessados)
+    }
+
+
+def reprocessar_parcial(
+    arquivo: BinaryIO,
+    nome_arquivo: str,
+    max_bytes: int,
+    anterior: Dict[str, Any],
+    indice: Dict[str, Any]
+) -> Optional[Dict[str, Any]]:
+    """
+    Monta a extração reaproveitando os ambientes inalterados do envio anterior
+
+    Args:
+        arquivo: Arquivo binário (relido apenas para coletar os ambientes alterados)
+        anterior: resultado_parse do envio anterior (extração + 'indice')
+        indice: Resultado de indexar_xml do arquivo atual
+
+    Returns:
+        Extração no formato de extrair_ambientes_xml com a chave extra 'diff',
+        ou None quando o reprocessamento parcial não se aplica
+    """
+    indice_anterior = anterior.get('indice') or {}
+    segmentos_anteriores = indice_anterior.get('segmentos')
+    segmentos = indice['segmentos']
+
+    if (
+        not segmentos
+        or not segmentos_anteriores
+        or indice_anterior.get('esqueleto') != indice['esqueleto']
+        or len(segmentos_anteriores) != len(anterior['ambientes'])
+    ):
+        return None
+
+    inicio = time.perf_counter()
+    anteriores_por_hash = dict(zip(segmentos_anteriores, anterior['ambientes']))
+    pendentes = [posicao for posicao, hash_ambiente in enumerate(segmentos) if hash_ambiente not in anteriores_por_hash]
+
+    # Nada a reaproveitar: o parse completo é mais simples e igualmente rápido
+    if len(pendentes) == len(segmentos):
+        return None
+
+    reprocessados: List[Dict[str, Any]] = []
+    if pendentes:
+        coletados = indexar_xml(arquivo, nome_arquivo, max_bytes, coletar=set(pendentes))['coletados']
+        documento = (
+            indice['declaracao']
+            + b'<LISTING><AMBIENTS>'
+            + b''.join(coletados[posicao] for posicao in pendentes)
+            + b'</AMBIENTS></LISTING>'
+        )
+        reprocessados = extrair_ambientes_xml(io.BytesIO(documento), nome_arquivo, max_bytes)['ambientes']
+        if len(reprocessados) != len(pendentes):
+            return None
+
+    ambientes = [anteriores_por_hash.get(hash_ambiente) for hash_ambiente in segmentos]
+    for ordem, (posicao, ambiente) in enumerate(zip(pendentes, reprocessados)):
+        # Nome padrão depende da posição no arquivo completo
+        if ambiente['nome_ambiente'] == f'Ambiente {ordem + 1}':
+            ambiente['nome_ambiente'] = f'Ambiente {posicao + 1}'
+        ambientes[posicao] = ambiente
+
+    colecoes_encontradas: List[str] = []
+    for ambiente in ambientes:
+        for colecao in ambiente['colecoes']:
+            if colecao not in colecoes_encontradas:
+                colecoes_encontradas.append(colecao)
+
+    return {
+        'ambientes': ambientes,
+        'dados_cliente': anterior['dados_cliente'],
+        'nome_cliente': anterior['nome_cliente'],
+        'valor_total': round(sum(ambiente['valor_total'] for ambiente in ambientes), 2),
+        'colecoes_encontradas': colecoes_encontradas,
+        'metricas': {
+            'tamanho_bytes': indice['tamanho_bytes'],
+            'tempo_parse_ms': round((time.perf_counter() - inicio) * 1000, 2),
+            'memoria_pico_mb': 0.0,
+            'itens': sum(len(ambiente['itens']) for ambiente in ambientes)
+        },
+        'diff': diferenca_ambientes(anterior['ambientes'], ambientes, set(pendentes))
+    }
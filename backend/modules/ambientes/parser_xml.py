@@ -0,0 +1,350 @@
+"""
+Parser incremental dos XMLs exportados pelo Promob.
+
+Usa lxml.etree.iterparse: os elementos são processados conforme chegam e
+descartados logo em seguida, então a memória não cresce com o tamanho do
+arquivo (exports reais chegam a dezenas de MB). O limite de tamanho é
+aplicado durante a leitura, sem depender do Content-Length.
+
+Estrutura esperada (tags sem diferenciar maiúsculas/minúsculas):
+
+    <LISTING>
+      <CUSTOMERSDATA>
+        <DATA ID="nomecliente" VALUE="Maria Silva"/>
+      </CUSTOMERSDATA>
+      <AMBIENTS>
+        <AMBIENT DESCRIPTION="Cozinha">
+          <CATEGORIES>
+            <CATEGORY DESCRIPTION="Unique">          ← coleção / linha de produto
+              <ITEMS>
+                <ITEM REFERENCE="..." DESCRIPTION="..." QUANTITY="2" UNIT="UN">
+                  <PRICE TOTAL="1234.50"/>
+                  <ITEMS>...componentes (não somados)...</ITEMS>
+                </ITEM>
+"""
+
+import functools
+import io
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, BinaryIO, Dict, List, Optional
+
+from lxml import etree
+
+from core.config import get_settings
+from core.exceptions import FluyteException, ValidationException, XMLProcessingException
+
+# Configurar logger
+logger = logging.getLogger(__name__)
+
+# Tags do export Promob (comparadas em maiúsculas, sem namespace)
+TAG_AMBIENTE = 'AMBIENT'
+TAG_COLECAO = 'CATEGORY'
+TAG_ITEM = 'ITEM'
+TAG_PRECO = 'PRICE'
+TAG_DADOS_CLIENTE = 'CUSTOMERSDATA'
+TAG_DADO = 'DATA'
+
+# Chaves de DATA que identificam o nome do cliente
+CHAVES_NOME_CLIENTE = ('nomecliente', 'cliente', 'nome', 'name', 'customer')
+
+# Amostragem de memória a cada N eventos do parser
+INTERVALO_AMOSTRA_MEMORIA = 2000
+
+TAMANHO_BLOCO_LEITURA = 64 * 1024
+
+
+class _LeitorLimitado:
+    """Envolve o arquivo e interrompe a leitura ao passar do tamanho máximo"""
+
+    def __init__(self, arquivo: BinaryIO, max_bytes: int, nome_arquivo: str):
+        self.arquivo = arquivo
+        self.max_bytes = max_bytes
+        self.nome_arquivo = nome_arquivo
+        self.bytes_lidos = 0
+
+    def read(self, tamanho: int = TAMANHO_BLOCO_LEITURA) -> bytes:
+        bloco = self.arquivo.read(tamanho if tamanho and tamanho > 0 else TAMANHO_BLOCO_LEITURA)
+        self.bytes_lidos += len(bloco)
+
+        if self.bytes_lidos > self.max_bytes:
+            raise ValidationException(
+                f"Arquivo excede o tamanho máximo de {self.max_bytes // (1024 * 1024)} MB",
+                field="arquivo",
+                details={"filename": self.nome_arquivo, "max_bytes": self.max_bytes}
+            )
+
+        return bloco
+
+
+def _memoria_residente() -> int:
+    """RSS atual do processo em bytes (Linux: /proc; demais: pico do processo)"""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+# O export repete poucas tags milhares de vezes; o limite impede que XMLs com
+# tags arbitrárias façam o cache crescer sem fim no processo
+@functools.lru_cache(maxsize=256)
+def _normalizar_tag(tag) -> str:
+    """Nome da tag em maiúsculas, sem namespace ('' para comentários e instruções)"""
+    return tag.rsplit('}', 1)[-1].upper() if isinstance(tag, str) else ''
+
+
+def _tag(elemento) -> str:
+    """Nome da tag em maiúsculas, sem namespace"""
+    return _normalizar_tag(elemento.tag)
+
+
+def _atributo(elemento, *nomes: str) -> Optional[str]:
+    """Primeiro atributo encontrado entre os nomes (MAIÚSCULO, minúsculo ou Capitalizado)"""
+    atributos = elemento.attrib
+    for nome in nomes:
+        valor = atributos.get(nome) or atributos.get(nome.lower()) or atributos.get(nome.capitalize())
+        if valor:
+            return valor.strip()
+    return None
+
+
+def _numero(valor: Optional[str]) -> float:
+    """Converte número do XML (aceita vírgula decimal)"""
+    if not valor:
+        return 0.0
+    try:
+        if ',' in valor and '.' in valor:
+            valor = valor.replace('.', '').replace(',', '.')
+        return float(valor.replace(',', '.'))
+    except ValueError:
+        return 0.0
+
+
+def _liberar(elemento) -> None:
+    """Descarta o elemento já processado e os irmãos anteriores (mantém o DOM vazio)"""
+    elemento.clear(keep_tail=True)
+    pai = elemento.getparent()
+    if pai is not None:
+        while elemento.getprevious() is not None:
+            del pai[0]
+
+
+def extrair_ambientes_xml(arquivo: BinaryIO, nome_arquivo: str, max_bytes: int) -> Dict[str, Any]:
+    """
+    Extrai ambientes, itens e dados do cliente de um XML Promob em streaming
+
+    Args:
+        arquivo: Arquivo binário (ex: UploadFile.file)
+        nome_arquivo: Nome para mensagens e logs
+        max_bytes: Tamanho máximo aceito (Settings.max_file_size_bytes)
+
+    Returns:
+        Dict com 'ambientes', 'dados_cliente', 'nome_cliente', 'valor_total',
+        'colecoes_encontradas' e 'metricas' (bytes, tempo de parse, pico de memória)
+
+    Raises:
+        ValidationException: arquivo acima do tamanho máximo
+        XMLProcessingException: XML malformado ou sem ambientes
+    """
+    leitor = _LeitorLimitado(arquivo, max_bytes, nome_arquivo)
+    memoria_inicial = memoria_pico = _memoria_residente()
+    inicio = time.perf_counter()
+
+    ambientes: List[Dict[str, Any]] = []
+    dados_cliente: Dict[str, str] = {}
+    colecoes_encontradas: List[str] = []
+
+    ambiente_atual: Optional[Dict[str, Any]] = None
+    colecao_atual: Optional[str] = None
+    preco_item_atual: Optional[float] = None
+    profundidade_item = 0
+    dentro_dados_cliente = False
+    eventos = 0
+
+    try:
+        contexto = etree.iterparse(
+            leitor,
+            events=('start', 'end'),
+            resolve_entities=False,
+            no_network=True,
+            huge_tree=False,
+            remove_comments=True
+        )
+
+        for evento, elemento in contexto:
+            eventos += 1
+            if eventos % INTERVALO_AMOSTRA_MEMORIA == 0:
+                memoria_pico = max(memoria_pico, _memoria_residente())
+
+            tag = _tag(elemento)
+
+            if evento == 'start':
+                if tag == TAG_AMBIENTE:
+                    ambiente_atual = {
+                        'nome_ambiente': _atributo(elemento, 'DESCRIPTION', 'NAME', 'ID') or f'Ambiente {len(ambientes) + 1}',
+                        'valor_total': 0.0,
+                        'colecoes': [],
+                        'itens': []
+                    }
+                elif tag == TAG_COLECAO and ambiente_atual is not None:
+                    colecao_atual = _atributo(elemento, 'DESCRIPTION', 'NAME')
+                    if colecao_atual and colecao_atual not in ambiente_atual['colecoes']:
+                        ambiente_atual['colecoes'].append(colecao_atual)
+                elif tag == TAG_ITEM:
+                    profundidade_item += 1
+                    if profundidade_item == 1:
+                        preco_item_atual = None
+                elif tag == TAG_DADOS_CLIENTE:
+                    dentro_dados_cliente = True
+                continue
+
+            # evento == 'end'
+            if tag == TAG_PRECO and profundidade_item == 1:
+                preco_item_atual = _numero(_atributo(elemento, 'TOTAL', 'VALUE'))
+
+            elif tag == TAG_ITEM:
+                if profundidade_item == 1 and ambiente_atual is not None:
+                    valor_item = preco_item_atual
+                    if valor_item is None:
+                        valor_item = _numero(_atributo(elemento, 'TOTAL', 'PRICE'))
+
+                    ambiente_atual['itens'].append({
+                        'referencia': _atributo(elemento, 'REFERENCE', 'ID'),
+                        'descricao': _atributo(elemento, 'DESCRIPTION', 'NAME'),
+                        'quantidade': _numero(_atributo(elemento, 'QUANTITY')) or 1.0,
+                        'unidade': _atributo(elemento, 'UNIT'),
+                        'colecao': colecao_atual,
+                        'valor_total': valor_item
+                    })
+                    ambiente_atual['valor_total'] += valor_item
+
+                profundidade_item -= 1
+                if profundidade_item == 0:
+                    _liberar(elemento)
+
+            elif tag == TAG_COLECAO:
+                colecao_atual = None
+
+            elif tag == TAG_AMBIENTE and ambiente_atual is not None:
+                ambiente_atual['valor_total'] = round(ambiente_atual['valor_total'], 2)
+                ambientes.append(ambiente_atual)
+                for colecao in ambiente_atual['colecoes']:
+                    if colecao not in colecoes_encontradas:
+                        colecoes_encontradas.append(colecao)
+                ambiente_atual = None
+                _liberar(elemento)
+
+            elif tag == TAG_DADO and dentro_dados_cliente:
+                chave = _atributo(elemento, 'ID', 'NAME', 'KEY')
+                if chave:
+                    dados_cliente[chave] = _atributo(elemento, 'VALUE') or (elemento.text or '').strip()
+                _liberar(elemento)
+
+            elif tag == TAG_DADOS_CLIENTE:
+                dentro_dados_cliente = False
+
+        del contexto
+
+    except (ValidationException, XMLProcessingException):
+        raise
+    except etree.XMLSyntaxError as e:
+        raise XMLProcessingException(f"XML malformado: {str(e)}", filename=nome_arquivo)
+
+    if not ambientes:
+        raise XMLProcessingException("Nenhum ambiente encontrado no arquivo", filename=nome_arquivo)
+
+    memoria_pico = max(memoria_pico, _memoria_residente())
+    tempo_parse_ms = (time.perf_counter() - inicio) * 1000
+
+    dados_cliente_normalizado = {chave.lower(): valor for chave, valor in dados_cliente.items()}
+    nome_cliente = next(
+        (dados_cliente_normalizado[chave] for chave in CHAVES_NOME_CLIENTE if dados_cliente_normalizado.get(chave)),
+        None
+    )
+
+    metricas = {
+        'tamanho_bytes': leitor.bytes_lidos,
+        'tempo_parse_ms': round(tempo_parse_ms, 2),
+        'memoria_pico_mb': round((memoria_pico - memoria_inicial) / (1024 * 1024), 2),
+        'itens': sum(len(ambiente['itens']) for ambiente in ambientes)
+    }
+
+    logger.info(
+        f"📄 XML {nome_arquivo}: {len(ambientes)} ambientes, {metricas['itens']} itens, "
+        f"{metricas['tamanho_bytes'] / 1024:,.0f} KB em {metricas['tempo_parse_ms']:.0f}ms "
+        f"(pico +{metricas['memoria_pico_mb']} MB)"
+    )
+
+    return {
+        'ambientes': ambientes,
+        'dados_cliente': dados_cliente,
+        'nome_cliente': nome_cliente,
+        'valor_total': round(sum(ambiente['valor_total'] for ambiente in ambientes), 2),
+        'colecoes_encontradas': colecoes_encontradas,
+        'metricas': metricas
+    }
+
+
+# ===== PROCESSAMENTO EM PROCESSOS =====
+# O parse é CPU-bound e o GIL serializa threads: importações em lote usam um
+# pool de processos. Exceções customizadas não atravessam o pickle de forma
+# confiável, então o worker devolve sempre um dict com o resultado ou o erro.
+
+_xml_executor: Optional[ProcessPoolExecutor] = None
+
+
+def xml_workers() -> int:
+    """Processos do pool XML: XML_PROCESS_WORKERS ou, com 0, o número de CPUs"""
+    return get_settings().xml_process_workers or os.cpu_count() or 1
+
+
+def get_xml_executor() -> ProcessPoolExecutor:
+    """
+    Retorna o pool de processos para parse de XML.
+    Criado sob demanda com xml_workers() processos.
+    """
+    global _xml_executor
+
+    if _xml_executor is None:
+        workers = xml_workers()
+        _xml_executor = ProcessPoolExecutor(max_workers=workers)
+        logger.info(f"Pool de processos XML criado: {workers} workers")
+
+    return _xml_executor
+
+
+def shutdown_xml_executor() -> None:
+    """Encerra o pool de processos XML (shutdown da aplicação)"""
+    global _xml_executor
+
+    if _xml_executor is not None:
+        _xml_executor.shutdown(wait=True, cancel_futures=True)
+        _xml_executor = None
+
+
+def processar_arquivo_xml(conteudo: bytes, nome_arquivo: str, max_bytes: int) -> Dict[str, Any]:
+    """
+    Ponto de entrada do worker: extrai um arquivo já lido em memória
+
+    Returns:
+        {'sucesso': True, 'extracao': {...}} ou
+        {'sucesso': False, 'erro': str, 'tipo': str, 'tempo_parse_ms': float}
+    """
+    inicio = time.perf_counter()
+    try:
+        return {
+            'sucesso': True,
+            'extracao': extrair_ambientes_xml(io.BytesIO(conteudo), nome_arquivo, max_bytes)
+        }
+    except Exception as e:
+        mensagem = e.message if isinstance(e, FluyteException) else str(e)
+        return {
+            'sucesso': False,
+            'erro': mensagem,
+            'tipo': type(e).__name__,
+            'tempo_parse_ms': round((time.perf_counter() - inicio) * 1000, 2)
+        }
@@ -1,5 +1,79 @@
+"""
+Repository para operações de ambientes com Supabase.
+Responsabilidade: Acesso a dados de c_ambientes.
+"""
 
-# Supabase access layer for ambientes
+import logging
+from typing import List, Dict, Any
+from supabase import Client
+from core.database import execute_async
+
+# Configurar logger
+logger = logging.getLogger(__name__)
+
+
+class AmbienteRepository:
+    """
+    Repository para ambientes - APENAS DADOS
+    
+    Responsabilidade: Acesso a dados, queries
+    Lógica de negócio: AmbienteService
+    """
+    
+    def __init__(self, supabase_client: Client):
+        self.supabase = supabase_client
+    
+    async def inserir_ambientes_lote(self, ambientes: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Insere vários ambientes em uma única chamada
+        
+        Args:
+            ambientes: Registros de c_ambientes (já com loja_id)
+            
+        Returns:
+            List[Dict]: Ambientes criados
+        """
+        try:
+            result = await execute_async(
+                self.supabase
+                .table('c_ambientes')
+                .insert(ambientes)
+            )
+            
+            logger.info(f"{len(result.data)} ambientes inseridos")
+            return result.data
+            
+        except Exception as e:
+            logger.error(f"Erro ao inserir ambientes: {str(e)}")
+            raise Exception(f"Erro ao inserir ambientes: {str(e)}")
+    
+    async def listar_ambientes(self, loja_id: str, skip: int = 0, limit: int = 50) -> List[Dict[str, Any]]:
+        """
+        Lista ambientes da loja (sem detalhes_xml, que pode ser grande)
+        
+        Args:
+            loja_id: ID da loja (RLS)
+            skip: Paginação - registros a pular
+            limit: Paginação - limite de registros
+        """
+        try:
+            result = await execute_async(
+                self.supabase
+                .table('c_ambientes')
+                .select('id, nome_ambiente, valor_total, linha_produto, nome_cliente, descricao_completa, created_at')
+                .eq('loja_id', loja_id)
+                .order('created_at', desc=True)
+                .range(skip, skip + limit - 1)
+            )
+            
+            return result.data
+            
+        except Exception as e:
+            logger.error(f"Erro ao listar ambientes: {str(e)}")
+            raise Exception(f"Erro ao listar ambientes: {str(e)}")
+
+
+# Função auxiliar para compatibilidade com código existente
 async def repo_list_ambientes():
-    # TODO: call Supabase HTTP API
+    """Função legacy - TODO: migrar para AmbienteRepository"""
     return []
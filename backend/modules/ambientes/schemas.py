@@ -1,12 +1,87 @@
+"""
+Schemas Pydantic para o módulo de Ambientes.
+Define modelos de validação para ambientes importados do XML Promob.
+"""
 
-# Pydantic models for ambientes
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+from typing import Optional, List, Dict, Any
+from decimal import Decimal
+from datetime import datetime
+import uuid
 
-class AmbientesBase(BaseModel):
-    pass
 
-class AmbientesCreate(AmbientesBase):
-    pass
+# ===== SCHEMAS DE SAÍDA (RESPONSE) =====
 
-class AmbientesResponse(AmbientesBase):
-    id: str
+class AmbienteResponse(BaseModel):
+    """Schema de resposta de um ambiente"""
+    id: uuid.UUID
+    nome_ambiente: str
+    valor_total: Decimal
+    linha_produto: Optional[str]
+    nome_cliente: Optional[str] = None
+    descricao_completa: Optional[str] = None
+    created_at: Optional[datetime] = None
+    
+    class Config:
+        from_attributes = True
+
+
+class MetricasProcessamentoXML(BaseModel):
+    """Métricas do processamento de um arquivo XML"""
+    tamanho_bytes: int = Field(..., description="Bytes lidos do arquivo")
+    tempo_parse_ms: float = Field(..., description="Tempo de parse em milissegundos")
+    memoria_pico_mb: float = Field(..., description="Pico de memória residente acima do início do parse (MB)")
+    itens: int = Field(..., description="Itens de primeiro nível extraídos")
+
+
+class DiffAmbientesXML(BaseModel):
+    """Diferença entre o envio anterior do arquivo e o atual"""
+    adicionados: List[str] = []
+    removidos: List[str] = []
+    alterados: List[str] = []
+    inalterados: int = 0
+
+
+class ResultadoCacheXML(BaseModel):
+    """Reaproveitamento de parses anteriores do mesmo conteúdo/arquivo"""
+    status: str = Field(..., description="HIT (conteúdo idêntico), PARCIAL (só ambientes alterados) ou MISS")
+    content_hash: str = Field(..., description="SHA-256 do arquivo")
+    tempo_economizado_ms: float = 0.0
+    ambientes_reprocessados: Optional[int] = None
+    diff: Optional[DiffAmbientesXML] = None
+
+
+class ImportacaoXMLResponse(BaseModel):
+    """Resultado da importação de um XML Promob"""
+    arquivo: str
+    ambientes: List[AmbienteResponse]
+    valor_total: Decimal
+    colecoes_encontradas: List[str]
+    nome_cliente: Optional[str] = None
+    dados_cliente: Dict[str, Any] = {}
+    metricas: MetricasProcessamentoXML
+    cache: Optional[ResultadoCacheXML] = None
+
+
+class ResultadoArquivoXML(BaseModel):
+    """Resultado de um arquivo dentro de uma importação em lote"""
+    arquivo: str
+    status: str = Field(..., description="SUCESSO ou ERRO")
+    ambientes_criados: int = 0
+    valor_total: Decimal = Decimal('0')
+    colecoes_encontradas: List[str] = []
+    nome_cliente: Optional[str] = None
+    erro: Optional[str] = None
+    metricas: Optional[MetricasProcessamentoXML] = None
+    cache: Optional[ResultadoCacheXML] = None
+
+
+class ImportacaoXMLLoteResponse(BaseModel):
+    """Resultado da importação de vários XMLs Promob"""
+    arquivos: List[ResultadoArquivoXML]
+    ambientes: List[AmbienteResponse]
+    valor_total: Decimal = Field(..., description="Soma dos ambientes criados (base do valor do orçamento)")
+    total_arquivos: int
+    arquivos_com_erro: int
+    workers: int
+    tempo_total_ms: float
@@ -1 +1,476 @@
-# Business logic helpers for ambientes
+"""
+Service layer para ambientes - importação de XML Promob.
+Responsabilidade: Validação do arquivo, extração em streaming (com reaproveitamento
+de parses anteriores), gravação em lote e log.
+"""
+
+import asyncio
+import io
+import logging
+import os
+import time
+from typing import Awaitable, Callable, Dict, Any, List, Optional
+
+from fastapi import UploadFile
+
+from core.config import get_settings
+from core.exceptions import FluyteException, ValidationException
+from modules.xml_logs.repository import XmlLogRepository
+from .dedup_xml import (
+    CACHE_HIT,
+    CACHE_MISS,
+    CACHE_PARCIAL,
+    indexar_xml,
+    indice_persistivel,
+    reprocessar_parcial
+)
+from .parser_xml import extrair_ambientes_xml, get_xml_executor, processar_arquivo_xml, xml_workers
+from .repository import AmbienteRepository
+from .schemas import AmbienteResponse, ImportacaoXMLResponse, ImportacaoXMLLoteResponse, ResultadoArquivoXML
+
+# Configurar logger
+logger = logging.getLogger(__name__)
+
+
+class _FalhaParseXML(Exception):
+    """Erro devolvido pelo worker do pool (mantém o tipo da exceção original)"""
+    
+    def __init__(self, mensagem: str, tipo: str):
+        super().__init__(mensagem)
+        self.tipo = tipo
+
+
+class AmbienteService:
+    """
+    Service layer para ambientes
+    
+    Responsabilidade: Validações, orquestração da importação XML
+    """
+    
+    def __init__(self, supabase_client):
+        self.repository = AmbienteRepository(supabase_client)
+        self.xml_logs = XmlLogRepository(supabase_client)
+        self.settings = get_settings()
+    
+    async def listar_ambientes(self, current_user: Dict[str, Any], skip: int = 0, limit: int = 50) -> List[AmbienteResponse]:
+        """Lista ambientes da loja do usuário"""
+        try:
+            ambientes = await self.repository.listar_ambientes(current_user['loja_id'], skip, limit)
+            return [AmbienteResponse(**ambiente) for ambiente in ambientes]
+            
+        except Exception as e:
+            logger.error(f"Erro ao listar ambientes: {str(e)}")
+            raise Exception(f"Erro ao listar ambientes: {str(e)}")
+    
+    def validar_arquivo(self, nome_arquivo: str, tamanho: int = None):
+        """
+        Valida extensão e, quando informado, o tamanho declarado do upload
+        
+        Raises:
+            ValidationException: extensão não permitida ou arquivo grande demais
+        """
+        extensao = os.path.splitext(nome_arquivo or '')[1].lower()
+        if extensao not in self.settings.allowed_file_extensions_list:
+            raise ValidationException(
+                f"Extensão {extensao or '(nenhuma)'} não permitida. Use: {', '.join(self.settings.allowed_file_extensions_list)}",
+                field="arquivo"
+            )
+        
+        if tamanho is not None and tamanho > self.settings.max_file_size_bytes:
+            raise ValidationException(
+                f"Arquivo excede o tamanho máximo de {self.settings.max_file_size_mb} MB",
+                field="arquivo",
+                details={"filename": nome_arquivo, "max_bytes": self.settings.max_file_size_bytes}
+            )
+    
+    def _validar_total_lote(self, nome_arquivo: str):
+        """
+        Arquivo que não cabe no total de bytes da importação em lote
+        
+        Raises:
+            ValidationException: sempre (o arquivo fica de fora; os já lidos seguem)
+        """
+        raise ValidationException(
+            f"Importação excede o total de {self.settings.xml_max_mb_lote} MB; envie {nome_arquivo} em outra importação",
+            field="arquivos",
+            details={"filename": nome_arquivo, "max_bytes_lote": self.settings.xml_max_bytes_lote}
+        )
+    
+    async def importar_xml(self, arquivo: UploadFile, current_user: Dict[str, Any]) -> ImportacaoXMLResponse:
+        """
+        Importa um XML Promob: extrai ambientes em streaming e grava em lote
+        
+        Args:
+            arquivo: Upload recebido no endpoint
+            current_user: Usuário logado (contém loja_id)
+            
+        Returns:
+            ImportacaoXMLResponse: Ambientes criados, cliente e métricas do processamento
+        """
+        nome_arquivo = arquivo.filename or 'arquivo.xml'
+        loja_id = current_user['loja_id']
+        inicio = time.perf_counter()
+        bytes_lidos = getattr(arquivo, 'size', None)
+        
+        try:
+            self.validar_arquivo(nome_arquivo, bytes_lidos)
+            
+            extracao, cache = await self._extrair_com_cache(arquivo.file, nome_arquivo, loja_id)
+            bytes_lidos = extracao['metricas']['tamanho_bytes']
+            
+            ambientes_db = self._montar_registros(extracao, loja_id, nome_arquivo)
+            ambientes_criados = await self.repository.inserir_ambientes_lote(ambientes_db)
+            
+            await self.xml_logs.registrar_log({
+                'filename': nome_arquivo,
+                'status': 'SUCESSO',
+                'loja_id': loja_id,
+                'created_by': current_user.get('user_id'),
+                'file_size': bytes_lidos,
+                'processing_time': round(time.perf_counter() - inicio, 3),
+                'ambientes_criados': len(ambientes_criados),
+                'colecoes_encontradas': ', '.join(extracao['colecoes_encontradas']),
+                'valor_total': extracao['valor_total'],
+                'dados_cliente': extracao['dados_cliente'],
+                **self._campos_cache_log(extracao, cache)
+            })
+            
+            logger.info(f"✅ XML {nome_arquivo} importado: {len(ambientes_criados)} ambientes, R$ {extracao['valor_total']:,.2f}")
+            
+            return ImportacaoXMLResponse(
+                arquivo=nome_arquivo,
+                ambientes=[AmbienteResponse(**ambiente) for ambiente in ambientes_criados],
+                valor_total=extracao['valor_total'],
+                colecoes_encontradas=extracao['colecoes_encontradas'],
+                nome_cliente=extracao['nome_cliente'],
+                dados_cliente=extracao['dados_cliente'],
+                metricas=extracao['metricas'],
+                cache=cache
+            )
+            
+        except Exception as e:
+            logger.error(f"Erro ao importar XML {nome_arquivo}: {str(e)}")
+            
+            await self.xml_logs.registrar_log({
+                'filename': nome_arquivo,
+                'status': 'ERRO',
+                'loja_id': loja_id,
+                'created_by': current_user.get('user_id'),
+                'file_size': bytes_lidos,
+                'processing_time': round(time.perf_counter() - inicio, 3),
+                'ambientes_criados': 0,
+                'error_details': {'erro': str(e), 'tipo': type(e).__name__}
+            })
+            
+            # Erros de validação/XML mantêm o status HTTP (400/422)
+            if isinstance(e, FluyteException):
+                raise
+            raise Exception(f"Erro ao importar XML: {str(e)}")
+    
+    async def _extrair_com_cache(
+        self,
+        arquivo,
+        nome_arquivo: str,
+        loja_id: str,
+        parse_completo: Optional[Callable[[], Awaitable[Dict[str, Any]]]] = None
+    ):
+        """
+        Extrai o XML reaproveitando parses anteriores da loja
+        
+        1. Conteúdo idêntico (mesmo SHA-256): resultado anterior inteiro, sem parse
+        2. Mesmo nome de arquivo e mesmo esqueleto: só ambientes alterados são reprocessados
+        3. Caso contrário: parse completo em streaming
+        
+        Args:
+            parse_completo: Parse do passo 3 (padrão: extrair_ambientes_xml em thread;
+                a importação em lote usa o pool de processos)
+        
+        Returns:
+            (extração, dict de cache para log/resposta ou None com cache desabilitado)
+        """
+        loop = asyncio.get_running_loop()
+        max_bytes = self.settings.max_file_size_bytes
+        inicio = time.perf_counter()
+        
+        if parse_completo is None:
+            parse_completo = lambda: loop.run_in_executor(None, extrair_ambientes_xml, arquivo, nome_arquivo, max_bytes)
+        
+        if not self.settings.xml_cache_habilitado:
+            return await parse_completo(), None
+        
+        indice = await loop.run_in_executor(None, indexar_xml, arquivo, nome_arquivo, max_bytes)
+        cache = {
+            'status': CACHE_MISS,
+            'content_hash': indice['hash'],
+            'tempo_economizado_ms': 0.0,
+            'ambientes_reprocessados': None,
+            'diff': None
+        }
+        
+        # 1. Reenvio idêntico
+        registro = await self.xml_logs.buscar_resultado_por_hash(loja_id, indice['hash'])
+        if registro and registro.get('resultado_parse'):
+            anterior = registro['resultado_parse']
+            decorrido_ms = (time.perf_counter() - inicio) * 1000
+            extracao = {
+                **anterior,
+                'metricas': {**anterior['metricas'], 'tempo_parse_ms': round(decorrido_ms, 2), 'memoria_pico_mb': 0.0}
+            }
+            cache.update({
+                'status': CACHE_HIT,
+                'ambientes_reprocessados': 0,
+                'tempo_economizado_ms': round(max(0.0, anterior['tempo_parse_completo_ms'] - decorrido_ms), 2)
+            })
+            logger.info(f"♻️ XML {nome_arquivo}: conteúdo já processado (log {registro['id']}), parse evitado")
+            return extracao, cache
+        
+        # 2. Reenvio com alguns ambientes alterados
+        registro = await self.xml_logs.buscar_ultimo_resultado(loja_id, nome_arquivo)
+        if registro and registro.get('resultado_parse'):
+            anterior = registro['resultado_parse']
+            extracao = await loop.run_in_executor(
+                None, reprocessar_parcial, arquivo, nome_arquivo, max_bytes, anterior, indice
+            )
+            if extracao is not None:
+                diff = extracao.pop('diff')
+                decorrido_ms = (time.perf_counter() - inicio) * 1000
+                extracao['tempo_parse_completo_ms'] = anterior['tempo_parse_completo_ms']
+                extracao['indice'] = indice_persistivel(indice, extracao)
+                cache.update({
+                    'status': CACHE_PARCIAL,
+                    'ambientes_reprocessados': len(diff['adicionados']) + len(diff['alterados']),
+                    'diff': diff,
+                    'tempo_economizado_ms': round(max(0.0, anterior['tempo_parse_completo_ms'] - decorrido_ms), 2)
+                })
+                logger.info(
+                    f"♻️ XML {nome_arquivo}: {cache['ambientes_reprocessados']} ambientes reprocessados, "
+                    f"{diff['inalterados']} reaproveitados"
+                )
+                return extracao, cache
+        
+        # 3. Parse completo
+        extracao = await parse_completo()
+        extracao['tempo_parse_completo_ms'] = extracao['metricas']['tempo_parse_ms']
+        extracao['indice'] = indice_persistivel(indice, extracao)
+        return extracao, cache
+    
+    def _campos_cache_log(self, extracao: Dict[str, Any], cache: Dict[str, Any]) -> Dict[str, Any]:
+        """Colunas de cache do xml_processing_logs (resultado gravado apenas quando houve parse)"""
+        if cache is None:
+            return {}
+        
+        campos = {
+            'content_hash': cache['content_hash'],
+            'cache_status': cache['status'],
+            'tempo_economizado_ms': cache['tempo_economizado_ms']
+        }
+        if cache['status'] != CACHE_HIT:
+            campos['resultado_parse'] = {
+                chave: extracao[chave]
+                for chave in ('ambientes', 'dados_cliente', 'nome_cliente', 'valor_total',
+                              'colecoes_encontradas', 'metricas', 'tempo_parse_completo_ms', 'indice')
+            }
+        return campos
+    
+    async def importar_xml_lote(self, arquivos: List[UploadFile], current_user: Dict[str, Any]) -> ImportacaoXMLLoteResponse:
+        """
+        Importa vários XMLs Promob de uma vez (ex: pasta do projeto)
+        
+        Cada arquivo passa pelo mesmo reaproveitamento da importação unitária
+        (HIT/PARCIAL por arquivo); só os que precisam de parse completo vão para
+        o pool de processos. Ambientes e logs de todos os arquivos são gravados
+        com uma inserção por tabela. Falha em um arquivo não impede a
+        importação dos demais.
+        
+        Args:
+            arquivos: Uploads recebidos no endpoint
+            current_user: Usuário logado (contém loja_id)
+            
+        Returns:
+            ImportacaoXMLLoteResponse: Resultado por arquivo, ambientes criados e total
+        """
+        inicio = time.perf_counter()
+        loja_id = current_user['loja_id']
+        max_bytes = self.settings.max_file_size_bytes
+        
+        if len(arquivos) > self.settings.xml_max_arquivos_lote:
+            raise ValidationException(
+                f"Máximo de {self.settings.xml_max_arquivos_lote} arquivos por importação",
+                field="arquivos"
+            )
+        
+        try:
+            # 1. Validar e ler cada arquivo (erros ficam registrados por arquivo). Os
+            #    uploads ficam em arquivos temporários até aqui; o total lido para a
+            #    memória é limitado por XML_MAX_MB_LOTE
+            nomes = [arquivo.filename or f'arquivo_{i + 1}.xml' for i, arquivo in enumerate(arquivos)]
+            saidas: List[Dict[str, Any]] = [None] * len(arquivos)
+            pendentes = []
+            restante_lote = self.settings.xml_max_bytes_lote
+            
+            for indice, arquivo in enumerate(arquivos):
+                try:
+                    tamanho_declarado = getattr(arquivo, 'size', None)
+                    self.validar_arquivo(nomes[indice], tamanho_declarado)
+                    if tamanho_declarado is not None and tamanho_declarado > restante_lote:
+                        self._validar_total_lote(nomes[indice])
+                    conteudo = await arquivo.read(min(max_bytes, restante_lote) + 1)
+                    if len(conteudo) > max_bytes:
+                        self.validar_arquivo(nomes[indice], len(conteudo))
+                    if len(conteudo) > restante_lote:
+                        self._validar_total_lote(nomes[indice])
+                    restante_lote -= len(conteudo)
+                    pendentes.append((indice, conteudo))
+                except FluyteException as e:
+                    saidas[indice] = {'sucesso': False, 'erro': e.message, 'tipo': type(e).__name__, 'tempo_parse_ms': 0.0}
+            
+            # 2. Reaproveitamento por hash/arquivo; parse completo em paralelo no pool de processos
+            executor = get_xml_executor()
+            processados = await asyncio.gather(*[
+                self._extrair_arquivo_lote(conteudo, nomes[indice], loja_id, executor)
+                for indice, conteudo in pendentes
+            ])
+            for (indice, _), saida in zip(pendentes, processados):
+                saidas[indice] = saida
+            
+            # 3. Uma inserção para os ambientes de todos os arquivos
+            registros, origem = [], []
+            for indice, saida in enumerate(saidas):
+                if saida['sucesso']:
+                    novos = self._montar_registros(saida['extracao'], loja_id, nomes[indice])
+                    registros.extend(novos)
+                    origem.extend([indice] * len(novos))
+            
+            ambientes_criados = await self.repository.inserir_ambientes_lote(registros) if registros else []
+            
+            criados_por_arquivo = [0] * len(arquivos)
+            for indice in origem[:len(ambientes_criados)]:
+                criados_por_arquivo[indice] += 1
+            
+            # 4. Uma inserção para os logs de todos os arquivos
+            resultados, logs = [], []
+            for indice, saida in enumerate(saidas):
+                resultado, log = self._resultado_arquivo(nomes[indice], saida, criados_por_arquivo[indice], loja_id, current_user)
+                resultados.append(resultado)
+                logs.append(log)
+            
+            await self.xml_logs.registrar_logs_lote(logs)
+            
+            valor_total = round(sum(float(ambiente['valor_total']) for ambiente in ambientes_criados), 2)
+            arquivos_com_erro = sum(1 for resultado in resultados if resultado.status == 'ERRO')
+            
+            logger.info(
+                f"✅ Lote XML: {len(arquivos)} arquivos ({arquivos_com_erro} com erro), "
+                f"{len(ambientes_criados)} ambientes, R$ {valor_total:,.2f}"
+            )
+            
+            return ImportacaoXMLLoteResponse(
+                arquivos=resultados,
+                ambientes=[AmbienteResponse(**ambiente) for ambiente in ambientes_criados],
+                valor_total=valor_total,
+                total_arquivos=len(arquivos),
+                arquivos_com_erro=arquivos_com_erro,
+                workers=xml_workers(),
+                tempo_total_ms=round((time.perf_counter() - inicio) * 1000, 2)
+            )
+            
+        except Exception as e:
+            logger.error(f"Erro ao importar lote de XML: {str(e)}")
+            raise Exception(f"Erro ao importar lote de XML: {str(e)}")
+    
+    async def _extrair_arquivo_lote(self, conteudo: bytes, nome_arquivo: str, loja_id: str, executor) -> Dict[str, Any]:
+        """
+        Extrai um arquivo do lote com _extrair_com_cache, parse completo no pool de processos
+        
+        Returns:
+            Mesmo formato de processar_arquivo_xml, com 'cache' nos sucessos
+        """
+        loop = asyncio.get_running_loop()
+        max_bytes = self.settings.max_file_size_bytes
+        inicio = time.perf_counter()
+        
+        async def parse_no_pool() -> Dict[str, Any]:
+            saida = await loop.run_in_executor(executor, processar_arquivo_xml, conteudo, nome_arquivo, max_bytes)
+            if not saida['sucesso']:
+                raise _FalhaParseXML(saida['erro'], saida['tipo'])
+            return saida['extracao']
+        
+        try:
+            extracao, cache = await self._extrair_com_cache(io.BytesIO(conteudo), nome_arquivo, loja_id, parse_no_pool)
+            return {'sucesso': True, 'extracao': extracao, 'cache': cache}
+        except Exception as e:
+            return {
+                'sucesso': False,
+                'erro': e.message if isinstance(e, FluyteException) else str(e),
+                'tipo': getattr(e, 'tipo', type(e).__name__),
+                'tempo_parse_ms': round((time.perf_counter() - inicio) * 1000, 2)
+            }
+    
+    def _resultado_arquivo(
+        self,
+        nome_arquivo: str,
+        saida: Dict[str, Any],
+        ambientes_criados: int,
+        loja_id: str,
+        current_user: Dict[str, Any]
+    ):
+        """Monta o resultado do arquivo na resposta e o registro em xml_processing_logs"""
+        log = {
+            'filename': nome_arquivo,
+            'loja_id': loja_id,
+            'created_by': current_user.get('user_id'),
+            'ambientes_criados': ambientes_criados
+        }
+        
+        if not saida['sucesso']:
+            log.update({
+                'status': 'ERRO',
+                'processing_time': round(saida['tempo_parse_ms'] / 1000, 3),
+                'error_details': {'erro': saida['erro'], 'tipo': saida['tipo']}
+            })
+            return ResultadoArquivoXML(arquivo=nome_arquivo, status='ERRO', erro=saida['erro']), log
+        
+        extracao = saida['extracao']
+        log.update({
+            'status': 'SUCESSO',
+            'file_size': extracao['metricas']['tamanho_bytes'],
+            'processing_time': round(extracao['metricas']['tempo_parse_ms'] / 1000, 3),
+            'colecoes_encontradas': ', '.join(extracao['colecoes_encontradas']),
+            'valor_total': extracao['valor_total'],
+            'dados_cliente': extracao['dados_cliente'],
+            **self._campos_cache_log(extracao, saida.get('cache'))
+        })
+        
+        resultado = ResultadoArquivoXML(
+            arquivo=nome_arquivo,
+            status='SUCESSO',
+            ambientes_criados=ambientes_criados,
+            valor_total=extracao['valor_total'],
+            colecoes_encontradas=extracao['colecoes_encontradas'],
+            nome_cliente=extracao['nome_cliente'],
+            metricas=extracao['metricas'],
+            cache=saida.get('cache')
+        )
+        return resultado, log
+    
+    def _montar_registros(self, extracao: Dict[str, Any], loja_id: str, nome_arquivo: str) -> List[Dict[str, Any]]:
+        """Converte ambientes extraídos em registros de c_ambientes"""
+        registros = []
+        
+        for ambiente in extracao['ambientes']:
+            colecoes = ', '.join(ambiente['colecoes']) or None
+            registros.append({
+                'nome_ambiente': ambiente['nome_ambiente'],
+                'valor_total': ambiente['valor_total'],
+                'linha_produto': colecoes,
+                'nome_cliente': extracao['nome_cliente'],
+                'descricao_completa': f"{len(ambiente['itens'])} itens" + (f" - {colecoes}" if colecoes else ''),
+                'detalhes_xml': {
+                    'arquivo': nome_arquivo,
+                    'colecoes': ambiente['colecoes'],
+                    'itens': ambiente['itens']
+                },
+                'loja_id': loja_id
+            })
+        
+        return registros
@@ -2,3 +2,207 @@
 # Tests for ambientes module
 async def test_list_ambientes():
     assert True
+
+
+# ===== PARSER XML PROMOB (STREAMING) =====
+
+import io
+
+import pytest
+
+from core.exceptions import ValidationException, XMLProcessingException
+from modules.ambientes.parser_xml import extrair_ambientes_xml, processar_arquivo_xml
+
+XML_PROMOB = b'''<?xml version="1.0" encoding="UTF-8"?>
+<LISTING>
+  <CUSTOMERSDATA><DATA ID="NomeCliente" VALUE="Maria Silva"/></CUSTOMERSDATA>
+  <AMBIENTS>
+    <AMBIENT DESCRIPTION="Cozinha">
+      <CATEGORIES><CATEGORY DESCRIPTION="Unique"><ITEMS>
+        <ITEM REFERENCE="A1" DESCRIPTION="Armario" QUANTITY="2">
+          <PRICE TOTAL="1000.50"/>
+          <ITEMS><ITEM REFERENCE="C1"><PRICE TOTAL="99"/></ITEM></ITEMS>
+        </ITEM>
+        <ITEM REFERENCE="A2" TOTAL="200"/>
+      </ITEMS></CATEGORY></CATEGORIES>
+    </AMBIENT>
+    <AMBIENT DESCRIPTION="Sala">
+      <CATEGORIES><CATEGORY DESCRIPTION="Sublime"><ITEMS>
+        <ITEM REFERENCE="B1"><PRICE TOTAL="1.234,56"/></ITEM>
+      </ITEMS></CATEGORY></CATEGORIES>
+    </AMBIENT>
+  </AMBIENTS>
+</LISTING>'''
+
+
+def test_extrair_ambientes_xml():
+    resultado = extrair_ambientes_xml(io.BytesIO(XML_PROMOB), 'projeto.xml', 1024 * 1024)
+
+    assert [a['nome_ambiente'] for a in resultado['ambientes']] == ['Cozinha', 'Sala']
+    # Componentes aninhados não entram na soma do ambiente
+    assert resultado['ambientes'][0]['valor_total'] == 1200.5
+    assert resultado['ambientes'][1]['valor_total'] == 1234.56
+    assert resultado['colecoes_encontradas'] == ['Unique', 'Sublime']
+    assert resultado['nome_cliente'] == 'Maria Silva'
+    assert resultado['metricas']['itens'] == 3
+    assert resultado['metricas']['tamanho_bytes'] == len(XML_PROMOB)
+
+
+def test_extrair_ambientes_xml_limites_e_erros():
+    with pytest.raises(ValidationException):
+        extrair_ambientes_xml(io.BytesIO(XML_PROMOB), 'grande.xml', 100)
+
+    with pytest.raises(XMLProcessingException):
+        extrair_ambientes_xml(io.BytesIO(b'<LISTING><AMBIENTS></LISTING>'), 'quebrado.xml', 1024)
+
+    with pytest.raises(XMLProcessingException):
+        extrair_ambientes_xml(io.BytesIO(b'<LISTING/>'), 'vazio.xml', 1024)
+
+
+def test_cache_de_tags_limitado():
+    from modules.ambientes.parser_xml import _normalizar_tag
+
+    tags = ''.join(f'<T{indice}/>' for indice in range(1000))
+    xml = XML_PROMOB.replace(b'</LISTING>', tags.encode() + b'</LISTING>')
+    extrair_ambientes_xml(io.BytesIO(xml), 'tags.xml', 1024 * 1024)
+
+    assert _normalizar_tag('{urn:promob}ambient') == 'AMBIENT'
+    assert _normalizar_tag.cache_info().currsize <= _normalizar_tag.cache_info().maxsize
+
+
+def test_processar_arquivo_xml_devolve_resultado_ou_erro():
+    sucesso = processar_arquivo_xml(XML_PROMOB, 'projeto.xml', 1024 * 1024)
+    assert sucesso['sucesso'] is True
+    assert sucesso['extracao']['valor_total'] == 2435.06
+
+    # Erros voltam como dict (exceções não atravessam o pool de processos)
+    erro = processar_arquivo_xml(b'<LISTING><AMBIENT', 'quebrado.xml', 1024 * 1024)
+    assert erro['sucesso'] is False
+    assert erro['tipo'] == 'XMLProcessingException'
+
+
+# ===== DEDUPLICAÇÃO / REPROCESSAMENTO PARCIAL =====
+
+from modules.ambientes.dedup_xml import indexar_xml, indice_persistivel, reprocessar_parcial
+
+
+def _resultado_anterior(conteudo):
+    extracao = extrair_ambientes_xml(io.BytesIO(conteudo), 'projeto.xml', 1024 * 1024)
+    indice = indexar_xml(io.BytesIO(conteudo), 'projeto.xml', 1024 * 1024)
+    extracao['indice'] = indice_persistivel(indice, extracao)
+    return extracao
+
+
+def test_indexar_xml_hash_por_ambiente():
+    indice = indexar_xml(io.BytesIO(XML_PROMOB), 'projeto.xml', 1024 * 1024)
+    assert len(indice['segmentos']) == 2
+    assert indice['tamanho_bytes'] == len(XML_PROMOB)
+
+    # Blocos pequenos não podem partir as tags entre leituras
+    import modules.ambientes.dedup_xml as dedup
+    original = dedup.TAMANHO_BLOCO_LEITURA
+    dedup.TAMANHO_BLOCO_LEITURA = 7
+    try:
+        assert indexar_xml(io.BytesIO(XML_PROMOB), 'projeto.xml', 1024 * 1024) == indice
+    finally:
+        dedup.TAMANHO_BLOCO_LEITURA = original
+
+
+def test_reprocessar_parcial_somente_ambiente_alterado():
+    anterior = _resultado_anterior(XML_PROMOB)
+    alterado = XML_PROMOB.replace(b'1.234,56', b'2.000,00')
+    indice = indexar_xml(io.BytesIO(alterado), 'projeto.xml', 1024 * 1024)
+
+    resultado = reprocessar_parcial(io.BytesIO(alterado), 'projeto.xml', 1024 * 1024, anterior, indice)
+
+    assert resultado['diff'] == {'adicionados': [], 'removidos': [], 'alterados': ['Sala'], 'inalterados': 1}
+    assert resultado['ambientes'][0] is anterior['ambientes'][0]
+    assert resultado['ambientes'][1]['valor_total'] == 2000.0
+    assert resultado['valor_total'] == 3200.5
+    assert resultado['nome_cliente'] == 'Maria Silva'
+
+
+def test_reprocessar_parcial_exige_mesmo_esqueleto():
+    anterior = _resultado_anterior(XML_PROMOB)
+    # Dados do cliente mudaram: parse completo
+    alterado = XML_PROMOB.replace(b'Maria Silva', b'Joana Souza').replace(b'1.234,56', b'2.000,00')
+    indice = indexar_xml(io.BytesIO(alterado), 'projeto.xml', 1024 * 1024)
+
+    assert reprocessar_parcial(io.BytesIO(alterado), 'projeto.xml', 1024 * 1024, anterior, indice) is None
+
+
+# ===== LOTE COM REAPROVEITAMENTO =====
+
+from modules.ambientes.services import AmbienteService
+
+
+class _XmlLogsFake:
+    """Resultados anteriores por hash de conteúdo (nenhum por nome de arquivo)"""
+
+    def __init__(self, por_hash):
+        self.por_hash = por_hash
+
+    async def buscar_resultado_por_hash(self, loja_id, content_hash):
+        return self.por_hash.get(content_hash)
+
+    async def buscar_ultimo_resultado(self, loja_id, nome_arquivo):
+        return None
+
+
+async def test_lote_reaproveita_hash_e_so_faz_parse_dos_novos():
+    anterior = {**_resultado_anterior(XML_PROMOB), 'tempo_parse_completo_ms': 50.0}
+    content_hash = indexar_xml(io.BytesIO(XML_PROMOB), 'projeto.xml', 1024 * 1024)['hash']
+    service = AmbienteService(None)
+    service.settings = service.settings.model_copy(update={'xml_cache_habilitado': True})
+    service.xml_logs = _XmlLogsFake({content_hash: {'id': 'log-1', 'resultado_parse': anterior}})
+
+    repetido = await service._extrair_arquivo_lote(XML_PROMOB, 'copia.xml', 'loja', None)
+    novo = await service._extrair_arquivo_lote(XML_PROMOB.replace(b'Maria Silva', b'Joana Souza'), 'novo.xml', 'loja', None)
+    quebrado = await service._extrair_arquivo_lote(b'<LISTING><AMBIENT', 'quebrado.xml', 'loja', None)
+
+    assert repetido['cache']['status'] == 'HIT'
+    assert repetido['extracao']['valor_total'] == anterior['valor_total']
+    assert novo['cache']['status'] == 'MISS'
+    assert novo['extracao']['nome_cliente'] == 'Joana Souza'
+    assert 'indice' in novo['extracao']  # gravado no log: próximos envios viram HIT
+    assert quebrado['sucesso'] is False and quebrado['tipo'] == 'XMLProcessingException'
+
+
+class _UploadFake:
+    """UploadFile sem tamanho declarado (força a leitura limitada)"""
+
+    def __init__(self, filename, conteudo):
+        self.filename = filename
+        self.size = None
+        self._arquivo = io.BytesIO(conteudo)
+
+    async def read(self, tamanho=-1):
+        return self._arquivo.read(tamanho)
+
+
+class _ColetorLogsFake:
+    async def registrar_logs_lote(self, logs):
+        self.logs = logs
+        return logs
+
+
+async def test_lote_limita_total_de_bytes_em_memoria(monkeypatch):
+    import modules.ambientes.services as services
+
+    monkeypatch.setattr(services, 'get_xml_executor', lambda: None)  # parse no pool de threads padrão
+    service = AmbienteService(None)
+    service.settings = service.settings.model_copy(update={'xml_max_mb_lote': 1, 'xml_cache_habilitado': False})
+    service.xml_logs = _ColetorLogsFake()
+
+    async def inserir_fake(registros):
+        return []
+
+    service.repository.inserir_ambientes_lote = inserir_fake
+    grande = XML_PROMOB.replace(b'</LISTING>', b'<!--' + b' ' * 600_000 + b'-->\n</LISTING>')
+    arquivos = [_UploadFake('a.xml', grande), _UploadFake('b.xml', grande), _UploadFake('c.xml', XML_PROMOB)]
+
+    resposta = await service.importar_xml_lote(arquivos, {'loja_id': 'loja', 'user_id': 'u-1'})
+
+    assert [resultado.status for resultado in resposta.arquivos] == ['SUCESSO', 'ERRO', 'SUCESSO']
+    assert '1 MB' in resposta.arquivos[1].erro
+    assert resposta.workers >= 1
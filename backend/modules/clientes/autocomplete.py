@@ -0,0 +1,392 @@
+"""
+Índice de autocomplete de clientes em memória, por loja.
+
+As telas de orçamento e contrato buscam o cliente a cada tecla; em vez de um
+listar_clientes por tecla, cada loja tem um índice de prefixos em memória:
+
+- palavras do nome (sem acento) → array('I') com as linhas dos clientes;
+- telefone (com e sem DDD) e CPF/CNPJ em um array NumPy ordenado;
+- um cliente = uma string compacta, linhas em ordem alfabética do nome;
+- consulta = bisect do prefixo + varredura limitada, já na ordem alfabética.
+
+O índice é montado sob demanda na primeira consulta da loja (leitura paginada
+de c_clientes) e mantido pelo ClienteService em criar/atualizar/excluir.
+Limites de memória: AUTOCOMPLETE_MAX_LOJAS índices (LRU, expiram após
+AUTOCOMPLETE_TTL_SECONDS para absorver alterações feitas fora do backend) e
+AUTOCOMPLETE_MAX_CLIENTES_LOJA clientes por índice; lojas acima do limite usam
+a busca do banco (buscar_clientes).
+"""
+
+import asyncio
+import heapq
+import logging
+from array import array
+from bisect import bisect_left, insort
+from operator import itemgetter
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from core.cache import TTLCache
+from core.config import get_settings
+from core.database import execute_async
+from core.pagination import aplicar_keyset, montar_pagina
+
+from .busca import apenas_digitos, normalizar_texto
+
+# Configurar logger
+logger = logging.getLogger(__name__)
+
+COLUNAS_AUTOCOMPLETE = 'id, nome, telefone, cpf_cnpj, cidade, created_at'
+
+# Dígitos mínimos para buscar por telefone/documento
+MIN_DIGITOS = 3
+
+# Limites por consulta (prefixos curtos como "a" cobrem metade da loja)
+MAX_CANDIDATOS = 1000
+MAX_PALAVRAS = 500
+
+# Chaves numéricas novas acumuladas antes de fundir no array ordenado
+LIMITE_RECENTES = 1024
+
+SEPARADOR = '\x1f'
+
+# Loja acima do limite de clientes: não indexada até o TTL expirar
+_LOJA_GRANDE_DEMAIS = object()
+
+
+def _digitos_do_cliente(telefone: Optional[str], cpf_cnpj: Optional[str]) -> List[str]:
+    """Chaves numéricas de um cliente: telefone com e sem DDD, CPF/CNPJ"""
+    chaves = []
+    digitos = apenas_digitos(telefone)
+    if len(digitos) >= MIN_DIGITOS:
+        chaves.append(digitos)
+        if len(digitos) >= 10:
+            chaves.append(digitos[2:])  # sem DDD
+    documento = apenas_digitos(cpf_cnpj)
+    if len(documento) >= MIN_DIGITOS:
+        chaves.append(documento)
+    return chaves
+
+
+class IndiceAutocomplete:
+    """
+    Índice de prefixos dos clientes de uma loja
+
+    - Cliente: uma string por linha ("id␟nome␟telefone␟cpf_cnpj␟cidade␟nome normalizado");
+      na montagem as linhas seguem a ordem alfabética do nome normalizado, então
+      "nome começa pelo termo" é um bisect nas linhas e listas de linhas crescentes
+      já saem em ordem de exibição. Clientes incluídos depois ficam no fim e em
+      uma lista ordenada à parte (nome normalizado, linha).
+    - Palavras do nome: palavras distintas ordenadas (bisect do prefixo) → array('I') de linhas.
+    - Dígitos: array NumPy ordenado de chaves 'S14' + linhas; escritas novas vão para
+      um buffer pequeno, fundido no array a cada LIMITE_RECENTES chaves.
+
+    Operações síncronas (sem await): dentro do event loop cada chamada é atômica.
+    Linhas de clientes removidos/alterados ficam inativas até a próxima montagem
+    (precisa_compactar indica quando vale remontar).
+    """
+
+    def __init__(self, clientes: List[Dict[str, Any]] = ()):
+        self._registros: List[str] = []
+        self._ativos = bytearray()
+        self._linha_por_id: Dict[str, int] = {}
+        self._postings: Dict[str, array] = {}
+        self._incluidas: List[Tuple[str, int]] = []
+        self._vazias = 0
+
+        ordenados = sorted(((normalizar_texto(c.get('nome')), c) for c in clientes), key=itemgetter(0))
+        chaves, linhas = [], []
+        for nome_normalizado, cliente in ordenados:
+            linha = self._guardar(cliente, nome_normalizado)
+            for chave in _digitos_do_cliente(cliente.get('telefone'), cliente.get('cpf_cnpj')):
+                chaves.append(chave)
+                linhas.append(linha)
+        self._montadas = len(self._registros)
+
+        self._palavras: List[str] = sorted(self._postings)
+        self._digitos = np.array(chaves, dtype='S14')
+        self._linhas_digitos = np.array(linhas, dtype=np.uint32)
+        ordem = np.argsort(self._digitos, kind='stable')
+        self._digitos, self._linhas_digitos = self._digitos[ordem], self._linhas_digitos[ordem]
+        self._digitos_recentes: List[Tuple[str, int]] = []
+
+    def __len__(self) -> int:
+        return len(self._linha_por_id)
+
+    def _guardar(self, cliente: Dict[str, Any], nome_normalizado: str) -> int:
+        cliente_id = str(cliente['id'])
+        linha = len(self._registros)
+        self._registros.append(SEPARADOR.join((
+            cliente_id,
+            cliente.get('nome') or '',
+            cliente.get('telefone') or '',
+            cliente.get('cpf_cnpj') or '',
+            cliente.get('cidade') or '',
+            nome_normalizado,
+        )))
+        self._ativos.append(1)
+        self._linha_por_id[cliente_id] = linha
+
+        for palavra in set(nome_normalizado.split()):
+            self._postings.setdefault(palavra, array('I')).append(linha)
+        return linha
+
+    def registrar(self, cliente: Dict[str, Any]) -> None:
+        """Inclui ou atualiza um cliente (nova linha no fim do índice)"""
+        self.remover(str(cliente['id']))
+
+        quantidade_palavras = len(self._postings)
+        nome_normalizado = normalizar_texto(cliente.get('nome'))
+        linha = self._guardar(cliente, nome_normalizado)
+        insort(self._incluidas, (nome_normalizado, linha))
+        if len(self._postings) != quantidade_palavras:
+            self._palavras = sorted(self._postings)
+
+        for chave in _digitos_do_cliente(cliente.get('telefone'), cliente.get('cpf_cnpj')):
+            self._digitos_recentes.append((chave, linha))
+        if len(self._digitos_recentes) >= LIMITE_RECENTES:
+            self._fundir_recentes()
+
+    def remover(self, cliente_id: str) -> None:
+        """Retira um cliente do índice (se presente)"""
+        linha = self._linha_por_id.pop(str(cliente_id), None)
+        if linha is not None:
+            self._ativos[linha] = 0
+            self._vazias += 1
+
+    @property
+    def precisa_compactar(self) -> bool:
+        """Muitas linhas inativas (alterações/exclusões): remontar libera memória"""
+        return self._vazias > max(1000, len(self._registros) // 4)
+
+    def _fundir_recentes(self) -> None:
+        chaves = np.concatenate([self._digitos, np.array([c for c, _ in self._digitos_recentes], dtype='S14')])
+        linhas = np.concatenate([self._linhas_digitos, np.array([l for _, l in self._digitos_recentes], dtype=np.uint32)])
+        ordem = np.argsort(chaves, kind='stable')
+        self._digitos, self._linhas_digitos = chaves[ordem], linhas[ordem]
+        self._digitos_recentes = []
+
+    def buscar(self, termo: str, limite: int = 10) -> List[Dict[str, str]]:
+        """
+        Clientes cujo nome tem palavras começando pelas palavras do termo, ou
+        cujo telefone/CPF/CNPJ começa pelos dígitos digitados
+
+        Ordem: nomes que começam pelo termo, depois os demais (alfabética).
+        """
+        texto = ' '.join(normalizar_texto(termo).split())
+        digitos = apenas_digitos(termo)
+
+        if len(digitos) >= MIN_DIGITOS and not any(c.isalpha() for c in texto):
+            linhas = self._buscar_digitos(digitos, limite)
+        elif texto:
+            linhas = self._buscar_nome(texto, limite)
+        else:
+            return []
+
+        sugestoes = []
+        for linha in linhas:
+            cliente_id, nome, telefone, cpf_cnpj, cidade, _ = self._registros[linha].split(SEPARADOR)
+            sugestoes.append({'id': cliente_id, 'nome': nome, 'telefone': telefone, 'cpf_cnpj': cpf_cnpj, 'cidade': cidade})
+        return sugestoes
+
+    def _nome_normalizado(self, linha: int) -> str:
+        registro = self._registros[linha]
+        return registro[registro.rindex(SEPARADOR) + 1:]
+
+    def _palavras_com_prefixo(self, prefixo: str) -> List[str]:
+        inicio = bisect_left(self._palavras, prefixo)
+        fim = bisect_left(self._palavras, prefixo + '\uffff', inicio)
+        return self._palavras[inicio:min(fim, inicio + MAX_PALAVRAS)]
+
+    def _primeira_montada(self, prefixo: str) -> int:
+        """Primeira linha da montagem com nome normalizado >= prefixo (bisect)"""
+        baixo, alto = 0, self._montadas
+        while baixo < alto:
+            meio = (baixo + alto) // 2
+            if self._nome_normalizado(meio) < prefixo:
+                baixo = meio + 1
+            else:
+                alto = meio
+        return baixo
+
+    def _buscar_nome(self, texto: str, limite: int) -> List[int]:
+        # 1) Nomes que começam pelo termo: linhas da montagem a partir do bisect
+        #    + clientes incluídos depois (lista ordenada à parte)
+        encontradas: List[int] = []
+        linha = self._primeira_montada(texto)
+        while linha < self._montadas and len(encontradas) < limite:
+            if not self._nome_normalizado(linha).startswith(texto):
+                break
+            if self._ativos[linha]:
+                encontradas.append(linha)
+            linha += 1
+
+        if self._incluidas:
+            posicao = bisect_left(self._incluidas, (texto,))
+            incluidas = []
+            for nome, linha in self._incluidas[posicao:]:
+                if not nome.startswith(texto) or len(incluidas) == limite:
+                    break
+                if self._ativos[linha]:
+                    incluidas.append(linha)
+            if incluidas:
+                encontradas = sorted(encontradas + incluidas, key=self._nome_normalizado)[:limite]
+
+        if len(encontradas) == limite:
+            return encontradas
+
+        # 2) Todas as palavras do termo no nome, percorrendo a palavra mais seletiva
+        palavras = texto.split()
+        candidatas = {p: self._palavras_com_prefixo(p) for p in palavras}
+        seletiva = min(palavras, key=lambda p: sum(len(self._postings[w]) for w in candidatas[p]))
+        outras = [p for p in palavras if p != seletiva]
+
+        vistas = set(encontradas)
+        demais: List[int] = []
+        anterior, examinadas = -1, 0
+        for linha in heapq.merge(*(self._postings[w] for w in candidatas[seletiva])):
+            if linha == anterior:
+                continue
+            anterior = linha
+            examinadas += 1
+            if examinadas > MAX_CANDIDATOS:
+                break
+            if not self._ativos[linha] or linha in vistas:
+                continue
+            if outras:
+                palavras_nome = self._nome_normalizado(linha).split()
+                if not all(any(w.startswith(p) for w in palavras_nome) for p in outras):
+                    continue
+            demais.append(linha)
+            if len(encontradas) + len(demais) == limite:
+                break
+
+        # Clientes incluídos depois da montagem ficam no fim das listas: reordena o trecho
+        demais.sort(key=self._nome_normalizado)
+        return encontradas + demais
+
+    def _buscar_digitos(self, digitos: str, limite: int) -> List[int]:
+        chave = digitos.encode()
+        inicio = int(np.searchsorted(self._digitos, chave, side='left'))
+        fim = int(np.searchsorted(self._digitos, chave + b'\xff', side='left'))
+        linhas = set(self._linhas_digitos[inicio:min(fim, inicio + MAX_CANDIDATOS)].tolist())
+        linhas.update(linha for recente, linha in self._digitos_recentes if recente.startswith(digitos))
+
+        return [linha for linha in sorted(linhas) if self._ativos[linha]][:limite]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'clientes': len(self._linha_por_id),
+            'linhas_vazias': self._vazias,
+            'palavras': len(self._palavras),
+            'chaves_numericas': len(self._digitos) + len(self._digitos_recentes),
+        }
+
+
+class AutocompleteClientes:
+    """Índices por loja com montagem sob demanda e limites de memória"""
+
+    def __init__(self, max_lojas: int, max_clientes_loja: int, ttl_seconds: float, tamanho_pagina: int = 1000):
+        self.max_clientes_loja = max_clientes_loja
+        self.tamanho_pagina = tamanho_pagina
+        self._indices = TTLCache("autocomplete_clientes", maxsize=max_lojas, ttl_seconds=ttl_seconds)
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._pendentes: Dict[str, List[Tuple[str, Any]]] = {}  # alterações durante a montagem
+
+    async def indice(self, supabase, loja_id: str) -> Optional[IndiceAutocomplete]:
+        """
+        Índice da loja (monta na primeira chamada)
+
+        Returns:
+            None se a loja passa de max_clientes_loja (usar a busca do banco)
+        """
+        loja_id = str(loja_id)
+        indice = self._indices.get(loja_id)
+        if indice is not None:
+            return None if indice is _LOJA_GRANDE_DEMAIS else indice
+
+        lock = self._locks.setdefault(loja_id, asyncio.Lock())
+        async with lock:
+            indice = self._indices.get(loja_id)
+            if indice is None:
+                indice = await self._montar(supabase, loja_id)
+                self._indices.set(loja_id, indice)
+
+        return None if indice is _LOJA_GRANDE_DEMAIS else indice
+
+    async def _montar(self, supabase, loja_id: str):
+        self._pendentes[loja_id] = []
+        try:
+            clientes: List[Dict[str, Any]] = []
+            cursor = None
+            while True:
+                query = (
+                    supabase.table('c_clientes')
+                    .select(COLUNAS_AUTOCOMPLETE)
+                    .eq('loja_id', loja_id)
+                    .not_.is_('excluido', 'true')
+                )
+                result = await execute_async(aplicar_keyset(query, cursor, self.tamanho_pagina))
+                pagina, cursor = montar_pagina(result.data, self.tamanho_pagina)
+                clientes.extend(pagina)
+
+                if len(clientes) > self.max_clientes_loja:
+                    logger.warning(
+                        f"⚠️ Loja {loja_id} passa de {self.max_clientes_loja} clientes: autocomplete pelo banco"
+                    )
+                    return _LOJA_GRANDE_DEMAIS
+                if not cursor:
+                    break
+
+            # Montagem fora do event loop (segundos em lojas grandes)
+            loop = asyncio.get_running_loop()
+            indice = await loop.run_in_executor(None, IndiceAutocomplete, clientes)
+            # Alterações feitas enquanto as páginas eram lidas
+            for operacao, dado in self._pendentes[loja_id]:
+                if operacao == 'registrar':
+                    indice.registrar(dado)
+                else:
+                    indice.remover(dado)
+
+            logger.info(f"🔎 Autocomplete da loja {loja_id}: {len(indice)} clientes indexados")
+            return indice
+        finally:
+            self._pendentes.pop(loja_id, None)
+
+    def registrar(self, loja_id: str, cliente: Dict[str, Any]) -> None:
+        """Cliente criado/atualizado pelo ClienteService"""
+        self._aplicar(str(loja_id), 'registrar', cliente)
+
+    def remover(self, loja_id: str, cliente_id: str) -> None:
+        """Cliente excluído pelo ClienteService"""
+        self._aplicar(str(loja_id), 'remover', str(cliente_id))
+
+    def _aplicar(self, loja_id: str, operacao: str, dado: Any) -> None:
+        if loja_id in self._pendentes:
+            self._pendentes[loja_id].append((operacao, dado))
+            return
+
+        indice = self._indices.get(loja_id)
+        if isinstance(indice, IndiceAutocomplete):
+            getattr(indice, operacao)(dado)
+            if indice.precisa_compactar:
+                # Remontado na próxima consulta, sem as linhas vazias
+                self._indices.invalidate(loja_id)
+
+    def invalidar(self, loja_id: Optional[str] = None) -> None:
+        """Descarta o índice da loja (ou de todas); será remontado na próxima consulta"""
+        if loja_id is None:
+            self._indices.clear()
+        else:
+            self._indices.invalidate(str(loja_id))
+
+
+_settings = get_settings()
+
+# Índices do processo (um conjunto por worker)
+autocomplete_clientes = AutocompleteClientes(
+    max_lojas=_settings.autocomplete_max_lojas,
+    max_clientes_loja=_settings.autocomplete_max_clientes_loja,
+    ttl_seconds=_settings.autocomplete_ttl_seconds
+)
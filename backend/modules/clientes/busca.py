@@ -0,0 +1,54 @@
+"""
+Normalização de termos de busca de clientes.
+
+Espelha as colunas geradas de c_clientes (migration 20261018080000):
+nome_busca/cidade_busca/procedencia_busca = public.normalizar_busca(...)
+(minúsculas, sem acentos) e telefone_digitos (apenas dígitos). O termo digitado
+passa pela mesma normalização antes de ir ao banco, para que "JOSÉ" encontre
+"Jose" usando os índices de trigramas.
+
+Cliente ativo é `excluido is not true` em todo lugar (listagem, busca,
+autocomplete e o índice único de CPF/CNPJ): a exclusão grava excluido = true.
+"""
+
+import re
+import unicodedata
+from typing import Optional
+
+_NAO_DIGITOS = re.compile(r'\D')
+
+
+def _sem_acento(texto: str) -> str:
+    decomposto = unicodedata.normalize('NFKD', texto)
+    return ''.join(c for c in decomposto if not unicodedata.combining(c))
+
+
+# Latin-1 e Latin Extended-A/B (U+00C0–U+024F): letra acentuada → letra base,
+# para não decompor caractere a caractere nos nomes comuns
+_TABELA_ACENTOS = {
+    codigo: _sem_acento(chr(codigo))
+    for codigo in range(0x00C0, 0x0250)
+    if _sem_acento(chr(codigo)) != chr(codigo)
+}
+
+
+def normalizar_texto(texto: Optional[str]) -> str:
+    """Minúsculas e sem acentos (equivalente a public.normalizar_busca)"""
+    if not texto:
+        return ''
+    if texto.isascii():
+        return texto.lower()
+    convertido = texto.translate(_TABELA_ACENTOS)
+    if not convertido.isascii():
+        convertido = _sem_acento(convertido)
+    return convertido.lower()
+
+
+def apenas_digitos(texto: Optional[str]) -> str:
+    """Somente os dígitos (equivalente a telefone_digitos)"""
+    return _NAO_DIGITOS.sub('', texto or '')
+
+
+def escapar_like(termo: str) -> str:
+    """Escapa \\, % e _ para o termo valer literalmente dentro de '%termo%'"""
+    return termo.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
@@ -3,10 +3,11 @@ Controller (rotas) para o módulo de Clientes.
 Define endpoints REST para operações de cliente.
 """
 
-from fastapi import APIRouter, Depends, Query, HTTPException, status
-from typing import List, Optional, Dict, Any
+from fastapi import APIRouter, Depends, File, Query, HTTPException, UploadFile, status
+from typing import List, Optional, Dict, Any, Union
 from core.auth import get_current_user, require_vendedor_ou_superior
 from core.database import get_database
+from core.pagination import decodificar_cursor
 from supabase import Client
 import uuid
 
@@ -15,7 +16,11 @@ from .schemas import (
     ClienteUpdate,
     ClienteResponse,
     ClienteListItem,
-    ClienteFilters
+    ClienteBuscaItem,
+    ClienteAutocompleteItem,
+    ClientePagina,
+    ClienteFilters,
+    ImportacaoClientesResponse
 )
 from .services import ClienteService
 
@@ -44,8 +49,32 @@ async def criar_cliente(
     return await service.criar_cliente(cliente_data, current_user)
 
 
+@router.post("/importar",
+    response_model=ImportacaoClientesResponse,
+    summary="Importar clientes de planilha",
+    description="Importa clientes de um arquivo CSV ou XLSX (primeira linha = cabeçalho)"
+)
+async def importar_clientes(
+    arquivo: UploadFile = File(..., description="Planilha CSV ou XLSX com os clientes"),
+    current_user: Dict[str, Any] = Depends(require_vendedor_ou_superior()),
+    db: Client = Depends(get_database)
+):
+    """
+    Importa clientes em lote a partir de uma planilha.
+    
+    - **Colunas**: nome, cpf_cnpj, telefone, endereco, cidade, cep (obrigatórias); email,
+      tipo_venda, procedencia, observacao (opcionais). Aceita sinônimos como CPF, Celular, E-mail
+    - **Leitura em streaming** e validação com as mesmas regras do cadastro
+    - **CPF/CNPJ** repetido no arquivo ou já cadastrado na loja é recusado por linha
+    - **Gravação em lotes** (CLIENTES_IMPORTACAO_LOTE linhas por chamada)
+    - **Relatório por linha**: linhas com erro não impedem a importação das demais
+    """
+    service = ClienteService(db)
+    return await service.importar_clientes(arquivo, current_user)
+
+
 @router.get("/",
-    response_model=List[ClienteListItem],
+    response_model=Union[List[ClienteListItem], ClientePagina],
     summary="Listar clientes",
     description="Lista clientes da loja com filtros e paginação"
 )
@@ -61,6 +90,7 @@ async def listar_clientes(
     # Paginação
     skip: int = Query(0, ge=0, description="Registros a pular"),
     limit: int = Query(50, ge=1, le=200, description="Limite de registros"),
+    cursor: Optional[str] = Query(None, description="Modo cursor: next_cursor da página anterior (envie vazio para a primeira página)"),
     
     # Dependências
     current_user: Dict[str, Any] = Depends(get_current_user),
@@ -70,6 +100,9 @@ async def listar_clientes(
     Lista clientes com filtros aplicados.
     
     **RLS aplicado:** Usuário vê apenas clientes da própria loja.
+    
+    **Paginação:** `skip`/`limit` (offset, retorna lista) ou `cursor` (keyset,
+    retorna `items` + `next_cursor`; recomendado para lojas com muitos registros).
     """
     # Constrói filtros
     filters = ClienteFilters(
@@ -82,9 +115,64 @@ async def listar_clientes(
     )
     
     service = ClienteService(db)
+    
+    # Modo cursor (keyset): presença do parâmetro, mesmo vazio
+    if cursor is not None:
+        if cursor:
+            decodificar_cursor(cursor)  # 400 para cursor inválido
+        return await service.listar_clientes_cursor(filters, current_user, cursor, limit)
+    
     return await service.listar_clientes(filters, current_user, skip, limit)
 
 
+@router.get("/buscar",
+    response_model=List[ClienteBuscaItem],
+    summary="Buscar clientes",
+    description="Busca livre por nome, telefone ou CPF/CNPJ, ordenada por relevância"
+)
+async def buscar_clientes(
+    q: str = Query(..., min_length=2, max_length=100, description="Nome, telefone ou CPF/CNPJ"),
+    skip: int = Query(0, ge=0, description="Resultados a pular"),
+    limit: int = Query(20, ge=1, le=100, description="Máximo de resultados"),
+    current_user: Dict[str, Any] = Depends(get_current_user),
+    db: Client = Depends(get_database)
+):
+    """
+    Busca clientes da loja por relevância.
+    
+    - **Nome:** sem diferença de acentos/maiúsculas e tolerante a erros de digitação
+    - **Telefone:** qualquer trecho com 4+ dígitos, em qualquer formatação
+    - **CPF/CNPJ:** documento completo
+    
+    **RLS aplicado:** Apenas clientes da mesma loja.
+    """
+    service = ClienteService(db)
+    return await service.buscar_clientes(q, current_user, limit, skip)
+
+
+@router.get("/autocomplete",
+    response_model=List[ClienteAutocompleteItem],
+    summary="Autocomplete de clientes",
+    description="Sugestões por prefixo de nome, telefone ou CPF/CNPJ (índice em memória da loja)"
+)
+async def autocomplete_clientes(
+    q: str = Query(..., min_length=1, max_length=100, description="Texto digitado"),
+    limit: int = Query(10, ge=1, le=50, description="Máximo de sugestões"),
+    current_user: Dict[str, Any] = Depends(get_current_user),
+    db: Client = Depends(get_database)
+):
+    """
+    Sugestões de clientes enquanto o usuário digita.
+    
+    - **Nome:** cada palavra digitada casa com o início de uma palavra do nome (sem acentos)
+    - **Telefone / CPF/CNPJ:** início dos dígitos (telefone com ou sem DDD)
+    
+    **RLS aplicado:** Apenas clientes da mesma loja.
+    """
+    service = ClienteService(db)
+    return await service.autocomplete(q, current_user, limit)
+
+
 @router.get("/{cliente_id}",
     response_model=ClienteResponse,
     summary="Obter cliente por ID",
@@ -0,0 +1,270 @@
+"""
+Leitura em streaming das planilhas de importação de clientes (CSV/XLSX).
+
+Lojas que migram de planilhas enviam milhares de clientes de uma vez. O
+arquivo é lido linha a linha (CSV decodificado por blocos; XLSX lido direto
+do zip com lxml.etree.iterparse, sem carregar a planilha inteira) e entregue
+ao ClienteService em lotes de CLIENTES_IMPORTACAO_LOTE linhas, que valida com
+as regras de ClienteCreate e grava cada lote em uma chamada
+(importar_clientes_lote).
+
+Cabeçalho: a primeira linha nomeia as colunas; nomes são comparados sem
+acento/maiúsculas e aceitam sinônimos comuns (ex: "CPF", "Documento",
+"Celular", "E-mail"). Colunas desconhecidas são ignoradas.
+"""
+
+import codecs
+import csv
+import logging
+import posixpath
+import zipfile
+from itertools import islice
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+from lxml import etree
+
+from core.exceptions import ValidationException
+from .busca import normalizar_texto
+from .schemas import ClienteCreate
+
+# Configurar logger
+logger = logging.getLogger(__name__)
+
+EXTENSOES_IMPORTACAO = ('.csv', '.xlsx')
+
+TAMANHO_BLOCO_LEITURA = 64 * 1024
+
+# Nome normalizado da coluna → campo de ClienteCreate
+SINONIMOS_COLUNAS = {
+    'nome': 'nome', 'nome completo': 'nome', 'cliente': 'nome', 'razao social': 'nome',
+    'cpf_cnpj': 'cpf_cnpj', 'cpf/cnpj': 'cpf_cnpj', 'cpf': 'cpf_cnpj', 'cnpj': 'cpf_cnpj', 'documento': 'cpf_cnpj',
+    'telefone': 'telefone', 'celular': 'telefone', 'fone': 'telefone', 'whatsapp': 'telefone',
+    'email': 'email', 'e-mail': 'email',
+    'endereco': 'endereco', 'logradouro': 'endereco',
+    'cidade': 'cidade', 'municipio': 'cidade',
+    'cep': 'cep',
+    'tipo_venda': 'tipo_venda', 'tipo de venda': 'tipo_venda',
+    'procedencia': 'procedencia', 'origem': 'procedencia',
+    'observacao': 'observacao', 'observacoes': 'observacao', 'obs': 'observacao',
+}
+
+CAMPOS_OBRIGATORIOS = tuple(nome for nome, campo in ClienteCreate.model_fields.items() if campo.is_required())
+
+# Namespaces do SpreadsheetML (XLSX)
+_NS_PLANILHA = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+_NS_RELACAO = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+_NS_PACOTE = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+
+
+def _erro_arquivo(mensagem: str, nome_arquivo: str) -> ValidationException:
+    return ValidationException(mensagem, field="arquivo", details={"filename": nome_arquivo})
+
+
+# ===== CSV =====
+
+def _linhas_csv(arquivo: BinaryIO, nome_arquivo: str, max_bytes: int) -> Iterator[Tuple[int, List[str]]]:
+    """
+    Registros do CSV decodificados por blocos
+
+    Codificação: UTF-8 (com ou sem BOM) ou, se o primeiro bloco não for UTF-8
+    válido, Windows-1252 (CSV salvo pelo Excel em português). Delimitador ';'
+    ou ',' conforme o cabeçalho.
+    """
+    primeiro = arquivo.read(TAMANHO_BLOCO_LEITURA)
+    try:
+        codecs.getincrementaldecoder('utf-8-sig')().decode(primeiro, final=False)
+        codificacao = 'utf-8-sig'
+    except UnicodeDecodeError:
+        codificacao = 'cp1252'
+
+    def textos() -> Iterator[str]:
+        decodificador = codecs.getincrementaldecoder(codificacao)()
+        bloco, bytes_lidos, resto = primeiro, 0, ''
+        while True:
+            bytes_lidos += len(bloco)
+            if bytes_lidos > max_bytes:
+                raise _erro_arquivo(f"Arquivo excede o tamanho máximo de {max_bytes // (1024 * 1024)} MB", nome_arquivo)
+            try:
+                texto = resto + decodificador.decode(bloco, final=not bloco)
+            except UnicodeDecodeError:
+                raise _erro_arquivo("Codificação do CSV inválida: salve o arquivo como UTF-8", nome_arquivo)
+            if not bloco:
+                if texto:
+                    yield texto
+                return
+            linhas = texto.splitlines(keepends=True)
+            # Última linha pode estar incompleta: aguarda o próximo bloco
+            resto = linhas.pop() if linhas and not linhas[-1].endswith('\n') else ''
+            yield from linhas
+            bloco = arquivo.read(TAMANHO_BLOCO_LEITURA)
+
+    linhas = textos()
+    cabecalho = next(linhas, '')
+    delimitador = ';' if cabecalho.count(';') >= cabecalho.count(',') and ';' in cabecalho else ','
+
+    def com_cabecalho() -> Iterator[str]:
+        yield cabecalho
+        yield from linhas
+
+    yield from enumerate(csv.reader(com_cabecalho(), delimiter=delimitador), start=1)
+
+
+# ===== XLSX =====
+
+def _coluna(referencia: str) -> int:
+    """Índice (0-based) da coluna de uma referência de célula ("AB12" → 27)"""
+    indice = 0
+    for caractere in referencia:
+        if not caractere.isalpha():
+            break
+        indice = indice * 26 + (ord(caractere.upper()) - 64)
+    return indice - 1
+
+
+def _caminho_primeira_planilha(pacote: zipfile.ZipFile) -> str:
+    workbook = etree.fromstring(pacote.read('xl/workbook.xml'))
+    planilha = workbook.find(f'{_NS_PLANILHA}sheets/{_NS_PLANILHA}sheet')
+    relacoes = etree.fromstring(pacote.read('xl/_rels/workbook.xml.rels'))
+    for relacao in relacoes.iter(f'{_NS_PACOTE}Relationship'):
+        if relacao.get('Id') == planilha.get(f'{_NS_RELACAO}id'):
+            destino = relacao.get('Target')
+            return destino.lstrip('/') if destino.startswith('/') else posixpath.normpath(f'xl/{destino}')
+    raise KeyError('planilha')
+
+
+def _textos_compartilhados(pacote: zipfile.ZipFile) -> List[str]:
+    if 'xl/sharedStrings.xml' not in pacote.namelist():
+        return []
+    textos = []
+    with pacote.open('xl/sharedStrings.xml') as arquivo:
+        for _, item in etree.iterparse(arquivo, tag=f'{_NS_PLANILHA}si', resolve_entities=False, no_network=True):
+            # Texto com formatação (runs) vem em vários <t>; fonética (<rPh>) fica de fora
+            textos.append(''.join(
+                t.text or '' for t in item.iter(f'{_NS_PLANILHA}t')
+                if t.getparent().tag != f'{_NS_PLANILHA}rPh'
+            ))
+            item.clear()
+    return textos
+
+
+def _valor_celula(celula, compartilhados: List[str]) -> str:
+    tipo = celula.get('t', 'n')
+    if tipo == 'inlineStr':
+        return ''.join(t.text or '' for t in celula.iter(f'{_NS_PLANILHA}t'))
+
+    valor = celula.findtext(f'{_NS_PLANILHA}v')
+    if valor is None:
+        return ''
+    if tipo == 's':
+        return compartilhados[int(valor)]
+    if tipo == 'n':
+        # CPF/telefone digitados como número: "12345678909" ou "1.2345678909E10"
+        try:
+            numero = float(valor)
+        except ValueError:
+            return valor
+        return str(int(numero)) if numero.is_integer() else valor
+    return valor
+
+
+def _linhas_xlsx(arquivo: BinaryIO, nome_arquivo: str, max_bytes: int) -> Iterator[Tuple[int, List[str]]]:
+    """Linhas da primeira planilha do XLSX, lidas do zip em streaming"""
+    arquivo.seek(0, 2)
+    if arquivo.tell() > max_bytes:
+        raise _erro_arquivo(f"Arquivo excede o tamanho máximo de {max_bytes // (1024 * 1024)} MB", nome_arquivo)
+    arquivo.seek(0)
+
+    try:
+        pacote = zipfile.ZipFile(arquivo)
+        caminho = _caminho_primeira_planilha(pacote)
+        compartilhados = _textos_compartilhados(pacote)
+    except (zipfile.BadZipFile, KeyError, etree.XMLSyntaxError):
+        raise _erro_arquivo("Arquivo XLSX inválido", nome_arquivo)
+
+    with pacote, pacote.open(caminho) as planilha:
+        try:
+            for posicao_linha, (_, linha) in enumerate(etree.iterparse(
+                planilha, tag=f'{_NS_PLANILHA}row', resolve_entities=False, no_network=True, huge_tree=False
+            ), start=1):
+                numero = int(linha.get('r') or posicao_linha)
+                valores: List[str] = []
+                for posicao, celula in enumerate(linha.iter(f'{_NS_PLANILHA}c')):
+                    coluna = _coluna(celula.get('r')) if celula.get('r') else posicao
+                    if coluna >= len(valores):
+                        valores.extend([''] * (coluna + 1 - len(valores)))
+                    valores[coluna] = _valor_celula(celula, compartilhados)
+                linha.clear()
+                while linha.getprevious() is not None:
+                    del linha.getparent()[0]
+                yield numero, valores
+        except etree.XMLSyntaxError:
+            raise _erro_arquivo("Arquivo XLSX inválido", nome_arquivo)
+
+
+# ===== LINHAS → CLIENTES =====
+
+def _campos_do_cabecalho(cabecalho: List[str], nome_arquivo: str) -> List[Optional[str]]:
+    campos = [SINONIMOS_COLUNAS.get(' '.join(normalizar_texto(coluna).split())) for coluna in cabecalho]
+    ausentes = [campo for campo in CAMPOS_OBRIGATORIOS if campo not in campos]
+    if ausentes:
+        raise _erro_arquivo(f"Colunas obrigatórias ausentes: {', '.join(ausentes)}", nome_arquivo)
+    return campos
+
+
+def _normalizar_documento(valor: str) -> str:
+    """Planilhas que tratam o CPF/CNPJ como número perdem os zeros à esquerda"""
+    if valor.isdigit() and len(valor) < 11:
+        return valor.zfill(11)
+    if valor.isdigit() and 11 < len(valor) < 14:
+        return valor.zfill(14)
+    return valor
+
+
+def ler_planilha_clientes(arquivo: BinaryIO, nome_arquivo: str, max_bytes: int) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """
+    Linhas de clientes da planilha, em streaming
+
+    Args:
+        arquivo: Arquivo binário (ex: UploadFile.file)
+        nome_arquivo: Nome (a extensão define o formato)
+        max_bytes: Tamanho máximo aceito (Settings.max_file_size_bytes)
+
+    Yields:
+        (número da linha na planilha, dados do cliente com os campos de ClienteCreate);
+        linhas vazias são puladas
+
+    Raises:
+        ValidationException: formato não suportado, arquivo grande demais/inválido
+            ou cabeçalho sem as colunas obrigatórias
+    """
+    nome = (nome_arquivo or '').lower()
+    if nome.endswith('.csv'):
+        linhas = _linhas_csv(arquivo, nome_arquivo, max_bytes)
+    elif nome.endswith('.xlsx'):
+        linhas = _linhas_xlsx(arquivo, nome_arquivo, max_bytes)
+    else:
+        raise _erro_arquivo(f"Formato não suportado. Use: {', '.join(EXTENSOES_IMPORTACAO)}", nome_arquivo)
+
+    _, cabecalho = next(linhas, (None, None))
+    if cabecalho is None:
+        raise _erro_arquivo("Planilha vazia", nome_arquivo)
+    campos = _campos_do_cabecalho(cabecalho, nome_arquivo)
+
+    for numero, valores in linhas:
+        dados: Dict[str, Any] = {}
+        for campo, valor in zip(campos, valores):
+            valor = (valor or '').strip()
+            if campo and valor:
+                dados[campo] = valor
+        if not dados:
+            continue
+        if 'cpf_cnpj' in dados:
+            dados['cpf_cnpj'] = _normalizar_documento(dados['cpf_cnpj'])
+        if 'tipo_venda' in dados:
+            dados['tipo_venda'] = dados['tipo_venda'].upper()
+        yield numero, dados
+
+
+def proximo_lote(linhas: Iterator[Tuple[int, Dict[str, Any]]], tamanho: int) -> List[Tuple[int, Dict[str, Any]]]:
+    """Próximas `tamanho` linhas (lista vazia no fim do arquivo)"""
+    return list(islice(linhas, tamanho))
@@ -4,8 +4,12 @@ Responsabilidade: Acesso a dados, queries, conversões.
 """
 
 import logging
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from supabase import Client
+from core.config import get_settings
+from core.database import execute_async, handle_supabase_error
+from core.pagination import aplicar_keyset, montar_pagina
+from .busca import apenas_digitos, escapar_like, normalizar_texto
 from .schemas import ClienteFilters
 
 # Configurar logger
@@ -22,6 +26,7 @@ class ClienteRepository:
     
     def __init__(self, supabase_client: Client):
         self.supabase = supabase_client
+        self.busca_indexada = get_settings().clientes_busca_indexada
     
     async def criar_cliente(self, dados_cliente: Dict[str, Any], loja_id: str) -> Dict[str, Any]:
         """
@@ -39,11 +44,10 @@ class ClienteRepository:
             dados_cliente['loja_id'] = loja_id
             
             # Inserir cliente
-            result = (
+            result = await execute_async(
                 self.supabase
                 .table('c_clientes')
                 .insert(dados_cliente)
-                .execute()
             )
             
             if not result.data:
@@ -55,9 +59,40 @@ class ClienteRepository:
             return cliente_criado
             
         except Exception as e:
+            if handle_supabase_error(e).code == "DUPLICATE_KEY":
+                # Índice único uq_c_clientes_loja_cpf_cnpj: CPF/CNPJ já ativo na loja
+                logger.warning(f"CPF/CNPJ {dados_cliente.get('cpf_cnpj')} já existe na loja {loja_id}")
+                raise Exception(f"CPF/CNPJ {dados_cliente.get('cpf_cnpj')} já está cadastrado nesta loja")
             logger.error(f"Erro ao criar cliente: {str(e)}")
             raise Exception(f"Erro ao criar cliente: {str(e)}")
     
+    async def importar_clientes_lote(self, clientes: List[Dict[str, Any]], loja_id: str) -> List[Dict[str, Any]]:
+        """
+        Insere um lote de clientes em uma chamada (RPC importar_clientes_lote)
+        
+        CPF/CNPJ já ativo na loja é ignorado pelo banco (índice único), sem
+        abortar o lote.
+        
+        Args:
+            clientes: Dados dos clientes (campos de ClienteCreate)
+            loja_id: ID da loja (RLS)
+            
+        Returns:
+            Lista de {id, cpf_cnpj} dos clientes gravados
+        """
+        try:
+            result = await execute_async(
+                self.supabase.rpc('importar_clientes_lote', {
+                    'p_loja_id': str(loja_id),
+                    'p_clientes': clientes
+                })
+            )
+            return result.data or []
+            
+        except Exception as e:
+            logger.error(f"Erro ao importar lote de clientes: {str(e)}")
+            raise Exception(f"Erro ao importar lote de clientes: {str(e)}")
+    
     async def listar_clientes(self, loja_id: str, filters: Optional[ClienteFilters] = None, skip: int = 0, limit: int = 50) -> List[Dict[str, Any]]:
         """
         Lista clientes com filtros aplicados
@@ -72,40 +107,11 @@ class ClienteRepository:
             List[Dict]: Lista de clientes
         """
         try:
-            # Query base
-            query = (
-                self.supabase
-                .table('c_clientes')
-                .select('*')
-                .eq('loja_id', loja_id)
-            )
-            
-            # Aplicar filtros se fornecidos
-            if filters:
-                if filters.nome:
-                    query = query.ilike('nome', f'%{filters.nome}%')
-                
-                if filters.cpf_cnpj:
-                    query = query.eq('cpf_cnpj', filters.cpf_cnpj)
-                
-                if filters.telefone:
-                    query = query.ilike('telefone', f'%{filters.telefone}%')
-                
-                if filters.cidade:
-                    query = query.ilike('cidade', f'%{filters.cidade}%')
-                
-                if filters.tipo_venda:
-                    query = query.eq('tipo_venda', filters.tipo_venda.value)
-                
-                if filters.procedencia:
-                    query = query.ilike('procedencia', f'%{filters.procedencia}%')
-            
             # Executar query com paginação
-            result = (
-                query
+            result = await execute_async(
+                self._query_listagem(loja_id, filters)
                 .order('created_at', desc=True)
                 .range(skip, skip + limit - 1)
-                .execute()
             )
             
             logger.debug(f"Listados {len(result.data)} clientes da loja {loja_id}")
@@ -115,6 +121,118 @@ class ClienteRepository:
             logger.error(f"Erro ao listar clientes: {str(e)}")
             raise Exception(f"Erro ao listar clientes: {str(e)}")
     
+    async def listar_clientes_cursor(self, loja_id: str, filters: Optional[ClienteFilters] = None, cursor: Optional[str] = None, limit: int = 50) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Lista clientes com paginação por cursor (created_at, id)
+        
+        Args:
+            loja_id: ID da loja (RLS)
+            filters: Filtros opcionais
+            cursor: next_cursor da página anterior (vazio = primeira página)
+            limit: Tamanho da página
+            
+        Returns:
+            Tuple: (clientes da página, next_cursor ou None na última página)
+        """
+        try:
+            result = await execute_async(
+                aplicar_keyset(self._query_listagem(loja_id, filters), cursor, limit)
+            )
+            
+            return montar_pagina(result.data, limit)
+            
+        except Exception as e:
+            logger.error(f"Erro ao listar clientes: {str(e)}")
+            raise Exception(f"Erro ao listar clientes: {str(e)}")
+    
+    def _query_listagem(self, loja_id: str, filters: Optional[ClienteFilters] = None):
+        """Query base da listagem com filtros (sem paginação)"""
+        # Query base
+        query = (
+            self.supabase
+            .table('c_clientes')
+            .select('*')
+            .eq('loja_id', loja_id)
+            .not_.is_('excluido', 'true')
+        )
+        
+        # Aplicar filtros se fornecidos
+        if filters:
+            if filters.cpf_cnpj:
+                query = query.eq('cpf_cnpj', filters.cpf_cnpj)
+            
+            if filters.tipo_venda:
+                query = query.eq('tipo_venda', filters.tipo_venda.value)
+            
+            if self.busca_indexada:
+                query = self._aplicar_filtros_busca(query, filters)
+            else:
+                if filters.nome:
+                    query = query.ilike('nome', f'%{escapar_like(filters.nome)}%')
+                if filters.telefone:
+                    query = query.ilike('telefone', f'%{escapar_like(filters.telefone)}%')
+                if filters.cidade:
+                    query = query.ilike('cidade', f'%{escapar_like(filters.cidade)}%')
+                if filters.procedencia:
+                    query = query.ilike('procedencia', f'%{escapar_like(filters.procedencia)}%')
+        
+        return query
+    
+    def _aplicar_filtros_busca(self, query, filters: ClienteFilters):
+        """
+        Filtros de texto sobre as colunas normalizadas (índices de trigramas)
+        
+        O termo passa pela mesma normalização da coluna: like '%termo%' sem
+        diferença de acentos/maiúsculas, e telefone comparado só pelos dígitos.
+        % e _ digitados valem como texto (escapar_like), não como curinga.
+        """
+        for campo, coluna in (('nome', 'nome_busca'), ('cidade', 'cidade_busca'), ('procedencia', 'procedencia_busca')):
+            termo = normalizar_texto(getattr(filters, campo))
+            if termo:
+                query = query.like(coluna, f'%{escapar_like(termo)}%')
+        
+        if filters.telefone:
+            digitos = apenas_digitos(filters.telefone)
+            if digitos:
+                query = query.like('telefone_digitos', f'%{digitos}%')
+            else:
+                query = query.ilike('telefone', f'%{escapar_like(filters.telefone)}%')
+        
+        return query
+    
+    async def buscar_clientes(self, loja_id: str, termo: str, limit: int = 20, skip: int = 0) -> List[Dict[str, Any]]:
+        """
+        Busca livre por nome, telefone ou CPF/CNPJ ordenada por relevância
+        
+        Função public.buscar_clientes (migrations 20261018080000 e 20261018150000): similaridade
+        de trigramas no nome (tolera erros de digitação), trecho de dígitos no
+        telefone e CPF/CNPJ exato.
+        
+        Args:
+            loja_id: ID da loja (RLS)
+            termo: Texto digitado
+            limit: Máximo de resultados (até 100)
+            skip: Resultados a pular
+            
+        Returns:
+            List[Dict]: Clientes com 'relevancia', do mais relevante ao menos
+        """
+        try:
+            result = await execute_async(
+                self.supabase.rpc('buscar_clientes', {
+                    'p_loja_id': str(loja_id),
+                    'p_termo': termo,
+                    'p_limite': limit,
+                    'p_offset': skip
+                })
+            )
+            
+            return result.data or []
+            
+        except Exception as e:
+            logger.error(f"Erro ao buscar clientes: {str(e)}")
+            raise Exception(f"Erro ao buscar clientes: {str(e)}")
+    
     async def obter_cliente(self, cliente_id: str, loja_id: str) -> Optional[Dict[str, Any]]:
         """
         Obtém cliente por ID
@@ -127,13 +245,12 @@ class ClienteRepository:
             Dict com dados do cliente ou None se não encontrado
         """
         try:
-            result = (
+            result = await execute_async(
                 self.supabase
                 .table('c_clientes')
                 .select('*')
                 .eq('id', cliente_id)
                 .eq('loja_id', loja_id)  # RLS
-                .execute()
             )
             
             if result.data:
@@ -165,13 +282,12 @@ class ClienteRepository:
             dados_atualizacao['updated_at'] = datetime.utcnow().isoformat()
             
             # Atualizar cliente
-            result = (
+            result = await execute_async(
                 self.supabase
                 .table('c_clientes')
                 .update(dados_atualizacao)
                 .eq('id', cliente_id)
                 .eq('loja_id', loja_id)  # RLS
-                .execute()
             )
             
             if not result.data:
@@ -201,7 +317,7 @@ class ClienteRepository:
             # Soft delete - marcar como excluído
             from datetime import datetime
             
-            result = (
+            result = await execute_async(
                 self.supabase
                 .table('c_clientes')
                 .update({
@@ -210,7 +326,6 @@ class ClienteRepository:
                 })
                 .eq('id', cliente_id)
                 .eq('loja_id', loja_id)  # RLS
-                .execute()
             )
             
             if not result.data:
@@ -222,44 +337,6 @@ class ClienteRepository:
         except Exception as e:
             logger.error(f"Erro ao excluir cliente {cliente_id}: {str(e)}")
             raise Exception(f"Erro ao excluir cliente: {str(e)}")
-    
-    async def verificar_cpf_cnpj_existente(self, cpf_cnpj: str, loja_id: str, cliente_id_excluir: Optional[str] = None) -> bool:
-        """
-        Verifica se CPF/CNPJ já existe na loja
-        
-        Args:
-            cpf_cnpj: CPF ou CNPJ para verificar
-            loja_id: ID da loja
-            cliente_id_excluir: ID do cliente a excluir da verificação (para updates)
-            
-        Returns:
-            bool: True se já existe
-        """
-        try:
-            query = (
-                self.supabase
-                .table('c_clientes')
-                .select('id')
-                .eq('cpf_cnpj', cpf_cnpj)
-                .eq('loja_id', loja_id)
-                .is_('excluido', 'null')  # Não considerar excluídos
-            )
-            
-            # Excluir cliente específico da verificação (para updates)
-            if cliente_id_excluir:
-                query = query.neq('id', cliente_id_excluir)
-            
-            result = query.execute()
-            
-            existe = len(result.data) > 0
-            if existe:
-                logger.warning(f"CPF/CNPJ {cpf_cnpj} já existe na loja {loja_id}")
-            
-            return existe
-            
-        except Exception as e:
-            logger.error(f"Erro ao verificar CPF/CNPJ: {str(e)}")
-            raise Exception(f"Erro ao verificar CPF/CNPJ: {str(e)}")
 
 
 # Função auxiliar para compatibilidade com código existente
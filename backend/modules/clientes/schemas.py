@@ -4,7 +4,7 @@ Define modelos de validação para entrada e saída de dados.
 """
 
 from pydantic import BaseModel, Field, validator
-from typing import Optional
+from typing import Optional, List
 from enum import Enum
 import uuid
 from datetime import datetime
@@ -105,6 +105,44 @@ class ClienteListItem(BaseModel):
         from_attributes = True
 
 
+class ClienteBuscaItem(ClienteListItem):
+    """Resultado da busca livre, com a relevância calculada no banco"""
+    relevancia: float = Field(..., description="Maior = mais relevante")
+
+
+class ClienteAutocompleteItem(BaseModel):
+    """Sugestão do autocomplete (campos exibidos na lista suspensa)"""
+    id: uuid.UUID
+    nome: str
+    telefone: str
+    cpf_cnpj: str
+    cidade: str
+
+
+class ErroImportacaoCliente(BaseModel):
+    """Linha da planilha não importada"""
+    linha: int
+    cpf_cnpj: Optional[str] = None
+    erros: List[str]
+
+
+class ImportacaoClientesResponse(BaseModel):
+    """Resultado de POST /clientes/importar"""
+    arquivo: str
+    total_linhas: int
+    importados: int
+    com_erro: int
+    erros: List[ErroImportacaoCliente]
+    tempo_ms: float
+    aviso: Optional[str] = None  # ex: importação interrompida no limite de linhas
+
+
+class ClientePagina(BaseModel):
+    """Página de clientes no modo cursor (keyset)"""
+    items: List[ClienteListItem]
+    next_cursor: Optional[str] = None  # None = última página
+
+
 class ClienteFilters(BaseModel):
     """Schema para filtros de busca de clientes"""
     nome: Optional[str] = Field(None, description="Filtro por nome (busca parcial)")
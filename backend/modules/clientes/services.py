@@ -3,12 +3,24 @@ Service layer para clientes - lógica de negócio e validações.
 Responsabilidade: Orquestração, validações, regras de negócio.
 """
 
+import asyncio
 import logging
+import time
 from typing import Dict, Any, List, Optional
 from datetime import datetime
 
+from fastapi import UploadFile
+from pydantic import ValidationError
+
+from core.config import get_settings
+from core.exceptions import FluyteException
+from .autocomplete import autocomplete_clientes
+from .importacao import ler_planilha_clientes, proximo_lote
 from .repository import ClienteRepository
-from .schemas import ClienteCreate, ClienteUpdate, ClienteResponse, ClienteListItem, ClienteFilters
+from .schemas import (
+    ClienteCreate, ClienteUpdate, ClienteResponse, ClienteListItem, ClienteBuscaItem, ClienteAutocompleteItem,
+    ClientePagina, ClienteFilters, ErroImportacaoCliente, ImportacaoClientesResponse
+)
 
 # Configurar logger
 logger = logging.getLogger(__name__)
@@ -22,6 +34,7 @@ class ClienteService:
     """
     
     def __init__(self, supabase_client):
+        self.supabase = supabase_client
         self.repository = ClienteRepository(supabase_client)
     
     async def criar_cliente(self, cliente_data: ClienteCreate, current_user: Dict[str, Any]) -> ClienteResponse:
@@ -40,15 +53,6 @@ class ClienteService:
             
             logger.info(f"Criando cliente {cliente_data.nome} na loja {loja_id}")
             
-            # Validar se CPF/CNPJ já existe na loja
-            cpf_cnpj_existe = await self.repository.verificar_cpf_cnpj_existente(
-                cliente_data.cpf_cnpj, 
-                loja_id
-            )
-            
-            if cpf_cnpj_existe:
-                raise Exception(f"CPF/CNPJ {cliente_data.cpf_cnpj} já está cadastrado nesta loja")
-            
             # Preparar dados para inserção
             dados_cliente = {
                 'nome': cliente_data.nome,
@@ -63,8 +67,9 @@ class ClienteService:
                 'observacao': cliente_data.observacao
             }
             
-            # Criar cliente
+            # Criar cliente (CPF/CNPJ duplicado na loja é recusado pelo índice único)
             cliente_criado = await self.repository.criar_cliente(dados_cliente, loja_id)
+            autocomplete_clientes.registrar(loja_id, cliente_criado)
             
             logger.info(f"Cliente {cliente_data.nome} criado com sucesso: ID {cliente_criado['id']}")
             
@@ -75,6 +80,120 @@ class ClienteService:
             logger.error(f"Erro ao criar cliente: {str(e)}")
             raise Exception(f"Erro ao criar cliente: {str(e)}")
     
+    async def importar_clientes(self, arquivo: UploadFile, current_user: Dict[str, Any]) -> ImportacaoClientesResponse:
+        """
+        Importa clientes de uma planilha CSV/XLSX
+        
+        A planilha é lida em lotes (CLIENTES_IMPORTACAO_LOTE linhas): cada lote é
+        validado com ClienteCreate, tem os CPF/CNPJ repetidos no arquivo descartados
+        e é gravado em uma chamada; a leitura do lote seguinte corre em paralelo
+        com a gravação. Linhas com erro não impedem as demais.
+        
+        Args:
+            arquivo: Upload recebido no endpoint
+            current_user: Usuário logado (contém loja_id)
+            
+        Returns:
+            ImportacaoClientesResponse: Totais e erros por linha
+        """
+        nome_arquivo = arquivo.filename or 'clientes.csv'
+        loja_id = current_user['loja_id']
+        settings = get_settings()
+        inicio = time.perf_counter()
+        
+        try:
+            loop = asyncio.get_running_loop()
+            linhas = ler_planilha_clientes(arquivo.file, nome_arquivo, settings.max_file_size_bytes)
+            
+            erros: List[ErroImportacaoCliente] = []
+            linha_por_documento: Dict[str, int] = {}
+            total_linhas = importados = 0
+            aviso = None
+            
+            proximo = loop.run_in_executor(None, proximo_lote, linhas, settings.clientes_importacao_lote)
+            while proximo is not None:
+                bloco, proximo = await proximo, None
+                if not bloco:
+                    break
+                
+                restantes = settings.clientes_importacao_max_linhas - total_linhas
+                if len(bloco) > restantes:
+                    aviso = (
+                        f"Importação interrompida no limite de {settings.clientes_importacao_max_linhas} linhas: "
+                        f"linhas a partir da {bloco[restantes][0]} não foram lidas"
+                    )
+                    bloco = bloco[:restantes]
+                else:
+                    # Lê o próximo lote enquanto este é validado e gravado
+                    proximo = loop.run_in_executor(None, proximo_lote, linhas, settings.clientes_importacao_lote)
+                total_linhas += len(bloco)
+                
+                lote: List[Dict[str, Any]] = []
+                linhas_lote: Dict[str, int] = {}
+                for numero, dados in bloco:
+                    try:
+                        cliente = ClienteCreate(**dados)
+                    except ValidationError as e:
+                        erros.append(ErroImportacaoCliente(
+                            linha=numero,
+                            cpf_cnpj=dados.get('cpf_cnpj'),
+                            erros=[f"{'.'.join(str(campo) for campo in erro['loc'])}: {erro['msg']}" for erro in e.errors()]
+                        ))
+                        continue
+                    
+                    anterior = linha_por_documento.setdefault(cliente.cpf_cnpj, numero)
+                    if anterior != numero:
+                        erros.append(ErroImportacaoCliente(
+                            linha=numero,
+                            cpf_cnpj=cliente.cpf_cnpj,
+                            erros=[f"CPF/CNPJ repetido no arquivo (linha {anterior})"]
+                        ))
+                        continue
+                    
+                    lote.append(cliente.model_dump(mode='json'))
+                    linhas_lote[cliente.cpf_cnpj] = numero
+                
+                if not lote:
+                    continue
+                
+                gravados = await self.repository.importar_clientes_lote(lote, loja_id)
+                importados += len(gravados)
+                
+                # Não devolvidos pelo banco: CPF/CNPJ já ativo na loja
+                for cpf_cnpj in linhas_lote.keys() - {gravado['cpf_cnpj'] for gravado in gravados}:
+                    erros.append(ErroImportacaoCliente(
+                        linha=linhas_lote[cpf_cnpj],
+                        cpf_cnpj=cpf_cnpj,
+                        erros=[f"CPF/CNPJ {cpf_cnpj} já está cadastrado nesta loja"]
+                    ))
+            
+            if importados:
+                autocomplete_clientes.invalidar(loja_id)
+            
+            erros.sort(key=lambda erro: erro.linha)
+            tempo_ms = round((time.perf_counter() - inicio) * 1000, 1)
+            logger.info(
+                f"📥 Importação {nome_arquivo} na loja {loja_id}: {importados} clientes gravados, "
+                f"{len(erros)} linhas com erro, {tempo_ms:.0f}ms"
+            )
+            
+            return ImportacaoClientesResponse(
+                arquivo=nome_arquivo,
+                total_linhas=total_linhas,
+                importados=importados,
+                com_erro=len(erros),
+                erros=erros,
+                tempo_ms=tempo_ms,
+                aviso=aviso
+            )
+            
+        except Exception as e:
+            logger.error(f"Erro ao importar clientes de {nome_arquivo}: {str(e)}")
+            # Erros de arquivo/cabeçalho mantêm o status HTTP (400)
+            if isinstance(e, FluyteException):
+                raise
+            raise Exception(f"Erro ao importar clientes: {str(e)}")
+    
     async def listar_clientes(self, filters: Optional[ClienteFilters], current_user: Dict[str, Any], skip: int = 0, limit: int = 50) -> List[ClienteListItem]:
         """
         Lista clientes com filtros aplicados
@@ -95,19 +214,7 @@ class ClienteService:
             clientes_data = await self.repository.listar_clientes(loja_id, filters, skip, limit)
             
             # Converter para ClienteListItem
-            clientes = []
-            for cliente_data in clientes_data:
-                cliente_item = ClienteListItem(
-                    id=cliente_data['id'],
-                    nome=cliente_data['nome'],
-                    telefone=cliente_data['telefone'],
-                    email=cliente_data.get('email'),
-                    cidade=cliente_data['cidade'],
-                    tipo_venda=cliente_data['tipo_venda'],
-                    procedencia=cliente_data.get('procedencia'),
-                    created_at=cliente_data['created_at']
-                )
-                clientes.append(cliente_item)
+            clientes = [self._converter_item_lista(cliente_data) for cliente_data in clientes_data]
             
             logger.debug(f"Listados {len(clientes)} clientes da loja {loja_id}")
             return clientes
@@ -116,6 +223,113 @@ class ClienteService:
             logger.error(f"Erro ao listar clientes: {str(e)}")
             raise Exception(f"Erro ao listar clientes: {str(e)}")
     
+    async def listar_clientes_cursor(self, filters: Optional[ClienteFilters], current_user: Dict[str, Any], cursor: Optional[str] = None, limit: int = 50) -> ClientePagina:
+        """
+        Lista clientes com paginação por cursor (created_at, id)
+        
+        Args:
+            filters: Filtros opcionais
+            current_user: Usuário logado
+            cursor: next_cursor da página anterior (vazio = primeira página)
+            limit: Tamanho da página
+            
+        Returns:
+            ClientePagina: Itens da página e next_cursor (None na última página)
+        """
+        try:
+            clientes_data, next_cursor = await self.repository.listar_clientes_cursor(
+                current_user['loja_id'], filters, cursor, limit
+            )
+            
+            return ClientePagina(
+                items=[self._converter_item_lista(cliente_data) for cliente_data in clientes_data],
+                next_cursor=next_cursor
+            )
+            
+        except Exception as e:
+            logger.error(f"Erro ao listar clientes: {str(e)}")
+            raise Exception(f"Erro ao listar clientes: {str(e)}")
+    
+    async def buscar_clientes(self, termo: str, current_user: Dict[str, Any], limit: int = 20, skip: int = 0) -> List[ClienteBuscaItem]:
+        """
+        Busca livre de clientes (nome, telefone, CPF/CNPJ) ordenada por relevância
+        
+        Args:
+            termo: Texto digitado
+            current_user: Usuário logado
+            limit: Máximo de resultados
+            skip: Resultados a pular
+            
+        Returns:
+            List[ClienteBuscaItem]: Do mais relevante ao menos relevante
+        """
+        try:
+            clientes_data = await self.repository.buscar_clientes(current_user['loja_id'], termo, limit, skip)
+            
+            return [
+                ClienteBuscaItem(
+                    **self._converter_item_lista(cliente_data).model_dump(),
+                    relevancia=float(cliente_data.get('relevancia') or 0)
+                )
+                for cliente_data in clientes_data
+            ]
+            
+        except Exception as e:
+            logger.error(f"Erro ao buscar clientes: {str(e)}")
+            raise Exception(f"Erro ao buscar clientes: {str(e)}")
+    
+    async def autocomplete(self, termo: str, current_user: Dict[str, Any], limit: int = 10) -> List[ClienteAutocompleteItem]:
+        """
+        Sugestões de clientes para digitação (nome, telefone ou CPF/CNPJ)
+        
+        Servido pelo índice em memória da loja; lojas acima de
+        AUTOCOMPLETE_MAX_CLIENTES_LOJA usam a busca do banco.
+        
+        Args:
+            termo: Texto digitado até agora
+            current_user: Usuário logado
+            limit: Máximo de sugestões
+            
+        Returns:
+            List[ClienteAutocompleteItem]: Sugestões em ordem de exibição
+        """
+        try:
+            loja_id = current_user['loja_id']
+            
+            indice = await autocomplete_clientes.indice(self.supabase, loja_id)
+            if indice is not None:
+                sugestoes = indice.buscar(termo, limit)
+            else:
+                sugestoes = await self.repository.buscar_clientes(loja_id, termo, limit)
+            
+            return [
+                ClienteAutocompleteItem(
+                    id=sugestao['id'],
+                    nome=sugestao['nome'],
+                    telefone=sugestao.get('telefone') or '',
+                    cpf_cnpj=sugestao.get('cpf_cnpj') or '',
+                    cidade=sugestao.get('cidade') or ''
+                )
+                for sugestao in sugestoes
+            ]
+            
+        except Exception as e:
+            logger.error(f"Erro no autocomplete de clientes: {str(e)}")
+            raise Exception(f"Erro no autocomplete de clientes: {str(e)}")
+    
+    def _converter_item_lista(self, cliente_data: Dict[str, Any]) -> ClienteListItem:
+        """Converte linha de c_clientes em ClienteListItem"""
+        return ClienteListItem(
+            id=cliente_data['id'],
+            nome=cliente_data['nome'],
+            telefone=cliente_data['telefone'],
+            email=cliente_data.get('email'),
+            cidade=cliente_data['cidade'],
+            tipo_venda=cliente_data['tipo_venda'],
+            procedencia=cliente_data.get('procedencia'),
+            created_at=cliente_data['created_at']
+        )
+    
     async def obter_cliente(self, cliente_id: str, current_user: Dict[str, Any]) -> ClienteResponse:
         """
         Obtém cliente por ID
@@ -201,6 +415,8 @@ class ClienteService:
                     loja_id
                 )
                 
+                autocomplete_clientes.registrar(loja_id, cliente_atualizado)
+                
                 logger.info(f"Cliente {cliente_id} atualizado com sucesso")
                 return ClienteResponse(**cliente_atualizado)
             else:
@@ -237,6 +453,7 @@ class ClienteService:
             sucesso = await self.repository.excluir_cliente(cliente_id, loja_id)
             
             if sucesso:
+                autocomplete_clientes.remover(loja_id, cliente_id)
                 logger.info(f"Cliente {cliente_id} ({cliente_atual['nome']}) excluído com sucesso")
             
             return sucesso
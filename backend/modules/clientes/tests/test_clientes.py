@@ -2,3 +2,294 @@
 # Tests for clientes module
 async def test_list_clientes():
     assert True
+
+
+# ===== PAGINAÇÃO POR CURSOR =====
+
+import pytest
+
+from core.exceptions import ValidationException
+from core.pagination import codificar_cursor, decodificar_cursor, montar_pagina
+
+
+def test_cursor_ida_e_volta():
+    registro_id = '6f1c2e6a-8a5b-4c1d-9e2f-0a1b2c3d4e5f'
+    cursor = codificar_cursor('2026-01-01T10:00:00+00:00', registro_id)
+    assert decodificar_cursor(cursor) == ('2026-01-01T10:00:00+00:00', registro_id)
+
+    with pytest.raises(ValidationException):
+        decodificar_cursor('nao-e-um-cursor')
+
+
+def test_cursor_forjado_rejeitado():
+    # Valores que quebrariam a expressão or=(...) do PostgREST
+    forjados = [
+        codificar_cursor('2026-01-01T10:00:00+00:00', 'abc),id.gt.0'),
+        codificar_cursor('2026-01-01",id.gt.(0', '6f1c2e6a-8a5b-4c1d-9e2f-0a1b2c3d4e5f'),
+    ]
+    for cursor in forjados:
+        with pytest.raises(ValidationException):
+            decodificar_cursor(cursor)
+
+
+def test_montar_pagina_next_cursor_apenas_com_linha_extra():
+    ids = [str(uuid.UUID(int=i)) for i in range(3)]
+    registros = [{'id': ids[i], 'created_at': f'2026-01-0{9 - i}'} for i in range(3)]
+
+    pagina, next_cursor = montar_pagina(registros, limit=2)
+    assert [r['id'] for r in pagina] == ids[:2]
+    assert decodificar_cursor(next_cursor) == ('2026-01-08', ids[1])
+
+    pagina, next_cursor = montar_pagina(registros, limit=3)
+    assert len(pagina) == 3 and next_cursor is None
+
+
+# ===== BUSCA INDEXADA =====
+
+from postgrest import SyncPostgrestClient
+
+from modules.clientes.busca import apenas_digitos, escapar_like, normalizar_texto
+from modules.clientes.repository import ClienteRepository
+from modules.clientes.schemas import ClienteFilters
+
+
+def test_normalizacao_espelha_colunas_de_busca():
+    assert normalizar_texto('JOSÉ da Conceição') == 'jose da conceicao'
+    assert normalizar_texto(None) == ''
+    assert apenas_digitos('(11) 98765-4321') == '11987654321'
+    assert escapar_like('50%_off\\') == '50\\%\\_off\\\\'
+
+
+def test_filtros_usam_colunas_normalizadas():
+    repository = ClienteRepository(SyncPostgrestClient('http://localhost'))
+    repository.busca_indexada = True
+    filters = ClienteFilters(nome='Conceição', telefone='(11) 9876', cidade='São Paulo', procedencia='100%_loja')
+
+    params = dict(repository._query_listagem('loja', filters).params)
+
+    assert params['nome_busca'] == 'like.%conceicao%'
+    assert params['telefone_digitos'] == 'like.%119876%'
+    assert params['cidade_busca'] == 'like.%sao paulo%'
+    assert params['procedencia_busca'] == 'like.%100\\%\\_loja%'
+    assert params['excluido'] == 'not.is.true'
+    assert 'nome' not in params and 'telefone' not in params
+
+
+def test_filtros_sem_busca_indexada_escapam_curingas():
+    repository = ClienteRepository(SyncPostgrestClient('http://localhost'))
+    repository.busca_indexada = False
+
+    params = dict(repository._query_listagem('loja', ClienteFilters(nome='a_b')).params)
+
+    assert params['nome'] == 'ilike.%a\\_b%'
+    assert params['excluido'] == 'not.is.true'
+
+
+# ===== AUTOCOMPLETE =====
+
+import asyncio
+
+from modules.clientes.autocomplete import AutocompleteClientes, IndiceAutocomplete
+
+
+def _cliente(indice, nome, telefone='(11) 98765-0000', cpf_cnpj='12345678901'):
+    return {'id': f'c{indice}', 'nome': nome, 'telefone': telefone, 'cpf_cnpj': cpf_cnpj, 'cidade': 'Goiânia',
+            'created_at': f'2026-01-01T00:00:{indice:02d}+00:00'}
+
+
+def test_indice_autocomplete_prefixos_sem_acento():
+    indice = IndiceAutocomplete([
+        _cliente(1, 'José da Silva', '(62) 99111-2222'),
+        _cliente(2, 'Josefa Conceição'),
+        _cliente(3, 'Maria José Santos', cpf_cnpj='98765432100'),
+    ])
+
+    assert [c['id'] for c in indice.buscar('jose')] == ['c1', 'c2', 'c3']  # começa com o termo primeiro
+    assert [c['id'] for c in indice.buscar('JOSÉ SAN')] == ['c3']
+    assert [c['id'] for c in indice.buscar('conceic')] == ['c2']
+    assert [c['id'] for c in indice.buscar('99111')] == ['c1']           # telefone sem DDD
+    assert [c['id'] for c in indice.buscar('987.654')] == ['c3']         # documento formatado
+
+    indice.registrar(_cliente(1, 'Joaquim Silva', '(62) 99111-2222'))
+    indice.remover('c2')
+    assert [c['id'] for c in indice.buscar('jos')] == ['c3']
+    assert [c['id'] for c in indice.buscar('joaq')] == ['c1']
+    assert indice.stats()['clientes'] == 2
+
+
+class _SupabaseClientes:
+    """c_clientes paginado pelo cursor, com espera opcional entre páginas"""
+
+    def __init__(self, clientes, espera=None):
+        self.clientes = clientes
+        self.espera = espera
+        self.consultas = 0
+
+    def table(self, nome):
+        return self
+
+    @property
+    def not_(self):
+        return self
+
+    def __getattr__(self, nome):
+        return lambda *args, **kwargs: self
+
+    def execute(self):
+        self.consultas += 1
+        if self.espera is not None:
+            self.espera.wait()
+        return type('Resposta', (), {'data': list(self.clientes)})()
+
+
+async def test_autocomplete_monta_uma_vez_e_aplica_alteracoes():
+    import threading
+
+    liberar = threading.Event()
+    banco = _SupabaseClientes([_cliente(1, 'Ana Paula'), _cliente(2, 'Antônio Carlos')], espera=liberar)
+    autocomplete = AutocompleteClientes(max_lojas=2, max_clientes_loja=10, ttl_seconds=60)
+
+    consultas = [asyncio.create_task(autocomplete.indice(banco, 'loja')) for _ in range(5)]
+    await asyncio.sleep(0.05)
+    # Criado enquanto a loja é lida: entra no índice ao final da montagem
+    autocomplete.registrar('loja', _cliente(3, 'Anderson Lima'))
+    liberar.set()
+    indices = await asyncio.gather(*consultas)
+
+    assert banco.consultas == 1
+    assert all(indice is indices[0] for indice in indices)
+    assert [c['nome'] for c in indices[0].buscar('an')] == ['Ana Paula', 'Anderson Lima', 'Antônio Carlos']
+
+    autocomplete.remover('loja', 'c1')
+    assert [c['id'] for c in (await autocomplete.indice(banco, 'loja')).buscar('ana')] == []
+
+    grande = AutocompleteClientes(max_lojas=2, max_clientes_loja=1, ttl_seconds=60)
+    assert await grande.indice(_SupabaseClientes([_cliente(1, 'A'), _cliente(2, 'B')]), 'loja') is None
+
+
+# ===== CPF/CNPJ ÚNICO (ÍNDICE NO BANCO) =====
+
+class _SupabaseInsertDuplicado(_SupabaseClientes):
+    """insert em c_clientes recusado pelo índice único de CPF/CNPJ"""
+
+    def execute(self):
+        self.consultas += 1
+        raise Exception(
+            "{'code': '23505', 'message': 'duplicate key value violates unique constraint "
+            "\"uq_c_clientes_loja_cpf_cnpj\"'}"
+        )
+
+
+async def test_criar_cliente_duplicado_em_uma_escrita():
+    from modules.clientes.schemas import ClienteCreate
+    from modules.clientes.services import ClienteService
+
+    banco = _SupabaseInsertDuplicado([])
+    cliente = ClienteCreate(
+        nome='Ana Paula', cpf_cnpj='123.456.789-09', telefone='62999991234',
+        endereco='Rua 1, 100', cidade='Goiânia', cep='74000000'
+    )
+
+    with pytest.raises(Exception, match='CPF/CNPJ 12345678909 já está cadastrado nesta loja'):
+        await ClienteService(banco).criar_cliente(cliente, {'loja_id': 'loja'})
+    assert banco.consultas == 1
+
+
+# ===== IMPORTAÇÃO DE PLANILHAS =====
+
+import io
+import uuid
+import zipfile
+
+from modules.clientes.importacao import ler_planilha_clientes
+
+_CABECALHO_IMPORTACAO = ['Nome', 'CPF', 'Celular', 'Endereço', 'Cidade', 'CEP', 'E-mail']
+
+
+def _xlsx(linhas):
+    """XLSX mínimo (uma planilha, textos inline e números)"""
+    def celula(coluna, linha, valor):
+        referencia = f"{chr(65 + coluna)}{linha}"
+        if isinstance(valor, (int, float)):
+            return f'<c r="{referencia}"><v>{valor}</v></c>'
+        return f'<c r="{referencia}" t="inlineStr"><is><t>{valor}</t></is></c>'
+
+    ns = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+    ns_rel = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+    linhas_xml = ''.join(
+        f'<row r="{numero}">' + ''.join(celula(coluna, numero, valor) for coluna, valor in enumerate(valores)) + '</row>'
+        for numero, valores in linhas
+    )
+    conteudo = io.BytesIO()
+    with zipfile.ZipFile(conteudo, 'w') as pacote:
+        pacote.writestr('xl/workbook.xml', f'<workbook xmlns="{ns}" xmlns:r="{ns_rel}"><sheets><sheet name="Clientes" sheetId="1" r:id="rId1"/></sheets></workbook>')
+        pacote.writestr('xl/_rels/workbook.xml.rels', '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships"><Relationship Id="rId1" Target="worksheets/sheet1.xml"/></Relationships>')
+        pacote.writestr('xl/worksheets/sheet1.xml', f'<worksheet xmlns="{ns}"><sheetData>{linhas_xml}</sheetData></worksheet>')
+    conteudo.seek(0)
+    return conteudo
+
+
+def test_planilha_csv_excel_e_xlsx_geram_as_mesmas_linhas():
+    csv_excel = (
+        ';'.join(_CABECALHO_IMPORTACAO) + '\r\n'
+        + 'José Araújo;123.456.789-09;(62) 99999-1234;Rua 1, 100;Goiânia;74000-000;\r\n'
+        + ';;;;;;\r\n'
+        + 'Ana Lima;1234567890;62988887777;Rua 2, 200;Anápolis;75000000;ana@x.com\r\n'
+    ).encode('cp1252')
+    xlsx = _xlsx([
+        (1, _CABECALHO_IMPORTACAO),
+        (2, ['José Araújo', '123.456.789-09', '(62) 99999-1234', 'Rua 1, 100', 'Goiânia', '74000-000']),
+        (4, ['Ana Lima', 1234567890, 62988887777, 'Rua 2, 200', 'Anápolis', 75000000, 'ana@x.com']),
+    ])
+
+    do_csv = list(ler_planilha_clientes(io.BytesIO(csv_excel), 'clientes.csv', 1024 * 1024))
+    do_xlsx = list(ler_planilha_clientes(xlsx, 'clientes.xlsx', 1024 * 1024))
+
+    assert do_csv == do_xlsx
+    assert [numero for numero, _ in do_csv] == [2, 4]
+    # Documento salvo como número perde o zero à esquerda
+    assert do_csv[1][1]['cpf_cnpj'] == '01234567890'
+    assert do_csv[0][1]['cidade'] == 'Goiânia'
+
+
+def test_planilha_sem_colunas_obrigatorias():
+    with pytest.raises(ValidationException, match='Colunas obrigatórias ausentes: cpf_cnpj'):
+        list(ler_planilha_clientes(io.BytesIO(b'nome,telefone,endereco,cidade,cep\n'), 'c.csv', 1024))
+
+
+class _SupabaseImportacao(_SupabaseClientes):
+    """RPC importar_clientes_lote: CPF/CNPJ em `existentes` é ignorado (on conflict do nothing)"""
+
+    def __init__(self, existentes):
+        super().__init__([])
+        self.existentes = set(existentes)
+        self.lotes = []
+
+    def rpc(self, nome, params):
+        self.lotes.append(params['p_clientes'])
+        gravados = [
+            {'id': str(uuid.uuid4()), 'cpf_cnpj': cliente['cpf_cnpj']}
+            for cliente in params['p_clientes'] if cliente['cpf_cnpj'] not in self.existentes
+        ]
+        return type('Rpc', (), {'execute': lambda _: type('Resposta', (), {'data': gravados})()})()
+
+
+async def test_importacao_relatorio_por_linha(monkeypatch):
+    from fastapi import UploadFile
+    from core.config import get_settings
+    from modules.clientes.services import ClienteService
+
+    monkeypatch.setattr(get_settings(), 'clientes_importacao_lote', 2)
+    linhas = [','.join(_CABECALHO_IMPORTACAO)]
+    linhas += [f'Cliente {i},{i:011d},6299999{i:04d},Rua {i},Goiânia,74000000,' for i in range(1, 6)]
+    linhas += ['Repetido,00000000002,62999990000,Rua 9,Goiânia,74000000,', 'Sem CEP,00000000009,62999990000,Rua 9,Goiânia,,']
+    arquivo = UploadFile(io.BytesIO('\n'.join(linhas).encode()), filename='clientes.csv')
+
+    banco = _SupabaseImportacao(existentes={'00000000004'})
+    resultado = await ClienteService(banco).importar_clientes(arquivo, {'loja_id': 'loja'})
+
+    assert (resultado.total_linhas, resultado.importados, resultado.com_erro) == (7, 4, 3)
+    assert [(erro.linha, erro.erros[0][:20]) for erro in resultado.erros] == [
+        (5, 'CPF/CNPJ 00000000004'), (7, 'CPF/CNPJ repetido no'), (8, 'cep: Field required'),
+    ]
+    assert [len(lote) for lote in banco.lotes] == [2, 2, 1]
@@ -1,11 +1,118 @@
+"""
+Controller (rotas) para o módulo de Configurações.
+Define endpoints REST para configurações da loja e regras de comissão.
+"""
 
-# FastAPI routes for configuracoes
 from fastapi import APIRouter, Depends
-from .schemas import *
-from .repository import *
+from typing import List, Dict, Any
+from core.auth import get_current_user, require_admin, require_gerente_ou_admin
+from core.database import get_database
+from supabase import Client
 
-router = APIRouter(prefix='/configuracoes', tags=['configuracoes'])
+from .schemas import (
+    ConfigLojaUpdate,
+    ConfigLojaResponse,
+    RegrasComissaoUpdate,
+    RegraComissaoResponse,
+    TipoComissao
+)
+from .services import ConfiguracaoService
 
-@router.get('/', response_model=list[dict])
-async def list_configuracoes():
-    return await repo_list_configuracoes()
+# Router para o módulo de configurações
+router = APIRouter()
+
+
+@router.get("/loja",
+    response_model=ConfigLojaResponse,
+    summary="Obter configurações da loja",
+    description="Retorna deflator, medidor, frete, limites de desconto e numeração da loja"
+)
+async def obter_config_loja(
+    current_user: Dict[str, Any] = Depends(get_current_user),
+    db: Client = Depends(get_database)
+):
+    """Busca configurações da loja do usuário logado."""
+    service = ConfiguracaoService(db)
+    return await service.obter_config_loja(current_user)
+
+
+@router.put("/loja",
+    response_model=ConfigLojaResponse,
+    summary="Atualizar configurações da loja",
+    description="Atualiza configurações da loja e invalida o cache de configuração"
+)
+async def atualizar_config_loja(
+    dados: ConfigLojaUpdate,
+    current_user: Dict[str, Any] = Depends(require_gerente_ou_admin()),
+    db: Client = Depends(get_database)
+):
+    """
+    Atualiza configurações da loja.
+    
+    - **Apenas gerente ou admin**
+    - **Invalida o cache** para que novos orçamentos usem os valores atualizados
+    """
+    service = ConfiguracaoService(db)
+    return await service.atualizar_config_loja(dados, current_user)
+
+
+@router.get("/regras-comissao/{tipo}",
+    response_model=List[RegraComissaoResponse],
+    summary="Listar regras de comissão",
+    description="Lista as faixas de comissão (VENDEDOR ou GERENTE) da loja"
+)
+async def listar_regras_comissao(
+    tipo: TipoComissao,
+    current_user: Dict[str, Any] = Depends(get_current_user),
+    db: Client = Depends(get_database)
+):
+    """Lista faixas de comissão ordenadas."""
+    service = ConfiguracaoService(db)
+    return await service.listar_regras_comissao(tipo, current_user)
+
+
+@router.put("/regras-comissao/{tipo}",
+    response_model=List[RegraComissaoResponse],
+    summary="Substituir regras de comissão",
+    description="Substitui todas as faixas de comissão de um tipo e invalida o cache"
+)
+async def substituir_regras_comissao(
+    tipo: TipoComissao,
+    dados: RegrasComissaoUpdate,
+    current_user: Dict[str, Any] = Depends(require_gerente_ou_admin()),
+    db: Client = Depends(get_database)
+):
+    """
+    Substitui as faixas de comissão.
+    
+    - **Apenas gerente ou admin**
+    - **Invalida o cache** de regras e tabelas compiladas da loja
+    """
+    service = ConfiguracaoService(db)
+    return await service.substituir_regras_comissao(tipo, dados, current_user)
+
+
+@router.get("/cache/estatisticas",
+    summary="Estatísticas do cache de configuração",
+    description="Hits, misses, evictions e hit ratio dos caches em memória"
+)
+async def estatisticas_cache(
+    current_user: Dict[str, Any] = Depends(require_admin()),
+    db: Client = Depends(get_database)
+):
+    """Retorna estatísticas dos caches de configuração (apenas admin)."""
+    service = ConfiguracaoService(db)
+    return service.obter_estatisticas_cache()
+
+
+@router.delete("/cache",
+    summary="Invalidar cache de configuração",
+    description="Descarta o cache de configuração de todas as lojas"
+)
+async def limpar_cache(
+    current_user: Dict[str, Any] = Depends(require_admin()),
+    db: Client = Depends(get_database)
+):
+    """Invalida o cache de configuração (apenas admin)."""
+    service = ConfiguracaoService(db)
+    return service.limpar_cache()
@@ -1,5 +1,149 @@
+"""
+Repository para operações de configurações com Supabase.
+Responsabilidade: Acesso a dados de config_loja e config_regras_comissao_faixa.
+"""
 
-# Supabase access layer for configuracoes
+import logging
+from typing import List, Dict, Any, Optional
+from supabase import Client
+from core.database import execute_async
+
+# Configurar logger
+logger = logging.getLogger(__name__)
+
+
+class ConfiguracaoRepository:
+    """
+    Repository para configurações da loja - APENAS DADOS
+    
+    Responsabilidade: Acesso a dados, queries
+    Lógica de negócio: ConfiguracaoService
+    """
+    
+    def __init__(self, supabase_client: Client):
+        self.supabase = supabase_client
+    
+    async def obter_config_loja(self, loja_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Busca configurações da loja diretamente no banco (sem cache)
+        
+        Args:
+            loja_id: ID da loja
+            
+        Returns:
+            Dict com configurações ou None se não existir
+        """
+        try:
+            result = await execute_async(
+                self.supabase
+                .table('config_loja')
+                .select('*')
+                .eq('loja_id', loja_id)
+            )
+            
+            return result.data[0] if result.data else None
+            
+        except Exception as e:
+            logger.error(f"Erro ao obter configuração da loja {loja_id}: {str(e)}")
+            raise Exception(f"Erro ao obter configuração da loja: {str(e)}")
+    
+    async def atualizar_config_loja(self, loja_id: str, dados_atualizacao: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Atualiza configurações da loja
+        
+        Args:
+            loja_id: ID da loja
+            dados_atualizacao: Campos a atualizar
+            
+        Returns:
+            Dict com configurações atualizadas
+        """
+        try:
+            from datetime import datetime
+            dados_atualizacao['updated_at'] = datetime.utcnow().isoformat()
+            
+            result = await execute_async(
+                self.supabase
+                .table('config_loja')
+                .update(dados_atualizacao)
+                .eq('loja_id', loja_id)
+            )
+            
+            if not result.data:
+                raise Exception("Configuração da loja não encontrada")
+            
+            logger.info(f"Configuração da loja {loja_id} atualizada: {list(dados_atualizacao.keys())}")
+            return result.data[0]
+            
+        except Exception as e:
+            logger.error(f"Erro ao atualizar configuração da loja {loja_id}: {str(e)}")
+            raise Exception(f"Erro ao atualizar configuração da loja: {str(e)}")
+    
+    async def listar_regras_comissao(self, loja_id: str, tipo: str) -> List[Dict[str, Any]]:
+        """
+        Lista faixas de comissão de um tipo, ordenadas
+        
+        Args:
+            loja_id: ID da loja
+            tipo: 'VENDEDOR' ou 'GERENTE'
+            
+        Returns:
+            List[Dict]: Faixas de comissão
+        """
+        try:
+            result = await execute_async(
+                self.supabase
+                .table('config_regras_comissao_faixa')
+                .select('*')
+                .eq('loja_id', loja_id)
+                .eq('tipo_comissao', tipo)
+                .order('ordem')
+            )
+            
+            return result.data
+            
+        except Exception as e:
+            logger.error(f"Erro ao listar regras de comissão da loja {loja_id}: {str(e)}")
+            raise Exception(f"Erro ao listar regras de comissão: {str(e)}")
+    
+    async def substituir_regras_comissao(self, loja_id: str, tipo: str, faixas: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Substitui todas as faixas de um tipo de comissão
+        
+        Delete + insert em uma única chamada à função public.substituir_regras_comissao
+        (migration 20261018110000): se a gravação falhar, as faixas anteriores permanecem.
+        
+        Args:
+            loja_id: ID da loja
+            tipo: 'VENDEDOR' ou 'GERENTE'
+            faixas: Novas faixas (valor_minimo, valor_maximo, percentual, ordem)
+            
+        Returns:
+            List[Dict]: Faixas inseridas
+        """
+        try:
+            registros = [
+                {**faixa, 'loja_id': loja_id, 'tipo_comissao': tipo}
+                for faixa in faixas
+            ]
+            
+            result = await execute_async(
+                self.supabase.rpc('substituir_regras_comissao', {
+                    'p_loja_id': str(loja_id),
+                    'p_tipo': tipo,
+                    'p_faixas': registros
+                })
+            )
+            
+            logger.info(f"Regras de comissão {tipo} da loja {loja_id} substituídas: {len(registros)} faixas")
+            return result.data
+            
+        except Exception as e:
+            logger.error(f"Erro ao substituir regras de comissão da loja {loja_id}: {str(e)}")
+            raise Exception(f"Erro ao substituir regras de comissão: {str(e)}")
+
+
+# Função auxiliar para compatibilidade com código existente
 async def repo_list_configuracoes():
-    # TODO: call Supabase HTTP API
+    """Função legacy - TODO: migrar para ConfiguracaoRepository"""
     return []
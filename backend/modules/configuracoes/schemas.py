@@ -1,12 +1,86 @@
+"""
+Schemas Pydantic para o módulo de Configurações.
+Define modelos de validação para configurações da loja e regras de comissão.
+"""
 
-# Pydantic models for configuracoes
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, validator
+from typing import Optional, List
+from decimal import Decimal
+from datetime import datetime
+from enum import Enum
+import uuid
 
-class ConfiguracoesBase(BaseModel):
-    pass
 
-class ConfiguracoesCreate(ConfiguracoesBase):
-    pass
+class TipoComissao(str, Enum):
+    """Tipos de regra de comissão"""
+    VENDEDOR = "VENDEDOR"
+    GERENTE = "GERENTE"
 
-class ConfiguracoesResponse(ConfiguracoesBase):
-    id: str
+
+class FormatoNumeracao(str, Enum):
+    """Formatos de numeração de orçamentos"""
+    SEQUENCIAL = "SEQUENCIAL"
+    ANO_SEQUENCIAL = "ANO_SEQUENCIAL"
+    PERSONALIZADO = "PERSONALIZADO"
+
+
+# ===== SCHEMAS DE ENTRADA (REQUEST) =====
+
+class ConfigLojaUpdate(BaseModel):
+    """Schema para atualização parcial das configurações da loja"""
+    deflator_custo_fabrica: Optional[Decimal] = Field(None, ge=0, le=1, description="Deflator do custo de fábrica (ex: 0.28)")
+    valor_medidor_padrao: Optional[Decimal] = Field(None, ge=0, description="Valor fixo do medidor")
+    valor_frete_percentual: Optional[Decimal] = Field(None, ge=0, le=1, description="Frete sobre valor da venda (ex: 0.02)")
+    limite_desconto_vendedor: Optional[Decimal] = Field(None, ge=0, le=1, description="Limite de desconto do vendedor")
+    limite_desconto_gerente: Optional[Decimal] = Field(None, ge=0, le=1, description="Limite de desconto do gerente")
+    formato_numeracao: Optional[FormatoNumeracao] = Field(None, description="Formato de numeração dos orçamentos")
+    prefixo_numeracao: Optional[str] = Field(None, max_length=20, description="Prefixo da numeração")
+
+
+class RegraComissaoFaixa(BaseModel):
+    """Schema de uma faixa de comissão"""
+    valor_minimo: Decimal = Field(..., ge=0, description="Início da faixa")
+    valor_maximo: Optional[Decimal] = Field(None, ge=0, description="Fim da faixa (vazio = sem teto)")
+    percentual: Decimal = Field(..., ge=0, le=1, description="Percentual aplicado sobre o valor total (ex: 0.05)")
+    ordem: int = Field(..., ge=1, description="Ordem da faixa")
+    
+    @validator('valor_maximo')
+    def validar_intervalo(cls, v, values):
+        """Valida se o fim da faixa é maior que o início"""
+        if v is not None and values.get('valor_minimo') is not None and v < values['valor_minimo']:
+            raise ValueError("valor_maximo deve ser maior ou igual a valor_minimo")
+        return v
+
+
+class RegrasComissaoUpdate(BaseModel):
+    """Schema para substituir todas as faixas de um tipo de comissão"""
+    faixas: List[RegraComissaoFaixa] = Field(..., min_items=1, description="Faixas de comissão")
+
+
+# ===== SCHEMAS DE SAÍDA (RESPONSE) =====
+
+class ConfigLojaResponse(BaseModel):
+    """Schema de resposta das configurações da loja"""
+    id: uuid.UUID
+    loja_id: uuid.UUID
+    deflator_custo_fabrica: Decimal
+    valor_medidor_padrao: Decimal
+    valor_frete_percentual: Decimal
+    limite_desconto_vendedor: Decimal
+    limite_desconto_gerente: Decimal
+    formato_numeracao: Optional[FormatoNumeracao]
+    prefixo_numeracao: Optional[str]
+    proximo_numero_orcamento: Optional[int]
+    updated_at: Optional[datetime]
+    
+    class Config:
+        from_attributes = True
+
+
+class RegraComissaoResponse(RegraComissaoFaixa):
+    """Schema de resposta de uma faixa de comissão"""
+    id: uuid.UUID
+    tipo_comissao: TipoComissao
+    
+    class Config:
+        from_attributes = True
@@ -1 +1,145 @@
-# Business logic helpers for configuracoes
+"""
+Service layer para configurações - lógica de negócio e validações.
+Responsabilidade: Orquestração das alterações e invalidação do cache de configuração.
+"""
+
+import logging
+from typing import Dict, Any, List
+
+from core.cache import invalidar_cache_loja, estatisticas_cache
+from .repository import ConfiguracaoRepository
+from .schemas import (
+    ConfigLojaUpdate,
+    ConfigLojaResponse,
+    RegrasComissaoUpdate,
+    RegraComissaoResponse,
+    TipoComissao
+)
+
+# Configurar logger
+logger = logging.getLogger(__name__)
+
+
+class ConfiguracaoService:
+    """
+    Service layer para configurações da loja
+    
+    Toda escrita em config_loja / config_regras_comissao_faixa invalida o
+    cache em memória da loja (core.cache), para que o próximo orçamento já
+    use os valores novos.
+    """
+    
+    def __init__(self, supabase_client):
+        self.repository = ConfiguracaoRepository(supabase_client)
+    
+    async def obter_config_loja(self, current_user: Dict[str, Any]) -> ConfigLojaResponse:
+        """Busca configurações da loja do usuário"""
+        try:
+            loja_id = current_user['loja_id']
+            config = await self.repository.obter_config_loja(loja_id)
+            
+            if not config:
+                raise Exception("Configuração da loja não encontrada")
+            
+            return ConfigLojaResponse(**config)
+            
+        except Exception as e:
+            logger.error(f"Erro ao obter configuração da loja: {str(e)}")
+            raise Exception(f"Erro ao obter configuração da loja: {str(e)}")
+    
+    async def atualizar_config_loja(self, dados: ConfigLojaUpdate, current_user: Dict[str, Any]) -> ConfigLojaResponse:
+        """
+        Atualiza configurações da loja e invalida o cache
+        
+        Args:
+            dados: Campos a atualizar
+            current_user: Usuário logado (contém loja_id)
+            
+        Returns:
+            ConfigLojaResponse: Configuração atualizada
+        """
+        try:
+            loja_id = current_user['loja_id']
+            dados_atualizacao = dados.dict(exclude_unset=True)
+            
+            if not dados_atualizacao:
+                raise Exception("Nenhum campo para atualizar")
+            
+            # Serializar para JSON (Decimal/Enum)
+            for campo, valor in dados_atualizacao.items():
+                if hasattr(valor, 'value'):
+                    dados_atualizacao[campo] = valor.value
+                elif valor is not None and not isinstance(valor, str):
+                    dados_atualizacao[campo] = float(valor)
+            
+            config = await self.repository.atualizar_config_loja(loja_id, dados_atualizacao)
+            invalidar_cache_loja(loja_id)
+            
+            return ConfigLojaResponse(**config)
+            
+        except Exception as e:
+            logger.error(f"Erro ao atualizar configuração da loja: {str(e)}")
+            raise Exception(f"Erro ao atualizar configuração da loja: {str(e)}")
+    
+    async def listar_regras_comissao(self, tipo: TipoComissao, current_user: Dict[str, Any]) -> List[RegraComissaoResponse]:
+        """Lista faixas de comissão de um tipo"""
+        try:
+            regras = await self.repository.listar_regras_comissao(current_user['loja_id'], tipo.value)
+            return [RegraComissaoResponse(**regra) for regra in regras]
+            
+        except Exception as e:
+            logger.error(f"Erro ao listar regras de comissão: {str(e)}")
+            raise Exception(f"Erro ao listar regras de comissão: {str(e)}")
+    
+    async def substituir_regras_comissao(
+        self,
+        tipo: TipoComissao,
+        dados: RegrasComissaoUpdate,
+        current_user: Dict[str, Any]
+    ) -> List[RegraComissaoResponse]:
+        """
+        Substitui as faixas de comissão de um tipo e invalida o cache
+        
+        Args:
+            tipo: VENDEDOR ou GERENTE
+            dados: Novas faixas
+            current_user: Usuário logado (contém loja_id)
+            
+        Returns:
+            List[RegraComissaoResponse]: Faixas gravadas
+        """
+        try:
+            loja_id = current_user['loja_id']
+            
+            ordens = [faixa.ordem for faixa in dados.faixas]
+            if len(set(ordens)) != len(ordens):
+                raise Exception("Ordem das faixas deve ser única")
+            
+            faixas = [
+                {
+                    'valor_minimo': float(faixa.valor_minimo),
+                    'valor_maximo': float(faixa.valor_maximo) if faixa.valor_maximo is not None else None,
+                    'percentual': float(faixa.percentual),
+                    'ordem': faixa.ordem,
+                    'ativo': True
+                }
+                for faixa in dados.faixas
+            ]
+            
+            regras = await self.repository.substituir_regras_comissao(loja_id, tipo.value, faixas)
+            invalidar_cache_loja(loja_id)
+            
+            return [RegraComissaoResponse(**regra) for regra in regras]
+            
+        except Exception as e:
+            logger.error(f"Erro ao substituir regras de comissão: {str(e)}")
+            raise Exception(f"Erro ao substituir regras de comissão: {str(e)}")
+    
+    def obter_estatisticas_cache(self) -> Dict[str, Dict[str, Any]]:
+        """Hit/miss/eviction dos caches de configuração"""
+        return estatisticas_cache()
+    
+    def limpar_cache(self) -> Dict[str, str]:
+        """Invalida o cache de configuração de todas as lojas"""
+        invalidar_cache_loja()
+        return {"message": "Cache de configuração invalidado"}
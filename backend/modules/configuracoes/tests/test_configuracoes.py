@@ -1,4 +1,80 @@
-
 # Tests for configuracoes module
+import time
+
+from core.cache import TTLCache, regras_comissao_cache, tabelas_comissao_cache, config_loja_cache, invalidar_cache_loja
+
+
 async def test_list_configuracoes():
     assert True
+
+
+def test_ttl_cache_lru_e_expiracao():
+    cache = TTLCache("teste", maxsize=2, ttl_seconds=0.05)
+
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # "a" passa a ser o mais recente
+    cache.set("c", 3)           # descarta "b" (LRU)
+
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+    assert cache.evictions == 1
+
+    time.sleep(0.06)
+    assert cache.get("a") is None
+    assert cache.expirations == 1
+
+    stats = cache.stats()
+    assert stats["hits"] == 2
+    assert stats["misses"] == 2
+    assert stats["hit_ratio"] == 0.5
+
+
+def test_invalidar_cache_loja_remove_apenas_a_loja():
+    config_loja_cache.set("loja-1", {"deflator_custo_fabrica": 0.28})
+    config_loja_cache.set("loja-2", {"deflator_custo_fabrica": 0.30})
+    regras_comissao_cache.set(("loja-1", "VENDEDOR"), "regras")
+    tabelas_comissao_cache.set(("loja-1", "GERENTE"), "tabela")
+
+    invalidar_cache_loja("loja-1")
+
+    assert config_loja_cache.get("loja-1") is None
+    assert regras_comissao_cache.get(("loja-1", "VENDEDOR")) is None
+    assert tabelas_comissao_cache.get(("loja-1", "GERENTE")) is None
+    assert config_loja_cache.get("loja-2") == {"deflator_custo_fabrica": 0.30}
+
+    invalidar_cache_loja()
+    assert len(config_loja_cache) == 0
+
+
+# ===== SUBSTITUIÇÃO ATÔMICA DAS FAIXAS =====
+
+from modules.configuracoes.repository import ConfiguracaoRepository
+
+
+class _SupabaseRpc:
+    """Cliente fake: só aceita rpc (delete/insert separados quebram o teste)"""
+
+    def __init__(self, resposta):
+        self.resposta = resposta
+        self.chamadas = []
+
+    def rpc(self, nome, params):
+        self.chamadas.append((nome, params))
+        resposta = self.resposta
+        return type('Query', (), {'execute': lambda _: type('Resposta', (), {'data': resposta})()})()
+
+
+async def test_substituir_regras_comissao_em_uma_chamada():
+    faixas = [{'valor_minimo': 0.0, 'valor_maximo': None, 'percentual': 0.05, 'ordem': 1, 'ativo': True}]
+    gravadas = [{'id': 'r-1', 'loja_id': 'loja-1', 'tipo_comissao': 'VENDEDOR', **faixas[0]}]
+    banco = _SupabaseRpc(gravadas)
+
+    resultado = await ConfiguracaoRepository(banco).substituir_regras_comissao('loja-1', 'VENDEDOR', faixas)
+
+    assert resultado == gravadas
+    assert len(banco.chamadas) == 1
+    nome, params = banco.chamadas[0]
+    assert nome == 'substituir_regras_comissao'
+    assert params['p_loja_id'] == 'loja-1' and params['p_tipo'] == 'VENDEDOR'
+    assert params['p_faixas'] == [{**faixas[0], 'loja_id': 'loja-1', 'tipo_comissao': 'VENDEDOR'}]
@@ -0,0 +1,90 @@
+"""
+Agregados diários de orçamentos para o dashboard.
+
+c_orcamentos_agregados_diarios (migration 20261018070000) guarda uma linha por
+dia/loja/vendedor/status com quantidade, valor_final, margem_lucro e aprovações
+pendentes. Triggers por comando em c_orcamentos (migration 20261018130000)
+aplicam os deltas na mesma transação de qualquer escrita (backend, recálculo em
+lote, importações, SQL manual), e o dashboard lê O(dias) linhas em vez de
+O(orçamentos).
+"""
+
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from core.database import execute_async
+
+# Configurar logger
+logger = logging.getLogger(__name__)
+
+COLUNAS_AGREGADOS = '''
+    dia,
+    loja_id,
+    vendedor_id,
+    status_id,
+    quantidade,
+    valor_final,
+    margem_lucro,
+    aguardando_aprovacao,
+    status:config_status_orcamento(nome_status),
+    vendedor:cad_equipe(nome)
+'''
+
+async def carregar_agregados(
+    supabase,
+    escopo: Dict[str, Optional[str]],
+    data_inicio: Optional[datetime] = None,
+    data_fim: Optional[datetime] = None,
+    tamanho_pagina: int = 1000
+) -> pd.DataFrame:
+    """
+    Lê os agregados do escopo/período no mesmo formato de carregar_orcamentos
+
+    Cada linha representa `quantidade` orçamentos; created_at é o início do dia
+    (UTC) e necessita_aprovacao é a contagem de pendentes. Serve para
+    resumo_margem (não para detalhar_orcamentos: não há custos por orçamento).
+    """
+    linhas: List[Dict[str, Any]] = []
+    inicio = 0
+
+    while True:
+        query = supabase.table('c_orcamentos_agregados_diarios').select(COLUNAS_AGREGADOS)
+        if escopo.get('loja_id'):
+            query = query.eq('loja_id', escopo['loja_id'])
+        if escopo.get('vendedor_id'):
+            query = query.eq('vendedor_id', escopo['vendedor_id'])
+        if data_inicio:
+            query = query.gte('dia', data_inicio.date().isoformat())
+        if data_fim:
+            query = query.lt('dia', data_fim.date().isoformat())
+
+        result = await execute_async(
+            query.order('dia').order('id').range(inicio, inicio + tamanho_pagina - 1)
+        )
+        pagina = result.data or []
+        linhas.extend(pagina)
+        if len(pagina) < tamanho_pagina:
+            break
+        inicio += tamanho_pagina
+
+    frame = pd.DataFrame({
+        'loja_id': [linha.get('loja_id') for linha in linhas],
+        'vendedor_id': [linha.get('vendedor_id') for linha in linhas],
+        'status_id': [linha.get('status_id') for linha in linhas],
+        'created_at': pd.to_datetime([linha['dia'] for linha in linhas], utc=True, format='ISO8601'),
+        'quantidade': np.array([linha.get('quantidade') or 0 for linha in linhas], dtype=np.int64),
+        'necessita_aprovacao': np.array([linha.get('aguardando_aprovacao') or 0 for linha in linhas], dtype=np.int64),
+        'status_nome': [(linha.get('status') or {}).get('nome_status') for linha in linhas],
+        'vendedor_nome': [(linha.get('vendedor') or {}).get('nome') for linha in linhas],
+    })
+    for coluna in ('valor_final', 'margem_lucro'):
+        frame[coluna] = pd.to_numeric(
+            pd.Series([linha.get(coluna) for linha in linhas], dtype=object), errors='coerce'
+        ).fillna(0.0).astype(np.float64)
+
+    logger.debug(f"Dashboard: {len(frame)} linhas de agregados diários")
+    return frame
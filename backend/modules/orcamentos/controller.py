@@ -3,10 +3,12 @@ Controller (rotas) para o módulo de Orçamentos.
 Define endpoints REST para operações de orçamento.
 """
 
-from fastapi import APIRouter, Depends, Query, HTTPException, status
-from typing import List, Optional, Dict, Any
-from core.auth import get_current_user, require_admin, require_vendedor_ou_superior
-from core.database import get_database
+from fastapi import APIRouter, BackgroundTasks, Depends, Query, HTTPException, status
+from fastapi.responses import StreamingResponse
+from typing import List, Optional, Dict, Any, Union
+from core.auth import get_current_user, require_admin, require_gerente_ou_admin, require_vendedor_ou_superior
+from core.database import get_database, get_service_database
+from core.pagination import decodificar_cursor
 from supabase import Client
 import uuid
 
@@ -15,12 +17,17 @@ from .schemas import (
     OrcamentoUpdate,
     OrcamentoResponse,
     OrcamentoListItem,
+    OrcamentoPagina,
     OrcamentoFilters,
+    SimulacaoOrcamento,
+    SimulacaoResponse,
     SolicitacaoAprovacao,
     CalculoCustos,
-    RelatorioMargem
+    RelatorioMargemResponse,
+    MetricasDashboard
 )
 from .services import OrcamentoService
+from .recalculo import criar_job_recalculo, obter_job_recalculo
 
 # Router para o módulo de orçamentos
 router = APIRouter()
@@ -49,7 +56,7 @@ async def criar_orcamento(
 
 
 @router.get("/",
-    response_model=List[OrcamentoListItem],
+    response_model=Union[List[OrcamentoListItem], OrcamentoPagina],
     summary="Listar orçamentos",
     description="Lista orçamentos da loja com filtros e paginação"
 )
@@ -65,6 +72,7 @@ async def listar_orcamentos(
     # Paginação
     skip: int = Query(0, ge=0, description="Registros a pular"),
     limit: int = Query(50, ge=1, le=200, description="Limite de registros"),
+    cursor: Optional[str] = Query(None, description="Modo cursor: next_cursor da página anterior (envie vazio para a primeira página)"),
     
     # Dependências
     current_user: Dict[str, Any] = Depends(get_current_user),
@@ -77,6 +85,9 @@ async def listar_orcamentos(
     - **Vendedor:** Vê apenas seus próprios orçamentos
     - **Gerente:** Vê orçamentos de toda a equipe da loja
     - **Admin Master:** Vê orçamentos de todas as lojas
+    
+    **Paginação:** `skip`/`limit` (offset, retorna lista) ou `cursor` (keyset,
+    retorna `items` + `next_cursor`; recomendado para lojas com muitos registros).
     """
     # Constrói filtros
     filters = OrcamentoFilters(
@@ -89,9 +100,56 @@ async def listar_orcamentos(
     )
     
     service = OrcamentoService(db)
+    
+    # Modo cursor (keyset): presença do parâmetro, mesmo vazio
+    if cursor is not None:
+        if cursor:
+            decodificar_cursor(cursor)  # 400 para cursor inválido
+        return await service.listar_orcamentos_cursor(filters, current_user, cursor, limit)
+    
     return await service.listar_orcamentos(filters, current_user, skip, limit)
 
 
+@router.get("/exportar",
+    summary="Exportar orçamentos",
+    description="Baixa a lista de orçamentos (mesmos filtros da listagem) em CSV ou XLSX",
+    response_class=StreamingResponse
+)
+async def exportar_orcamentos(
+    formato: str = Query('csv', pattern='^(csv|xlsx)$', description="Formato do arquivo"),
+    
+    # Filtros opcionais (os mesmos de GET /orcamentos)
+    cliente_nome: Optional[str] = Query(None, description="Filtro por nome do cliente"),
+    vendedor_id: Optional[uuid.UUID] = Query(None, description="Filtro por vendedor"),
+    status_id: Optional[uuid.UUID] = Query(None, description="Filtro por status"),
+    necessita_aprovacao: Optional[bool] = Query(None, description="Apenas orçamentos pendentes de aprovação"),
+    valor_minimo: Optional[float] = Query(None, ge=0, description="Valor mínimo"),
+    valor_maximo: Optional[float] = Query(None, ge=0, description="Valor máximo"),
+    
+    # Dependências
+    current_user: Dict[str, Any] = Depends(get_current_user),
+    db: Client = Depends(get_database)
+):
+    """
+    Exporta orçamentos para planilha.
+    
+    - **Mesmas regras de acesso** da listagem (vendedor: próprios; gerente/admin: loja)
+    - **Streaming**: páginas por cursor enviadas conforme chegam (memória constante)
+    - **CSV** no padrão do Excel em português (;, vírgula decimal, UTF-8 com BOM) ou **XLSX**
+    """
+    filters = OrcamentoFilters(
+        cliente_nome=cliente_nome,
+        vendedor_id=vendedor_id,
+        status_id=status_id,
+        necessita_aprovacao=necessita_aprovacao,
+        valor_minimo=valor_minimo,
+        valor_maximo=valor_maximo
+    )
+    
+    service = OrcamentoService(db)
+    return service.exportar_orcamentos(filters, current_user, formato)
+
+
 @router.get("/{orcamento_id}",
     response_model=OrcamentoResponse,
     summary="Obter orçamento por ID",
@@ -240,20 +298,21 @@ async def duplicar_orcamento(
 # ===== RELATÓRIOS =====
 
 @router.get("/relatorios/margem",
-    response_model=List[RelatorioMargem],
+    response_model=RelatorioMargemResponse,
     summary="Relatório de margem",
-    description="Relatório detalhado de margem por orçamento (Admin Master apenas)"
+    description="Margem por vendedor, status e período + detalhamento por orçamento (Admin Master apenas)"
 )
 async def relatorio_margem(
     # Filtros de período
-    data_inicio: Optional[str] = Query(None, description="Data inicial (YYYY-MM-DD)"),
-    data_fim: Optional[str] = Query(None, description="Data final (YYYY-MM-DD)"),
+    data_inicio: Optional[str] = Query(None, description="Data inicial (YYYY-MM-DD); sem datas = últimos 12 meses"),
+    data_fim: Optional[str] = Query(None, description="Data final inclusiva (YYYY-MM-DD)"),
+    agrupamento: str = Query('mes', pattern='^(dia|semana|mes)$', description="Agrupamento do período"),
     
     # Filtros específicos
     vendedor_id: Optional[uuid.UUID] = Query(None, description="Filtro por vendedor"),
-    loja_id: Optional[uuid.UUID] = Query(None, description="Filtro por loja (Admin Master)"),
+    loja_id: Optional[uuid.UUID] = Query(None, description="Filtro por loja (vazio = todas as lojas)"),
     
-    # Paginação
+    # Paginação do detalhamento
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=500),
     
@@ -262,25 +321,52 @@ async def relatorio_margem(
     db: Client = Depends(get_database)
 ):
     """
-    Gera relatório detalhado de margem e lucratividade.
+    Gera relatório de margem e lucratividade.
     
     **Acesso restrito:** Apenas Admin Master.
-    **Dados incluídos:** Custos completos, margem líquida, percentual de margem.
+    **Agregados:** total, por vendedor, por status e por período (dia/semana/mês).
+    **Detalhamento:** custos completos, margem líquida e percentual por orçamento (skip/limit).
     """
     service = OrcamentoService(db)
     return await service.relatorio_margem(
-        data_inicio, data_fim, vendedor_id, loja_id, 
-        current_user, skip, limit
+        data_inicio, data_fim, vendedor_id, loja_id,
+        current_user, skip, limit, agrupamento
     )
 
 
+@router.get("/relatorios/margem/exportar",
+    summary="Exportar relatório de margem",
+    description="Baixa o detalhamento do relatório de margem (um orçamento por linha) em CSV ou XLSX (Admin Master apenas)",
+    response_class=StreamingResponse
+)
+async def exportar_relatorio_margem(
+    formato: str = Query('csv', pattern='^(csv|xlsx)$', description="Formato do arquivo"),
+    data_inicio: Optional[str] = Query(None, description="Data inicial (YYYY-MM-DD); sem datas = últimos 12 meses"),
+    data_fim: Optional[str] = Query(None, description="Data final inclusiva (YYYY-MM-DD)"),
+    vendedor_id: Optional[uuid.UUID] = Query(None, description="Filtro por vendedor"),
+    loja_id: Optional[uuid.UUID] = Query(None, description="Filtro por loja (vazio = todas as lojas)"),
+    current_user: Dict[str, Any] = Depends(require_admin()),
+    db: Client = Depends(get_database)
+):
+    """
+    Exporta o relatório de margem para planilha.
+    
+    **Acesso restrito:** Apenas Admin Master.
+    **Conteúdo:** valor, custos, margem líquida e percentual por orçamento do período.
+    **Streaming:** todas as lojas podem ser exportadas sem montar o relatório em memória.
+    """
+    service = OrcamentoService(db)
+    return service.exportar_relatorio_margem(data_inicio, data_fim, vendedor_id, loja_id, current_user, formato)
+
+
 @router.get("/dashboard/metricas",
+    response_model=MetricasDashboard,
     summary="Métricas do dashboard",
     description="Métricas resumidas para dashboard (por perfil)"
 )
 async def metricas_dashboard(
     periodo_dias: int = Query(30, ge=1, le=365, description="Período em dias"),
-    current_user: Dict[str, Any] = Depends(get_current_user),
+    current_user: Dict[str, Any] = Depends(require_vendedor_ou_superior()),
     db: Client = Depends(get_database)
 ):
     """
@@ -289,10 +375,97 @@ async def metricas_dashboard(
     **Dados variam por perfil:**
     - **Vendedor:** Apenas suas métricas
     - **Gerente:** Métricas da equipe
-    - **Admin Master:** Métricas consolidadas
+    - **Admin Master:** Métricas consolidadas (com custos e margem)
     """
     service = OrcamentoService(db)
-    return await service.obter_metricas_dashboard(periodo_dias, current_user)
+    return await service.metricas_dashboard(periodo_dias, current_user)
+
+
+@router.post("/dashboard/reconstruir",
+    summary="Reconstruir agregados do dashboard",
+    description="Recalcula os agregados diários do dashboard a partir dos orçamentos"
+)
+async def reconstruir_agregados_dashboard(
+    loja_id: Optional[uuid.UUID] = Query(None, description="Loja a reconstruir (vazio = todas)"),
+    current_user: Dict[str, Any] = Depends(require_admin()),
+    db: Client = Depends(get_service_database)
+):
+    """
+    Reconstrói os agregados diários usados em /dashboard/metricas.
+    
+    **Acesso restrito:** Apenas Admin Master.
+    Os agregados são mantidos por trigger em c_orcamentos; a reconstrução só é
+    necessária para corrigir divergências (ex: trigger desabilitado em carga manual).
+    """
+    service = OrcamentoService(db)
+    return await service.reconstruir_agregados(str(loja_id) if loja_id else None)
+
+
+# ===== SIMULAÇÃO DE DESCONTOS =====
+
+@router.post("/simular",
+    response_model=SimulacaoResponse,
+    summary="Simular descontos",
+    description="Calcula margem, comissões e aprovação necessária para vários descontos de uma vez, sem gravar"
+)
+async def simular_orcamento(
+    simulacao: SimulacaoOrcamento,
+    current_user: Dict[str, Any] = Depends(require_vendedor_ou_superior()),
+    db: Client = Depends(get_database)
+):
+    """
+    Simula cenários "e se" para um orçamento.
+    
+    - **descontos**: lista de descontos candidatos (%)
+    - **variantes**: variações de montador, custos adicionais, frete e medidor (opcional)
+    - Cada desconto é combinado com cada variante, em um único cálculo vetorizado
+    - Custos, comissões e margem aparecem apenas para **Admin Master**
+    """
+    service = OrcamentoService(db)
+    return await service.simular_orcamento(simulacao, current_user)
+
+
+# ===== RECÁLCULO EM LOTE =====
+
+@router.post("/recalcular",
+    status_code=status.HTTP_202_ACCEPTED,
+    summary="Recalcular orçamentos abertos",
+    description="Recalcula custos e margens de todos os orçamentos abertos da loja em background"
+)
+async def recalcular_orcamentos(
+    background_tasks: BackgroundTasks,
+    tamanho_lote: Optional[int] = Query(None, ge=50, le=5000, description="Orçamentos por lote"),
+    current_user: Dict[str, Any] = Depends(require_gerente_ou_admin()),
+    db: Client = Depends(get_database)
+):
+    """
+    Dispara o recálculo dos orçamentos abertos (status não final) da loja.
+    
+    Usar após alterar deflator, frete, medidor, limites de desconto ou faixas
+    de comissão. Acompanhe pelo `job_id` retornado. Uma loja só pode ter um
+    recálculo em andamento (409). O job vive na memória do worker que o criou:
+    com vários workers, o acompanhamento exige afinidade de sessão.
+    """
+    job = criar_job_recalculo(db, current_user['loja_id'], tamanho_lote)
+    background_tasks.add_task(job.executar)
+    return job.progresso()
+
+
+@router.get("/recalcular/{job_id}",
+    summary="Progresso do recálculo",
+    description="Progresso e throughput (orçamentos/s) de um job de recálculo"
+)
+async def progresso_recalculo(
+    job_id: str,
+    current_user: Dict[str, Any] = Depends(require_gerente_ou_admin())
+):
+    """Retorna o progresso de um job de recálculo da loja do usuário."""
+    job = obter_job_recalculo(job_id)
+    
+    if not job or job.loja_id != current_user['loja_id']:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job de recálculo não encontrado")
+    
+    return job.progresso()
 
 
 # ===== ENDPOINTS DE APOIO =====
@@ -0,0 +1,208 @@
+"""
+Engine de comissão por faixa única compilada em arrays NumPy.
+
+As regras de `config_regras_comissao_faixa` são ordenadas e convertidas uma
+única vez em arrays (valor_minimo, valor_maximo, percentual, ordem). A busca
+da faixa passa a ser uma busca binária (bisect/searchsorted) em vez de um
+iterrows() sobre o DataFrame a cada cálculo.
+
+REGRA DE NEGÓCIO (inalterada):
+- Identifica a primeira faixa (por valor_minimo) que contém o valor
+- Aplica o percentual da faixa sobre TODO o valor
+- Valor fora de qualquer faixa → comissão zero
+"""
+
+import logging
+import time
+from bisect import bisect_right
+from typing import Any, Dict
+
+import numpy as np
+import pandas as pd
+
+from core.metrics import comissao_duracao
+
+# Configurar logger
+logger = logging.getLogger(__name__)
+
+# Índice usado nos resultados em lote quando o valor não se encaixa em nenhuma faixa
+SEM_FAIXA = -1
+
+
+class TabelaComissao:
+    """
+    Tabela de faixas de comissão pré-compilada.
+
+    Uso:
+        tabela = TabelaComissao.from_dataframe(regras_df)
+        tabela.calcular(40000.0)                      # dict de auditoria
+        tabela.calcular_lote(np.array([...]))         # arrays vetorizados
+    """
+
+    def __init__(
+        self,
+        valor_minimo: np.ndarray,
+        valor_maximo: np.ndarray,
+        percentual: np.ndarray,
+        ordem: np.ndarray
+    ):
+        # Ordenação estável por valor mínimo (mesma ordem de prioridade do algoritmo original)
+        indices = np.argsort(valor_minimo, kind='stable')
+
+        self.valor_minimo = np.asarray(valor_minimo, dtype=np.float64)[indices]
+        self.valor_maximo = np.asarray(valor_maximo, dtype=np.float64)[indices]
+        self.percentual = np.asarray(percentual, dtype=np.float64)[indices]
+        self.ordem = np.asarray(ordem, dtype=np.int64)[indices]
+
+        # Faixa sem teto (NaN/None) vale até o infinito
+        self.valor_maximo = np.where(np.isnan(self.valor_maximo), np.inf, self.valor_maximo)
+
+        # Com faixas disjuntas, a faixa candidata é sempre a de maior mínimo <= valor
+        self.sem_sobreposicao = bool(np.all(self.valor_maximo[:-1] < self.valor_minimo[1:]))
+
+        # Cópias em listas Python para o caminho escalar (bisect é mais rápido que NumPy p/ 1 valor)
+        self._minimos = self.valor_minimo.tolist()
+        self._maximos = self.valor_maximo.tolist()
+        self._percentuais = self.percentual.tolist()
+        self._ordens = self.ordem.tolist()
+
+    @classmethod
+    def from_dataframe(cls, regras_df: pd.DataFrame) -> "TabelaComissao":
+        """Compila um DataFrame no formato retornado por OrcamentoRepository.get_regras_comissao"""
+        if regras_df.empty:
+            vazio = np.array([], dtype=np.float64)
+            return cls(vazio, vazio, vazio, np.array([], dtype=np.int64))
+
+        # Faixa sem ordem (NULL) fica com a posição da linha em vez de quebrar o cast para int64
+        posicao = pd.Series(np.arange(1, len(regras_df) + 1), index=regras_df.index)
+        ordem = pd.to_numeric(regras_df['ordem'], errors='coerce') if 'ordem' in regras_df else posicao
+
+        return cls(
+            valor_minimo=pd.to_numeric(regras_df['valor_minimo'], errors='coerce').to_numpy(dtype=np.float64),
+            valor_maximo=pd.to_numeric(regras_df['valor_maximo'], errors='coerce').to_numpy(dtype=np.float64),
+            percentual=pd.to_numeric(regras_df['percentual'], errors='coerce').to_numpy(dtype=np.float64),
+            ordem=ordem.fillna(posicao).to_numpy(dtype=np.int64)
+        )
+
+    @property
+    def vazia(self) -> bool:
+        return len(self._minimos) == 0
+
+    def __len__(self) -> int:
+        return len(self._minimos)
+
+    # ===== CAMINHO ESCALAR =====
+
+    def localizar_faixa(self, valor_venda: float) -> int:
+        """Retorna o índice (na tabela ordenada) da faixa aplicável ou SEM_FAIXA"""
+        if self.sem_sobreposicao:
+            indice = bisect_right(self._minimos, valor_venda) - 1
+            if indice >= 0 and valor_venda <= self._maximos[indice]:
+                return indice
+            return SEM_FAIXA
+
+        # Faixas sobrepostas: primeira faixa (por mínimo) que contém o valor
+        for indice, (valor_min, valor_max) in enumerate(zip(self._minimos, self._maximos)):
+            if valor_min <= valor_venda <= valor_max:
+                return indice
+        return SEM_FAIXA
+
+    def calcular(self, valor_venda: float) -> Dict[str, Any]:
+        """
+        Calcula a comissão de um valor de venda.
+
+        Returns:
+            Dict no mesmo formato de OrcamentoService.calcular_comissao_faixa_unica_pandas
+        """
+        inicio = time.perf_counter()
+        valor_venda = float(valor_venda)
+        indice = self.localizar_faixa(valor_venda)
+
+        if indice == SEM_FAIXA:
+            resultado = {
+                'comissao_total': 0.0,
+                'detalhes_faixas': [],
+                'valor_total_processado': valor_venda,
+                'faixa_aplicada': None
+            }
+        else:
+            resultado = self.detalhar(valor_venda, indice)
+
+        comissao_duracao.observar(time.perf_counter() - inicio, 'calcular')
+        return resultado
+
+    def detalhar(self, valor_venda: float, indice: int) -> Dict[str, Any]:
+        """Monta o dict de auditoria para um valor e uma faixa já localizada"""
+        percentual_faixa = self._percentuais[indice]
+        valor_maximo = self._maximos[indice]
+        comissao_total = valor_venda * percentual_faixa
+
+        detalhe_faixa = {
+            'faixa': self._ordens[indice],
+            'valor_minimo': self._minimos[indice],
+            'valor_maximo': valor_maximo if valor_maximo != float('inf') else None,
+            'percentual': percentual_faixa,
+            'valor_total_aplicado': valor_venda,
+            'comissao_calculada': comissao_total
+        }
+
+        return {
+            'comissao_total': comissao_total,
+            'detalhes_faixas': [detalhe_faixa],  # Sempre uma única faixa
+            'valor_total_processado': valor_venda,
+            'faixa_aplicada': self._ordens[indice]
+        }
+
+    # ===== CAMINHO VETORIZADO =====
+
+    def localizar_faixas(self, valores: np.ndarray) -> np.ndarray:
+        """Versão vetorizada de localizar_faixa: um índice (ou SEM_FAIXA) por valor"""
+        valores = np.asarray(valores, dtype=np.float64)
+
+        if self.vazia:
+            return np.full(valores.shape, SEM_FAIXA, dtype=np.int64)
+
+        if self.sem_sobreposicao:
+            indices = np.searchsorted(self.valor_minimo, valores, side='right') - 1
+            candidatos = np.clip(indices, 0, None)
+            dentro = (indices >= 0) & (valores <= self.valor_maximo[candidatos])
+            return np.where(dentro, indices, SEM_FAIXA)
+
+        # Faixas sobrepostas (raro): matriz faixas × valores, primeira faixa verdadeira
+        contem = (self.valor_minimo[:, None] <= valores) & (valores <= self.valor_maximo[:, None])
+        primeira = contem.argmax(axis=0)
+        return np.where(contem.any(axis=0), primeira, SEM_FAIXA)
+
+    def calcular_lote(self, valores: np.ndarray) -> Dict[str, np.ndarray]:
+        """
+        Calcula comissões para um array de valores em uma única passada.
+
+        Returns:
+            Dict de arrays alinhados com `valores`:
+            - comissao_total: comissão de cada valor (0.0 fora de faixa)
+            - percentual: percentual aplicado (0.0 fora de faixa)
+            - faixa_aplicada: ordem da faixa (SEM_FAIXA fora de faixa)
+            - indice_faixa: índice na tabela, para obter a auditoria via detalhar()
+        """
+        inicio = time.perf_counter()
+        valores = np.asarray(valores, dtype=np.float64)
+        indices = self.localizar_faixas(valores)
+        encontrado = indices != SEM_FAIXA
+
+        if self.vazia:
+            percentual = np.zeros(valores.shape, dtype=np.float64)
+            faixa = np.full(valores.shape, SEM_FAIXA, dtype=np.int64)
+        else:
+            seguros = np.where(encontrado, indices, 0)
+            percentual = np.where(encontrado, self.percentual[seguros], 0.0)
+            faixa = np.where(encontrado, self.ordem[seguros], SEM_FAIXA)
+
+        resultado = {
+            'comissao_total': valores * percentual,
+            'percentual': percentual,
+            'faixa_aplicada': faixa,
+            'indice_faixa': indices
+        }
+
+        comissao_duracao.observar(time.perf_counter() - inicio, 'calcular_lote')
+        return resultado
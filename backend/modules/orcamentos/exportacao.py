@@ -0,0 +1,276 @@
+"""
+Exportação de orçamentos e do relatório de margem (CSV/XLSX) em streaming.
+
+Os orçamentos são lidos com percorrer_keyset (páginas por cursor, a próxima já
+em voo) e cada página vira um pedaço da resposta assim que chega: a memória do
+worker fica em uma ou duas páginas, seja qual for o total exportado.
+
+- CSV: padrão do Excel em português (UTF-8 com BOM, ';' e vírgula decimal).
+  Texto puro e repetitivo: comprime bem com o GZipMiddleware.
+- XLSX: pacote zip gerado em fluxo (zipfile sem seek, descritores de dados) com
+  uma planilha de textos inline, sem tabela de strings compartilhadas para não
+  acumular nada em memória.
+
+Textos que começam com =, +, - ou @ recebem um apóstrofo no CSV, para que o
+Excel não os interprete como fórmula.
+"""
+
+import csv
+import io
+import logging
+import re
+import zipfile
+from datetime import date
+from typing import Any, AsyncIterator, Callable, Dict, List, Sequence, Tuple
+from xml.sax.saxutils import escape, quoteattr
+
+from fastapi.responses import StreamingResponse
+
+# Configurar logger
+logger = logging.getLogger(__name__)
+
+TIPOS_EXPORTACAO = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+# (título da coluna, extrator a partir da linha do PostgREST)
+Coluna = Tuple[str, Callable[[Dict[str, Any]], Any]]
+
+
+def _data(linha: Dict[str, Any]) -> str:
+    return (linha.get('created_at') or '')[:19].replace('T', ' ')
+
+
+def _valor(campo: str) -> Callable[[Dict[str, Any]], float]:
+    return lambda linha: round(float(linha.get(campo) or 0), 2)
+
+
+def _nome(relacao: str, campo: str = 'nome') -> Callable[[Dict[str, Any]], str]:
+    return lambda linha: (linha.get(relacao) or {}).get(campo) or ''
+
+
+def _percentual_margem(linha: Dict[str, Any]) -> float:
+    valor = float(linha.get('valor_final') or 0)
+    return round(float(linha.get('margem_lucro') or 0) / valor * 100, 2) if valor > 0 else 0.0
+
+
+# Linhas de OrcamentoService._query_listagem
+COLUNAS_LISTA_ORCAMENTOS: List[Coluna] = [
+    ('Número', lambda linha: linha.get('numero') or ''),
+    ('Data (UTC)', _data),
+    ('Cliente', _nome('c_clientes')),
+    ('Vendedor', _nome('cad_equipe')),
+    ('Status', _nome('config_status_orcamento', 'nome_status')),
+    ('Valor final', _valor('valor_final')),
+    ('Aguardando aprovação', lambda linha: bool(linha.get('necessita_aprovacao'))),
+]
+
+# Linhas de relatorios.query_relatorio (custos: apenas Admin Master)
+COLUNAS_RELATORIO_MARGEM: List[Coluna] = [
+    ('Número', lambda linha: linha.get('numero') or ''),
+    ('Data (UTC)', _data),
+    ('Loja', lambda linha: linha.get('loja_id') or ''),
+    ('Cliente', _nome('cliente')),
+    ('Vendedor', _nome('vendedor')),
+    ('Status', _nome('status', 'nome_status')),
+    ('Valor venda', _valor('valor_final')),
+    ('Custo fábrica', _valor('custo_fabrica')),
+    ('Comissão vendedor', _valor('comissao_vendedor')),
+    ('Comissão gerente', _valor('comissao_gerente')),
+    ('Custo medidor', _valor('custo_medidor')),
+    ('Custo montador', _valor('custo_montador')),
+    ('Custo frete', _valor('custo_frete')),
+    ('Custo total', lambda linha: round(float(linha.get('valor_final') or 0) - float(linha.get('margem_lucro') or 0), 2)),
+    ('Margem líquida', _valor('margem_lucro')),
+    ('% margem', _percentual_margem),
+]
+
+
+# ===== CSV =====
+
+def _celula_csv(valor: Any) -> str:
+    if isinstance(valor, bool):
+        return 'Sim' if valor else 'Não'
+    if isinstance(valor, float):
+        return f'{valor:.2f}'.replace('.', ',')
+    texto = str(valor)
+    if texto[:1] in ('=', '+', '-', '@'):
+        return "'" + texto
+    return texto
+
+
+async def gerar_csv(colunas: Sequence[Coluna], paginas: AsyncIterator[List[Dict[str, Any]]]) -> AsyncIterator[bytes]:
+    """CSV em pedaços: cabeçalho e depois um pedaço por página"""
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer, delimiter=';', lineterminator='\r\n')
+
+    def drenar() -> bytes:
+        conteudo = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+        return conteudo.encode('utf-8')
+
+    buffer.write('\ufeff')  # BOM: Excel abre acentos corretamente
+    escritor.writerow([titulo for titulo, _ in colunas])
+    yield drenar()
+
+    async for pagina in paginas:
+        escritor.writerows([_celula_csv(extrair(linha)) for _, extrair in colunas] for linha in pagina)
+        yield drenar()
+
+
+# ===== XLSX =====
+
+# Caracteres de controle não permitidos em XML 1.0
+_CONTROLE_XML = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>'
+)
+
+_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '</Relationships>'
+)
+
+_INICIO_PLANILHA = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+
+_FIM_PLANILHA = '</sheetData></worksheet>'
+
+
+def _workbook(nome_planilha: str) -> str:
+    return (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        f'<sheets><sheet name={quoteattr(nome_planilha[:31])} sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    )
+
+
+def _celula_xlsx(valor: Any) -> str:
+    if isinstance(valor, bool):
+        valor = 'Sim' if valor else 'Não'
+    elif isinstance(valor, (int, float)):
+        return f'<c><v>{valor}</v></c>'
+    texto = _CONTROLE_XML.sub('', str(valor))
+    if not texto:
+        return '<c/>'
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{escape(texto)}</t></is></c>'
+
+
+def _linha_xlsx(numero: int, valores) -> str:
+    return f'<row r="{numero}">' + ''.join(_celula_xlsx(valor) for valor in valores) + '</row>'
+
+
+class _SaidaZip:
+    """Destino do zipfile sem seek: guarda os bytes escritos até o próximo envio"""
+
+    def __init__(self):
+        self._partes: List[bytes] = []
+
+    def write(self, dados) -> int:
+        self._partes.append(bytes(dados))
+        return len(dados)
+
+    def flush(self) -> None:
+        pass
+
+    def drenar(self) -> bytes:
+        dados = b''.join(self._partes)
+        self._partes = []
+        return dados
+
+
+async def gerar_xlsx(
+    colunas: Sequence[Coluna],
+    paginas: AsyncIterator[List[Dict[str, Any]]],
+    nome_planilha: str
+) -> AsyncIterator[bytes]:
+    """XLSX em pedaços: o zip é escrito em fluxo e drenado a cada página"""
+    saida = _SaidaZip()
+    pacote = zipfile.ZipFile(saida, 'w', compression=zipfile.ZIP_DEFLATED)
+    pacote.writestr('[Content_Types].xml', _CONTENT_TYPES)
+    pacote.writestr('_rels/.rels', _RELS)
+    pacote.writestr('xl/workbook.xml', _workbook(nome_planilha))
+    pacote.writestr('xl/_rels/workbook.xml.rels', _WORKBOOK_RELS)
+
+    # Tamanho final desconhecido: zip64 evita o limite de 2 GB do descritor
+    planilha = pacote.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True)
+    planilha.write((_INICIO_PLANILHA + _linha_xlsx(1, [titulo for titulo, _ in colunas])).encode('utf-8'))
+    yield saida.drenar()
+
+    numero = 1
+    async for pagina in paginas:
+        linhas = []
+        for linha in pagina:
+            numero += 1
+            linhas.append(_linha_xlsx(numero, [extrair(linha) for _, extrair in colunas]))
+        planilha.write(''.join(linhas).encode('utf-8'))
+        yield saida.drenar()
+
+    planilha.write(_FIM_PLANILHA.encode('utf-8'))
+    planilha.close()
+    pacote.close()
+    yield saida.drenar()
+
+
+# ===== RESPOSTA =====
+
+def resposta_exportacao(
+    formato: str,
+    colunas: Sequence[Coluna],
+    paginas: AsyncIterator[List[Dict[str, Any]]],
+    nome_arquivo: str,
+    nome_planilha: str
+) -> StreamingResponse:
+    """
+    StreamingResponse do arquivo exportado (download)
+
+    Args:
+        formato: 'csv' ou 'xlsx'
+        nome_arquivo: Nome sem extensão (a data de hoje é acrescentada)
+    """
+    conteudo = gerar_csv(colunas, paginas) if formato == 'csv' else gerar_xlsx(colunas, paginas, nome_planilha)
+
+    async def com_log():
+        pedacos = 0
+        try:
+            async for pedaco in conteudo:
+                pedacos += 1
+                yield pedaco
+        except Exception as e:
+            # Status já enviado: o download é interrompido e o erro fica no log
+            logger.error(f"Erro na exportação {nome_arquivo}.{formato} após {pedacos} pedaços: {str(e)}")
+            raise
+
+    return StreamingResponse(
+        com_log(),
+        media_type=TIPOS_EXPORTACAO[formato],
+        headers={'Content-Disposition': f'attachment; filename="{nome_arquivo}_{date.today().isoformat()}.{formato}"'}
+    )
@@ -0,0 +1,158 @@
+"""
+Numeração de orçamentos por loja.
+
+O contador fica em config_loja.proximo_numero_orcamento. Nenhum caminho faz
+leitura + escrita sem condição, então dois vendedores nunca recebem o mesmo
+número. Os modos, conforme ORCAMENTO_RPC_HABILITADO e NUMERACAO_BLOCO_TAMANHO:
+
+- RPC + bloco 1: o número é reservado dentro de criar_orcamento_atomico
+  (migration 20261018140000), na transação do cabeçalho. Sem lacunas (a falha
+  desfaz o incremento), mas a linha da loja fica bloqueada até o commit da
+  gravação: orçamentos simultâneos da mesma loja são gravados em fila.
+- RPC + bloco N > 1: reservar_numeros_orcamento (migration 20261018060000)
+  reserva um intervalo por worker, consumido em memória. Uma ida ao banco a
+  cada N orçamentos e nenhuma disputa pela linha da loja, ao custo de lacunas
+  quando o worker reinicia e de números fora de ordem entre workers.
+- Sem RPC (padrão, nenhuma migration necessária): select + update condicional
+  em config_loja (OrcamentoRepository._reservar_numeros_sem_rpc) antes da
+  gravação sequencial. O bloqueio dura só o update, mas uma falha na gravação
+  deixa lacuna.
+
+O texto final segue formato_numeracao / prefixo_numeracao da loja.
+"""
+
+import asyncio
+import logging
+import re
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+FORMATO_SEQUENCIAL = 'SEQUENCIAL'
+FORMATO_ANO_SEQUENCIAL = 'ANO_SEQUENCIAL'
+FORMATO_PERSONALIZADO = 'PERSONALIZADO'
+
+
+class _MarcadorNumero:
+    """Ocupa o lugar de {numero} no modelo e guarda a especificação de formato usada"""
+
+    def __init__(self):
+        self.especificacoes: List[str] = []
+
+    def __format__(self, especificacao: str) -> str:
+        self.especificacoes.append(especificacao)
+        return '\0'
+
+
+def molde_numero(config: Dict[str, Any], data: Optional[datetime] = None) -> Dict[str, Any]:
+    """
+    Partes fixas do número do orçamento: prefixo + número com `digitos` + sufixo
+
+    É o que criar_orcamento_atomico recebe para montar o número no banco
+    (prefixo || lpad(número, digitos, '0') || sufixo).
+
+    - SEQUENCIAL: prefixo + número (ex: "ORC-42")
+    - ANO_SEQUENCIAL: prefixo + ano/número com 5 dígitos (ex: "ORC-2026/00042")
+    - PERSONALIZADO: prefixo usado como modelo com {numero}, {ano} e {mes}
+      (ex: "{ano}{mes}-{numero:04d}" → "202610-0042"); sem {numero}, o número
+      é anexado ao final
+
+    Args:
+        config: Configuração da loja (formato_numeracao, prefixo_numeracao)
+        data: Data de referência para o ano/{ano}/{mes} (padrão: agora)
+    """
+    prefixo = config.get('prefixo_numeracao') or ''
+    formato = config.get('formato_numeracao') or FORMATO_SEQUENCIAL
+    data = data or datetime.utcnow()
+
+    if formato == FORMATO_ANO_SEQUENCIAL:
+        return {'prefixo': f"{prefixo}{data.year}/", 'sufixo': '', 'digitos': 5}
+
+    if formato == FORMATO_PERSONALIZADO and '{' in prefixo:
+        try:
+            modelo = prefixo if '{numero' in prefixo else prefixo + '{numero}'
+            marcador = _MarcadorNumero()
+            texto = modelo.format(numero=marcador, ano=data.year, mes=f"{data.month:02d}")
+            largura = re.fullmatch(r'0?(\d*)d?', marcador.especificacoes[0]) if len(marcador.especificacoes) == 1 else None
+            if largura is None:
+                raise ValueError('{numero} deve aparecer uma vez, sem formato ou como {numero:0Nd}')
+            antes, _, depois = texto.partition('\0')
+            return {'prefixo': antes, 'sufixo': depois, 'digitos': int(largura.group(1) or 0)}
+        except (KeyError, IndexError, ValueError) as e:
+            logger.warning(f"⚠️ Modelo de numeração inválido '{prefixo}': {str(e)} - usando sequencial")
+
+    return {'prefixo': prefixo, 'sufixo': '', 'digitos': 0}
+
+
+def formatar_numero(numero: int, config: Dict[str, Any], data: Optional[datetime] = None) -> str:
+    """
+    Monta o número do orçamento conforme a configuração da loja (ver molde_numero)
+
+    Args:
+        numero: Número reservado
+        config: Configuração da loja (formato_numeracao, prefixo_numeracao)
+        data: Data de referência para {ano}/{mes} (padrão: agora)
+    """
+    molde = molde_numero(config, data)
+    return f"{molde['prefixo']}{str(numero).zfill(molde['digitos'])}{molde['sufixo']}"
+
+
+class NumeradorOrcamentos:
+    """
+    Intervalos de números reservados por loja neste processo
+
+    Consumir um número do intervalo atual não tem await, então é atômico no
+    event loop. Só a reserva de um novo intervalo passa pelo lock da loja
+    (requisições simultâneas esperam a mesma reserva em vez de fazer várias).
+    """
+
+    def __init__(self):
+        self._intervalos: Dict[str, List[int]] = {}   # loja_id → [próximo, fim exclusivo]
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self.reservas = 0
+
+    def _consumir(self, loja_id: str) -> Optional[int]:
+        intervalo = self._intervalos.get(loja_id)
+        if intervalo is None or intervalo[0] >= intervalo[1]:
+            return None
+        numero = intervalo[0]
+        intervalo[0] += 1
+        return numero
+
+    async def proximo(self, repository, loja_id: str, tamanho_bloco: int = 1) -> int:
+        """
+        Próximo número da loja
+
+        Args:
+            repository: OrcamentoRepository (reservar_numeros_orcamento)
+            loja_id: ID da loja
+            tamanho_bloco: Números reservados por ida ao banco
+        """
+        loja_id = str(loja_id)
+        quantidade = max(1, int(tamanho_bloco))
+        if quantidade == 1:
+            # Sem intervalo em memória: o UPDATE atômico já basta (sem fila no processo)
+            self.reservas += 1
+            return await repository.reservar_numeros_orcamento(loja_id, 1)
+
+        numero = self._consumir(loja_id)
+        if numero is not None:
+            return numero
+
+        lock = self._locks.setdefault(loja_id, asyncio.Lock())
+        async with lock:
+            # Outra requisição pode ter reservado enquanto esperávamos o lock
+            numero = self._consumir(loja_id)
+            if numero is not None:
+                return numero
+
+            inicio = await repository.reservar_numeros_orcamento(loja_id, quantidade)
+            self.reservas += 1
+            self._intervalos[loja_id] = [inicio + 1, inicio + quantidade]
+            logger.debug(f"Intervalo {inicio}-{inicio + quantidade - 1} reservado para loja {loja_id}")
+            return inicio
+
+
+# Numerador do processo (um por worker)
+numerador_orcamentos = NumeradorOrcamentos()
@@ -0,0 +1,304 @@
+"""
+Recálculo em lote dos orçamentos abertos de uma loja.
+
+Quando a loja altera deflator, frete, medidor, limites de desconto ou faixas
+de comissão, custos e margens gravados em `c_orcamentos` ficam desatualizados.
+O job percorre os orçamentos abertos (status não final, não excluídos) em lotes por cursor,
+recalcula tudo com as mesmas regras de `calcular_orcamento_completo` de forma
+vetorizada (NumPy/Pandas) e grava cada lote com uma única chamada
+(aplicar_recalculo_orcamentos): update só das colunas recalculadas, ignorando
+orçamentos editados depois da leitura do lote.
+
+Os jobs ficam na memória do processo (_jobs). Com vários workers, o GET de
+progresso só encontra o job no worker que o iniciou, e a regra de um job em
+execução por loja também vale apenas dentro de cada worker: o recálculo deve
+rodar em uma instância com um único worker (ou com afinidade de sessão para
+/orcamentos/recalcular).
+"""
+
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from fastapi import status
+
+from core.cache import invalidar_cache_loja
+from core.config import get_settings
+from core.database import execute_async
+from core.exceptions import FluyteException
+from core.pagination import aplicar_keyset, montar_pagina
+from .engine_comissao import TabelaComissao
+from .repository import OrcamentoRepository
+
+# Configurar logger
+logger = logging.getLogger(__name__)
+
+# Colunas necessárias para recalcular (updated_at: guarda contra edições durante o job)
+COLUNAS_RECALCULO = '''
+    id,
+    valor_ambientes,
+    desconto_percentual,
+    custo_montador,
+    created_at,
+    updated_at,
+    config_status_orcamento!inner(is_final)
+'''
+
+# Colunas gravadas pelo recálculo (entradas como valor_ambientes/desconto nunca são escritas)
+COLUNAS_GRAVADAS = (
+    'valor_final', 'custo_fabrica', 'comissao_vendedor', 'comissao_gerente',
+    'custo_medidor', 'custo_frete', 'margem_lucro', 'necessita_aprovacao'
+)
+
+
+def calcular_custos_lote(
+    orcamentos_df: pd.DataFrame,
+    custos_adicionais: pd.Series,
+    config: Dict[str, Any],
+    tabela_vendedor: TabelaComissao,
+    tabela_gerente: TabelaComissao
+) -> pd.DataFrame:
+    """
+    Versão vetorizada de calcular_orcamento_completo + validar_limite_desconto
+
+    Args:
+        orcamentos_df: Linhas de c_orcamentos (id, valor_ambientes, desconto_percentual, custo_montador)
+        custos_adicionais: Total de custos adicionais indexado por orcamento_id
+        config: Configuração da loja (get_config_loja)
+        tabela_vendedor / tabela_gerente: Faixas de comissão compiladas
+
+    Returns:
+        DataFrame indexado como orcamentos_df com valor_final, custos, margem_lucro
+        e necessita_aprovacao recalculados
+    """
+    valor_ambientes = pd.to_numeric(orcamentos_df['valor_ambientes']).to_numpy(dtype=np.float64)
+    desconto = pd.to_numeric(orcamentos_df['desconto_percentual']).fillna(0.0).to_numpy(dtype=np.float64)
+    custo_montador = pd.to_numeric(orcamentos_df['custo_montador']).fillna(0.0).to_numpy(dtype=np.float64)
+    total_adicionais = orcamentos_df['id'].map(custos_adicionais).fillna(0.0).to_numpy(dtype=np.float64)
+
+    valor_final = valor_ambientes * (1 - desconto)
+
+    custos = pd.DataFrame({
+        'custo_fabrica': valor_ambientes * float(config['deflator_custo_fabrica']),
+        'comissao_vendedor': tabela_vendedor.calcular_lote(valor_final)['comissao_total'],
+        'comissao_gerente': tabela_gerente.calcular_lote(valor_final)['comissao_total'],
+        'custo_medidor': np.full(valor_final.shape, float(config['valor_medidor_padrao'])),
+        'custo_frete': valor_final * float(config['valor_frete_percentual']),
+        'custo_montador': custo_montador,
+    }, index=orcamentos_df.index)
+
+    total_custos = custos.sum(axis=1).to_numpy() + total_adicionais
+
+    custos['valor_final'] = valor_final
+    custos['margem_lucro'] = valor_final - total_custos
+    custos['necessita_aprovacao'] = desconto > float(config['limite_desconto_vendedor'])
+
+    return custos
+
+
+class RecalculoOrcamentosJob:
+    """
+    Job de recálculo dos orçamentos abertos de uma loja
+
+    Uso:
+        job = criar_job_recalculo(supabase, loja_id)
+        background_tasks.add_task(job.executar)
+        obter_job_recalculo(job.job_id).progresso()
+    """
+
+    def __init__(self, supabase_client, loja_id: str, tamanho_lote: Optional[int] = None):
+        self.supabase = supabase_client
+        self.repository = OrcamentoRepository(supabase_client)
+        self.job_id = str(uuid.uuid4())
+        self.loja_id = loja_id
+        self.tamanho_lote = tamanho_lote or get_settings().recalculo_tamanho_lote
+
+        self.status = 'PENDENTE'
+        self.lotes_processados = 0
+        self.orcamentos_processados = 0
+        self.orcamentos_ignorados = 0  # editados durante o job (não sobrescritos)
+        self.iniciado_em: Optional[datetime] = None
+        self.finalizado_em: Optional[datetime] = None
+        self.erro: Optional[str] = None
+        self._inicio: Optional[float] = None
+        self._duracao: float = 0.0
+
+    def progresso(self) -> Dict[str, Any]:
+        """Situação atual do job (para o endpoint de acompanhamento)"""
+        duracao = (time.perf_counter() - self._inicio) if self.status == 'EXECUTANDO' else self._duracao
+
+        return {
+            'job_id': self.job_id,
+            'loja_id': self.loja_id,
+            'status': self.status,
+            'tamanho_lote': self.tamanho_lote,
+            'lotes_processados': self.lotes_processados,
+            'orcamentos_processados': self.orcamentos_processados,
+            'orcamentos_ignorados': self.orcamentos_ignorados,
+            'orcamentos_por_segundo': round(self.orcamentos_processados / duracao, 1) if duracao else 0.0,
+            'duracao_segundos': round(duracao, 3),
+            'iniciado_em': self.iniciado_em.isoformat() if self.iniciado_em else None,
+            'finalizado_em': self.finalizado_em.isoformat() if self.finalizado_em else None,
+            'erro': self.erro
+        }
+
+    async def executar(self) -> Dict[str, Any]:
+        """Percorre, recalcula e grava todos os orçamentos abertos da loja"""
+        self.status = 'EXECUTANDO'
+        self.iniciado_em = datetime.utcnow()
+        self._inicio = time.perf_counter()
+
+        logger.info(f"🔄 Recálculo {self.job_id} iniciado para loja {self.loja_id} (lotes de {self.tamanho_lote})")
+
+        try:
+            # Configuração e faixas lidas uma vez para o job inteiro, direto do banco:
+            # o cache é por processo e este worker pode não ter visto a alteração
+            invalidar_cache_loja(self.loja_id)
+            contexto = await self.repository.get_contexto_calculo(self.loja_id)
+            config, tabela_vendedor, tabela_gerente = contexto.config, contexto.tabela_vendedor, contexto.tabela_gerente
+            config_snapshot = {
+                chave: config.get(chave)
+                for chave in ('deflator_custo_fabrica', 'valor_medidor_padrao', 'valor_frete_percentual',
+                              'limite_desconto_vendedor', 'limite_desconto_gerente')
+            }
+
+            cursor = ''
+            while cursor is not None:
+                orcamentos, cursor = await self._buscar_lote(cursor)
+                if not orcamentos:
+                    break
+
+                gravados = await self._recalcular_lote(orcamentos, config, config_snapshot, tabela_vendedor, tabela_gerente)
+
+                self.lotes_processados += 1
+                self.orcamentos_processados += gravados
+                self.orcamentos_ignorados += len(orcamentos) - gravados
+                logger.debug(f"Recálculo {self.job_id}: {self.orcamentos_processados} orçamentos")
+
+            self.status = 'CONCLUIDO'
+
+        except Exception as e:
+            self.status = 'ERRO'
+            self.erro = str(e)
+            logger.error(f"❌ Erro no recálculo {self.job_id}: {str(e)}")
+
+        finally:
+            self._duracao = time.perf_counter() - self._inicio
+            self.finalizado_em = datetime.utcnow()
+
+        progresso = self.progresso()
+        logger.info(
+            f"✅ Recálculo {self.job_id} {self.status}: {self.orcamentos_processados} orçamentos "
+            f"({self.orcamentos_ignorados} editados durante o job) em {progresso['duracao_segundos']}s ({progresso['orcamentos_por_segundo']} orçamentos/s)"
+        )
+        return progresso
+
+    async def _buscar_lote(self, cursor: str):
+        """Próximo lote de orçamentos abertos (status não final, não excluídos), por cursor"""
+        result = await execute_async(
+            aplicar_keyset(
+                self.supabase
+                .table('c_orcamentos')
+                .select(COLUNAS_RECALCULO)
+                .eq('loja_id', self.loja_id)
+                .not_.is_('excluido', 'true')
+                .eq('config_status_orcamento.is_final', False),
+                cursor,
+                self.tamanho_lote
+            )
+        )
+
+        return montar_pagina(result.data, self.tamanho_lote)
+
+    async def _somar_custos_adicionais(self, orcamento_ids: List[str]) -> pd.Series:
+        """Total de custos adicionais por orçamento do lote (uma query por lote)"""
+        result = await execute_async(
+            self.supabase
+            .table('c_orcamento_custos_adicionais')
+            .select('orcamento_id, valor_custo')
+            .in_('orcamento_id', orcamento_ids)
+        )
+
+        if not result.data:
+            return pd.Series(dtype=np.float64)
+
+        custos_df = pd.DataFrame(result.data)
+        return pd.to_numeric(custos_df['valor_custo']).groupby(custos_df['orcamento_id']).sum()
+
+    async def _recalcular_lote(
+        self,
+        orcamentos: List[Dict[str, Any]],
+        config: Dict[str, Any],
+        config_snapshot: Dict[str, Any],
+        tabela_vendedor: TabelaComissao,
+        tabela_gerente: TabelaComissao
+    ):
+        """
+        Recalcula um lote e grava com uma única chamada
+
+        Returns:
+            int: Orçamentos gravados (os editados desde a leitura ficam de fora)
+        """
+        orcamentos_df = pd.DataFrame(orcamentos)
+        custos_adicionais = await self._somar_custos_adicionais(orcamentos_df['id'].tolist())
+
+        recalculado = calcular_custos_lote(orcamentos_df, custos_adicionais, config, tabela_vendedor, tabela_gerente)
+
+        registros = []
+        for orcamento, valores in zip(orcamentos, recalculado[list(COLUNAS_GRAVADAS)].to_dict('records')):
+            valores['necessita_aprovacao'] = bool(valores['necessita_aprovacao'])
+            registros.append({
+                'id': orcamento['id'],
+                'updated_at': orcamento.get('updated_at'),  # como lido: comparado no banco
+                **valores,
+                'config_snapshot': config_snapshot
+            })
+
+        gravados = await self.repository.aplicar_recalculo_lote(self.loja_id, registros)
+        if len(gravados) < len(registros):
+            logger.info(f"Recálculo {self.job_id}: {len(registros) - len(gravados)} orçamentos editados durante o job mantidos")
+        return len(gravados)
+
+
+# ===== REGISTRO DE JOBS =====
+
+_jobs: "OrderedDict[str, RecalculoOrcamentosJob]" = OrderedDict()
+
+
+def criar_job_recalculo(supabase_client, loja_id: str, tamanho_lote: Optional[int] = None) -> RecalculoOrcamentosJob:
+    """
+    Cria e registra um job (histórico limitado aos mais recentes)
+
+    Raises:
+        FluyteException (409): A loja já tem um job pendente ou em execução neste processo
+    """
+    em_andamento = next(
+        (job for job in _jobs.values() if job.loja_id == loja_id and job.status in ('PENDENTE', 'EXECUTANDO')),
+        None
+    )
+    if em_andamento is not None:
+        raise FluyteException(
+            "Já existe um recálculo em andamento para esta loja",
+            code="RECALCULO_EM_ANDAMENTO",
+            status_code=status.HTTP_409_CONFLICT,
+            details={'job_id': em_andamento.job_id}
+        )
+
+    job = RecalculoOrcamentosJob(supabase_client, loja_id, tamanho_lote)
+    _jobs[job.job_id] = job
+
+    while len(_jobs) > get_settings().recalculo_max_jobs_historico:
+        _jobs.popitem(last=False)
+
+    return job
+
+
+def obter_job_recalculo(job_id: str) -> Optional[RecalculoOrcamentosJob]:
+    """Busca um job registrado"""
+    return _jobs.get(job_id)
@@ -0,0 +1,281 @@
+"""
+Engine de relatórios de margem e métricas do dashboard.
+
+Os orçamentos do período são lidos em páginas por cursor (keyset) e cada página
+vira um bloco colunar (DataFrame com colunas numéricas float64 e categorias);
+as linhas em dict são descartadas página a página. A próxima página é buscada
+enquanto a anterior é convertida. Com o frame montado, margem por vendedor,
+status e período sai de um groupby.
+
+Escopo por PerfilUsuario:
+- VENDEDOR: orçamentos próprios da loja
+- GERENTE: todos os orçamentos da loja
+- ADMIN_MASTER: loja informada ou todas as lojas (consolidado)
+- MEDIDOR: sem acesso
+
+Custos e margem só são expostos para ADMIN_MASTER (mesma regra do resumo
+financeiro do orçamento).
+"""
+
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from core.auth import PerfilUsuario
+from core.exceptions import PermissionException
+from core.pagination import percorrer_keyset
+
+# Configurar logger
+logger = logging.getLogger(__name__)
+
+COLUNAS_RELATORIO = '''
+    id,
+    numero,
+    loja_id,
+    vendedor_id,
+    status_id,
+    valor_final,
+    custo_fabrica,
+    comissao_vendedor,
+    comissao_gerente,
+    custo_medidor,
+    custo_montador,
+    custo_frete,
+    margem_lucro,
+    necessita_aprovacao,
+    created_at,
+    status:config_status_orcamento(nome_status),
+    cliente:c_clientes(nome),
+    vendedor:cad_equipe(nome)
+'''
+
+COLUNAS_CUSTO = (
+    'custo_fabrica', 'comissao_vendedor', 'comissao_gerente',
+    'custo_medidor', 'custo_montador', 'custo_frete'
+)
+COLUNAS_NUMERICAS = ('valor_final', 'margem_lucro') + COLUNAS_CUSTO
+
+# Agrupamento temporal → frequência do pandas
+AGRUPAMENTOS = {'dia': 'D', 'semana': 'W-SUN', 'mes': 'M'}  # W-SUN: semanas de segunda a domingo
+
+
+def escopo_relatorio(
+    current_user: Dict[str, Any],
+    loja_id: Optional[str] = None,
+    vendedor_id: Optional[str] = None
+) -> Dict[str, Optional[str]]:
+    """
+    Lojas e vendedores visíveis para o perfil do usuário
+
+    Returns:
+        {'loja_id': str | None (None = todas), 'vendedor_id': str | None}
+
+    Raises:
+        PermissionException: perfil sem acesso a relatórios
+    """
+    perfil = current_user['perfil']
+
+    if perfil == PerfilUsuario.ADMIN_MASTER.value:
+        return {
+            'loja_id': str(loja_id) if loja_id else None,
+            'vendedor_id': str(vendedor_id) if vendedor_id else None
+        }
+
+    if perfil == PerfilUsuario.GERENTE.value:
+        return {
+            'loja_id': current_user['loja_id'],
+            'vendedor_id': str(vendedor_id) if vendedor_id else None
+        }
+
+    if perfil == PerfilUsuario.VENDEDOR.value:
+        return {'loja_id': current_user['loja_id'], 'vendedor_id': current_user['user_id']}
+
+    raise PermissionException("Perfil sem acesso a relatórios de orçamentos")
+
+
+def _pagina_para_frame(linhas: List[Dict[str, Any]]) -> pd.DataFrame:
+    """Converte uma página do PostgREST em bloco colunar"""
+    frame = pd.DataFrame({
+        'id': [linha['id'] for linha in linhas],
+        'numero': [linha.get('numero') for linha in linhas],
+        'loja_id': [linha.get('loja_id') for linha in linhas],
+        'vendedor_id': [linha.get('vendedor_id') for linha in linhas],
+        'status_id': [linha.get('status_id') for linha in linhas],
+        'necessita_aprovacao': [bool(linha.get('necessita_aprovacao')) for linha in linhas],
+        'created_at': pd.to_datetime([linha['created_at'] for linha in linhas], utc=True, format='ISO8601'),
+        'status_nome': [(linha.get('status') or {}).get('nome_status') for linha in linhas],
+        'cliente_nome': [(linha.get('cliente') or {}).get('nome') for linha in linhas],
+        'vendedor_nome': [(linha.get('vendedor') or {}).get('nome') for linha in linhas],
+    })
+
+    for coluna in COLUNAS_NUMERICAS:
+        frame[coluna] = pd.to_numeric(
+            pd.Series([linha.get(coluna) for linha in linhas], dtype=object), errors='coerce'
+        ).fillna(0.0).astype(np.float64)
+
+    return frame
+
+
+def _frame_vazio() -> pd.DataFrame:
+    frame = _pagina_para_frame([])
+    frame['created_at'] = pd.to_datetime(frame['created_at'], utc=True)
+    return frame
+
+
+def query_relatorio(
+    supabase,
+    escopo: Dict[str, Optional[str]],
+    data_inicio: Optional[datetime] = None,
+    data_fim: Optional[datetime] = None
+):
+    """Query de c_orcamentos do escopo/período (sem paginação; uma nova a cada página)"""
+    query = supabase.table('c_orcamentos').select(COLUNAS_RELATORIO)
+    if escopo.get('loja_id'):
+        query = query.eq('loja_id', escopo['loja_id'])
+    if escopo.get('vendedor_id'):
+        query = query.eq('vendedor_id', escopo['vendedor_id'])
+    if data_inicio:
+        query = query.gte('created_at', data_inicio.isoformat())
+    if data_fim:
+        query = query.lt('created_at', data_fim.isoformat())
+    return query.not_.is_('excluido', 'true')
+
+
+async def carregar_orcamentos(
+    supabase,
+    escopo: Dict[str, Optional[str]],
+    data_inicio: Optional[datetime] = None,
+    data_fim: Optional[datetime] = None,
+    tamanho_pagina: int = 1000
+) -> pd.DataFrame:
+    """
+    Lê os orçamentos do escopo/período em páginas e devolve um DataFrame colunar
+
+    Ordenado por created_at desc, id desc (ordem do cursor).
+    """
+    blocos: List[pd.DataFrame] = []
+    async for linhas in percorrer_keyset(
+        lambda: query_relatorio(supabase, escopo, data_inicio, data_fim), tamanho_pagina
+    ):
+        blocos.append(_pagina_para_frame(linhas))
+
+    if not blocos:
+        return _frame_vazio()
+
+    frame = pd.concat(blocos, ignore_index=True)
+    for coluna in ('loja_id', 'vendedor_id', 'status_id', 'status_nome', 'vendedor_nome'):
+        frame[coluna] = frame[coluna].astype('category')
+
+    logger.debug(f"Relatório: {len(frame)} orçamentos carregados em {len(blocos)} páginas")
+    return frame
+
+
+def agregar(frame: pd.DataFrame, chaves, incluir_margem: bool) -> List[Dict[str, Any]]:
+    """
+    Quantidade, valor vendido, ticket médio e (opcional) custo e margem por grupo
+
+    Args:
+        frame: DataFrame de carregar_orcamentos ou carregar_agregados (com ou sem 'periodo')
+        chaves: Coluna(s) de agrupamento; a primeira vira 'chave', a segunda 'nome'
+        incluir_margem: False oculta custo_total, margem_lucro e percentual_margem
+    """
+    chaves = [chaves] if isinstance(chaves, str) else list(chaves)
+    if frame.empty:
+        return []
+
+    # Frame de agregados diários: cada linha já traz a sua quantidade
+    quantidade = ('quantidade', 'sum') if 'quantidade' in frame.columns else ('id', 'size')
+    grupos = frame.groupby(chaves, observed=True, sort=True, dropna=False).agg(
+        quantidade=quantidade,
+        valor_venda=('valor_final', 'sum'),
+        margem_lucro=('margem_lucro', 'sum'),
+        aguardando_aprovacao=('necessita_aprovacao', 'sum'),
+    ).reset_index()
+
+    grupos['ticket_medio'] = grupos['valor_venda'] / grupos['quantidade']
+    grupos['custo_total'] = grupos['valor_venda'] - grupos['margem_lucro']
+    grupos['percentual_margem'] = np.divide(
+        grupos['margem_lucro'] * 100, grupos['valor_venda'],
+        out=np.zeros(len(grupos)), where=grupos['valor_venda'].to_numpy() > 0
+    )
+
+    resultado = []
+    for linha in grupos.itertuples(index=False):
+        item = {
+            'chave': _texto(getattr(linha, chaves[0])),
+            'nome': _texto(getattr(linha, chaves[1])) if len(chaves) > 1 else None,
+            'quantidade': int(linha.quantidade),
+            'valor_venda': round(float(linha.valor_venda), 2),
+            'ticket_medio': round(float(linha.ticket_medio), 2),
+            'aguardando_aprovacao': int(linha.aguardando_aprovacao),
+        }
+        if incluir_margem:
+            item.update({
+                'custo_total': round(float(linha.custo_total), 2),
+                'margem_lucro': round(float(linha.margem_lucro), 2),
+                'percentual_margem': round(float(linha.percentual_margem), 2),
+            })
+        resultado.append(item)
+
+    return resultado
+
+
+def _texto(valor: Any) -> Optional[str]:
+    if valor is None or (isinstance(valor, float) and np.isnan(valor)):
+        return None
+    if isinstance(valor, pd.Timestamp):
+        return valor.date().isoformat()
+    return str(valor)
+
+
+def adicionar_periodo(frame: pd.DataFrame, agrupamento: str) -> pd.DataFrame:
+    """Coluna 'periodo' com o início do dia/semana/mês de created_at"""
+    frequencia = AGRUPAMENTOS[agrupamento]
+    datas = frame['created_at'].dt.tz_convert(None)
+    frame['periodo'] = datas.dt.to_period(frequencia).dt.start_time
+    return frame
+
+
+def agrupamento_automatico(periodo_dias: int) -> str:
+    """Granularidade do dashboard conforme o tamanho do período"""
+    if periodo_dias <= 31:
+        return 'dia'
+    if periodo_dias <= 120:
+        return 'semana'
+    return 'mes'
+
+
+def resumo_margem(frame: pd.DataFrame, agrupamento: str, incluir_margem: bool) -> Dict[str, Any]:
+    """Total + agregados por vendedor, status e período"""
+    frame = adicionar_periodo(frame, agrupamento)
+    total = agregar(frame.assign(escopo='total'), 'escopo', incluir_margem)
+
+    return {
+        'total': total[0] if total else None,
+        'por_vendedor': agregar(frame, ['vendedor_id', 'vendedor_nome'], incluir_margem),
+        'por_status': agregar(frame, ['status_id', 'status_nome'], incluir_margem),
+        'por_periodo': agregar(frame, 'periodo', incluir_margem),
+    }
+
+
+def detalhar_orcamentos(frame: pd.DataFrame, skip: int, limit: int) -> List[Dict[str, Any]]:
+    """Linhas do relatório detalhado (uma por orçamento) para a página pedida"""
+    pagina = frame.iloc[skip:skip + limit]
+    detalhes = []
+    for linha in pagina.itertuples(index=False):
+        detalhes.append({
+            'orcamento_id': linha.id,
+            'numero': linha.numero or '',
+            'cliente_nome': linha.cliente_nome or '',
+            'vendedor_nome': linha.vendedor_nome if isinstance(linha.vendedor_nome, str) else '',
+            'valor_venda': round(linha.valor_final, 2),
+            'custo_total': round(linha.valor_final - linha.margem_lucro, 2),
+            'margem_liquida': round(linha.margem_lucro, 2),
+            'percentual_margem': round(linha.margem_lucro / linha.valor_final * 100, 2) if linha.valor_final > 0 else 0.0,
+            'data_criacao': linha.created_at.to_pydatetime(),
+            'detalhes_custos': {coluna: round(getattr(linha, coluna), 2) for coluna in COLUNAS_CUSTO},
+        })
+    return detalhes
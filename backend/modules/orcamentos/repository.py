@@ -1,13 +1,32 @@
+import asyncio
 import pandas as pd
 import numpy as np
+from dataclasses import dataclass
 from typing import List, Dict, Any, Optional
 import logging
 from supabase import create_client, Client
+from core.config import get_settings
+from core.database import execute_async
+from core.cache import config_loja_cache, regras_comissao_cache, tabelas_comissao_cache
+from .engine_comissao import TabelaComissao
 
 # Configurar logger
 logger = logging.getLogger(__name__)
 
 
+@dataclass
+class ContextoCalculo:
+    """
+    Dados da loja usados no cálculo de um orçamento, lidos uma vez por requisição
+
+    Passado adiante por criar_orcamento_completo → validar_limite_desconto /
+    calcular_orcamento_completo para que nenhuma etapa busque de novo.
+    """
+    config: Dict[str, Any]
+    tabela_vendedor: TabelaComissao
+    tabela_gerente: TabelaComissao
+
+
 class OrcamentoRepository:
     """
     Repository para operações de orçamentos com Supabase - APENAS DADOS
@@ -19,6 +38,7 @@ class OrcamentoRepository:
     
     def __init__(self, supabase_client: Client):
         self.supabase = supabase_client
+        self.rpc_habilitado = get_settings().orcamento_rpc_habilitado
     
     async def get_regras_comissao(self, loja_id: str, tipo: str) -> pd.DataFrame:
         """
@@ -36,17 +56,24 @@ class OrcamentoRepository:
             
         Colunas do DataFrame retornado:
         - id, loja_id, tipo_comissao, valor_minimo, valor_maximo, percentual, ordem
+        
+        Cache: regras ficam em memória por (loja_id, tipo) até o TTL ou até
+        invalidar_cache_loja() ser chamado pelo módulo de configurações.
         """
+        chave_cache = (str(loja_id), tipo)
+        regras_em_cache = regras_comissao_cache.get(chave_cache)
+        if regras_em_cache is not None:
+            return regras_em_cache.copy()
+        
         try:
             # Query Supabase com filtros e ordenação
-            result = (
+            result = await execute_async(
                 self.supabase
                 .table('config_regras_comissao_faixa')
                 .select('*')
                 .eq('loja_id', loja_id)
                 .eq('tipo_comissao', tipo)
                 .order('ordem')
-                .execute()
             )
             
             if result.data:
@@ -63,15 +90,56 @@ class OrcamentoRepository:
                 df = df.sort_values('ordem').reset_index(drop=True)
                 
                 logger.debug(f"Regras de comissão carregadas: {len(df)} faixas para {tipo} na loja {loja_id}")
-                return df
             else:
                 logger.warning(f"Nenhuma regra de comissão encontrada para loja {loja_id}, tipo {tipo}")
-                return pd.DataFrame()
+                df = pd.DataFrame()
+            
+            regras_comissao_cache.set(chave_cache, df)
+            return df.copy()
                 
         except Exception as e:
             logger.error(f"Erro ao buscar regras de comissão para loja {loja_id}, tipo {tipo}: {str(e)}")
             raise Exception(f"Erro ao buscar regras de comissão: {str(e)}")
 
+    async def get_tabela_comissao(self, loja_id: str, tipo: str) -> TabelaComissao:
+        """
+        Busca regras de comissão e retorna a tabela de faixas compilada (NumPy)
+        
+        A tabela compilada fica em cache por (loja_id, tipo), com a mesma
+        invalidação das regras de comissão.
+        
+        Args:
+            loja_id (str): ID da loja
+            tipo (str): Tipo de comissão ('VENDEDOR' ou 'GERENTE')
+            
+        Returns:
+            TabelaComissao: Tabela pronta para calcular() / calcular_lote()
+        """
+        chave_cache = (str(loja_id), tipo)
+        tabela = tabelas_comissao_cache.get(chave_cache)
+        
+        if tabela is None:
+            regras_df = await self.get_regras_comissao(loja_id, tipo)
+            tabela = TabelaComissao.from_dataframe(regras_df)
+            tabelas_comissao_cache.set(chave_cache, tabela)
+            logger.debug(f"Tabela de comissão compilada: {len(tabela)} faixas para {tipo} na loja {loja_id}")
+        
+        return tabela
+
+    async def get_contexto_calculo(self, loja_id: str) -> ContextoCalculo:
+        """
+        Busca config da loja e tabelas de comissão (VENDEDOR e GERENTE) em paralelo
+
+        As três leituras são independentes: com cache frio custam um round trip
+        em vez de três.
+        """
+        config, tabela_vendedor, tabela_gerente = await asyncio.gather(
+            self.get_config_loja(loja_id),
+            self.get_tabela_comissao(loja_id, 'VENDEDOR'),
+            self.get_tabela_comissao(loja_id, 'GERENTE')
+        )
+        return ContextoCalculo(config=config, tabela_vendedor=tabela_vendedor, tabela_gerente=tabela_gerente)
+
     async def get_config_loja(self, loja_id: str) -> Dict[str, Any]:
         """
         Busca configurações de uma loja. Se não existir, cria automaticamente com valores padrão.
@@ -86,23 +154,29 @@ class OrcamentoRepository:
         Raises:
             Exception: Em caso de erro na consulta/criação
         """
+        config_em_cache = config_loja_cache.get(str(loja_id))
+        if config_em_cache is not None:
+            return dict(config_em_cache)
+        
         try:
             # Tentar buscar configuração existente
-            result = (
+            result = await execute_async(
                 self.supabase
                 .table('config_loja')
                 .select('*')
                 .eq('loja_id', loja_id)
-                .execute()
             )
             
             if result.data:
                 logger.debug(f"Config encontrada para loja {loja_id}")
-                return result.data[0]
+                config = result.data[0]
             else:
                 # Config não existe - criar automaticamente com valores padrão
                 logger.info(f"Config não encontrada para loja {loja_id}, criando automaticamente")
-                return await self._criar_config_padrao(loja_id)
+                config = await self._criar_config_padrao(loja_id)
+            
+            config_loja_cache.set(str(loja_id), config)
+            return dict(config)
                 
         except Exception as e:
             logger.error(f"Erro ao buscar/criar configuração da loja {loja_id}: {str(e)}")
@@ -130,11 +204,10 @@ class OrcamentoRepository:
             
             # Tentar inserir (pode falhar se outro processo criou simultaneamente)
             try:
-                insert_result = (
+                insert_result = await execute_async(
                     self.supabase
                     .table('config_loja')
                     .insert(config_padrao)
-                    .execute()
                 )
                 
                 logger.info(f"Config padrão criada para loja {loja_id}")
@@ -144,12 +217,11 @@ class OrcamentoRepository:
                 # Se falhou na inserção, pode ser concorrência - tentar buscar novamente
                 logger.warning(f"Falha na inserção (provável concorrência), tentando buscar novamente: {str(insert_error)}")
                 
-                result = (
+                result = await execute_async(
                     self.supabase
                     .table('config_loja')
                     .select('*')
                     .eq('loja_id', loja_id)
-                    .execute()
                 )
                 
                 if result.data:
@@ -163,6 +235,180 @@ class OrcamentoRepository:
             logger.error(f"Erro ao criar configuração padrão para loja {loja_id}: {str(e)}")
             raise Exception(f"Erro ao criar configuração padrão: {str(e)}")
 
+    async def criar_orcamento_atomico(
+        self,
+        orcamento: Dict[str, Any],
+        ambiente_ids: List[str],
+        custos_adicionais: List[Dict[str, Any]],
+        numeracao: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """
+        Grava cabeçalho, vínculos com ambientes e custos adicionais em uma transação
+
+        Uma única chamada à função public.criar_orcamento_atomico (migrations
+        20261018050000 e 20261018140000): ou tudo é gravado, ou nada. Sem
+        'numero' no orçamento, a função reserva o próximo número da loja na
+        mesma transação e o monta com `numeracao`.
+
+        Args:
+            orcamento: Colunas de c_orcamentos
+            ambiente_ids: Ambientes vinculados (incluido = true)
+            custos_adicionais: [{'descricao_custo': str, 'valor_custo': float}]
+            numeracao: Saída de numeracao.molde_numero (prefixo, sufixo, digitos)
+
+        Returns:
+            Dict[str, Any]: Linha de c_orcamentos + 'custos_adicionais' com os ids gerados
+        """
+        try:
+            result = await execute_async(
+                self.supabase.rpc('criar_orcamento_atomico', {
+                    'p_orcamento': orcamento,
+                    'p_ambiente_ids': [str(ambiente_id) for ambiente_id in ambiente_ids],
+                    'p_custos_adicionais': custos_adicionais,
+                    'p_numeracao': numeracao
+                })
+            )
+
+            criado = result.data[0] if isinstance(result.data, list) and result.data else result.data
+            if not criado:
+                raise Exception("RPC não retornou o orçamento criado")
+
+            return criado
+
+        except Exception as e:
+            logger.error(f"Erro ao criar orçamento (rpc): {str(e)}")
+            raise Exception(f"Erro ao criar orçamento: {str(e)}")
+
+    async def aplicar_recalculo_lote(self, loja_id: str, registros: List[Dict[str, Any]]) -> List[str]:
+        """
+        Grava custos/margem recalculados de um lote em uma chamada (update por id)
+
+        Função public.aplicar_recalculo_orcamentos (migration 20261018120000): só
+        as colunas recalculadas, e só nas linhas cujo updated_at ainda é o lido
+        pelo job (edições feitas durante o recálculo não são desfeitas).
+
+        Args:
+            registros: id, updated_at lido e colunas recalculadas
+
+        Returns:
+            List[str]: IDs efetivamente gravados
+        """
+        try:
+            result = await execute_async(
+                self.supabase.rpc('aplicar_recalculo_orcamentos', {
+                    'p_loja_id': str(loja_id),
+                    'p_orcamentos': registros
+                })
+            )
+
+            return [linha['id'] for linha in result.data or []]
+
+        except Exception as e:
+            logger.error(f"Erro ao gravar recálculo da loja {loja_id}: {str(e)}")
+            raise Exception(f"Erro ao gravar recálculo: {str(e)}")
+
+    async def reservar_numeros_orcamento(self, loja_id: str, quantidade: int = 1) -> int:
+        """
+        Reserva `quantidade` números consecutivos da loja (incremento atômico no banco)
+
+        Com ORCAMENTO_RPC_HABILITADO=false a função reservar_numeros_orcamento
+        pode não existir: usa a troca condicional em config_loja (sem RPC).
+
+        Returns:
+            int: Primeiro número do intervalo reservado
+        """
+        if not self.rpc_habilitado:
+            return await self._reservar_numeros_sem_rpc(loja_id, quantidade)
+
+        try:
+            result = await execute_async(
+                self.supabase.rpc('reservar_numeros_orcamento', {
+                    'p_loja_id': str(loja_id),
+                    'p_quantidade': quantidade
+                })
+            )
+
+            inicio = result.data[0] if isinstance(result.data, list) and result.data else result.data
+            if inicio is None:
+                raise Exception(f"config_loja não encontrada para loja {loja_id}")
+
+            return int(inicio)
+
+        except Exception as e:
+            logger.error(f"Erro ao reservar numeração da loja {loja_id}: {str(e)}")
+            raise Exception(f"Erro ao reservar numeração: {str(e)}")
+
+    async def _reservar_numeros_sem_rpc(self, loja_id: str, quantidade: int = 1, tentativas: int = 5) -> int:
+        """
+        Reserva números só com select + update condicional em config_loja
+
+        O update só grava se proximo_numero_orcamento ainda for o valor lido
+        (compare-and-set): duas reservas simultâneas nunca recebem o mesmo
+        intervalo, a perdedora lê de novo. A linha da loja fica bloqueada só
+        durante o update.
+
+        Returns:
+            int: Primeiro número do intervalo reservado
+        """
+        try:
+            for _ in range(tentativas):
+                lido = await execute_async(
+                    self.supabase
+                    .table('config_loja')
+                    .select('proximo_numero_orcamento, numero_inicial_orcamento')
+                    .eq('loja_id', loja_id)
+                )
+                if not lido.data:
+                    raise Exception(f"config_loja não encontrada para loja {loja_id}")
+
+                atual = lido.data[0].get('proximo_numero_orcamento')
+                inicio = int(atual or lido.data[0].get('numero_inicial_orcamento') or 1)
+
+                query = (
+                    self.supabase
+                    .table('config_loja')
+                    .update({'proximo_numero_orcamento': inicio + quantidade})
+                    .eq('loja_id', loja_id)
+                )
+                query = query.eq('proximo_numero_orcamento', atual) if atual is not None else query.is_('proximo_numero_orcamento', 'null')
+                gravado = await execute_async(query)
+                if gravado.data:
+                    return inicio
+
+                logger.debug(f"Numeração da loja {loja_id} alterada por outra requisição - lendo de novo")
+
+            raise Exception(f"numeração da loja {loja_id} em disputa após {tentativas} tentativas")
+
+        except Exception as e:
+            logger.error(f"Erro ao reservar numeração da loja {loja_id}: {str(e)}")
+            raise Exception(f"Erro ao reservar numeração: {str(e)}")
+
+    async def reconstruir_agregados(self, loja_id: Optional[str] = None) -> int:
+        """
+        Recalcula os agregados diários a partir de c_orcamentos
+
+        Requer cliente com chave de serviço (a função não é liberada para authenticated).
+
+        Args:
+            loja_id: Loja a reconstruir (None = todas)
+
+        Returns:
+            int: Linhas de agregados gravadas
+        """
+        try:
+            result = await execute_async(
+                self.supabase.rpc('reconstruir_agregados_orcamentos', {
+                    'p_loja_id': str(loja_id) if loja_id else None
+                })
+            )
+
+            linhas = result.data[0] if isinstance(result.data, list) and result.data else result.data
+            return int(linhas or 0)
+
+        except Exception as e:
+            logger.error(f"Erro ao reconstruir agregados do dashboard: {str(e)}")
+            raise Exception(f"Erro ao reconstruir agregados do dashboard: {str(e)}")
+
 
 # Função auxiliar para compatibilidade com código existente
 async def repo_list_orcamentos():
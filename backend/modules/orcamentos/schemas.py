@@ -96,6 +96,37 @@ class SolicitacaoAprovacao(BaseModel):
     justificativa: str = Field(..., min_length=10, max_length=500, description="Justificativa para o desconto")
 
 
+class VarianteSimulacao(BaseModel):
+    """Variação de custos testada com todos os descontos da simulação"""
+    descricao: Optional[str] = Field(None, max_length=100, description="Identificação da variante")
+    custo_montador: Decimal = Field(default=0, ge=0, description="Custo do montador")
+    custos_adicionais: Decimal = Field(default=0, ge=0, description="Total de custos adicionais")
+    valor_frete_percentual: Optional[Decimal] = Field(None, ge=0, le=1, description="Frete sobre o valor final (vazio = config da loja)")
+    custo_medidor: Optional[Decimal] = Field(None, ge=0, description="Custo do medidor (vazio = config da loja)")
+
+
+class SimulacaoOrcamento(BaseModel):
+    """Schema para simular descontos sem gravar (POST /orcamentos/simular)"""
+    ambiente_ids: Optional[List[uuid.UUID]] = Field(None, min_items=1, description="Ambientes do orçamento (alternativa a valor_ambientes)")
+    valor_ambientes: Optional[Decimal] = Field(None, gt=0, description="Valor dos ambientes antes do desconto")
+    descontos: List[Decimal] = Field(..., min_items=1, max_items=500, description="Descontos candidatos em % (0 a 100)")
+    variantes: List[VarianteSimulacao] = Field(default=[], max_items=20, description="Variações de custo (vazio = custos padrão)")
+    
+    @validator('descontos', each_item=True)
+    def validar_desconto(cls, v):
+        """Cada desconto deve estar entre 0 e 100%"""
+        if v < 0 or v > 100:
+            raise ValueError("Descontos devem estar entre 0 e 100")
+        return v
+    
+    @validator('valor_ambientes', always=True)
+    def validar_contexto(cls, v, values):
+        """Exige o valor dos ambientes ou os ambientes para buscá-lo"""
+        if v is None and not values.get('ambiente_ids'):
+            raise ValueError("Informe valor_ambientes ou ambiente_ids")
+        return v
+
+
 # ===== SCHEMAS DE SAÍDA (RESPONSE) =====
 
 class AmbienteResumo(BaseModel):
@@ -139,6 +170,10 @@ class OrcamentoResponse(BaseModel):
     vendedor_id: uuid.UUID
     status_id: Optional[uuid.UUID]
     
+    # Dados relacionados (vêm no mesmo select embutido)
+    status_nome: Optional[str] = None
+    cliente_nome: Optional[str] = None
+    
     # Dados financeiros básicos (sempre visíveis)
     resumo_financeiro: ResumoFinanceiro
     
@@ -179,6 +214,12 @@ class OrcamentoListItem(BaseModel):
         from_attributes = True
 
 
+class OrcamentoPagina(BaseModel):
+    """Página de orçamentos no modo cursor (keyset)"""
+    items: List[OrcamentoListItem]
+    next_cursor: Optional[str] = None  # None = última página
+
+
 class CalculoCustos(BaseModel):
     """Schema para retorno do cálculo de custos"""
     valor_ambientes: Decimal
@@ -200,6 +241,32 @@ class CalculoCustos(BaseModel):
     detalhes_calculo: Dict[str, Any]
 
 
+class CenarioSimulado(BaseModel):
+    """Resultado de um cenário da simulação (custos e margem apenas para Admin Master)"""
+    desconto_percentual: Decimal
+    variante: int
+    valor_final: Decimal
+    necessita_aprovacao: bool
+    nivel_aprovacao: Optional[str] = None
+    
+    custo_fabrica: Optional[Decimal] = None
+    comissao_vendedor: Optional[Decimal] = None
+    comissao_gerente: Optional[Decimal] = None
+    custo_medidor: Optional[Decimal] = None
+    custo_frete: Optional[Decimal] = None
+    custo_montador: Optional[Decimal] = None
+    total_custos_adicionais: Optional[Decimal] = None
+    margem_lucro: Optional[Decimal] = None
+    percentual_margem: Optional[Decimal] = None
+
+
+class SimulacaoResponse(BaseModel):
+    """Todos os cenários de uma simulação, na ordem desconto → variante"""
+    valor_ambientes: Decimal
+    cenarios: List[CenarioSimulado]
+    tempo_calculo_ms: float
+
+
 class AprovacaoResponse(BaseModel):
     """Schema para resposta de aprovação"""
     id: uuid.UUID
@@ -255,3 +322,41 @@ class RelatorioMargem(BaseModel):
     
     class Config:
         from_attributes = True
+
+
+class AgregadoMargem(BaseModel):
+    """Agregado de orçamentos por vendedor, status ou período (custos e margem apenas para Admin Master)"""
+    chave: Optional[str]
+    nome: Optional[str] = None
+    quantidade: int
+    valor_venda: Decimal
+    ticket_medio: Decimal
+    aguardando_aprovacao: int
+    custo_total: Optional[Decimal] = None
+    margem_lucro: Optional[Decimal] = None
+    percentual_margem: Optional[Decimal] = None
+
+
+class RelatorioMargemResponse(BaseModel):
+    """Relatório de margem: agregados do período + página do detalhamento por orçamento"""
+    data_inicio: Optional[datetime]
+    data_fim: Optional[datetime]
+    agrupamento: str
+    total: Optional[AgregadoMargem]
+    por_vendedor: List[AgregadoMargem]
+    por_status: List[AgregadoMargem]
+    por_periodo: List[AgregadoMargem]
+    orcamentos: List[RelatorioMargem]
+    total_orcamentos: int
+    tempo_calculo_ms: float
+
+
+class MetricasDashboard(BaseModel):
+    """Métricas do dashboard no escopo do perfil"""
+    periodo_dias: int
+    agrupamento: str
+    total: Optional[AgregadoMargem]
+    por_vendedor: List[AgregadoMargem]
+    por_status: List[AgregadoMargem]
+    por_periodo: List[AgregadoMargem]
+    tempo_calculo_ms: float
@@ -1,19 +1,60 @@
 # Business logic helpers for orcamentos
 
+import asyncio
 import pandas as pd
 import numpy as np
 from typing import Dict, Any, List, Optional
 import logging
 from decimal import Decimal
-from datetime import datetime
+from datetime import datetime, timedelta
+import time
 import uuid
 
-from .repository import OrcamentoRepository
-from .schemas import OrcamentoCreate, OrcamentoUpdate, OrcamentoResponse, OrcamentoListItem, OrcamentoFilters
+from fastapi.responses import StreamingResponse
+
+from core.config import get_settings
+from core.database import execute_async
+from core.exceptions import ValidationException
+from core.pagination import aplicar_keyset, montar_pagina, percorrer_keyset
+from .agregados import carregar_agregados
+from .repository import ContextoCalculo, OrcamentoRepository
+from .engine_comissao import TabelaComissao
+from .exportacao import COLUNAS_LISTA_ORCAMENTOS, COLUNAS_RELATORIO_MARGEM, resposta_exportacao
+from .numeracao import formatar_numero, molde_numero, numerador_orcamentos
+from .relatorios import (
+    agrupamento_automatico, carregar_orcamentos, detalhar_orcamentos, escopo_relatorio, query_relatorio, resumo_margem
+)
+from .simulacao import calcular_cenarios
+from .schemas import (
+    OrcamentoCreate, OrcamentoUpdate, OrcamentoResponse, OrcamentoListItem, OrcamentoPagina, OrcamentoFilters,
+    SimulacaoOrcamento, SimulacaoResponse, CenarioSimulado, VarianteSimulacao,
+    RelatorioMargemResponse, MetricasDashboard
+)
 
 # Configurar logger
 logger = logging.getLogger(__name__)
 
+# Detalhe do orçamento em um único round trip: orçamento + status + cliente + ambientes + custos
+SELECT_ORCAMENTO_DETALHE = '''
+    *,
+    status:config_status_orcamento(nome_status),
+    cliente:c_clientes(nome),
+    ambientes:c_orcamento_ambientes(
+        incluido,
+        c_ambientes(
+            id,
+            nome_ambiente,
+            valor_total,
+            linha_produto
+        )
+    ),
+    custos_adicionais:c_orcamento_custos_adicionais(
+        id,
+        descricao_custo,
+        valor_custo
+    )
+'''
+
 
 class OrcamentoService:
     """
@@ -26,6 +67,7 @@ class OrcamentoService:
     def __init__(self, supabase_client):
         self.repository = OrcamentoRepository(supabase_client)
         self.supabase = supabase_client
+        self.settings = get_settings()
     
     # ===== MÉTODOS CRUD BÁSICOS (conectar com Controllers) =====
 
@@ -42,12 +84,18 @@ class OrcamentoService:
         """
         try:
             loja_id = current_user['loja_id']
-            vendedor_id = current_user['id']
+            vendedor_id = current_user['user_id']
             
             logger.info(f"Criando orçamento para cliente {orcamento_data.cliente_id} na loja {loja_id}")
             
-            # 1. Buscar ambientes e calcular valor base
-            valor_ambientes = await self._calcular_valor_ambientes(orcamento_data.ambiente_ids, loja_id)
+            # 1. Leituras independentes em paralelo: ambientes, config + tabelas de comissão, status padrão, cliente
+            ambientes, contexto, status_padrao, cliente = await asyncio.gather(
+                self._get_ambientes_selecionados(orcamento_data.ambiente_ids, loja_id),
+                self.repository.get_contexto_calculo(loja_id),
+                self._get_status_padrao(loja_id),
+                self._get_cliente(orcamento_data.cliente_id, loja_id)
+            )
+            valor_ambientes = sum(float(ambiente['valor_total']) for ambiente in ambientes)
             
             # 2. Calcular valor final com desconto
             desconto_decimal = float(orcamento_data.desconto_percentual) / 100
@@ -62,16 +110,19 @@ class OrcamentoService:
                 'custos_adicionais': [dict(item) for item in orcamento_data.custos_adicionais] if orcamento_data.custos_adicionais else []
             }
             
-            # 4. Calcular orçamento completo
-            calculo_completo = await self.criar_orcamento_completo(dados_calculo)
-            
-            # 5. Gerar numeração automática
-            numero = await self._gerar_numero_orcamento(loja_id)
+            # 4. Calcular orçamento completo (sem novas leituras)
+            calculo_completo = await self.criar_orcamento_completo(dados_calculo, contexto)
             
-            # 6. Buscar status padrão
-            status_padrao = await self._get_status_padrao(loja_id)
+            # 5. Numeração: com o RPC e sem blocos, o número é reservado na própria
+            #    transação da gravação (passo 7), sem round trip nem lacuna
+            numeracao = None
+            if self.settings.orcamento_rpc_habilitado and self.settings.numeracao_bloco_tamanho <= 1:
+                numero = None
+                numeracao = molde_numero(contexto.config)
+            else:
+                numero = await self._gerar_numero_orcamento(loja_id, contexto.config)
             
-            # 7. Preparar dados para inserção
+            # 6. Preparar dados para inserção
             orcamento_db = {
                 'numero': numero,
                 'cliente_id': str(orcamento_data.cliente_id),
@@ -97,31 +148,33 @@ class OrcamentoService:
                 'observacoes': orcamento_data.observacoes
             }
             
-            # 8. Inserir orçamento
-            orcamento_result = (
-                self.supabase
-                .table('c_orcamentos')
-                .insert(orcamento_db)
-                .execute()
-            )
-            
-            if not orcamento_result.data:
-                raise Exception("Erro ao inserir orçamento")
-                
-            orcamento_criado = orcamento_result.data[0]
-            orcamento_id = orcamento_criado['id']
-            
-            # 9. Inserir relacionamentos com ambientes
-            await self._inserir_ambientes_orcamento(orcamento_id, orcamento_data.ambiente_ids)
+            custos_db = [
+                {'descricao_custo': custo.descricao_custo, 'valor_custo': float(custo.valor_custo)}
+                for custo in orcamento_data.custos_adicionais or []
+            ]
             
-            # 10. Inserir custos adicionais se existirem
-            if orcamento_data.custos_adicionais:
-                await self._inserir_custos_adicionais(orcamento_id, orcamento_data.custos_adicionais)
+            # 7. Gravar cabeçalho, ambientes e custos adicionais
+            if self.settings.orcamento_rpc_habilitado:
+                # Uma transação, um round trip: falha não deixa cabeçalho órfão
+                orcamento_criado = await self.repository.criar_orcamento_atomico(
+                    orcamento_db, orcamento_data.ambiente_ids, custos_db, numeracao
+                )
+                custos_adicionais = orcamento_criado.pop('custos_adicionais', None) or []
+            else:
+                orcamento_criado, custos_adicionais = await self._inserir_orcamento_sequencial(
+                    orcamento_db, orcamento_data.ambiente_ids, custos_db
+                )
             
-            logger.info(f"Orçamento {numero} criado com sucesso: R$ {valor_final:,.2f}")
+            logger.info(f"Orçamento {orcamento_criado['numero']} criado com sucesso: R$ {valor_final:,.2f}")
             
-            # 11. Retornar orçamento completo
-            return await self.obter_orcamento(orcamento_id, current_user)
+            # 8. Montar resposta com os dados já em mãos (sem reler do banco)
+            orcamento_criado.update({
+                'ambientes': ambientes,
+                'custos_adicionais': custos_adicionais,
+                'status_nome': status_padrao.get('nome_status'),
+                'cliente_nome': cliente.get('nome')
+            })
+            return self._montar_orcamento_response(orcamento_criado, current_user['perfil'])
             
         except Exception as e:
             logger.error(f"Erro ao criar orçamento: {str(e)}")
@@ -141,158 +194,120 @@ class OrcamentoService:
             List[OrcamentoListItem]: Lista de orçamentos
         """
         try:
-            loja_id = current_user['loja_id']
-            perfil = current_user['perfil']
-            user_id = current_user['id']
-            
-            # Construir query base
-            query = (
-                self.supabase
-                .table('c_orcamentos')
-                .select('''
-                    id,
-                    numero,
-                    valor_final,
-                    necessita_aprovacao,
-                    created_at,
-                    c_clientes!inner(nome),
-                    config_status_orcamento!inner(nome_status),
-                    cad_equipe!inner(nome)
-                ''')
-                .eq('loja_id', loja_id)
-            )
-            
-            # Aplicar filtro por perfil
-            if perfil == 'VENDEDOR':
-                query = query.eq('vendedor_id', user_id)
-            # GERENTE e ADMIN_MASTER veem todos da loja
-            
-            # Aplicar filtros opcionais
-            if filters.vendedor_id:
-                query = query.eq('vendedor_id', str(filters.vendedor_id))
-            
-            if filters.status_id:
-                query = query.eq('status_id', str(filters.status_id))
-                
-            if filters.necessita_aprovacao is not None:
-                query = query.eq('necessita_aprovacao', filters.necessita_aprovacao)
-                
-            if filters.valor_minimo:
-                query = query.gte('valor_final', float(filters.valor_minimo))
-                
-            if filters.valor_maximo:
-                query = query.lte('valor_final', float(filters.valor_maximo))
-            
             # Executar query com paginação
-            result = (
-                query
+            result = await execute_async(
+                self._query_listagem(filters, current_user)
                 .order('created_at', desc=True)
                 .range(skip, skip + limit - 1)
-                .execute()
             )
             
-            # Converter para OrcamentoListItem
-            orcamentos = []
-            for item in result.data:
-                orcamento_item = OrcamentoListItem(
-                    id=item['id'],
-                    numero=item['numero'],
-                    cliente_nome=item['c_clientes']['nome'],
-                    valor_final=item['valor_final'],
-                    status_nome=item['config_status_orcamento']['nome_status'],
-                    necessita_aprovacao=item['necessita_aprovacao'],
-                    vendedor_nome=item['cad_equipe']['nome'],
-                    created_at=item['created_at']
-                )
-                orcamentos.append(orcamento_item)
+            orcamentos = [self._converter_item_lista(item) for item in result.data]
             
-            logger.debug(f"Listados {len(orcamentos)} orçamentos para {perfil} na loja {loja_id}")
+            logger.debug(f"Listados {len(orcamentos)} orçamentos para {current_user['perfil']} na loja {current_user['loja_id']}")
             return orcamentos
             
         except Exception as e:
             logger.error(f"Erro ao listar orçamentos: {str(e)}")
             raise Exception(f"Erro ao listar orçamentos: {str(e)}")
 
-    async def obter_orcamento(self, orcamento_id: str, current_user: Dict[str, Any]) -> OrcamentoResponse:
+    async def listar_orcamentos_cursor(self, filters: OrcamentoFilters, current_user: Dict[str, Any], cursor: Optional[str] = None, limit: int = 50) -> OrcamentoPagina:
         """
-        Obtém orçamento por ID com dados adaptados ao perfil do usuário
+        Lista orçamentos com paginação por cursor (created_at, id)
         
         Args:
-            orcamento_id: ID do orçamento
+            filters: Filtros aplicados
             current_user: Usuário logado
+            cursor: next_cursor da página anterior (vazio = primeira página)
+            limit: Tamanho da página
             
         Returns:
-            OrcamentoResponse: Orçamento completo
+            OrcamentoPagina: Itens da página e next_cursor (None na última página)
         """
         try:
-            loja_id = current_user['loja_id']
-            perfil = current_user['perfil']
-            
-            # Buscar orçamento base
-            result = (
-                self.supabase
-                .table('c_orcamentos')
-                .select('*')
-                .eq('id', orcamento_id)
-                .eq('loja_id', loja_id)  # RLS: só da mesma loja
-                .execute()
+            result = await execute_async(
+                aplicar_keyset(self._query_listagem(filters, current_user), cursor, limit)
             )
             
-            if not result.data:
-                raise Exception("Orçamento não encontrado")
-                
-            orcamento = result.data[0]
-            
-            # Verificar permissão por perfil
-            if perfil == 'VENDEDOR' and orcamento['vendedor_id'] != current_user['id']:
-                raise Exception("Acesso negado: vendedor só vê próprios orçamentos")
+            registros, next_cursor = montar_pagina(result.data, limit)
             
-            # Buscar ambientes relacionados
-            ambientes = await self._get_ambientes_orcamento(orcamento_id)
+            return OrcamentoPagina(
+                items=[self._converter_item_lista(item) for item in registros],
+                next_cursor=next_cursor
+            )
             
-            # Buscar custos adicionais
-            custos_adicionais = await self._get_custos_adicionais_orcamento(orcamento_id)
+        except Exception as e:
+            logger.error(f"Erro ao listar orçamentos: {str(e)}")
+            raise Exception(f"Erro ao listar orçamentos: {str(e)}")
+
+    def _query_listagem(self, filters: OrcamentoFilters, current_user: Dict[str, Any]):
+        """Query base da listagem com filtros de perfil e filtros opcionais (sem paginação)"""
+        # Construir query base
+        query = (
+            self.supabase
+            .table('c_orcamentos')
+            .select('''
+                id,
+                numero,
+                valor_final,
+                necessita_aprovacao,
+                created_at,
+                c_clientes!inner(nome),
+                config_status_orcamento!inner(nome_status),
+                cad_equipe!inner(nome)
+            ''')
+            .eq('loja_id', current_user['loja_id'])
+        )
+        
+        # Aplicar filtro por perfil
+        if current_user['perfil'] == 'VENDEDOR':
+            query = query.eq('vendedor_id', current_user['user_id'])
+        # GERENTE e ADMIN_MASTER veem todos da loja
+        
+        # Aplicar filtros opcionais
+        if filters.vendedor_id:
+            query = query.eq('vendedor_id', str(filters.vendedor_id))
+        
+        if filters.status_id:
+            query = query.eq('status_id', str(filters.status_id))
             
-            # Montar resumo financeiro (dados sensíveis apenas para Admin Master)
-            resumo_financeiro = {
-                'valor_ambientes': orcamento['valor_ambientes'],
-                'desconto_aplicado': orcamento['valor_ambientes'] * orcamento['desconto_percentual'],
-                'valor_final': orcamento['valor_final']
-            }
+        if filters.necessita_aprovacao is not None:
+            query = query.eq('necessita_aprovacao', filters.necessita_aprovacao)
             
-            # Admin Master vê custos e margem
-            if perfil == 'ADMIN_MASTER':
-                resumo_financeiro.update({
-                    'custo_fabrica': orcamento['custo_fabrica'],
-                    'comissao_vendedor': orcamento['comissao_vendedor'],
-                    'comissao_gerente': orcamento['comissao_gerente'],
-                    'custo_medidor': orcamento['custo_medidor'],
-                    'custo_montador': orcamento['custo_montador'],
-                    'custo_frete': orcamento['custo_frete'],
-                    'total_custos_adicionais': sum(c['valor_custo'] for c in custos_adicionais),
-                    'margem_lucro': orcamento['margem_lucro']
-                })
+        if filters.valor_minimo:
+            query = query.gte('valor_final', float(filters.valor_minimo))
             
-            # Montar response
-            orcamento_response = OrcamentoResponse(
-                id=orcamento['id'],
-                numero=orcamento['numero'],
-                cliente_id=orcamento['cliente_id'],
-                loja_id=orcamento['loja_id'],
-                vendedor_id=orcamento['vendedor_id'],
-                status_id=orcamento['status_id'],
-                resumo_financeiro=resumo_financeiro,
-                ambientes=ambientes,
-                custos_adicionais=custos_adicionais,
-                plano_pagamento=orcamento['plano_pagamento'],
-                necessita_aprovacao=orcamento['necessita_aprovacao'],
-                aprovador_id=orcamento.get('aprovador_id'),
-                observacoes=orcamento.get('observacoes'),
-                created_at=orcamento['created_at'],
-                updated_at=orcamento['updated_at']
-            )
+        if filters.valor_maximo:
+            query = query.lte('valor_final', float(filters.valor_maximo))
+        
+        return query
+
+    def _converter_item_lista(self, item: Dict[str, Any]) -> OrcamentoListItem:
+        """Converte linha da listagem em OrcamentoListItem"""
+        return OrcamentoListItem(
+            id=item['id'],
+            numero=item['numero'],
+            cliente_nome=item['c_clientes']['nome'],
+            valor_final=item['valor_final'],
+            status_nome=item['config_status_orcamento']['nome_status'],
+            necessita_aprovacao=item['necessita_aprovacao'],
+            vendedor_nome=item['cad_equipe']['nome'],
+            created_at=item['created_at']
+        )
+
+    async def obter_orcamento(self, orcamento_id: str, current_user: Dict[str, Any]) -> OrcamentoResponse:
+        """
+        Obtém orçamento por ID com dados adaptados ao perfil do usuário
+        
+        Args:
+            orcamento_id: ID do orçamento
+            current_user: Usuário logado
             
-            return orcamento_response
+        Returns:
+            OrcamentoResponse: Orçamento completo
+        """
+        try:
+            orcamento = await self._buscar_orcamento_detalhe(orcamento_id, current_user)
+            return self._montar_orcamento_response(orcamento, current_user['perfil'])
             
         except Exception as e:
             logger.error(f"Erro ao obter orçamento {orcamento_id}: {str(e)}")
@@ -312,7 +327,7 @@ class OrcamentoService:
         """
         try:
             # Verificar se orçamento existe e usuário tem permissão
-            orcamento_atual = await self.obter_orcamento(orcamento_id, current_user)
+            orcamento_atual = await self._buscar_orcamento_detalhe(orcamento_id, current_user)
             
             # Preparar dados de atualização
             dados_atualizacao = {}
@@ -320,16 +335,16 @@ class OrcamentoService:
             # Se há mudança de desconto, recalcular tudo
             if orcamento_data.desconto_percentual is not None:
                 novo_desconto = float(orcamento_data.desconto_percentual) / 100
-                valor_ambientes = orcamento_atual.resumo_financeiro.valor_ambientes
+                valor_ambientes = float(orcamento_atual['valor_ambientes'])
                 novo_valor_final = valor_ambientes * (1 - novo_desconto)
                 
-                # Recalcular todos os custos
+                # Recalcular todos os custos (custos adicionais já vieram no select do detalhe)
                 dados_calculo = {
                     'loja_id': current_user['loja_id'],
-                    'vendedor_id': orcamento_atual.vendedor_id,
+                    'vendedor_id': orcamento_atual['vendedor_id'],
                     'valor_ambientes': valor_ambientes,
                     'desconto_percentual': novo_desconto,
-                    'custos_adicionais': []  # TODO: carregar custos existentes se necessário
+                    'custos_adicionais': orcamento_atual['custos_adicionais']
                 }
                 
                 calculo_completo = await self.criar_orcamento_completo(dados_calculo)
@@ -365,21 +380,23 @@ class OrcamentoService:
             if dados_atualizacao:
                 dados_atualizacao['updated_at'] = datetime.utcnow().isoformat()
                 
-                update_result = (
+                update_result = await execute_async(
                     self.supabase
                     .table('c_orcamentos')
                     .update(dados_atualizacao)
                     .eq('id', orcamento_id)
-                    .execute()
                 )
                 
                 if not update_result.data:
                     raise Exception("Erro ao atualizar orçamento")
+                
+                # Relacionamentos não mudam aqui: mantém os já carregados
+                orcamento_atual.update(update_result.data[0])
             
             logger.info(f"Orçamento {orcamento_id} atualizado com sucesso")
             
-            # Retornar orçamento atualizado
-            return await self.obter_orcamento(orcamento_id, current_user)
+            # Retornar orçamento atualizado (sem reler do banco)
+            return self._montar_orcamento_response(orcamento_atual, current_user['perfil'])
             
         except Exception as e:
             logger.error(f"Erro ao atualizar orçamento {orcamento_id}: {str(e)}")
@@ -398,22 +415,21 @@ class OrcamentoService:
         """
         try:
             # Verificar se orçamento existe e usuário tem permissão
-            orcamento = await self.obter_orcamento(orcamento_id, current_user)
+            orcamento = await self._buscar_orcamento_detalhe(orcamento_id, current_user)
             
             # Verificar se pode ser excluído (apenas status Negociação)
             # TODO: implementar verificação de status quando necessário
             
             # Soft delete (marcar como excluído)
-            delete_result = (
+            delete_result = await execute_async(
                 self.supabase
                 .table('c_orcamentos')
                 .update({
                     'excluido': True,
                     'excluido_em': datetime.utcnow().isoformat(),
-                    'excluido_por': current_user['id']
+                    'excluido_por': current_user['user_id']
                 })
                 .eq('id', orcamento_id)
-                .execute()
             )
             
             logger.info(f"Orçamento {orcamento_id} excluído com sucesso")
@@ -425,33 +441,131 @@ class OrcamentoService:
 
     # ===== MÉTODOS AUXILIARES =====
 
-    async def _calcular_valor_ambientes(self, ambiente_ids: List[str], loja_id: str) -> float:
-        """Calcula valor total dos ambientes selecionados"""
+    async def _buscar_orcamento_detalhe(self, orcamento_id: str, current_user: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Busca orçamento com status, cliente, ambientes e custos em um único select embutido
+        
+        Returns:
+            Dict da linha de c_orcamentos com 'ambientes', 'custos_adicionais',
+            'status_nome' e 'cliente_nome' já achatados
+        """
+        result = await execute_async(
+            self.supabase
+            .table('c_orcamentos')
+            .select(SELECT_ORCAMENTO_DETALHE)
+            .eq('id', orcamento_id)
+            .eq('loja_id', current_user['loja_id'])  # RLS: só da mesma loja
+        )
+        
+        if not result.data:
+            raise Exception("Orçamento não encontrado")
+            
+        orcamento = result.data[0]
+        
+        # Verificar permissão por perfil
+        if current_user['perfil'] == 'VENDEDOR' and orcamento['vendedor_id'] != current_user['user_id']:
+            raise Exception("Acesso negado: vendedor só vê próprios orçamentos")
+        
+        status = orcamento.pop('status', None) or {}
+        cliente = orcamento.pop('cliente', None) or {}
+        
+        orcamento['status_nome'] = status.get('nome_status')
+        orcamento['cliente_nome'] = cliente.get('nome')
+        orcamento['ambientes'] = [
+            item['c_ambientes']
+            for item in orcamento.get('ambientes') or []
+            if item.get('incluido') and item.get('c_ambientes')
+        ]
+        orcamento['custos_adicionais'] = orcamento.get('custos_adicionais') or []
+        
+        return orcamento
+
+    def _montar_orcamento_response(self, orcamento: Dict[str, Any], perfil: str) -> OrcamentoResponse:
+        """Monta OrcamentoResponse a partir da linha do orçamento com relacionamentos"""
+        custos_adicionais = orcamento['custos_adicionais']
+        
+        # Montar resumo financeiro (dados sensíveis apenas para Admin Master)
+        resumo_financeiro = {
+            'valor_ambientes': orcamento['valor_ambientes'],
+            'desconto_aplicado': orcamento['valor_ambientes'] * orcamento['desconto_percentual'],
+            'valor_final': orcamento['valor_final']
+        }
+        
+        # Admin Master vê custos e margem
+        if perfil == 'ADMIN_MASTER':
+            resumo_financeiro.update({
+                'custo_fabrica': orcamento['custo_fabrica'],
+                'comissao_vendedor': orcamento['comissao_vendedor'],
+                'comissao_gerente': orcamento['comissao_gerente'],
+                'custo_medidor': orcamento['custo_medidor'],
+                'custo_montador': orcamento['custo_montador'],
+                'custo_frete': orcamento['custo_frete'],
+                'total_custos_adicionais': sum(c['valor_custo'] for c in custos_adicionais),
+                'margem_lucro': orcamento['margem_lucro']
+            })
+        
+        return OrcamentoResponse(
+            id=orcamento['id'],
+            numero=orcamento['numero'],
+            cliente_id=orcamento['cliente_id'],
+            loja_id=orcamento['loja_id'],
+            vendedor_id=orcamento['vendedor_id'],
+            status_id=orcamento['status_id'],
+            status_nome=orcamento.get('status_nome'),
+            cliente_nome=orcamento.get('cliente_nome'),
+            resumo_financeiro=resumo_financeiro,
+            ambientes=orcamento['ambientes'],
+            custos_adicionais=custos_adicionais,
+            plano_pagamento=orcamento['plano_pagamento'],
+            necessita_aprovacao=orcamento['necessita_aprovacao'],
+            aprovador_id=orcamento.get('aprovador_id'),
+            observacoes=orcamento.get('observacoes'),
+            created_at=orcamento['created_at'],
+            updated_at=orcamento['updated_at']
+        )
+
+    async def _get_ambientes_selecionados(self, ambiente_ids: List[str], loja_id: str) -> List[Dict]:
+        """Busca os ambientes selecionados (valor para o cálculo e dados para a resposta)"""
         try:
-            result = (
+            result = await execute_async(
                 self.supabase
                 .table('c_ambientes')
-                .select('valor_total')
+                .select('id, nome_ambiente, valor_total, linha_produto')
                 .in_('id', [str(id) for id in ambiente_ids])
                 .eq('loja_id', loja_id)
-                .execute()
             )
             
-            total = sum(float(item['valor_total']) for item in result.data)
-            logger.debug(f"Valor total dos ambientes: R$ {total:,.2f}")
-            return total
+            logger.debug(f"{len(result.data)} ambientes selecionados")
+            return result.data
+            
+        except Exception as e:
+            logger.error(f"Erro ao buscar ambientes selecionados: {str(e)}")
+            raise
+
+    async def _get_cliente(self, cliente_id, loja_id: str) -> Dict[str, Any]:
+        """Busca o nome do cliente para a resposta da criação (vazio se não encontrado)"""
+        try:
+            result = await execute_async(
+                self.supabase
+                .table('c_clientes')
+                .select('id, nome')
+                .eq('id', str(cliente_id))
+                .eq('loja_id', loja_id)
+            )
+            
+            return result.data[0] if result.data else {}
             
         except Exception as e:
-            logger.error(f"Erro ao calcular valor dos ambientes: {str(e)}")
+            logger.error(f"Erro ao buscar cliente {cliente_id}: {str(e)}")
             raise
 
-    async def _gerar_numero_orcamento(self, loja_id: str) -> str:
-        """Gera numeração automática para orçamento"""
+    async def _gerar_numero_orcamento(self, loja_id: str, config: Dict[str, Any]) -> str:
+        """Gera o número do orçamento pela sequência e formato da loja (ver numeracao.py)"""
         try:
-            # TODO: Implementar lógica de numeração automática baseada na config da loja
-            # Por enquanto, gerar número simples
-            import random
-            numero = f"ORC-{random.randint(1000, 9999)}"
+            sequencial = await numerador_orcamentos.proximo(
+                self.repository, loja_id, self.settings.numeracao_bloco_tamanho
+            )
+            numero = formatar_numero(sequencial, config)
             logger.debug(f"Número gerado: {numero}")
             return numero
             
@@ -462,13 +576,12 @@ class OrcamentoService:
     async def _get_status_padrao(self, loja_id: str) -> Dict[str, Any]:
         """Busca status padrão da loja"""
         try:
-            result = (
+            result = await execute_async(
                 self.supabase
                 .table('config_status_orcamento')
                 .select('*')
                 .eq('loja_id', loja_id)
                 .eq('is_default', True)
-                .execute()
             )
             
             if result.data:
@@ -484,11 +597,10 @@ class OrcamentoService:
                     'is_final': False
                 }
                 
-                insert_result = (
+                insert_result = await execute_async(
                     self.supabase
                     .table('config_status_orcamento')
                     .insert(status_padrao)
-                    .execute()
                 )
                 
                 return insert_result.data[0]
@@ -509,91 +621,139 @@ class OrcamentoService:
                 for ambiente_id in ambiente_ids
             ]
             
-            (
+            await execute_async(
                 self.supabase
                 .table('c_orcamento_ambientes')
                 .insert(relacionamentos)
-                .execute()
             )
             
         except Exception as e:
             logger.error(f"Erro ao inserir ambientes do orçamento: {str(e)}")
             raise
 
-    async def _inserir_custos_adicionais(self, orcamento_id: str, custos_adicionais: List):
-        """Insere custos adicionais do orçamento"""
+    async def _inserir_custos_adicionais(self, orcamento_id: str, custos_db: List[Dict[str, Any]]) -> List[Dict]:
+        """Insere custos adicionais do orçamento e retorna as linhas gravadas"""
         try:
-            custos_db = [
-                {
-                    'orcamento_id': orcamento_id,
-                    'descricao_custo': custo.descricao_custo,
-                    'valor_custo': float(custo.valor_custo)
-                }
-                for custo in custos_adicionais
-            ]
-            
-            (
+            result = await execute_async(
                 self.supabase
                 .table('c_orcamento_custos_adicionais')
-                .insert(custos_db)
-                .execute()
+                .insert([{'orcamento_id': orcamento_id, **custo} for custo in custos_db])
             )
             
+            return result.data
+            
         except Exception as e:
             logger.error(f"Erro ao inserir custos adicionais: {str(e)}")
             raise
 
-    async def _get_ambientes_orcamento(self, orcamento_id: str) -> List[Dict]:
-        """Busca ambientes relacionados ao orçamento"""
-        try:
-            result = (
-                self.supabase
-                .table('c_orcamento_ambientes')
-                .select('''
-                    c_ambientes!inner(
-                        id,
-                        nome_ambiente,
-                        valor_total,
-                        linha_produto
-                    )
-                ''')
-                .eq('orcamento_id', orcamento_id)
-                .eq('incluido', True)
-                .execute()
-            )
-            
-            ambientes = []
-            for item in result.data:
-                ambiente = item['c_ambientes']
-                ambientes.append({
-                    'id': ambiente['id'],
-                    'nome_ambiente': ambiente['nome_ambiente'],
-                    'valor_total': ambiente['valor_total'],
-                    'linha_produto': ambiente['linha_produto']
-                })
-            
-            return ambientes
+    async def _inserir_orcamento_sequencial(
+        self,
+        orcamento_db: Dict[str, Any],
+        ambiente_ids: List[str],
+        custos_db: List[Dict[str, Any]]
+    ):
+        """
+        Caminho sem a função criar_orcamento_atomico (ORCAMENTO_RPC_HABILITADO=false)
+
+        Três chamadas separadas, sem transação: uma falha depois do cabeçalho
+        deixa o orçamento sem ambientes/custos.
+        """
+        orcamento_result = await execute_async(
+            self.supabase
+            .table('c_orcamentos')
+            .insert(orcamento_db)
+        )
+        
+        if not orcamento_result.data:
+            raise Exception("Erro ao inserir orçamento")
             
-        except Exception as e:
-            logger.error(f"Erro ao buscar ambientes do orçamento: {str(e)}")
-            return []
+        orcamento_criado = orcamento_result.data[0]
+        await self._inserir_ambientes_orcamento(orcamento_criado['id'], ambiente_ids)
+        
+        custos_adicionais = []
+        if custos_db:
+            custos_adicionais = await self._inserir_custos_adicionais(orcamento_criado['id'], custos_db)
+        
+        return orcamento_criado, custos_adicionais
+
+    # ===== SIMULAÇÃO DE DESCONTOS =====
 
-    async def _get_custos_adicionais_orcamento(self, orcamento_id: str) -> List[Dict]:
-        """Busca custos adicionais do orçamento"""
+    async def simular_orcamento(self, simulacao: SimulacaoOrcamento, current_user: Dict[str, Any]) -> SimulacaoResponse:
+        """
+        Calcula margem, comissões e aprovação para vários descontos sem gravar nada
+        
+        Config e faixas vêm do cache da loja; com valor_ambientes informado a
+        simulação não faz nenhuma consulta (com ambiente_ids, uma em paralelo).
+        
+        Args:
+            simulacao: Descontos candidatos, variantes de custo e valor/ambientes
+            current_user: Usuário logado (loja_id, perfil)
+            
+        Returns:
+            SimulacaoResponse: Um cenário por desconto × variante
+        """
         try:
-            result = (
-                self.supabase
-                .table('c_orcamento_custos_adicionais')
-                .select('*')
-                .eq('orcamento_id', orcamento_id)
-                .execute()
+            loja_id = current_user['loja_id']
+            
+            if simulacao.valor_ambientes is not None:
+                contexto = await self.repository.get_contexto_calculo(loja_id)
+                valor_ambientes = float(simulacao.valor_ambientes)
+            else:
+                ambientes, contexto = await asyncio.gather(
+                    self._get_ambientes_selecionados(simulacao.ambiente_ids, loja_id),
+                    self.repository.get_contexto_calculo(loja_id)
+                )
+                valor_ambientes = sum(float(ambiente['valor_total']) for ambiente in ambientes)
+            
+            inicio = time.perf_counter()
+            variantes = simulacao.variantes or [VarianteSimulacao()]
+            config = contexto.config
+            cenarios = calcular_cenarios(
+                valor_ambientes,
+                [float(desconto) / 100 for desconto in simulacao.descontos],
+                contexto,
+                custo_montador=[float(v.custo_montador) for v in variantes],
+                custos_adicionais=[float(v.custos_adicionais) for v in variantes],
+                frete_percentual=[
+                    float(v.valor_frete_percentual if v.valor_frete_percentual is not None else config['valor_frete_percentual'])
+                    for v in variantes
+                ],
+                custo_medidor=[
+                    float(v.custo_medidor if v.custo_medidor is not None else config['valor_medidor_padrao'])
+                    for v in variantes
+                ]
             )
             
-            return result.data
+            # Custos e margem apenas para Admin Master (mesma regra do resumo financeiro)
+            campos = ['valor_final', 'necessita_aprovacao', 'nivel_aprovacao']
+            if current_user['perfil'] == 'ADMIN_MASTER':
+                campos += ['custo_fabrica', 'comissao_vendedor', 'comissao_gerente', 'custo_medidor',
+                           'custo_frete', 'custo_montador', 'margem_lucro', 'percentual_margem']
+            
+            colunas = {
+                campo: (np.round(cenarios[campo], 2) if cenarios[campo].dtype.kind == 'f' else cenarios[campo]).tolist()
+                for campo in campos
+            }
+            if current_user['perfil'] == 'ADMIN_MASTER':
+                colunas['total_custos_adicionais'] = cenarios['custos_adicionais'].tolist()
+            
+            descontos = [desconto for desconto in simulacao.descontos for _ in variantes]
+            resultado = [
+                CenarioSimulado(
+                    desconto_percentual=desconto,
+                    variante=indice % len(variantes),
+                    **{campo: valores[indice] for campo, valores in colunas.items()}
+                )
+                for indice, desconto in enumerate(descontos)
+            ]
+            tempo_ms = (time.perf_counter() - inicio) * 1000
+            
+            logger.debug(f"Simulação: {len(resultado)} cenários em {tempo_ms:.2f}ms")
+            return SimulacaoResponse(valor_ambientes=valor_ambientes, cenarios=resultado, tempo_calculo_ms=round(tempo_ms, 3))
             
         except Exception as e:
-            logger.error(f"Erro ao buscar custos adicionais: {str(e)}")
-            return []
+            logger.error(f"Erro ao simular orçamento: {str(e)}")
+            raise Exception(f"Erro ao simular orçamento: {str(e)}")
 
     # ===== MÉTODOS DE APROVAÇÃO (placeholder para conexão futura) =====
 
@@ -613,13 +773,165 @@ class OrcamentoService:
         """TODO: Implementar duplicação de orçamento"""
         return {"message": "Funcionalidade de duplicação em desenvolvimento"}
 
-    async def relatorio_margem(self, filtros, current_user: Dict[str, Any]):
-        """TODO: Implementar relatório de margem"""
-        return {"message": "Relatório de margem em desenvolvimento"}
+    async def relatorio_margem(
+        self,
+        data_inicio: Optional[str],
+        data_fim: Optional[str],
+        vendedor_id: Optional[str],
+        loja_id: Optional[str],
+        current_user: Dict[str, Any],
+        skip: int = 0,
+        limit: int = 100,
+        agrupamento: str = 'mes'
+    ) -> RelatorioMargemResponse:
+        """
+        Relatório de margem por vendedor, status e período + detalhamento paginado
+        
+        Args:
+            data_inicio / data_fim: Período (YYYY-MM-DD, fim inclusivo). Sem datas: últimos 12 meses
+            vendedor_id / loja_id: Filtros (loja_id apenas para Admin Master)
+            skip / limit: Página do detalhamento por orçamento
+            agrupamento: 'dia', 'semana' ou 'mes'
+        """
+        escopo = escopo_relatorio(current_user, loja_id, vendedor_id)
+        inicio_periodo, fim_periodo = self._periodo_relatorio(data_inicio, data_fim)
+        
+        try:
+            inicio = time.perf_counter()
+            frame = await carregar_orcamentos(
+                self.supabase, escopo, inicio_periodo, fim_periodo, self.settings.relatorio_tamanho_pagina
+            )
+            incluir_margem = current_user['perfil'] == 'ADMIN_MASTER'
+            resumo = resumo_margem(frame, agrupamento, incluir_margem)
+            tempo_ms = (time.perf_counter() - inicio) * 1000
+            
+            logger.info(f"📊 Relatório de margem: {len(frame)} orçamentos em {tempo_ms:.0f}ms")
+            return RelatorioMargemResponse(
+                data_inicio=inicio_periodo,
+                data_fim=fim_periodo,
+                agrupamento=agrupamento,
+                orcamentos=detalhar_orcamentos(frame, skip, limit) if incluir_margem else [],
+                total_orcamentos=len(frame),
+                tempo_calculo_ms=round(tempo_ms, 1),
+                **resumo
+            )
+            
+        except Exception as e:
+            logger.error(f"Erro ao gerar relatório de margem: {str(e)}")
+            raise Exception(f"Erro ao gerar relatório de margem: {str(e)}")
+
+    def exportar_orcamentos(self, filters: OrcamentoFilters, current_user: Dict[str, Any], formato: str = 'csv') -> StreamingResponse:
+        """
+        Lista de orçamentos (mesmos filtros e permissões da listagem) em CSV/XLSX
+        
+        As páginas (RELATORIO_TAMANHO_PAGINA linhas) são lidas por cursor e
+        enviadas conforme chegam; nada é montado em memória.
+        """
+        paginas = percorrer_keyset(
+            lambda: self._query_listagem(filters, current_user), self.settings.relatorio_tamanho_pagina
+        )
+        logger.info(f"📤 Exportação de orçamentos ({formato}) para {current_user['perfil']} na loja {current_user['loja_id']}")
+        return resposta_exportacao(formato, COLUNAS_LISTA_ORCAMENTOS, paginas, 'orcamentos', 'Orçamentos')
+
+    def exportar_relatorio_margem(
+        self,
+        data_inicio: Optional[str],
+        data_fim: Optional[str],
+        vendedor_id: Optional[str],
+        loja_id: Optional[str],
+        current_user: Dict[str, Any],
+        formato: str = 'csv'
+    ) -> StreamingResponse:
+        """
+        Detalhamento do relatório de margem (um orçamento por linha, com custos) em CSV/XLSX
+        
+        Mesmo escopo e período de relatorio_margem; escopo e datas são validados
+        antes do envio começar (erros ainda viram 400/403).
+        """
+        escopo = escopo_relatorio(current_user, loja_id, vendedor_id)
+        inicio_periodo, fim_periodo = self._periodo_relatorio(data_inicio, data_fim)
+        
+        paginas = percorrer_keyset(
+            lambda: query_relatorio(self.supabase, escopo, inicio_periodo, fim_periodo),
+            self.settings.relatorio_tamanho_pagina
+        )
+        logger.info(f"📤 Exportação do relatório de margem ({formato}), loja {escopo['loja_id'] or 'todas'}")
+        return resposta_exportacao(formato, COLUNAS_RELATORIO_MARGEM, paginas, 'relatorio_margem', 'Margem')
+
+    async def metricas_dashboard(self, periodo_dias: int, current_user: Dict[str, Any]) -> MetricasDashboard:
+        """
+        Métricas do dashboard dos últimos `periodo_dias` no escopo do perfil
+        
+        Vendedor: próprias; Gerente: loja; Admin Master: todas as lojas (com margem)
+        """
+        escopo = escopo_relatorio(current_user)
+        agrupamento = agrupamento_automatico(periodo_dias)
+        
+        try:
+            inicio = time.perf_counter()
+            inicio_periodo = datetime.utcnow() - timedelta(days=periodo_dias)
+            if self.settings.dashboard_agregados_habilitado:
+                # O(dias × vendedores × status) linhas já somadas
+                frame = await carregar_agregados(
+                    self.supabase, escopo, inicio_periodo, None, self.settings.relatorio_tamanho_pagina
+                )
+            else:
+                frame = await carregar_orcamentos(
+                    self.supabase, escopo, inicio_periodo, None, self.settings.relatorio_tamanho_pagina
+                )
+            resumo = resumo_margem(frame, agrupamento, current_user['perfil'] == 'ADMIN_MASTER')
+            tempo_ms = (time.perf_counter() - inicio) * 1000
+            
+            return MetricasDashboard(
+                periodo_dias=periodo_dias,
+                agrupamento=agrupamento,
+                tempo_calculo_ms=round(tempo_ms, 1),
+                **resumo
+            )
+            
+        except Exception as e:
+            logger.error(f"Erro ao calcular métricas do dashboard: {str(e)}")
+            raise Exception(f"Erro ao calcular métricas do dashboard: {str(e)}")
 
-    async def metricas_dashboard(self, periodo_dias: int, current_user: Dict[str, Any]):
-        """TODO: Implementar métricas do dashboard"""
-        return {"message": "Métricas do dashboard em desenvolvimento"}
+    async def reconstruir_agregados(self, loja_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Recalcula os agregados diários do dashboard a partir de c_orcamentos
+        
+        Os triggers de c_orcamentos mantêm os agregados; usar só para corrigir
+        divergências. Requer o cliente com chave de serviço.
+        
+        Args:
+            loja_id: Loja a reconstruir (None = todas)
+        """
+        try:
+            inicio = time.perf_counter()
+            linhas = await self.repository.reconstruir_agregados(loja_id)
+            tempo_ms = (time.perf_counter() - inicio) * 1000
+            
+            logger.info(f"📊 Agregados do dashboard reconstruídos: {linhas} linhas em {tempo_ms:.0f}ms")
+            return {
+                'loja_id': str(loja_id) if loja_id else None,
+                'linhas_agregadas': linhas,
+                'tempo_ms': round(tempo_ms, 1)
+            }
+            
+        except Exception as e:
+            logger.error(f"Erro ao reconstruir agregados do dashboard: {str(e)}")
+            raise Exception(f"Erro ao reconstruir agregados do dashboard: {str(e)}")
+
+    def _periodo_relatorio(self, data_inicio: Optional[str], data_fim: Optional[str]):
+        """Converte YYYY-MM-DD em [início, fim + 1 dia); sem datas, últimos 12 meses"""
+        try:
+            fim = datetime.strptime(data_fim, '%Y-%m-%d') + timedelta(days=1) if data_fim else None
+            inicio = datetime.strptime(data_inicio, '%Y-%m-%d') if data_inicio else None
+        except ValueError:
+            raise ValidationException("Datas devem estar no formato YYYY-MM-DD", field="data_inicio")
+        
+        if inicio is None and fim is None:
+            inicio = datetime.utcnow() - timedelta(days=365)
+        if inicio and fim and fim <= inicio:
+            raise ValidationException("Data fim deve ser posterior à data início", field="data_fim")
+        return inicio, fim
 
     async def listar_status_disponiveis(self, current_user: Dict[str, Any]):
         """TODO: Implementar listagem de status disponíveis"""
@@ -662,56 +974,30 @@ class OrcamentoService:
                 'faixa_aplicada': None
             }
         
-        logger.debug(f"🔧 CORREÇÃO: Cálculo por faixa única para valor: R$ {valor_venda:,.2f}")
-        
-        # Ordenar regras por valor mínimo para processar em ordem
-        regras_ordenadas = regras_df.sort_values('valor_minimo')
+        # Busca binária sobre a tabela compilada (substitui o iterrows por faixa)
+        resultado = TabelaComissao.from_dataframe(regras_df).calcular(valor_venda)
         
-        # Encontrar a faixa onde o valor se encaixa
-        faixa_aplicada = None
-        for idx, regra in regras_ordenadas.iterrows():
-            valor_min = float(regra['valor_minimo'])
-            valor_max = float(regra['valor_maximo']) if pd.notna(regra['valor_maximo']) else float('inf')
-            
-            # Verificar se valor está nesta faixa
-            if valor_min <= valor_venda <= valor_max:
-                faixa_aplicada = regra
-                break
-        
-        if faixa_aplicada is None:
+        if resultado['faixa_aplicada'] is None:
             logger.warning(f"Nenhuma faixa encontrada para valor R$ {valor_venda:,.2f}")
-            return {
-                'comissao_total': 0.0,
-                'detalhes_faixas': [],
-                'valor_total_processado': valor_venda,
-                'faixa_aplicada': None
-            }
-        
-        # Calcular comissão: percentual da faixa × valor total
-        percentual_faixa = float(faixa_aplicada['percentual'])
-        comissao_total = valor_venda * percentual_faixa
-        
-        # Detalhar para auditoria
-        detalhe_faixa = {
-            'faixa': int(faixa_aplicada['ordem']),
-            'valor_minimo': float(faixa_aplicada['valor_minimo']),
-            'valor_maximo': float(faixa_aplicada['valor_maximo']) if pd.notna(faixa_aplicada['valor_maximo']) else None,
-            'percentual': percentual_faixa,
-            'valor_total_aplicado': float(valor_venda),
-            'comissao_calculada': float(comissao_total)
-        }
-        
-        resultado = {
-            'comissao_total': float(comissao_total),
-            'detalhes_faixas': [detalhe_faixa],  # Sempre uma única faixa
-            'valor_total_processado': float(valor_venda),
-            'faixa_aplicada': int(faixa_aplicada['ordem'])
-        }
-        
-        logger.info(f"✅ Faixa {faixa_aplicada['ordem']}: R$ {valor_venda:,.2f} × {percentual_faixa:.1%} = R$ {comissao_total:,.2f}")
+        else:
+            logger.debug(f"✅ Faixa {resultado['faixa_aplicada']}: R$ {valor_venda:,.2f} = R$ {resultado['comissao_total']:,.2f}")
         
         return resultado
 
+    def calcular_comissao_faixa_unica_lote(self, valores_venda, regras_df: pd.DataFrame) -> Dict[str, np.ndarray]:
+        """
+        Versão vetorizada de calcular_comissao_faixa_unica_pandas para muitos valores
+        
+        Args:
+            valores_venda: Sequência/array de valores de venda
+            regras_df (pd.DataFrame): DataFrame com regras de comissão por faixa
+            
+        Returns:
+            Dict de arrays (comissao_total, percentual, faixa_aplicada, indice_faixa).
+            A auditoria de um item pode ser obtida com TabelaComissao.detalhar().
+        """
+        return TabelaComissao.from_dataframe(regras_df).calcular_lote(np.asarray(valores_venda, dtype=np.float64))
+
     # Manter método antigo por compatibilidade, mas redirecionar para o correto
     def calcular_comissao_progressiva_pandas(self, valor_venda: float, regras_df: pd.DataFrame) -> Dict[str, Any]:
         """
@@ -754,11 +1040,12 @@ class OrcamentoService:
             # Valor não se encaixa nesta faixa
             return 0.0, 0.0
 
-    async def calcular_orcamento_completo(self, dados_orcamento: Dict[str, Any]) -> Dict[str, Any]:
+    async def calcular_orcamento_completo(self, dados_orcamento: Dict[str, Any], contexto: Optional[ContextoCalculo] = None) -> Dict[str, Any]:
         """
         Calcula orçamento completo com todos os custos usando engine Pandas
         
         Args:
+            contexto: Config e tabelas de comissão já carregadas (busca se None)
             dados_orcamento: {
                 'loja_id': str,
                 'vendedor_id': str,
@@ -795,7 +1082,6 @@ class OrcamentoService:
         """
         try:
             loja_id = dados_orcamento['loja_id']
-            vendedor_id = dados_orcamento['vendedor_id']
             valor_ambientes = float(dados_orcamento['valor_ambientes'])
             desconto_percentual = float(dados_orcamento.get('desconto_percentual', 0.0))
             
@@ -804,16 +1090,16 @@ class OrcamentoService:
             
             logger.info(f"Iniciando cálculo completo: R$ {valor_ambientes:,.2f} → R$ {valor_final:,.2f} (desconto {desconto_percentual:.1%})")
             
-            # 1. Buscar configurações da loja usando Pandas
-            config = await self.repository.get_config_loja(loja_id)
+            # 1. Configurações da loja e tabelas de comissão (uma leitura paralela)
+            if contexto is None:
+                contexto = await self.repository.get_contexto_calculo(loja_id)
+            config = contexto.config
             
             # 2. Calcular todos os custos
-            custos = await self._calcular_todos_custos(
-                loja_id=loja_id,
-                vendedor_id=vendedor_id,
+            custos = self._calcular_todos_custos(
                 valor_ambientes=valor_ambientes,
                 valor_final=valor_final,
-                config=config,
+                contexto=contexto,
                 dados_orcamento=dados_orcamento
             )
             
@@ -848,21 +1134,22 @@ class OrcamentoService:
             logger.error(f"Erro no cálculo completo do orçamento: {str(e)}")
             raise Exception(f"Erro ao calcular orçamento: {str(e)}")
 
-    async def _calcular_todos_custos(
+    def _calcular_todos_custos(
         self, 
-        loja_id: str, 
-        vendedor_id: str,
         valor_ambientes: float,
         valor_final: float,
-        config: Dict[str, Any],
+        contexto: ContextoCalculo,
         dados_orcamento: Dict[str, Any]
     ) -> Dict[str, Any]:
         """
         Calcula todos os custos do orçamento usando engine Pandas
         
+        Puramente em memória: config e tabelas de comissão vêm do contexto.
+        
         Returns:
             Dict com custos detalhados e cálculos de comissão
         """
+        config = contexto.config
         custos_detalhes = {}
         
         # 1. Custo de fábrica (valor XML × deflator)
@@ -871,14 +1158,12 @@ class OrcamentoService:
         custos_detalhes['custo_fabrica'] = custo_fabrica
         logger.debug(f"Custo fábrica: R$ {valor_ambientes:,.2f} × {deflator:.1%} = R$ {custo_fabrica:,.2f}")
         
-        # 2. Comissão vendedor (progressiva com Pandas)
-        regras_vendedor_df = await self.repository.get_regras_comissao(loja_id, 'VENDEDOR')
-        comissao_vendedor_calc = self.calcular_comissao_faixa_unica_pandas(valor_final, regras_vendedor_df)
+        # 2. Comissão vendedor (faixa única, tabela compilada)
+        comissao_vendedor_calc = contexto.tabela_vendedor.calcular(valor_final)
         custos_detalhes['comissao_vendedor'] = comissao_vendedor_calc['comissao_total']
         
-        # 3. Comissão gerente (progressiva com Pandas) 
-        regras_gerente_df = await self.repository.get_regras_comissao(loja_id, 'GERENTE')
-        comissao_gerente_calc = self.calcular_comissao_faixa_unica_pandas(valor_final, regras_gerente_df)
+        # 3. Comissão gerente (faixa única, tabela compilada)
+        comissao_gerente_calc = contexto.tabela_gerente.calcular(valor_final)
         custos_detalhes['comissao_gerente'] = comissao_gerente_calc['comissao_total']
         
         # 4. Custo medidor
@@ -909,7 +1194,13 @@ class OrcamentoService:
             'detalhes_comissao_gerente': comissao_gerente_calc
         }
 
-    async def validar_limite_desconto(self, loja_id: str, vendedor_id: str, desconto_percentual: float) -> Dict[str, Any]:
+    async def validar_limite_desconto(
+        self,
+        loja_id: str,
+        vendedor_id: str,
+        desconto_percentual: float,
+        config: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
         """
         Valida se desconto está dentro dos limites configurados
         
@@ -917,12 +1208,14 @@ class OrcamentoService:
             loja_id: ID da loja
             vendedor_id: ID do vendedor
             desconto_percentual: Percentual de desconto (ex: 0.15 = 15%)
+            config: Configuração da loja já carregada (busca se None)
             
         Returns:
             Dict com validação e necessidade de aprovação
         """
         try:
-            config = await self.repository.get_config_loja(loja_id)
+            if config is None:
+                config = await self.repository.get_config_loja(loja_id)
             
             limite_vendedor = float(config['limite_desconto_vendedor'])
             limite_gerente = float(config['limite_desconto_gerente'])
@@ -954,26 +1247,31 @@ class OrcamentoService:
             logger.error(f"Erro ao validar limite de desconto: {str(e)}")
             raise Exception(f"Erro na validação de desconto: {str(e)}")
 
-    async def criar_orcamento_completo(self, dados: Dict[str, Any]) -> Dict[str, Any]:
+    async def criar_orcamento_completo(self, dados: Dict[str, Any], contexto: Optional[ContextoCalculo] = None) -> Dict[str, Any]:
         """
         Cria orçamento completo integrando cálculos e validações
         
         Args:
             dados: Dados completos do orçamento
+            contexto: Config e tabelas de comissão da requisição (busca uma vez se None)
             
         Returns:
             Dict com orçamento calculado e status de aprovação
         """
         try:
+            if contexto is None:
+                contexto = await self.repository.get_contexto_calculo(dados['loja_id'])
+            
             # 1. Validar desconto
             validacao_desconto = await self.validar_limite_desconto(
                 dados['loja_id'],
                 dados['vendedor_id'], 
-                dados.get('desconto_percentual', 0.0)
+                dados.get('desconto_percentual', 0.0),
+                config=contexto.config
             )
             
             # 2. Calcular orçamento completo
-            calculo = await self.calcular_orcamento_completo(dados)
+            calculo = await self.calcular_orcamento_completo(dados, contexto)
             
             # 3. Montar resposta final
             orcamento_completo = {
@@ -0,0 +1,112 @@
+"""
+Simulação de cenários de desconto ("e se") para um orçamento.
+
+O vendedor testa vários descontos e variações de custo antes de fechar. Em vez
+de um calcular_orcamento_completo por tentativa, todos os cenários são
+calculados de uma vez com NumPy sobre o ContextoCalculo da loja (config e
+faixas de comissão em cache), sem gravar nada.
+
+As regras são as mesmas de calcular_orcamento_completo/validar_limite_desconto;
+o teste de equivalência fica em tests/test_orcamentos.py.
+"""
+
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+from .repository import ContextoCalculo
+
+NIVEL_GERENTE = 'GERENTE'
+NIVEL_ADMIN_MASTER = 'ADMIN_MASTER'
+
+
+def calcular_cenarios(
+    valor_ambientes: float,
+    descontos: Sequence[float],
+    contexto: ContextoCalculo,
+    custo_montador: Sequence[float] = (0.0,),
+    custos_adicionais: Sequence[float] = (0.0,),
+    frete_percentual: Optional[Sequence[float]] = None,
+    custo_medidor: Optional[Sequence[float]] = None
+) -> Dict[str, np.ndarray]:
+    """
+    Calcula todas as combinações desconto × variante de custos
+
+    Args:
+        valor_ambientes: Valor dos ambientes (antes do desconto)
+        descontos: Descontos candidatos em fração (ex: 0.15 = 15%)
+        contexto: Config e tabelas de comissão da loja
+        custo_montador / custos_adicionais: Um valor por variante
+        frete_percentual / custo_medidor: Um valor por variante (None = config da loja)
+
+    Returns:
+        Dict de arrays com shape (len(descontos) * variantes,), ordenados por
+        desconto e depois por variante: desconto_percentual, variante, valor_final,
+        custo_fabrica, comissao_vendedor, comissao_gerente, custo_medidor,
+        custo_frete, custo_montador, custos_adicionais, total_custos,
+        margem_lucro, percentual_margem, necessita_aprovacao, nivel_aprovacao
+    """
+    config = contexto.config
+    montador = np.asarray(custo_montador, dtype=np.float64)
+    adicionais = np.asarray(custos_adicionais, dtype=np.float64)
+    variantes = max(len(montador), len(adicionais))
+
+    frete = np.asarray(
+        frete_percentual if frete_percentual is not None else [float(config['valor_frete_percentual'])],
+        dtype=np.float64
+    )
+    medidor = np.asarray(
+        custo_medidor if custo_medidor is not None else [float(config['valor_medidor_padrao'])],
+        dtype=np.float64
+    )
+
+    # Grade (descontos, variantes) achatada: linha = desconto, coluna = variante
+    desconto = np.repeat(np.asarray(descontos, dtype=np.float64), variantes)
+    coluna = np.tile(np.arange(variantes), len(descontos))
+
+    def por_variante(valores: np.ndarray) -> np.ndarray:
+        return np.broadcast_to(valores, (variantes,))[coluna]
+
+    valor_final = valor_ambientes * (1 - desconto)
+    custo_fabrica = np.full(desconto.shape, valor_ambientes * float(config['deflator_custo_fabrica']))
+    comissao_vendedor = contexto.tabela_vendedor.calcular_lote(valor_final)['comissao_total']
+    comissao_gerente = contexto.tabela_gerente.calcular_lote(valor_final)['comissao_total']
+    custo_medidor_cenario = por_variante(medidor)
+    custo_frete = valor_final * por_variante(frete)
+    custo_montador_cenario = por_variante(montador)
+    custos_adicionais_cenario = por_variante(adicionais)
+
+    total_custos = (
+        custo_fabrica + comissao_vendedor + comissao_gerente + custo_medidor_cenario
+        + custo_frete + custo_montador_cenario + custos_adicionais_cenario
+    )
+    margem_lucro = valor_final - total_custos
+    percentual_margem = np.divide(
+        margem_lucro * 100, valor_final, out=np.zeros_like(valor_final), where=valor_final > 0
+    )
+
+    limite_vendedor = float(config['limite_desconto_vendedor'])
+    limite_gerente = float(config['limite_desconto_gerente'])
+    nivel_aprovacao = np.select(
+        [desconto <= limite_vendedor, desconto <= limite_gerente],
+        [None, NIVEL_GERENTE],
+        NIVEL_ADMIN_MASTER
+    )
+
+    return {
+        'desconto_percentual': desconto,
+        'variante': coluna,
+        'valor_final': valor_final,
+        'custo_fabrica': custo_fabrica,
+        'comissao_vendedor': comissao_vendedor,
+        'comissao_gerente': comissao_gerente,
+        'custo_medidor': custo_medidor_cenario,
+        'custo_frete': custo_frete,
+        'custo_montador': custo_montador_cenario,
+        'custos_adicionais': custos_adicionais_cenario,
+        'total_custos': total_custos,
+        'margem_lucro': margem_lucro,
+        'percentual_margem': percentual_margem,
+        'necessita_aprovacao': desconto > limite_vendedor,
+        'nivel_aprovacao': nivel_aprovacao
+    }
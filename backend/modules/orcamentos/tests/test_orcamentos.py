@@ -1,4 +1,835 @@
-
 # Tests for orcamentos module
+import asyncio
+import time
+
+from core.database import execute_async
+
+
 async def test_list_orcamentos():
     assert True
+
+
+class _QueryLenta:
+    """Query fake que bloqueia a thread como o httpx síncrono do supabase-py"""
+
+    def execute(self):
+        time.sleep(0.05)
+        return "ok"
+
+
+async def test_execute_async_nao_bloqueia_event_loop():
+    inicio = time.perf_counter()
+    resultados = await asyncio.gather(*[execute_async(_QueryLenta()) for _ in range(5)])
+    duracao = time.perf_counter() - inicio
+
+    assert resultados == ["ok"] * 5
+    # 5 queries de 50ms em paralelo no pool ficam bem abaixo dos 250ms sequenciais
+    assert duracao < 0.2
+
+
+# ===== ENGINE DE COMISSÃO COMPILADA =====
+
+import numpy as np
+import pandas as pd
+
+from modules.orcamentos.engine_comissao import SEM_FAIXA, TabelaComissao
+
+REGRAS_PRD = pd.DataFrame([
+    {'valor_minimo': 0.0, 'valor_maximo': 25000.0, 'percentual': 0.05, 'ordem': 1},
+    {'valor_minimo': 25000.01, 'valor_maximo': 50000.0, 'percentual': 0.06, 'ordem': 2},
+    {'valor_minimo': 50000.01, 'valor_maximo': None, 'percentual': 0.08, 'ordem': 3},
+])
+
+
+def _comissao_referencia(valor, regras_df):
+    """Algoritmo original (iterrows) usado como oráculo"""
+    for _, regra in regras_df.sort_values('valor_minimo', kind='stable').iterrows():
+        valor_max = float(regra['valor_maximo']) if pd.notna(regra['valor_maximo']) else float('inf')
+        if float(regra['valor_minimo']) <= valor <= valor_max:
+            return valor * float(regra['percentual']), int(regra['ordem'])
+    return 0.0, None
+
+
+def test_tabela_comissao_exemplos_prd():
+    tabela = TabelaComissao.from_dataframe(REGRAS_PRD)
+
+    assert tabela.calcular(40000.0)['comissao_total'] == 2400.0
+    assert abs(tabela.calcular(24999.0)['comissao_total'] - 1249.95) < 1e-9
+    resultado = tabela.calcular(100000.0)
+    assert resultado['faixa_aplicada'] == 3
+    assert resultado['detalhes_faixas'][0]['valor_maximo'] is None
+    # Intervalo entre faixas (25000 < v < 25000.01) não tem comissão
+    assert tabela.calcular(25000.005)['faixa_aplicada'] is None
+
+
+def test_tabela_comissao_equivale_algoritmo_original():
+    sobrepostas = pd.DataFrame([
+        {'valor_minimo': 0.0, 'valor_maximo': None, 'percentual': 0.03, 'ordem': 1},
+        {'valor_minimo': 10000.0, 'valor_maximo': 20000.0, 'percentual': 0.07, 'ordem': 2},
+    ])
+    valores = np.concatenate([np.random.default_rng(7).uniform(-10, 120000, 500), [0, 25000, 25000.01, 50000]])
+
+    for regras_df in (REGRAS_PRD, sobrepostas):
+        tabela = TabelaComissao.from_dataframe(regras_df)
+        lote = tabela.calcular_lote(valores)
+        for i, valor in enumerate(valores):
+            esperado, faixa = _comissao_referencia(float(valor), regras_df)
+            assert tabela.calcular(valor)['comissao_total'] == esperado
+            assert tabela.calcular(valor)['faixa_aplicada'] == faixa
+            assert lote['comissao_total'][i] == esperado
+            assert lote['faixa_aplicada'][i] == (faixa if faixa is not None else SEM_FAIXA)
+
+
+def test_tabela_comissao_vazia():
+    tabela = TabelaComissao.from_dataframe(pd.DataFrame())
+
+    assert tabela.calcular(1000.0)['comissao_total'] == 0.0
+    assert tabela.calcular_lote(np.array([1.0, 2.0]))['comissao_total'].tolist() == [0.0, 0.0]
+
+
+def test_tabela_comissao_ordem_nula():
+    regras = REGRAS_PRD.astype({'ordem': 'object'})
+    regras.loc[1, 'ordem'] = None
+
+    tabela = TabelaComissao.from_dataframe(regras)
+
+    assert tabela.calcular(40000.0)['comissao_total'] == 2400.0
+    assert tabela.calcular(40000.0)['faixa_aplicada'] == 2
+    assert tabela.calcular(100000.0)['faixa_aplicada'] == 3
+
+
+# ===== DETALHE EM UM ÚNICO ROUND TRIP =====
+
+import uuid
+
+from core.consultas import coletar_consultas
+from modules.orcamentos.schemas import OrcamentoUpdate
+from modules.orcamentos.services import OrcamentoService
+
+
+def _usuario(perfil, user_id=None, loja_id='loja'):
+    """Usuário com as mesmas chaves de core.auth.usuario_do_token"""
+    return {
+        'user_id': user_id or str(uuid.uuid4()), 'loja_id': loja_id, 'perfil': perfil,
+        'email': 'usuario@loja.com', 'nome': '', 'token': 'token',
+    }
+
+
+class _SupabaseDetalhe:
+    """Cliente fake que devolve o orçamento no formato do select embutido"""
+
+    def __init__(self, linha):
+        self.linha = linha
+        self.chamadas = []
+        self.atualizacoes = []
+
+    def table(self, nome):
+        self.chamadas.append(nome)
+        return self
+
+    def update(self, dados):
+        self.atualizacoes.append(dados)
+        return self
+
+    def __getattr__(self, nome):
+        return lambda *args, **kwargs: self
+
+    def execute(self):
+        return type('Resposta', (), {'data': [dict(self.linha)]})()
+
+
+async def test_obter_orcamento_em_uma_query():
+    agora = '2026-01-01T00:00:00'
+    vendedor_id = str(uuid.uuid4())
+    ambiente_id = str(uuid.uuid4())
+    linha = {
+        'id': str(uuid.uuid4()), 'numero': 'ORC-1', 'cliente_id': str(uuid.uuid4()),
+        'loja_id': str(uuid.uuid4()), 'vendedor_id': vendedor_id, 'status_id': str(uuid.uuid4()),
+        'valor_ambientes': 1000.0, 'desconto_percentual': 0.1, 'valor_final': 900.0,
+        'plano_pagamento': [], 'necessita_aprovacao': False, 'created_at': agora, 'updated_at': agora,
+        'status': {'nome_status': 'Negociação'},
+        'cliente': {'nome': 'Maria'},
+        'ambientes': [
+            {'incluido': True, 'c_ambientes': {'id': ambiente_id, 'nome_ambiente': 'Cozinha', 'valor_total': 1000.0, 'linha_produto': None}},
+            {'incluido': False, 'c_ambientes': {'id': str(uuid.uuid4()), 'nome_ambiente': 'Sala', 'valor_total': 500.0, 'linha_produto': None}},
+        ],
+        'custos_adicionais': [],
+    }
+    banco = _SupabaseDetalhe(linha)
+    usuario = _usuario('VENDEDOR', vendedor_id, linha['loja_id'])
+
+    with coletar_consultas() as coletor:
+        orcamento = await OrcamentoService(banco).obter_orcamento(linha['id'], usuario)
+
+    assert banco.chamadas == ['c_orcamentos']
+    assert coletor.total == 1
+    assert orcamento.status_nome == 'Negociação'
+    assert orcamento.cliente_nome == 'Maria'
+    assert [str(a.id) for a in orcamento.ambientes] == [ambiente_id]
+
+
+async def test_vendedor_identificado_por_user_id_no_detalhe_e_exclusao():
+    # current_user vem de usuario_do_token: o id do usuário está em 'user_id' (não há 'id')
+    vendedor_id = str(uuid.uuid4())
+    banco = _SupabaseDetalhe({
+        'id': str(uuid.uuid4()), 'loja_id': 'loja', 'vendedor_id': vendedor_id,
+        'status': None, 'cliente': None, 'ambientes': [], 'custos_adicionais': [],
+    })
+    service = OrcamentoService(banco)
+
+    with pytest.raises(Exception, match='Acesso negado'):
+        await service.excluir_orcamento('orc-1', _usuario('VENDEDOR'))
+    assert banco.atualizacoes == []
+
+    assert await service.excluir_orcamento('orc-1', _usuario('VENDEDOR', vendedor_id)) is True
+    assert banco.atualizacoes[0]['excluido_por'] == vendedor_id
+
+
+
+async def test_atualizar_desconto_recalcula_com_custos_adicionais():
+    vendedor_id = str(uuid.uuid4())
+    custos = [{'id': str(uuid.uuid4()), 'descricao_custo': 'Frete extra', 'valor_custo': 300.0}]
+    linha = {
+        'id': str(uuid.uuid4()), 'numero': 'ORC-1', 'cliente_id': str(uuid.uuid4()),
+        'loja_id': str(uuid.uuid4()), 'vendedor_id': vendedor_id, 'status_id': str(uuid.uuid4()),
+        'valor_ambientes': 1000.0, 'desconto_percentual': 0.0, 'valor_final': 1000.0,
+        'plano_pagamento': [], 'necessita_aprovacao': False,
+        'created_at': '2026-01-01T00:00:00', 'updated_at': '2026-01-01T00:00:00',
+        'status': {'nome_status': 'Negociação'}, 'cliente': {'nome': 'Maria'},
+        'ambientes': [], 'custos_adicionais': custos,
+    }
+    service = OrcamentoService(_SupabaseDetalhe(linha))
+    recebidos = []
+
+    async def calculo_fake(dados, contexto=None):
+        recebidos.append(dados)
+        return {
+            'valor_final': 900.0, 'margem_lucro': 100.0, 'necessita_aprovacao': False,
+            'custos': {'custo_fabrica': 0.0, 'comissao_vendedor': 0.0, 'comissao_gerente': 0.0, 'custo_frete': 0.0},
+        }
+
+    service.criar_orcamento_completo = calculo_fake
+    usuario = _usuario('VENDEDOR', vendedor_id, linha['loja_id'])
+    await service.atualizar_orcamento(linha['id'], OrcamentoUpdate(desconto_percentual=10), usuario)
+
+    assert recebidos[0]['custos_adicionais'] == custos
+
+
+# ===== RECÁLCULO EM LOTE =====
+
+from modules.orcamentos.recalculo import calcular_custos_lote
+
+CONFIG_LOJA = {
+    'deflator_custo_fabrica': 0.28,
+    'valor_medidor_padrao': 200.0,
+    'valor_frete_percentual': 0.02,
+    'limite_desconto_vendedor': 0.15,
+    'limite_desconto_gerente': 0.25,
+}
+
+
+def test_calcular_custos_lote_equivale_calculo_unitario():
+    tabela = TabelaComissao.from_dataframe(REGRAS_PRD)
+    orcamentos_df = pd.DataFrame([
+        {'id': 'a', 'valor_ambientes': 50000.0, 'desconto_percentual': 0.20, 'custo_montador': 1000.0},
+        {'id': 'b', 'valor_ambientes': 10000.0, 'desconto_percentual': 0.0, 'custo_montador': None},
+    ])
+    custos_adicionais = pd.Series({'a': 500.0})
+
+    resultado = calcular_custos_lote(orcamentos_df, custos_adicionais, CONFIG_LOJA, tabela, tabela)
+
+    # Orçamento 'a' pelas regras de calcular_orcamento_completo
+    valor_final = 40000.0
+    comissao = tabela.calcular(valor_final)['comissao_total']
+    total_custos = 50000.0 * 0.28 + comissao * 2 + 200.0 + valor_final * 0.02 + 1000.0 + 500.0
+    assert resultado.loc[0, 'valor_final'] == valor_final
+    assert abs(resultado.loc[0, 'margem_lucro'] - (valor_final - total_custos)) < 1e-6
+    assert bool(resultado.loc[0, 'necessita_aprovacao']) is True
+    assert bool(resultado.loc[1, 'necessita_aprovacao']) is False
+    assert resultado.loc[1, 'custo_montador'] == 0.0
+
+
+
+class _SupabaseRecalculo:
+    """Cliente fake do job: um lote de orçamentos e o rpc que só grava as linhas não editadas"""
+
+    def __init__(self, orcamentos, editados):
+        self.orcamentos = orcamentos
+        self.editados = editados
+        self.tabela = None
+        self.gravacoes = []
+        self.filtros = []
+
+    def table(self, nome):
+        self.tabela = nome
+        return self
+
+    @property
+    def not_(self):
+        self.filtros.append('not')
+        return self
+
+    def __getattr__(self, nome):
+        def filtro(*args, **kwargs):
+            self.filtros.append((nome, *args))
+            return self
+        return filtro
+
+    def rpc(self, nome, params):
+        self.gravacoes.append((nome, params))
+        gravados = [{'id': r['id']} for r in params['p_orcamentos'] if r['id'] not in self.editados]
+        return type('Query', (), {'execute': lambda _: type('Resposta', (), {'data': gravados})()})()
+
+    def execute(self):
+        dados = self.orcamentos if self.tabela == 'c_orcamentos' else []
+        return type('Resposta', (), {'data': dados})()
+
+
+async def test_recalculo_grava_so_colunas_calculadas_e_respeita_edicoes():
+    from core.cache import config_loja_cache
+    from modules.orcamentos.recalculo import RecalculoOrcamentosJob
+    from modules.orcamentos.repository import ContextoCalculo
+
+    orcamentos = [
+        {'id': str(uuid.UUID(int=i)), 'valor_ambientes': 10000.0, 'desconto_percentual': 0.1, 'custo_montador': 0.0,
+         'created_at': f'2026-01-0{9 - i}T10:00:00+00:00', 'updated_at': f'2026-01-0{9 - i}T11:00:00+00:00',
+         'config_status_orcamento': {'is_final': False}}
+        for i in range(2)
+    ]
+    banco = _SupabaseRecalculo(orcamentos, editados={orcamentos[1]['id']})
+    job = RecalculoOrcamentosJob(banco, 'loja', tamanho_lote=10)
+    tabela = TabelaComissao.from_dataframe(REGRAS_PRD)
+
+    async def contexto_fake(loja_id):
+        return ContextoCalculo(config=CONFIG_LOJA, tabela_vendedor=tabela, tabela_gerente=tabela)
+
+    job.repository.get_contexto_calculo = contexto_fake
+    config_loja_cache.set('loja', {'deflator_custo_fabrica': 0.9})  # valor antigo, de antes da alteração
+    progresso = await job.executar()
+
+    assert progresso['status'] == 'CONCLUIDO'
+    assert progresso['orcamentos_processados'] == 1 and progresso['orcamentos_ignorados'] == 1
+    assert config_loja_cache.get('loja') is None  # o job relê a configuração do banco
+    nome, params = banco.gravacoes[0]
+    assert nome == 'aplicar_recalculo_orcamentos'
+    registro = params['p_orcamentos'][0]
+    assert registro['updated_at'] == orcamentos[0]['updated_at']
+    assert registro['valor_final'] == 9000.0
+    assert 'valor_ambientes' not in registro and 'desconto_percentual' not in registro
+    # orçamentos excluídos (soft delete) ficam fora do lote
+    posicao = banco.filtros.index('not')
+    assert banco.filtros[posicao + 1] == ('is_', 'excluido', 'true')
+
+
+def test_recalculo_rejeita_segundo_job_da_loja(monkeypatch):
+    from core.exceptions import FluyteException
+    from modules.orcamentos import recalculo
+
+    monkeypatch.setattr(recalculo, '_jobs', recalculo.OrderedDict())
+    banco = _SupabaseRecalculo([], editados=set())
+    primeiro = recalculo.criar_job_recalculo(banco, 'loja')
+
+    with pytest.raises(FluyteException) as erro:
+        recalculo.criar_job_recalculo(banco, 'loja')
+    assert erro.value.status_code == 409
+    assert erro.value.details == {'job_id': primeiro.job_id}
+
+    # outra loja não é afetada; encerrado o job, a loja pode disparar outro
+    recalculo.criar_job_recalculo(banco, 'outra-loja')
+    primeiro.status = 'CONCLUIDO'
+    assert recalculo.criar_job_recalculo(banco, 'loja').job_id != primeiro.job_id
+
+
+# ===== CONSULTAS POR REQUISIÇÃO =====
+
+from postgrest import SyncPostgrestClient
+
+from core.consultas import ColetorConsultas, forma_consulta
+
+
+def test_forma_consulta_ignora_valores_dos_filtros():
+    cliente = SyncPostgrestClient('http://localhost')
+    primeira = cliente.from_('c_orcamentos').select('id, numero').eq('id', '1').eq('loja_id', 'a')
+    segunda = cliente.from_('c_orcamentos').select('id, numero').eq('id', '2').eq('loja_id', 'b')
+
+    assert forma_consulta(primeira, 'c_orcamentos', 'GET') == forma_consulta(segunda, 'c_orcamentos', 'GET')
+    assert forma_consulta(primeira, 'c_orcamentos', 'GET') == 'GET c_orcamentos id=eq&loja_id=eq&select=id,numero'
+
+
+def test_coletor_avisa_budget_e_n_mais_1():
+    coletor = ColetorConsultas()
+    coletor.registrar('c_orcamentos', 'GET', 'GET c_orcamentos id=eq', 5.0)
+    for _ in range(3):
+        coletor.registrar('c_ambientes', 'GET', 'GET c_ambientes orcamento_id=eq', 2.0)
+
+    avisos = coletor.avaliar('GET /api/v1/orcamentos', budget=3, repeticoes_alerta=3)
+
+    assert avisos == ['4 consultas (budget 3)', 'possível N+1: 3x GET c_ambientes orcamento_id=eq']
+    assert coletor.server_timing().startswith('db;dur=11.0;desc="4 consultas"')
+    assert 'db-c_ambientes;dur=6.0;desc="3x"' in coletor.server_timing()
+
+
+# ===== CONTEXTO DE CÁLCULO POR REQUISIÇÃO =====
+
+from modules.orcamentos.repository import ContextoCalculo
+
+
+async def test_criar_orcamento_completo_reaproveita_contexto():
+    contexto = ContextoCalculo(
+        config={
+            'deflator_custo_fabrica': 0.28, 'valor_medidor_padrao': 200.0, 'valor_frete_percentual': 0.02,
+            'limite_desconto_vendedor': 0.15, 'limite_desconto_gerente': 0.25,
+        },
+        tabela_vendedor=TabelaComissao.from_dataframe(REGRAS_PRD),
+        tabela_gerente=TabelaComissao.from_dataframe(REGRAS_PRD),
+    )
+    dados = {'loja_id': 'loja', 'vendedor_id': 'vendedor', 'valor_ambientes': 50000.0, 'desconto_percentual': 0.2}
+
+    with coletar_consultas() as coletor:
+        calculo = await OrcamentoService(None).criar_orcamento_completo(dados, contexto)
+
+    assert coletor.total == 0
+    assert calculo['valor_final'] == 40000.0
+    assert calculo['custos']['comissao_vendedor'] == 2400.0
+    assert calculo['necessita_aprovacao'] is True
+
+
+# ===== CRIAÇÃO ATÔMICA (RPC) =====
+
+from modules.orcamentos.repository import OrcamentoRepository
+
+
+class _SupabaseRpc:
+    """Cliente fake que registra as chamadas rpc"""
+
+    def __init__(self, resposta):
+        self.resposta = resposta
+        self.chamadas = []
+
+    def rpc(self, nome, params):
+        self.chamadas.append((nome, params))
+        resposta = self.resposta
+        return type('Query', (), {'execute': lambda _: type('Resposta', (), {'data': resposta})()})()
+
+
+async def test_criar_orcamento_atomico_em_uma_chamada():
+    ambiente_id = uuid.uuid4()
+    criado = {'id': 'orc-1', 'numero': 'ORC-1', 'custos_adicionais': [{'id': 'c-1', 'descricao_custo': 'Frete', 'valor_custo': 300}]}
+    banco = _SupabaseRpc(criado)
+
+    resultado = await OrcamentoRepository(banco).criar_orcamento_atomico(
+        {'numero': 'ORC-1'}, [ambiente_id], [{'descricao_custo': 'Frete', 'valor_custo': 300.0}]
+    )
+
+    assert resultado == criado
+    assert len(banco.chamadas) == 1
+    nome, params = banco.chamadas[0]
+    assert nome == 'criar_orcamento_atomico'
+    assert params['p_ambiente_ids'] == [str(ambiente_id)]
+    assert params['p_custos_adicionais'] == [{'descricao_custo': 'Frete', 'valor_custo': 300.0}]
+
+
+# ===== NUMERAÇÃO =====
+
+from datetime import datetime
+
+from modules.orcamentos.numeracao import NumeradorOrcamentos, formatar_numero, molde_numero
+from modules.orcamentos.schemas import OrcamentoCreate
+
+
+class _SequenciaFake:
+    """config_loja.proximo_numero_orcamento com o incremento atômico da função SQL"""
+
+    def __init__(self):
+        self.proximo = 1
+        self.chamadas = 0
+
+    async def reservar_numeros_orcamento(self, loja_id, quantidade):
+        self.chamadas += 1
+        inicio = self.proximo
+        self.proximo += quantidade
+        await asyncio.sleep(0.001)  # round trip: outras corrotinas avançam enquanto isso
+        return inicio
+
+
+async def test_numeracao_concorrente_sem_duplicados():
+    sequencia = _SequenciaFake()
+    # 3 workers, cada um com seus intervalos; 1200 orçamentos simultâneos
+    workers = [NumeradorOrcamentos() for _ in range(3)]
+
+    numeros = await asyncio.gather(*[
+        workers[indice % 3].proximo(sequencia, 'loja', tamanho_bloco=50)
+        for indice in range(1200)
+    ])
+
+    assert len(set(numeros)) == 1200
+    assert sequencia.chamadas <= 1200 // 50 + 3
+
+
+async def test_numeracao_sem_bloco_e_continua():
+    sequencia = _SequenciaFake()
+    numerador = NumeradorOrcamentos()
+
+    numeros = await asyncio.gather(*[numerador.proximo(sequencia, 'loja') for _ in range(200)])
+
+    assert sorted(numeros) == list(range(1, 201))
+
+
+class _ConfigLojaFake:
+    """config_loja com update condicional; `disputas` simula outra reserva entre o select e o update"""
+
+    def __init__(self, proximo, disputas=0):
+        self.proximo = proximo
+        self.disputas = disputas
+        self.updates = 0
+
+    def table(self, nome):
+        assert nome == 'config_loja'
+        return _ConsultaConfigLoja(self)
+
+    def rpc(self, nome, params):
+        raise AssertionError(f'{nome} não deve ser chamado com ORCAMENTO_RPC_HABILITADO=false')
+
+
+class _ConsultaConfigLoja:
+    def __init__(self, banco):
+        self.banco = banco
+        self.novo = None
+        self.esperado = None
+
+    def select(self, colunas):
+        return self
+
+    def update(self, dados):
+        self.novo = dados['proximo_numero_orcamento']
+        return self
+
+    def eq(self, coluna, valor):
+        if coluna == 'proximo_numero_orcamento':
+            self.esperado = valor
+        return self
+
+    def execute(self):
+        banco = self.banco
+        if self.novo is None:
+            data = [{'proximo_numero_orcamento': banco.proximo, 'numero_inicial_orcamento': 1}]
+        else:
+            banco.updates += 1
+            if banco.disputas:
+                banco.disputas -= 1
+                banco.proximo += 1
+            data = []
+            if banco.proximo == self.esperado:
+                banco.proximo = self.novo
+                data = [{'proximo_numero_orcamento': self.novo}]
+        return type('Resposta', (), {'data': data})()
+
+
+async def test_numeracao_sem_rpc_usa_update_condicional():
+    banco = _ConfigLojaFake(proximo=10, disputas=1)
+    repository = OrcamentoRepository(banco)
+    repository.rpc_habilitado = False
+
+    assert await repository.reservar_numeros_orcamento('loja', 1) == 11  # perdeu a primeira troca para o 10
+    assert await repository.reservar_numeros_orcamento('loja', 5) == 12
+    assert banco.proximo == 17 and banco.updates == 3
+
+
+def test_formatar_numero_conforme_config():
+    data = datetime(2026, 10, 18)
+
+    assert formatar_numero(42, {'prefixo_numeracao': 'ORC-', 'formato_numeracao': 'SEQUENCIAL'}, data) == 'ORC-42'
+    assert formatar_numero(42, {'prefixo_numeracao': '', 'formato_numeracao': 'ANO_SEQUENCIAL'}, data) == '2026/00042'
+    assert formatar_numero(42, {'prefixo_numeracao': '{ano}{mes}-{numero:04d}', 'formato_numeracao': 'PERSONALIZADO'}, data) == '202610-0042'
+    assert formatar_numero(7, {}, data) == '7'
+    assert molde_numero({'prefixo_numeracao': '{ano}{mes}-{numero:04d}/A', 'formato_numeracao': 'PERSONALIZADO'}, data) == {
+        'prefixo': '202610-', 'sufixo': '/A', 'digitos': 4
+    }
+
+
+async def test_criar_orcamento_reserva_numero_na_gravacao(monkeypatch):
+    service = OrcamentoService(None)
+    monkeypatch.setattr(service.settings, 'orcamento_rpc_habilitado', True)
+    monkeypatch.setattr(service.settings, 'numeracao_bloco_tamanho', 1)
+    gravados = []
+
+    async def ambientes(ambiente_ids, loja_id):
+        return [{'id': str(ambiente_ids[0]), 'nome_ambiente': 'Cozinha', 'valor_total': 10000.0, 'linha_produto': None}]
+
+    async def contexto(loja_id):
+        tabela = TabelaComissao.from_dataframe(REGRAS_PRD)
+        config = {**CONFIG_LOJA, 'prefixo_numeracao': 'ORC-', 'formato_numeracao': 'ANO_SEQUENCIAL'}
+        return ContextoCalculo(config=config, tabela_vendedor=tabela, tabela_gerente=tabela)
+
+    async def status_padrao(loja_id):
+        return {'id': str(uuid.uuid4()), 'nome_status': 'Negociação'}
+
+    async def cliente(cliente_id, loja_id):
+        return {'id': str(cliente_id), 'nome': 'Maria'}
+
+    async def reserva_separada(loja_id, quantidade):
+        raise AssertionError('número deve ser reservado dentro de criar_orcamento_atomico')
+
+    async def criar_atomico(orcamento, ambiente_ids, custos_adicionais, numeracao=None):
+        gravados.append((orcamento, numeracao))
+        agora = datetime.utcnow().isoformat()
+        return {**orcamento, 'id': str(uuid.uuid4()), 'numero': 'ORC-2026/00001',
+                'created_at': agora, 'updated_at': agora, 'custos_adicionais': []}
+
+    service._get_ambientes_selecionados = ambientes
+    service._get_status_padrao = status_padrao
+    service._get_cliente = cliente
+    service.repository.get_contexto_calculo = contexto
+    service.repository.reservar_numeros_orcamento = reserva_separada
+    service.repository.criar_orcamento_atomico = criar_atomico
+
+    dados = OrcamentoCreate(
+        cliente_id=uuid.uuid4(), ambiente_ids=[uuid.uuid4()],
+        medidor_selecionado_id=uuid.uuid4(), montador_selecionado_id=uuid.uuid4(),
+        transportadora_selecionada_id=uuid.uuid4(),
+        plano_pagamento=[{'descricao': 'Entrada', 'valor': 10000, 'data_vencimento': '2026-11-01T00:00:00', 'forma_pagamento': 'PIX'}],
+    )
+    orcamento = await service.criar_orcamento(dados, _usuario('VENDEDOR', loja_id=str(uuid.uuid4())))
+
+    [(gravado, numeracao)] = gravados
+    assert gravado['numero'] is None
+    assert numeracao == {'prefixo': f'ORC-{datetime.utcnow().year}/', 'sufixo': '', 'digitos': 5}
+    assert orcamento.numero == 'ORC-2026/00001'
+
+
+# ===== SIMULAÇÃO DE DESCONTOS =====
+
+from modules.orcamentos.schemas import SimulacaoOrcamento
+from modules.orcamentos.simulacao import calcular_cenarios
+
+
+def _contexto_teste():
+    return ContextoCalculo(
+        config={
+            'deflator_custo_fabrica': 0.28, 'valor_medidor_padrao': 200.0, 'valor_frete_percentual': 0.02,
+            'limite_desconto_vendedor': 0.15, 'limite_desconto_gerente': 0.25,
+        },
+        tabela_vendedor=TabelaComissao.from_dataframe(REGRAS_PRD),
+        tabela_gerente=TabelaComissao.from_dataframe(REGRAS_PRD),
+    )
+
+
+async def test_calcular_cenarios_equivale_calculo_completo():
+    contexto = _contexto_teste()
+    descontos = [0.0, 0.1, 0.2, 0.3, 0.5]
+    cenarios = calcular_cenarios(60000.0, descontos, contexto)
+
+    for indice, desconto in enumerate(descontos):
+        dados = {'loja_id': 'loja', 'vendedor_id': 'v', 'valor_ambientes': 60000.0, 'desconto_percentual': desconto}
+        esperado = await OrcamentoService(None).criar_orcamento_completo(dados, contexto)
+
+        assert abs(cenarios['margem_lucro'][indice] - esperado['margem_lucro']) < 1e-6
+        assert cenarios['comissao_gerente'][indice] == esperado['custos']['comissao_gerente']
+        assert bool(cenarios['necessita_aprovacao'][indice]) == esperado['necessita_aprovacao']
+        assert cenarios['nivel_aprovacao'][indice] == esperado['nivel_aprovacao']
+
+
+async def test_simular_orcamento_sem_consultas_e_perfil():
+    service = OrcamentoService(None)
+    contexto = _contexto_teste()
+
+    async def contexto_em_cache(loja_id):
+        return contexto
+
+    service.repository.get_contexto_calculo = contexto_em_cache
+    simulacao = SimulacaoOrcamento(
+        valor_ambientes=50000, descontos=[10, 20, 30],
+        variantes=[{}, {'custo_montador': 1000, 'valor_frete_percentual': 0.05}]
+    )
+
+    with coletar_consultas() as coletor:
+        admin = await service.simular_orcamento(simulacao, _usuario('ADMIN_MASTER'))
+        vendedor = await service.simular_orcamento(simulacao, _usuario('VENDEDOR'))
+
+    assert coletor.total == 0
+    assert len(admin.cenarios) == 6
+    assert [(float(c.desconto_percentual), c.variante) for c in admin.cenarios[:2]] == [(10.0, 0), (10.0, 1)]
+    assert float(admin.cenarios[1].custo_montador) == 1000.0
+    assert float(admin.cenarios[1].custo_frete) == 45000 * 0.05
+    assert [c.nivel_aprovacao for c in admin.cenarios[::2]] == [None, 'GERENTE', 'ADMIN_MASTER']
+    assert vendedor.cenarios[0].margem_lucro is None
+
+
+# ===== RELATÓRIO DE MARGEM =====
+
+import pytest
+
+from core.exceptions import PermissionException
+from modules.orcamentos.relatorios import carregar_orcamentos, escopo_relatorio, resumo_margem
+
+
+class _SupabasePaginas:
+    """Cliente fake que devolve as linhas em páginas na ordem do cursor"""
+
+    def __init__(self, linhas, tamanho_pagina):
+        self.linhas = linhas
+        self.tamanho_pagina = tamanho_pagina
+        self.consultas = 0
+
+    def table(self, nome):
+        return self
+
+    @property
+    def not_(self):
+        return self
+
+    def __getattr__(self, nome):
+        return lambda *args, **kwargs: self
+
+    def execute(self):
+        inicio = self.consultas * self.tamanho_pagina
+        self.consultas += 1
+        pagina = self.linhas[inicio:inicio + self.tamanho_pagina + 1]
+        return type('Resposta', (), {'data': pagina})()
+
+
+def _linhas_relatorio(quantidade):
+    vendedores = [('v1', 'Ana'), ('v2', 'Bruno')]
+    linhas = []
+    for indice in range(quantidade):
+        vendedor_id, nome = vendedores[indice % 2]
+        linhas.append({
+            'id': str(uuid.UUID(int=indice)), 'numero': str(indice), 'loja_id': 'loja', 'vendedor_id': vendedor_id,
+            'status_id': 's1', 'valor_final': 1000.0, 'margem_lucro': 300.0 if vendedor_id == 'v1' else 100.0,
+            'custo_fabrica': 400.0, 'comissao_vendedor': 50.0, 'comissao_gerente': 20.0, 'custo_medidor': 200.0,
+            'custo_montador': 0.0, 'custo_frete': 30.0, 'necessita_aprovacao': indice % 10 == 0,
+            'created_at': f'2026-0{1 + indice % 3}-1{indice % 10}T10:00:00+00:00',
+            'status': {'nome_status': 'Negociação'}, 'cliente': {'nome': 'Cliente'}, 'vendedor': {'nome': nome},
+        })
+    return linhas
+
+
+async def test_relatorio_margem_paginado_e_agregado():
+    banco = _SupabasePaginas(_linhas_relatorio(2500), tamanho_pagina=1000)
+
+    frame = await carregar_orcamentos(banco, {'loja_id': 'loja', 'vendedor_id': None}, tamanho_pagina=1000)
+    resumo = resumo_margem(frame, 'mes', incluir_margem=True)
+
+    assert banco.consultas == 3
+    assert len(frame) == 2500
+    assert resumo['total']['valor_venda'] == 2_500_000.0
+    assert resumo['total']['aguardando_aprovacao'] == 250
+    por_vendedor = {item['chave']: item for item in resumo['por_vendedor']}
+    assert por_vendedor['v1']['nome'] == 'Ana'
+    assert por_vendedor['v1']['percentual_margem'] == 30.0
+    assert por_vendedor['v2']['margem_lucro'] == 1250 * 100.0
+    assert [item['chave'] for item in resumo['por_periodo']] == ['2026-01-01', '2026-02-01', '2026-03-01']
+
+    sem_margem = resumo_margem(frame, 'semana', incluir_margem=False)
+    assert 'margem_lucro' not in sem_margem['total']
+
+
+def test_escopo_relatorio_por_perfil():
+    gerente = _usuario('GERENTE', 'g')
+    vendedor = _usuario('VENDEDOR', 'v')
+    admin = _usuario('ADMIN_MASTER', 'a')
+
+    assert escopo_relatorio(gerente, loja_id='outra') == {'loja_id': 'loja', 'vendedor_id': None}
+    assert escopo_relatorio(vendedor, vendedor_id='outro') == {'loja_id': 'loja', 'vendedor_id': 'v'}
+    assert escopo_relatorio(admin) == {'loja_id': None, 'vendedor_id': None}
+    with pytest.raises(PermissionException):
+        escopo_relatorio(_usuario('MEDIDOR', 'm'))
+
+
+# ===== AGREGADOS DO DASHBOARD =====
+
+from modules.orcamentos.agregados import carregar_agregados
+
+
+def _reconstruir_agregados(linhas):
+    """Mesma soma de reconstruir_agregados_orcamentos: dia UTC de created_at, excluídos fora"""
+    frame = pd.DataFrame([linha for linha in linhas if not linha.get('excluido')])
+    frame['dia'] = pd.to_datetime(frame['created_at'], utc=True).dt.strftime('%Y-%m-%d')
+    frame['aguardando_aprovacao'] = frame['necessita_aprovacao'].astype(int)
+    return (
+        frame.groupby(['dia', 'loja_id', 'vendedor_id', 'status_id'])
+        .agg(quantidade=('id', 'size'), valor_final=('valor_final', 'sum'),
+             margem_lucro=('margem_lucro', 'sum'), aguardando_aprovacao=('aguardando_aprovacao', 'sum'))
+        .reset_index()
+        .to_dict('records')
+    )
+
+
+async def test_dashboard_por_agregados_equivale_ao_calculo_direto():
+    linhas = _linhas_relatorio(300)
+    # Alterações e exclusões depois da criação
+    for linha in linhas[:30]:
+        linha.update(status_id='s2', valor_final=800.0, necessita_aprovacao=False, status={'nome_status': 'Vendido'})
+    for linha in linhas[30:40]:
+        linha['excluido'] = True
+    restantes = linhas[:30] + linhas[40:]
+
+    nomes_vendedor = {'v1': 'Ana', 'v2': 'Bruno'}
+    nomes_status = {'s1': 'Negociação', 's2': 'Vendido'}
+    agregados = [
+        dict(linha, status={'nome_status': nomes_status[linha['status_id']]},
+             vendedor={'nome': nomes_vendedor[linha['vendedor_id']]})
+        for linha in _reconstruir_agregados(linhas)
+    ]
+    banco = _SupabasePaginas(agregados, tamanho_pagina=1000)
+
+    por_agregados = resumo_margem(await carregar_agregados(banco, {'loja_id': 'loja'}), 'semana', incluir_margem=True)
+    direto = resumo_margem(
+        await carregar_orcamentos(_SupabasePaginas(restantes, 1000), {'loja_id': 'loja'}), 'semana', incluir_margem=True
+    )
+
+    assert len(agregados) < len(restantes)
+    assert por_agregados == direto
+
+
+# ===== EXPORTAÇÃO =====
+
+import io
+import zipfile
+
+from lxml import etree
+
+from core.pagination import percorrer_keyset
+from modules.orcamentos.exportacao import COLUNAS_RELATORIO_MARGEM, resposta_exportacao
+
+
+async def _baixar(formato, linhas, tamanho_pagina=1000):
+    banco = _SupabasePaginas(linhas, tamanho_pagina)
+    paginas = percorrer_keyset(lambda: banco.table('orcamentos'), tamanho_pagina)
+    resposta = resposta_exportacao(formato, COLUNAS_RELATORIO_MARGEM, paginas, 'relatorio_margem', 'Margem')
+    pedacos = [pedaco async for pedaco in resposta.body_iterator]
+    return banco, resposta, pedacos
+
+
+async def test_exportar_csv_em_pedacos_por_pagina():
+    linhas = _linhas_relatorio(2500)
+    linhas[0]['cliente'] = {'nome': '=HYPERLINK("x")'}
+
+    banco, resposta, pedacos = await _baixar('csv', linhas)
+
+    assert banco.consultas == 3
+    assert len(pedacos) == 4  # cabeçalho + 3 páginas
+    assert 'relatorio_margem_' in resposta.headers['content-disposition']
+    texto = b''.join(pedacos).decode('utf-8')
+    assert texto.startswith('\ufeffNúmero;Data (UTC);Loja')
+    registros = texto.lstrip('\ufeff').split('\r\n')[:-1]
+    assert len(registros) == 2501
+    primeira = registros[1].split(';')
+    assert primeira[3] == '"\'=HYPERLINK(""x"")"'  # fórmula neutralizada
+    assert primeira[6] == '1000,00' and primeira[-1] == '30,00'
+
+
+async def test_exportar_xlsx_zip_valido_com_todas_as_linhas():
+    linhas = _linhas_relatorio(2500)
+    linhas[1]['cliente'] = {'nome': 'Ana & Filhos <Ltda>\x07'}
+
+    _, _, pedacos = await _baixar('xlsx', linhas)
+
+    pacote = zipfile.ZipFile(io.BytesIO(b''.join(pedacos)))
+    assert pacote.testzip() is None
+    planilha = etree.fromstring(pacote.read('xl/worksheets/sheet1.xml'))
+    ns = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+    registros = planilha.findall(f'{ns}sheetData/{ns}row')
+    assert len(registros) == 2501
+    assert registros[2].findall(f'{ns}c')[3].findtext(f'{ns}is/{ns}t') == 'Ana & Filhos <Ltda>'
+    assert registros[1].findall(f'{ns}c')[6].findtext(f'{ns}v') == '1000.0'
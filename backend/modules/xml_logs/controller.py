@@ -1,11 +1,53 @@
+"""
+Controller (rotas) para o módulo de Logs XML.
+Define endpoints REST para consulta dos logs de importação de XML Promob.
+"""
 
-# FastAPI routes for xml_logs
-from fastapi import APIRouter, Depends
-from .schemas import *
-from .repository import *
+from fastapi import APIRouter, Depends, Query
+from typing import List, Optional, Dict, Any
+from core.auth import get_current_user
+from core.database import get_database
+from supabase import Client
 
-router = APIRouter(prefix='/xml_logs', tags=['xml_logs'])
+from .schemas import XmlLogResponse, EstatisticasCacheXML
+from .services import XmlLogService
 
-@router.get('/', response_model=list[dict])
-async def list_xml_logs():
-    return await repo_list_xml_logs()
+# Router para o módulo de logs XML
+router = APIRouter()
+
+
+@router.get("/",
+    response_model=List[XmlLogResponse],
+    summary="Listar logs de importação XML",
+    description="Lista os processamentos de XML da loja (mais recentes primeiro)"
+)
+async def listar_logs(
+    skip: int = Query(0, ge=0, description="Registros a pular"),
+    limit: int = Query(50, ge=1, le=200, description="Limite de registros"),
+    current_user: Dict[str, Any] = Depends(get_current_user),
+    db: Client = Depends(get_database)
+):
+    """Lista logs de importação da loja do usuário."""
+    service = XmlLogService(db)
+    return await service.listar_logs(current_user, skip, limit)
+
+
+@router.get("/estatisticas-cache",
+    response_model=EstatisticasCacheXML,
+    summary="Estatísticas do cache de parse XML",
+    description="Taxa de reaproveitamento de reenvios e tempo de parse economizado"
+)
+async def estatisticas_cache(
+    desde: Optional[str] = Query(None, description="Data inicial (ISO 8601)"),
+    current_user: Dict[str, Any] = Depends(get_current_user),
+    db: Client = Depends(get_database)
+):
+    """
+    Estatísticas do reaproveitamento de parses da loja.
+    
+    - **HIT**: reenvio idêntico, resultado anterior reaproveitado sem parse
+    - **PARCIAL**: apenas ambientes alterados foram reprocessados
+    - **MISS**: parse completo
+    """
+    service = XmlLogService(db)
+    return await service.estatisticas_cache(current_user, desde)
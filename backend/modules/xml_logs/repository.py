@@ -1,5 +1,191 @@
+"""
+Repository para logs de processamento XML (xml_processing_logs).
+Responsabilidade: Registro e consulta dos logs de importação.
+"""
+
+import logging
+from typing import List, Dict, Any, Optional
+from supabase import Client
+from core.config import get_settings
+from core.database import execute_async
+
+# Configurar logger
+logger = logging.getLogger(__name__)
+
+# Apenas parses efetivos gravam resultado_parse (HIT reaproveita um deles)
+STATUS_COM_RESULTADO = ['MISS', 'PARCIAL']
+
+# Listagem sem resultado_parse (pode ter vários MB)
+COLUNAS_LISTAGEM = '''
+    id, filename, status, ambientes_criados, colecoes_encontradas, valor_total,
+    file_size, processing_time, error_details, created_at
+'''
+
+# Colunas da migration 20261018040000 (só com XML_CACHE_HABILITADO)
+COLUNAS_LISTAGEM_CACHE = ', cache_status, tempo_economizado_ms'
+
+
+class XmlLogRepository:
+    """
+    Repository para xml_processing_logs - APENAS DADOS
+    """
+    
+    def __init__(self, supabase_client: Client):
+        self.supabase = supabase_client
+        self.cache_habilitado = get_settings().xml_cache_habilitado
+    
+    async def registrar_log(self, log: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Registra o processamento de um arquivo XML
+        
+        Args:
+            log: filename, status, loja_id, created_by, file_size, processing_time,
+                 ambientes_criados, colecoes_encontradas, valor_total, dados_cliente, error_details
+            
+        Returns:
+            Dict com o log registrado (vazio se a gravação falhar)
+        """
+        try:
+            result = await execute_async(
+                self.supabase
+                .table('xml_processing_logs')
+                .insert(log)
+            )
+            
+            return result.data[0] if result.data else {}
+            
+        except Exception as e:
+            # Falha ao registrar log não deve derrubar a importação
+            logger.error(f"Erro ao registrar log XML de {log.get('filename')}: {str(e)}")
+            return {}
+    
+    async def registrar_logs_lote(self, logs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Registra logs de vários arquivos em uma única chamada
+        
+        Args:
+            logs: Um registro por arquivo (mesmos campos de registrar_log)
+            
+        Returns:
+            List[Dict]: Logs registrados (vazio se a gravação falhar)
+        """
+        try:
+            result = await execute_async(
+                self.supabase
+                .table('xml_processing_logs')
+                .insert(logs)
+            )
+            
+            return result.data
+            
+        except Exception as e:
+            # Falha ao registrar log não deve derrubar a importação
+            logger.error(f"Erro ao registrar {len(logs)} logs XML: {str(e)}")
+            return []
+    
+    async def buscar_resultado_por_hash(self, loja_id: str, content_hash: str) -> Optional[Dict[str, Any]]:
+        """
+        Último resultado de parse gravado para um conteúdo idêntico
+        
+        Args:
+            loja_id: ID da loja
+            content_hash: SHA-256 do arquivo
+            
+        Returns:
+            Dict com id e resultado_parse, ou None se o conteúdo nunca foi processado
+        """
+        try:
+            result = await execute_async(
+                self.supabase
+                .table('xml_processing_logs')
+                .select('id, resultado_parse')
+                .eq('loja_id', loja_id)
+                .eq('content_hash', content_hash)
+                .in_('cache_status', STATUS_COM_RESULTADO)
+                .order('created_at', desc=True)
+                .limit(1)
+            )
+            
+            return result.data[0] if result.data else None
+            
+        except Exception as e:
+            # Sem cache a importação segue com o parse completo
+            logger.warning(f"Erro ao buscar resultado XML em cache: {str(e)}")
+            return None
+    
+    async def buscar_ultimo_resultado(self, loja_id: str, filename: str) -> Optional[Dict[str, Any]]:
+        """
+        Último resultado de parse de um arquivo com o mesmo nome (base do reprocessamento parcial)
+        
+        Args:
+            loja_id: ID da loja
+            filename: Nome do arquivo enviado
+        """
+        try:
+            result = await execute_async(
+                self.supabase
+                .table('xml_processing_logs')
+                .select('id, resultado_parse')
+                .eq('loja_id', loja_id)
+                .eq('filename', filename)
+                .in_('cache_status', STATUS_COM_RESULTADO)
+                .order('created_at', desc=True)
+                .limit(1)
+            )
+            
+            return result.data[0] if result.data else None
+            
+        except Exception as e:
+            logger.warning(f"Erro ao buscar último resultado XML de {filename}: {str(e)}")
+            return None
+    
+    async def listar_status_cache(self, loja_id: str, desde: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Totais por status de cache das importações da loja (somados no banco)
+        
+        Args:
+            loja_id: ID da loja
+            desde: Data ISO inicial (opcional)
+            
+        Returns:
+            List[Dict]: Uma linha por cache_status com importacoes, tempo_economizado_ms
+            e processing_time (vazio com o cache desabilitado)
+        """
+        if not self.cache_habilitado:
+            return []
+        
+        try:
+            result = await execute_async(
+                self.supabase.rpc('estatisticas_cache_xml', {'p_loja_id': loja_id, 'p_desde': desde})
+            )
+            return result.data or []
+            
+        except Exception as e:
+            logger.error(f"Erro ao listar status de cache XML: {str(e)}")
+            raise Exception(f"Erro ao listar status de cache XML: {str(e)}")
+    
+    async def listar_logs(self, loja_id: str, skip: int = 0, limit: int = 50) -> List[Dict[str, Any]]:
+        """
+        Lista logs de processamento da loja (mais recentes primeiro)
+        
+        Args:
+            loja_id: ID da loja
+            skip: Paginação - registros a pular
+            limit: Paginação - limite de registros
+        """
+        try:
+            result = await execute_async(
+                self.supabase
+                .table('xml_processing_logs')
+                .select(COLUNAS_LISTAGEM + (COLUNAS_LISTAGEM_CACHE if self.cache_habilitado else ''))
+                .eq('loja_id', loja_id)
+                .order('created_at', desc=True)
+                .range(skip, skip + limit - 1)
+            )
+            
+            return result.data
+            
+        except Exception as e:
+            logger.error(f"Erro ao listar logs XML: {str(e)}")
+            raise Exception(f"Erro ao listar logs XML: {str(e)}")
 
-# Supabase access layer for xml_logs
-async def repo_list_xml_logs():
-    # TODO: call Supabase HTTP API
-    return []
@@ -1,12 +1,42 @@
+"""
+Schemas Pydantic para o módulo de Logs XML.
+Define modelos de resposta dos logs de importação de XML Promob.
+"""
 
-# Pydantic models for xml_logs
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+from typing import Optional, Dict, Any
+from decimal import Decimal
+from datetime import datetime
+import uuid
 
-class Xml_logsBase(BaseModel):
-    pass
 
-class Xml_logsCreate(Xml_logsBase):
-    pass
+# ===== SCHEMAS DE SAÍDA (RESPONSE) =====
 
-class Xml_logsResponse(Xml_logsBase):
-    id: str
+class XmlLogResponse(BaseModel):
+    """Schema de resposta de um log de processamento XML (sem o resultado do parse)"""
+    id: uuid.UUID
+    filename: str
+    status: str
+    ambientes_criados: Optional[int] = None
+    colecoes_encontradas: Optional[str] = None
+    valor_total: Optional[Decimal] = None
+    file_size: Optional[int] = None
+    processing_time: Optional[float] = None
+    cache_status: Optional[str] = None
+    tempo_economizado_ms: Optional[float] = None
+    error_details: Optional[Dict[str, Any]] = None
+    created_at: Optional[datetime] = None
+    
+    class Config:
+        from_attributes = True
+
+
+class EstatisticasCacheXML(BaseModel):
+    """Efetividade do reaproveitamento de parses (reenvios de XML)"""
+    importacoes: int = Field(..., description="Importações com status de cache registrado")
+    hits: int = Field(..., description="Reenvios idênticos (sem parse)")
+    parciais: int = Field(..., description="Reenvios com apenas ambientes alterados reprocessados")
+    misses: int = Field(..., description="Parses completos")
+    hit_ratio: float = Field(..., description="(hits + parciais) / importacoes")
+    tempo_economizado_ms: float = Field(..., description="Tempo de parse evitado somado")
+    tempo_processamento_s: float = Field(..., description="Tempo total de processamento registrado")
@@ -1 +1,69 @@
-# Business logic helpers for xml_logs
+"""
+Service layer para logs XML.
+Responsabilidade: Consulta dos logs de importação e estatísticas do cache de parse.
+"""
+
+import logging
+from typing import Dict, Any, List, Optional
+
+from .repository import XmlLogRepository
+from .schemas import XmlLogResponse, EstatisticasCacheXML
+
+# Configurar logger
+logger = logging.getLogger(__name__)
+
+
+class XmlLogService:
+    """
+    Service layer para logs de processamento XML
+    """
+    
+    def __init__(self, supabase_client):
+        self.repository = XmlLogRepository(supabase_client)
+    
+    async def listar_logs(self, current_user: Dict[str, Any], skip: int = 0, limit: int = 50) -> List[XmlLogResponse]:
+        """Lista logs de importação da loja do usuário"""
+        try:
+            logs = await self.repository.listar_logs(current_user['loja_id'], skip, limit)
+            return [XmlLogResponse(**log) for log in logs]
+            
+        except Exception as e:
+            logger.error(f"Erro ao listar logs XML: {str(e)}")
+            raise Exception(f"Erro ao listar logs XML: {str(e)}")
+    
+    async def estatisticas_cache(self, current_user: Dict[str, Any], desde: Optional[str] = None) -> EstatisticasCacheXML:
+        """
+        Taxa de acerto e tempo economizado pelo reaproveitamento de parses
+        
+        Args:
+            current_user: Usuário logado (contém loja_id)
+            desde: Data ISO inicial (opcional)
+        """
+        try:
+            registros = await self.repository.listar_status_cache(current_user['loja_id'], desde)
+            
+            contagem = {'HIT': 0, 'PARCIAL': 0, 'MISS': 0}
+            tempo_economizado_ms = 0.0
+            tempo_processamento_s = 0.0
+            
+            for registro in registros:
+                contagem[registro['cache_status']] = contagem.get(registro['cache_status'], 0) + int(registro['importacoes'])
+                tempo_economizado_ms += float(registro.get('tempo_economizado_ms') or 0)
+                tempo_processamento_s += float(registro.get('processing_time') or 0)
+            
+            importacoes = sum(contagem.values())
+            reaproveitadas = contagem['HIT'] + contagem['PARCIAL']
+            
+            return EstatisticasCacheXML(
+                importacoes=importacoes,
+                hits=contagem['HIT'],
+                parciais=contagem['PARCIAL'],
+                misses=contagem['MISS'],
+                hit_ratio=round(reaproveitadas / importacoes, 4) if importacoes else 0.0,
+                tempo_economizado_ms=round(tempo_economizado_ms, 2),
+                tempo_processamento_s=round(tempo_processamento_s, 3)
+            )
+            
+        except Exception as e:
+            logger.error(f"Erro ao calcular estatísticas de cache XML: {str(e)}")
+            raise Exception(f"Erro ao calcular estatísticas de cache XML: {str(e)}")
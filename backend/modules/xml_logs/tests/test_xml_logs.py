@@ -1,4 +1,76 @@
-
 # Tests for xml_logs module
-async def test_list_xml_logs():
-    assert True
+from modules.xml_logs.repository import XmlLogRepository
+from modules.xml_logs.services import XmlLogService
+
+
+class _RepositorioFake:
+    async def listar_status_cache(self, loja_id, desde=None):
+        # Linhas de estatisticas_cache_xml: já somadas por cache_status
+        return [
+            {'cache_status': 'MISS', 'importacoes': 1, 'tempo_economizado_ms': 0, 'processing_time': 2.5},
+            {'cache_status': 'HIT', 'importacoes': 2, 'tempo_economizado_ms': 4790, 'processing_time': 0.2},
+            {'cache_status': 'PARCIAL', 'importacoes': 1, 'tempo_economizado_ms': 1800.5, 'processing_time': 0.7},
+        ]
+
+
+async def test_estatisticas_cache():
+    service = XmlLogService(None)
+    service.repository = _RepositorioFake()
+
+    estatisticas = await service.estatisticas_cache({'loja_id': 'loja-1'})
+
+    assert estatisticas.importacoes == 4
+    assert (estatisticas.hits, estatisticas.parciais, estatisticas.misses) == (2, 1, 1)
+    assert estatisticas.hit_ratio == 0.75
+    assert estatisticas.tempo_economizado_ms == 6590.5
+    assert estatisticas.tempo_processamento_s == 3.4
+
+
+class _SupabaseLogs:
+    """Registra a última chamada (tabela ou rpc) e devolve uma resposta vazia"""
+
+    def __init__(self):
+        self.chamadas = []
+
+    def table(self, nome):
+        self.chamadas.append(('table', nome))
+        return self
+
+    def rpc(self, nome, params):
+        self.chamadas.append(('rpc', nome, params))
+        return self
+
+    def __getattr__(self, nome):
+        def metodo(*args, **kwargs):
+            self.chamadas.append((nome, *args))
+            return self
+        return metodo
+
+    def execute(self):
+        return type('Resposta', (), {'data': []})()
+
+
+async def test_repositorio_sem_cache_nao_usa_colunas_da_migration():
+    banco = _SupabaseLogs()
+    repository = XmlLogRepository(banco)
+    repository.cache_habilitado = False
+
+    assert await repository.listar_status_cache('loja-1') == []
+    await repository.listar_logs('loja-1')
+
+    [colunas] = [chamada[1] for chamada in banco.chamadas if chamada[0] == 'select']
+    assert 'cache_status' not in colunas and 'tempo_economizado_ms' not in colunas
+    assert not any(chamada[0] == 'rpc' for chamada in banco.chamadas)
+
+
+async def test_repositorio_com_cache_soma_no_banco():
+    banco = _SupabaseLogs()
+    repository = XmlLogRepository(banco)
+    repository.cache_habilitado = True
+
+    await repository.listar_status_cache('loja-1', '2026-10-01')
+    await repository.listar_logs('loja-1')
+
+    assert ('rpc', 'estatisticas_cache_xml', {'p_loja_id': 'loja-1', 'p_desde': '2026-10-01'}) in banco.chamadas
+    [colunas] = [chamada[1] for chamada in banco.chamadas if chamada[0] == 'select']
+    assert 'cache_status' in colunas
@@ -0,0 +1,18 @@
+-- migration: índices para paginação por cursor (keyset)
+-- propósito: suportar GET /orcamentos e GET /clientes no modo cursor, que filtram por
+--            loja_id e percorrem (created_at desc, id desc) a partir do último item visto
+-- tabelas afetadas: public.c_orcamentos, public.c_clientes
+-- observações: apenas criação de índices (não destrutivo). o índice composto atende tanto
+--              o filtro da loja quanto a ordenação, evitando sort e offset em páginas profundas
+
+-- orçamentos: listagem da loja (gerente/admin)
+create index if not exists idx_c_orcamentos_loja_created_id
+  on public.c_orcamentos (loja_id, created_at desc, id desc);
+
+-- orçamentos: listagem do vendedor (perfil VENDEDOR filtra por vendedor_id)
+create index if not exists idx_c_orcamentos_loja_vendedor_created_id
+  on public.c_orcamentos (loja_id, vendedor_id, created_at desc, id desc);
+
+-- clientes: listagem da loja
+create index if not exists idx_c_clientes_loja_created_id
+  on public.c_clientes (loja_id, created_at desc, id desc);
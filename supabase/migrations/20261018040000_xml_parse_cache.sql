@@ -0,0 +1,67 @@
+-- migration: cache de parse dos xmls promob em xml_processing_logs
+-- propósito: reaproveitar o resultado do parse quando o vendedor reenvia o mesmo export
+--            (mesmo sha-256) ou um export com poucos ambientes alterados (mesmo nome de
+--            arquivo, hashes por ambiente em resultado_parse.indice)
+-- tabelas afetadas: public.xml_processing_logs
+-- observações: apenas novas colunas anuláveis, índices e uma função de leitura (não
+--              destrutivo). cache_status também alimenta GET /xml-logs/estatisticas-cache
+--              (taxa de acerto e tempo economizado, somados no banco por
+--              estatisticas_cache_xml). o backend só usa essas colunas com
+--              XML_CACHE_HABILITADO=true
+
+alter table public.xml_processing_logs
+  add column if not exists content_hash text,
+  add column if not exists cache_status text,
+  add column if not exists tempo_economizado_ms numeric,
+  add column if not exists resultado_parse jsonb;
+
+alter table public.xml_processing_logs
+  drop constraint if exists xml_processing_logs_cache_status_check;
+
+alter table public.xml_processing_logs
+  add constraint xml_processing_logs_cache_status_check
+  check (cache_status is null or cache_status in ('HIT', 'PARCIAL', 'MISS'));
+
+comment on column public.xml_processing_logs.content_hash is 'sha-256 do arquivo enviado';
+comment on column public.xml_processing_logs.cache_status is 'HIT: parse reaproveitado; PARCIAL: só ambientes alterados; MISS: parse completo';
+comment on column public.xml_processing_logs.tempo_economizado_ms is 'tempo de parse evitado pelo reaproveitamento';
+comment on column public.xml_processing_logs.resultado_parse is 'extração completa + hashes por ambiente (gravado apenas em MISS/PARCIAL)';
+
+-- reenvio idêntico: último resultado da loja para o hash
+create index if not exists idx_xml_logs_loja_hash_created
+  on public.xml_processing_logs (loja_id, content_hash, created_at desc)
+  where cache_status in ('MISS', 'PARCIAL');
+
+-- reenvio alterado: último resultado da loja para o nome do arquivo
+create index if not exists idx_xml_logs_loja_filename_created
+  on public.xml_processing_logs (loja_id, filename, created_at desc)
+  where cache_status in ('MISS', 'PARCIAL');
+
+
+-- estatísticas do cache: uma linha por cache_status, sem trazer os logs para o backend
+create or replace function public.estatisticas_cache_xml(
+  p_loja_id uuid,
+  p_desde timestamptz default null
+)
+returns table (cache_status text, importacoes bigint, tempo_economizado_ms numeric, processing_time numeric)
+language sql
+stable
+security invoker
+set search_path = ''
+as $$
+  select
+    l.cache_status,
+    count(*),
+    coalesce(sum(l.tempo_economizado_ms), 0),
+    coalesce(sum(l.processing_time), 0)::numeric
+  from public.xml_processing_logs l
+  where l.loja_id = p_loja_id
+    and l.cache_status in ('HIT', 'PARCIAL', 'MISS')
+    and (p_desde is null or l.created_at >= p_desde)
+  group by l.cache_status;
+$$;
+
+comment on function public.estatisticas_cache_xml(uuid, timestamptz) is
+  'quantidade, tempo economizado e tempo de processamento das importações da loja por cache_status';
+
+grant execute on function public.estatisticas_cache_xml(uuid, timestamptz) to authenticated;
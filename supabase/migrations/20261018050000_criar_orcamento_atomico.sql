@@ -0,0 +1,69 @@
+-- migration: criação atômica de orçamento via rpc
+-- propósito: POST /orcamentos gravava o cabeçalho, os vínculos com ambientes e os custos
+--            adicionais em três chamadas http separadas. uma falha no meio deixava
+--            cabeçalhos órfãos em c_orcamentos. esta função grava tudo em uma única
+--            chamada (o postgrest executa cada rpc dentro de uma transação)
+-- tabelas afetadas: public.c_orcamentos, public.c_orcamento_ambientes,
+--                   public.c_orcamento_custos_adicionais
+-- observações: apenas criação de função (não destrutivo). security invoker: as políticas
+--              de rls do usuário continuam valendo para os três inserts. qualquer erro
+--              (fk, check, rls) desfaz a transação inteira
+
+create or replace function public.criar_orcamento_atomico(
+  p_orcamento jsonb,
+  p_ambiente_ids uuid[],
+  p_custos_adicionais jsonb default '[]'::jsonb
+)
+returns jsonb
+language plpgsql
+security invoker
+set search_path = ''
+as $$
+declare
+  v_orcamento public.c_orcamentos;
+  v_custos jsonb;
+begin
+  -- cabeçalho: apenas as colunas enviadas pelo backend; as demais ficam com o default
+  insert into public.c_orcamentos (
+    numero, cliente_id, loja_id, vendedor_id,
+    medidor_selecionado_id, montador_selecionado_id, transportadora_selecionada_id,
+    valor_ambientes, desconto_percentual, valor_final,
+    custo_fabrica, comissao_vendedor, comissao_gerente,
+    custo_medidor, custo_montador, custo_frete, margem_lucro,
+    config_snapshot, plano_pagamento, necessita_aprovacao, status_id, observacoes
+  )
+  select
+    r.numero, r.cliente_id, r.loja_id, r.vendedor_id,
+    r.medidor_selecionado_id, r.montador_selecionado_id, r.transportadora_selecionada_id,
+    r.valor_ambientes, r.desconto_percentual, r.valor_final,
+    r.custo_fabrica, r.comissao_vendedor, r.comissao_gerente,
+    r.custo_medidor, r.custo_montador, r.custo_frete, r.margem_lucro,
+    r.config_snapshot, r.plano_pagamento, r.necessita_aprovacao, r.status_id, r.observacoes
+  from jsonb_populate_record(null::public.c_orcamentos, p_orcamento) as r
+  returning * into v_orcamento;
+
+  -- vínculos com os ambientes selecionados
+  insert into public.c_orcamento_ambientes (orcamento_id, ambiente_id, incluido)
+  select v_orcamento.id, ambiente_id, true
+  from unnest(p_ambiente_ids) as ambiente_id;
+
+  -- custos adicionais, devolvidos com os ids gerados
+  with inseridos as (
+    insert into public.c_orcamento_custos_adicionais (orcamento_id, descricao_custo, valor_custo)
+    select v_orcamento.id, c.descricao_custo, c.valor_custo
+    from jsonb_to_recordset(coalesce(p_custos_adicionais, '[]'::jsonb))
+      as c(descricao_custo text, valor_custo numeric)
+    returning id, descricao_custo, valor_custo
+  )
+  select coalesce(jsonb_agg(to_jsonb(inseridos)), '[]'::jsonb)
+  into v_custos
+  from inseridos;
+
+  return to_jsonb(v_orcamento) || jsonb_build_object('custos_adicionais', v_custos);
+end;
+$$;
+
+comment on function public.criar_orcamento_atomico(jsonb, uuid[], jsonb) is
+  'cria cabeçalho, vínculos com ambientes e custos adicionais do orçamento em uma transação; retorna a linha de c_orcamentos com custos_adicionais';
+
+grant execute on function public.criar_orcamento_atomico(jsonb, uuid[], jsonb) to authenticated;
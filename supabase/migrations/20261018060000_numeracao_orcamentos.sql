@@ -0,0 +1,39 @@
+-- migration: reserva atômica de números de orçamento por loja
+-- propósito: substituir o "ORC-" + número aleatório (colidia após alguns milhares de
+--            orçamentos) pela sequência de config_loja.proximo_numero_orcamento. o backend
+--            reserva um número (ou um intervalo, NUMERACAO_BLOCO_TAMANHO) por chamada
+-- tabelas afetadas: public.config_loja
+-- observações: apenas criação de função (não destrutivo). o incremento e a leitura são o
+--              mesmo update ... returning: a linha da loja fica bloqueada só durante esse
+--              comando, e duas chamadas simultâneas nunca recebem o mesmo intervalo
+
+create or replace function public.reservar_numeros_orcamento(
+  p_loja_id uuid,
+  p_quantidade integer default 1
+)
+returns bigint
+language plpgsql
+security invoker
+set search_path = ''
+as $$
+declare
+  v_inicio bigint;
+begin
+  if p_quantidade is null or p_quantidade < 1 then
+    raise exception 'p_quantidade deve ser >= 1 (recebido: %)', p_quantidade;
+  end if;
+
+  update public.config_loja
+     set proximo_numero_orcamento = coalesce(proximo_numero_orcamento, numero_inicial_orcamento, 1) + p_quantidade
+   where loja_id = p_loja_id
+  returning proximo_numero_orcamento - p_quantidade into v_inicio;
+
+  -- null quando a loja ainda não tem config_loja (o backend cria antes de numerar)
+  return v_inicio;
+end;
+$$;
+
+comment on function public.reservar_numeros_orcamento(uuid, integer) is
+  'reserva p_quantidade números consecutivos de orçamento da loja e retorna o primeiro';
+
+grant execute on function public.reservar_numeros_orcamento(uuid, integer) to authenticated;
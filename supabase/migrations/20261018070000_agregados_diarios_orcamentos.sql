@@ -0,0 +1,149 @@
+-- migration: agregados diários de orçamentos para o dashboard
+-- propósito: GET /orcamentos/dashboard/metricas recalculava tudo a partir de c_orcamentos a
+--            cada carregamento (O(orçamentos)). esta tabela guarda uma linha por
+--            dia/loja/vendedor/status com quantidade, soma de valor_final, soma de
+--            margem_lucro e aprovações pendentes; o dashboard passa a ler O(dias)
+-- tabelas afetadas: public.c_orcamentos_agregados_diarios (nova)
+-- observações: não destrutivo. os deltas (criação, alteração, exclusão) são aplicados por
+--              aplicar_deltas_agregados_orcamentos, chamada pelos triggers da migration
+--              20261018130000 (não é executável por usuários autenticados). leitura
+--              restrita à loja do jwt (admin master lê todas). reconstrução:
+--                select public.reconstruir_agregados_orcamentos();           -- todas as lojas
+--                select public.reconstruir_agregados_orcamentos('<loja_id>'); -- uma loja
+--              ou POST /orcamentos/dashboard/reconstruir (admin master). o dia é a data
+--              utc de created_at; orçamentos com excluido = true não entram
+
+create table if not exists public.c_orcamentos_agregados_diarios (
+  id uuid primary key default gen_random_uuid(),
+  dia date not null,
+  loja_id uuid not null references public.c_lojas (id) on delete cascade,
+  vendedor_id uuid references public.cad_equipe (id) on delete cascade,
+  status_id uuid references public.config_status_orcamento (id) on delete cascade,
+  quantidade integer not null default 0,
+  valor_final numeric(14, 2) not null default 0,
+  margem_lucro numeric(14, 2) not null default 0,
+  aguardando_aprovacao integer not null default 0,
+  updated_at timestamptz not null default now(),
+  constraint uq_agregados_diarios_chave unique nulls not distinct (loja_id, dia, vendedor_id, status_id)
+);
+
+comment on table public.c_orcamentos_agregados_diarios is
+  'totais diários de orçamentos por loja/vendedor/status, mantidos pelo backend para o dashboard';
+
+-- leitura do dashboard: loja (ou todas) por intervalo de dias
+create index if not exists idx_agregados_diarios_dia
+  on public.c_orcamentos_agregados_diarios (dia);
+
+alter table public.c_orcamentos_agregados_diarios enable row level security;
+
+-- leitura apenas da loja do usuário (admin master lê todas); o escopo por vendedor é
+-- aplicado pelo backend. escrita apenas pelas funções abaixo (security definer)
+create policy "agregados diários: leitura da própria loja"
+  on public.c_orcamentos_agregados_diarios
+  for select
+  to authenticated
+  using (
+    loja_id = nullif((select auth.jwt()) ->> 'loja_id', '')::uuid
+    or (select auth.jwt()) ->> 'perfil' = 'ADMIN_MASTER'
+  );
+
+
+-- aplica um lote de deltas: p_deltas = [{dia, loja_id, vendedor_id, status_id,
+-- quantidade, valor_final, margem_lucro, aguardando_aprovacao}, ...]. deltas negativos
+-- subtraem (alteração/exclusão); linhas que chegam a quantidade 0 são removidas.
+-- as chaves são gravadas sempre na mesma ordem: duas transações concorrentes travam
+-- as linhas na mesma sequência e não entram em deadlock
+create or replace function public.aplicar_deltas_agregados_orcamentos(p_deltas jsonb)
+returns integer
+language plpgsql
+security definer
+set search_path = ''
+as $$
+declare
+  v_linhas integer;
+  v_zerados uuid[];
+begin
+  with aplicados as (
+    insert into public.c_orcamentos_agregados_diarios as a (
+      dia, loja_id, vendedor_id, status_id,
+      quantidade, valor_final, margem_lucro, aguardando_aprovacao
+    )
+    select
+      d.dia, d.loja_id, d.vendedor_id, d.status_id,
+      sum(d.quantidade), sum(d.valor_final), sum(d.margem_lucro), sum(d.aguardando_aprovacao)
+    from jsonb_to_recordset(coalesce(p_deltas, '[]'::jsonb)) as d(
+      dia date, loja_id uuid, vendedor_id uuid, status_id uuid,
+      quantidade integer, valor_final numeric, margem_lucro numeric, aguardando_aprovacao integer
+    )
+    group by d.loja_id, d.dia, d.vendedor_id, d.status_id
+    order by d.loja_id, d.dia, d.vendedor_id, d.status_id
+    on conflict (loja_id, dia, vendedor_id, status_id) do update
+      set quantidade = a.quantidade + excluded.quantidade,
+          valor_final = a.valor_final + excluded.valor_final,
+          margem_lucro = a.margem_lucro + excluded.margem_lucro,
+          aguardando_aprovacao = a.aguardando_aprovacao + excluded.aguardando_aprovacao,
+          updated_at = now()
+    returning a.id, a.quantidade
+  )
+  select count(*), array_agg(id) filter (where quantidade <= 0)
+    into v_linhas, v_zerados
+    from aplicados;
+
+  -- só as chaves deste lote (já travadas pelo upsert), nunca a tabela inteira
+  if v_zerados is not null then
+    delete from public.c_orcamentos_agregados_diarios where id = any(v_zerados);
+  end if;
+
+  return v_linhas;
+end;
+$$;
+
+comment on function public.aplicar_deltas_agregados_orcamentos(jsonb) is
+  'soma deltas de orçamentos criados/alterados/excluídos aos agregados diários';
+
+
+-- recalcula os agregados a partir de c_orcamentos (uma loja ou todas)
+create or replace function public.reconstruir_agregados_orcamentos(p_loja_id uuid default null)
+returns integer
+language plpgsql
+security definer
+set search_path = ''
+as $$
+declare
+  v_linhas integer;
+begin
+  delete from public.c_orcamentos_agregados_diarios
+   where p_loja_id is null or loja_id = p_loja_id;
+
+  insert into public.c_orcamentos_agregados_diarios (
+    dia, loja_id, vendedor_id, status_id,
+    quantidade, valor_final, margem_lucro, aguardando_aprovacao
+  )
+  select
+    (o.created_at at time zone 'utc')::date,
+    o.loja_id, o.vendedor_id, o.status_id,
+    count(*),
+    coalesce(sum(o.valor_final), 0),
+    coalesce(sum(o.margem_lucro), 0),
+    count(*) filter (where o.necessita_aprovacao)
+  from public.c_orcamentos o
+  where o.excluido is not true
+    and (p_loja_id is null or o.loja_id = p_loja_id)
+  group by 1, o.loja_id, o.vendedor_id, o.status_id;
+
+  get diagnostics v_linhas = row_count;
+  return v_linhas;
+end;
+$$;
+
+comment on function public.reconstruir_agregados_orcamentos(uuid) is
+  'recria os agregados diários de orçamentos a partir de c_orcamentos; retorna as linhas gravadas';
+
+-- deltas pelos triggers (security definer) e reconstrução: apenas a chave de serviço
+revoke execute on function public.aplicar_deltas_agregados_orcamentos(jsonb) from public, anon, authenticated;
+grant execute on function public.aplicar_deltas_agregados_orcamentos(jsonb) to service_role;
+revoke execute on function public.reconstruir_agregados_orcamentos(uuid) from public, anon, authenticated;
+grant execute on function public.reconstruir_agregados_orcamentos(uuid) to service_role;
+
+-- carga inicial
+select public.reconstruir_agregados_orcamentos();
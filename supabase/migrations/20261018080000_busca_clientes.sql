@@ -0,0 +1,112 @@
+-- migration: busca indexada de clientes
+-- propósito: GET /clientes filtrava com ilike('%termo%') em nome, telefone, cidade e
+--            procedencia; com o curinga no início nenhum índice b-tree ajuda e lojas com
+--            dezenas de milhares de clientes caíam em seq scan de c_clientes. esta migration
+--            cria colunas de busca normalizadas (minúsculas, sem acento; telefone só com
+--            dígitos), índices de trigramas sobre elas e a função buscar_clientes, que
+--            ordena os resultados por relevância
+-- tabelas afetadas: public.c_clientes (colunas geradas + índices)
+-- observações: não destrutivo. as colunas são "generated always ... stored": o postgres as
+--              mantém em todo insert/update, sem mudança no backend para gravar. a adição
+--              das colunas reescreve c_clientes uma vez (executar fora do horário de pico
+--              em lojas grandes). public.normalizar_busca é espelhada em
+--              backend/modules/clientes/busca.py (normalizar_texto)
+
+create extension if not exists pg_trgm with schema extensions;
+create extension if not exists unaccent with schema extensions;
+
+-- unaccent() não é immutable (depende do dicionário configurado); com o dicionário
+-- explícito o resultado é estável e pode ser usado em colunas geradas e índices
+create or replace function public.normalizar_busca(p_texto text)
+returns text
+language sql
+immutable
+parallel safe
+set search_path = ''
+as $$
+  select lower(extensions.unaccent('extensions.unaccent'::regdictionary, coalesce(p_texto, '')));
+$$;
+
+comment on function public.normalizar_busca(text) is
+  'texto em minúsculas e sem acentos, usado nas colunas *_busca';
+
+alter table public.c_clientes
+  add column if not exists nome_busca text
+    generated always as (public.normalizar_busca(nome)) stored,
+  add column if not exists telefone_digitos text
+    generated always as (regexp_replace(coalesce(telefone, ''), '[^0-9]', '', 'g')) stored,
+  add column if not exists cidade_busca text
+    generated always as (public.normalizar_busca(cidade)) stored,
+  add column if not exists procedencia_busca text
+    generated always as (public.normalizar_busca(procedencia)) stored;
+
+-- trigramas: atendem like '%termo%' e os operadores de similaridade (%, <%)
+create index if not exists idx_c_clientes_nome_busca_trgm
+  on public.c_clientes using gin (nome_busca extensions.gin_trgm_ops);
+
+create index if not exists idx_c_clientes_telefone_digitos_trgm
+  on public.c_clientes using gin (telefone_digitos extensions.gin_trgm_ops);
+
+create index if not exists idx_c_clientes_cidade_busca_trgm
+  on public.c_clientes using gin (cidade_busca extensions.gin_trgm_ops);
+
+create index if not exists idx_c_clientes_procedencia_busca_trgm
+  on public.c_clientes using gin (procedencia_busca extensions.gin_trgm_ops);
+
+
+-- busca livre por nome (tolerante a erros de digitação), telefone ou cpf/cnpj, ordenada
+-- por relevância. retorna as colunas de c_clientes (sem as colunas de busca) + relevancia
+create or replace function public.buscar_clientes(
+  p_loja_id uuid,
+  p_termo text,
+  p_limite integer default 20,
+  p_offset integer default 0
+)
+returns setof jsonb
+language sql
+stable
+security invoker
+set search_path = ''
+as $$
+  with termo as (
+    select
+      public.normalizar_busca(btrim(p_termo)) as texto,
+      regexp_replace(coalesce(p_termo, ''), '[^0-9]', '', 'g') as digitos
+  )
+  select
+    to_jsonb(c) - array['nome_busca', 'telefone_digitos', 'cidade_busca', 'procedencia_busca']
+      || jsonb_build_object('relevancia', round(r.relevancia::numeric, 4))
+  from public.c_clientes c
+  cross join termo t
+  cross join lateral (
+    select greatest(
+      -- nome: similaridade da palavra + bônus para prefixo
+      extensions.word_similarity(t.texto, c.nome_busca)
+        + case when c.nome_busca like t.texto || '%' then 0.5 else 0 end,
+      -- telefone / documento: trecho de dígitos
+      case
+        when length(t.digitos) >= 4 and c.telefone_digitos like '%' || t.digitos || '%' then 1.0
+        when length(t.digitos) >= 11 and c.cpf_cnpj = t.digitos then 1.5
+        else 0
+      end
+    ) as relevancia
+  ) r
+  where c.loja_id = p_loja_id
+    and c.excluido is not true
+    and length(t.texto) >= 2
+    and (
+      t.texto operator(extensions.<%) c.nome_busca
+      or c.nome_busca like '%' || t.texto || '%'
+      or (length(t.digitos) >= 4 and c.telefone_digitos like '%' || t.digitos || '%')
+      or (length(t.digitos) >= 11 and c.cpf_cnpj = t.digitos)
+    )
+  order by r.relevancia desc, c.nome
+  limit least(greatest(coalesce(p_limite, 20), 1), 100)
+  offset greatest(coalesce(p_offset, 0), 0);
+$$;
+
+comment on function public.buscar_clientes(uuid, text, integer, integer) is
+  'busca clientes da loja por nome, telefone ou cpf/cnpj, ordenados por relevância';
+
+grant execute on function public.normalizar_busca(text) to authenticated;
+grant execute on function public.buscar_clientes(uuid, text, integer, integer) to authenticated;
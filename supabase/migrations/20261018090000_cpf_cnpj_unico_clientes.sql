@@ -0,0 +1,45 @@
+-- migration: cpf/cnpj único por loja em c_clientes
+-- propósito: ClienteService.criar_cliente consultava c_clientes (verificar_cpf_cnpj_existente)
+--            antes de cada insert: dois round trips e, com dois cadastros simultâneos, os
+--            dois passavam na verificação. o índice único parcial abaixo garante a regra no
+--            banco e o insert vira a única escrita; a violação (duplicate key) é convertida
+--            pelo backend na mensagem "CPF/CNPJ ... já está cadastrado nesta loja"
+-- tabelas afetadas: public.c_clientes (índice)
+-- observações: não destrutivo. a chave é loja_id + apenas os dígitos de cpf_cnpj, então
+--              "123.456.789-09" e "12345678909" colidem; clientes excluídos (excluido
+--              preenchido) não contam. se a loja já tiver duplicados ativos a migration
+--              falha com a lista de casos; resolver (excluir ou corrigir) e executar de novo:
+--                select loja_id, regexp_replace(cpf_cnpj, '[^0-9]', '', 'g'), count(*)
+--                  from public.c_clientes
+--                 where excluido is null
+--                 group by 1, 2 having count(*) > 1;
+
+do $$
+declare
+  v_duplicados text;
+begin
+  select string_agg(format('loja %s, cpf/cnpj %s (%s clientes)', loja_id, digitos, total), '; ')
+    into v_duplicados
+    from (
+      select loja_id, regexp_replace(cpf_cnpj, '[^0-9]', '', 'g') as digitos, count(*) as total
+        from public.c_clientes
+       where excluido is null
+         and regexp_replace(coalesce(cpf_cnpj, ''), '[^0-9]', '', 'g') <> ''
+       group by 1, 2
+      having count(*) > 1
+       limit 20
+    ) d;
+
+  if v_duplicados is not null then
+    raise exception 'c_clientes tem cpf/cnpj duplicados ativos: %', v_duplicados;
+  end if;
+end;
+$$;
+
+create unique index if not exists uq_c_clientes_loja_cpf_cnpj
+  on public.c_clientes (loja_id, (regexp_replace(cpf_cnpj, '[^0-9]', '', 'g')))
+  where excluido is null
+    and regexp_replace(coalesce(cpf_cnpj, ''), '[^0-9]', '', 'g') <> '';
+
+comment on index public.uq_c_clientes_loja_cpf_cnpj is
+  'cpf/cnpj (apenas dígitos) único entre os clientes ativos da loja';
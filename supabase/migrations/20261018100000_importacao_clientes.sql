@@ -0,0 +1,36 @@
+-- migration: importação de clientes em lote
+-- propósito: POST /clientes/importar grava planilhas com milhares de clientes; criar um a um
+--            custava um round trip por linha. importar_clientes_lote insere um lote inteiro
+--            em um único comando e devolve os clientes gravados
+-- tabelas afetadas: public.c_clientes (apenas inserts via função)
+-- observações: não destrutivo. "on conflict do nothing" sem alvo usa o índice único
+--              uq_c_clientes_loja_cpf_cnpj (migration 20261018090000): cpf/cnpj já ativo na
+--              loja (inclusive gravado com outra formatação ou por um cadastro simultâneo) é
+--              ignorado, não aborta o lote. o backend compara os cpf/cnpj devolvidos com os
+--              enviados para montar o relatório por linha. security invoker: as políticas de
+--              rls de c_clientes valem como no insert direto
+
+create or replace function public.importar_clientes_lote(p_loja_id uuid, p_clientes jsonb)
+returns table (id uuid, cpf_cnpj text)
+language sql
+volatile
+security invoker
+set search_path = ''
+as $$
+  insert into public.c_clientes as c (
+    loja_id, nome, cpf_cnpj, telefone, email, endereco, cidade, cep,
+    tipo_venda, procedencia, observacao
+  )
+  select
+    p_loja_id, r.nome, r.cpf_cnpj, r.telefone, r.email, r.endereco, r.cidade, r.cep,
+    r.tipo_venda, r.procedencia, r.observacao
+  -- jsonb_populate_recordset com o tipo da tabela: cada campo chega no tipo da coluna
+  from jsonb_populate_recordset(null::public.c_clientes, coalesce(p_clientes, '[]'::jsonb)) as r
+  on conflict do nothing
+  returning c.id, c.cpf_cnpj;
+$$;
+
+comment on function public.importar_clientes_lote(uuid, jsonb) is
+  'insere um lote de clientes na loja, ignorando cpf/cnpj já cadastrados; retorna id e cpf_cnpj gravados';
+
+grant execute on function public.importar_clientes_lote(uuid, jsonb) to authenticated;
@@ -0,0 +1,37 @@
+-- migration: substituição atômica das faixas de comissão via rpc
+-- propósito: PUT /configuracoes/comissoes/{tipo} apagava as faixas e inseria as novas em
+--            duas chamadas http. se o insert falhasse, a loja ficava sem faixas e toda
+--            comissão passava a ser calculada como zero. esta função faz as duas
+--            escritas em uma única chamada (o postgrest executa cada rpc em uma transação)
+-- tabelas afetadas: public.config_regras_comissao_faixa
+-- observações: apenas criação de função (não destrutivo). security invoker: as políticas
+--              de rls do usuário continuam valendo para o delete e o insert. qualquer erro
+--              desfaz a transação e as faixas anteriores permanecem
+
+create or replace function public.substituir_regras_comissao(
+  p_loja_id uuid,
+  p_tipo text,
+  p_faixas jsonb
+)
+returns setof public.config_regras_comissao_faixa
+language sql
+security invoker
+set search_path = ''
+as $$
+  delete from public.config_regras_comissao_faixa
+  where loja_id = p_loja_id
+    and tipo_comissao::text = p_tipo;
+
+  insert into public.config_regras_comissao_faixa (
+    loja_id, tipo_comissao, valor_minimo, valor_maximo, percentual, ordem, ativo
+  )
+  select
+    p_loja_id, r.tipo_comissao, r.valor_minimo, r.valor_maximo, r.percentual, r.ordem, coalesce(r.ativo, true)
+  from jsonb_populate_recordset(null::public.config_regras_comissao_faixa, coalesce(p_faixas, '[]'::jsonb)) as r
+  returning *;
+$$;
+
+comment on function public.substituir_regras_comissao(uuid, text, jsonb) is
+  'substitui as faixas de comissão de um tipo da loja em uma transação; retorna as faixas gravadas';
+
+grant execute on function public.substituir_regras_comissao(uuid, text, jsonb) to authenticated;
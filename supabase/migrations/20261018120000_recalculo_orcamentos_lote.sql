@@ -0,0 +1,58 @@
+-- migration: gravação em lote do recálculo de orçamentos via rpc
+-- propósito: o job de recálculo gravava cada lote com um upsert de c_orcamentos. o upsert
+--            devolvia valor_ambientes/desconto_percentual lidos no início do lote (uma
+--            edição feita durante o job era desfeita) e a metade insert dependia de todas
+--            as colunas not null no payload. esta função faz apenas um update das colunas
+--            recalculadas, por id, e só nas linhas que não mudaram desde a leitura
+-- tabelas afetadas: public.c_orcamentos
+-- observações: apenas criação de função (não destrutivo). security invoker: as políticas
+--              de rls do usuário continuam valendo. linhas com updated_at diferente do lido
+--              (editadas durante o job) e orçamentos excluídos são ignorados; a função
+--              devolve os ids gravados
+
+create or replace function public.aplicar_recalculo_orcamentos(
+  p_loja_id uuid,
+  p_orcamentos jsonb
+)
+returns table (id uuid)
+language sql
+security invoker
+set search_path = ''
+as $$
+  update public.c_orcamentos as o
+  set
+    valor_final = r.valor_final,
+    custo_fabrica = r.custo_fabrica,
+    comissao_vendedor = r.comissao_vendedor,
+    comissao_gerente = r.comissao_gerente,
+    custo_medidor = r.custo_medidor,
+    custo_frete = r.custo_frete,
+    margem_lucro = r.margem_lucro,
+    necessita_aprovacao = r.necessita_aprovacao,
+    config_snapshot = r.config_snapshot,
+    updated_at = now()
+  from jsonb_to_recordset(coalesce(p_orcamentos, '[]'::jsonb)) as r(
+    id uuid,
+    updated_at timestamptz,
+    valor_final numeric,
+    custo_fabrica numeric,
+    comissao_vendedor numeric,
+    comissao_gerente numeric,
+    custo_medidor numeric,
+    custo_frete numeric,
+    margem_lucro numeric,
+    necessita_aprovacao boolean,
+    config_snapshot jsonb
+  )
+  where o.id = r.id
+    and o.loja_id = p_loja_id
+    and o.excluido is not true
+    -- guarda otimista: não sobrescreve orçamento editado depois da leitura do lote
+    and o.updated_at is not distinct from r.updated_at
+  returning o.id;
+$$;
+
+comment on function public.aplicar_recalculo_orcamentos(uuid, jsonb) is
+  'grava custos/margem recalculados por id, apenas nas linhas com o updated_at lido pelo job; retorna os ids gravados';
+
+grant execute on function public.aplicar_recalculo_orcamentos(uuid, jsonb) to authenticated;
@@ -0,0 +1,124 @@
+-- migration: agregados diários de orçamentos mantidos por trigger
+-- propósito: aplicar deltas pelo backend só cobria os caminhos que chamavam o rpc; o
+--            recálculo em lote, importações e sql manual deixavam os agregados
+--            divergentes. um trigger por comando em c_orcamentos aplica os deltas na
+--            mesma transação de qualquer escrita
+-- tabelas afetadas: public.c_orcamentos (triggers), public.c_orcamentos_agregados_diarios
+-- observações: não destrutivo. requer 20261018070000. a contribuição de cada orçamento
+--              segue a reconstrução: dia utc de created_at, excluido = true não entra.
+--              reconstrói ao final para partir de agregados consistentes
+
+
+-- contribuição das linhas novas (+) e antigas (−) do comando, somada por
+-- dia/loja/vendedor/status e aplicada em uma chamada. as tabelas de transição só
+-- existem no evento que as declara, por isso um ramo por operação. alterações que
+-- não mexem nos campos agregados (observações, plano de pagamento) somam zero e
+-- não geram escrita
+create or replace function public.trg_agregados_orcamentos()
+returns trigger
+language plpgsql
+security definer
+set search_path = ''
+as $$
+declare
+  v_deltas jsonb;
+begin
+  if tg_op = 'INSERT' then
+    select jsonb_agg(d) into v_deltas
+      from (
+        select (n.created_at at time zone 'utc')::date as dia,
+               n.loja_id, n.vendedor_id, n.status_id,
+               1 as quantidade,
+               coalesce(n.valor_final, 0) as valor_final,
+               coalesce(n.margem_lucro, 0) as margem_lucro,
+               (n.necessita_aprovacao is true)::integer as aguardando_aprovacao
+          from novos n
+         where n.excluido is not true
+           and n.created_at is not null
+      ) d;
+  elsif tg_op = 'DELETE' then
+    select jsonb_agg(d) into v_deltas
+      from (
+        select (a.created_at at time zone 'utc')::date as dia,
+               a.loja_id, a.vendedor_id, a.status_id,
+               -1 as quantidade,
+               -coalesce(a.valor_final, 0) as valor_final,
+               -coalesce(a.margem_lucro, 0) as margem_lucro,
+               -(a.necessita_aprovacao is true)::integer as aguardando_aprovacao
+          from antigos a
+         where a.excluido is not true
+           and a.created_at is not null
+      ) d;
+  else
+    select jsonb_agg(d) into v_deltas
+      from (
+        select l.dia, l.loja_id, l.vendedor_id, l.status_id,
+               sum(l.quantidade) as quantidade,
+               sum(l.valor_final) as valor_final,
+               sum(l.margem_lucro) as margem_lucro,
+               sum(l.aguardando_aprovacao) as aguardando_aprovacao
+          from (
+            select (n.created_at at time zone 'utc')::date as dia,
+                   n.loja_id, n.vendedor_id, n.status_id,
+                   1 as quantidade,
+                   coalesce(n.valor_final, 0) as valor_final,
+                   coalesce(n.margem_lucro, 0) as margem_lucro,
+                   (n.necessita_aprovacao is true)::integer as aguardando_aprovacao
+              from novos n
+             where n.excluido is not true
+               and n.created_at is not null
+            union all
+            select (a.created_at at time zone 'utc')::date,
+                   a.loja_id, a.vendedor_id, a.status_id,
+                   -1,
+                   -coalesce(a.valor_final, 0),
+                   -coalesce(a.margem_lucro, 0),
+                   -(a.necessita_aprovacao is true)::integer
+              from antigos a
+             where a.excluido is not true
+               and a.created_at is not null
+          ) l
+         group by l.dia, l.loja_id, l.vendedor_id, l.status_id
+        having sum(l.quantidade) <> 0
+            or sum(l.valor_final) <> 0
+            or sum(l.margem_lucro) <> 0
+            or sum(l.aguardando_aprovacao) <> 0
+      ) d;
+  end if;
+
+  if v_deltas is not null then
+    perform public.aplicar_deltas_agregados_orcamentos(v_deltas);
+  end if;
+
+  return null;
+end;
+$$;
+
+comment on function public.trg_agregados_orcamentos() is
+  'trigger por comando em c_orcamentos: aplica aos agregados diários a diferença das linhas alteradas';
+
+drop trigger if exists trg_agregados_orcamentos_insert on public.c_orcamentos;
+create trigger trg_agregados_orcamentos_insert
+  after insert on public.c_orcamentos
+  referencing new table as novos
+  for each statement
+  execute function public.trg_agregados_orcamentos();
+
+drop trigger if exists trg_agregados_orcamentos_update on public.c_orcamentos;
+create trigger trg_agregados_orcamentos_update
+  after update on public.c_orcamentos
+  referencing old table as antigos new table as novos
+  for each statement
+  execute function public.trg_agregados_orcamentos();
+
+drop trigger if exists trg_agregados_orcamentos_delete on public.c_orcamentos;
+create trigger trg_agregados_orcamentos_delete
+  after delete on public.c_orcamentos
+  referencing old table as antigos
+  for each statement
+  execute function public.trg_agregados_orcamentos();
+
+revoke execute on function public.trg_agregados_orcamentos() from public, anon, authenticated;
+
+-- carga a partir do estado atual de c_orcamentos
+select public.reconstruir_agregados_orcamentos();
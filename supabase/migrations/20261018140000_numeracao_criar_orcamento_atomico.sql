@@ -0,0 +1,97 @@
+-- migration: número do orçamento reservado dentro de criar_orcamento_atomico
+-- propósito: com NUMERACAO_BLOCO_TAMANHO=1 o backend reservava o número em uma chamada
+--            (reservar_numeros_orcamento, que bloqueia a linha de config_loja) e só
+--            depois gravava o orçamento em outra: dois round trips e, se a gravação
+--            falhasse, o número ficava perdido (lacuna). agora a função recebe o molde
+--            do número (p_numeracao) e incrementa config_loja na mesma transação do
+--            cabeçalho: um round trip, e a falha desfaz também o incremento
+-- tabelas afetadas: public.config_loja, public.c_orcamentos, public.c_orcamento_ambientes,
+--                   public.c_orcamento_custos_adicionais
+-- observações: substitui a assinatura de três parâmetros (o postgrest não escolhe entre
+--              sobrecargas com os mesmos nomes). p_orcamento com numero preenchido
+--              (reserva em blocos, NUMERACAO_BLOCO_TAMANHO > 1) mantém o comportamento
+--              anterior. p_numeracao = {prefixo, sufixo, digitos}: o número gravado é
+--              prefixo || lpad(sequencial, digitos, '0') || sufixo. o bloqueio da linha
+--              da loja dura até o fim da transação, que só faz os três inserts
+
+drop function if exists public.criar_orcamento_atomico(jsonb, uuid[], jsonb);
+
+create or replace function public.criar_orcamento_atomico(
+  p_orcamento jsonb,
+  p_ambiente_ids uuid[],
+  p_custos_adicionais jsonb default '[]'::jsonb,
+  p_numeracao jsonb default null
+)
+returns jsonb
+language plpgsql
+security invoker
+set search_path = ''
+as $$
+declare
+  v_orcamento public.c_orcamentos;
+  v_custos jsonb;
+  v_sequencial bigint;
+begin
+  -- número ainda não reservado: incrementa a sequência da loja nesta transação
+  if coalesce(p_orcamento ->> 'numero', '') = '' then
+    update public.config_loja
+       set proximo_numero_orcamento = coalesce(proximo_numero_orcamento, numero_inicial_orcamento, 1) + 1
+     where loja_id = (p_orcamento ->> 'loja_id')::uuid
+    returning proximo_numero_orcamento - 1 into v_sequencial;
+
+    if v_sequencial is null then
+      raise exception 'config_loja não encontrada para loja %', p_orcamento ->> 'loja_id';
+    end if;
+
+    p_orcamento := p_orcamento || jsonb_build_object(
+      'numero',
+      coalesce(p_numeracao ->> 'prefixo', '')
+        || lpad(v_sequencial::text, greatest(coalesce((p_numeracao ->> 'digitos')::integer, 0), length(v_sequencial::text)), '0')
+        || coalesce(p_numeracao ->> 'sufixo', '')
+    );
+  end if;
+
+  -- cabeçalho: apenas as colunas enviadas pelo backend; as demais ficam com o default
+  insert into public.c_orcamentos (
+    numero, cliente_id, loja_id, vendedor_id,
+    medidor_selecionado_id, montador_selecionado_id, transportadora_selecionada_id,
+    valor_ambientes, desconto_percentual, valor_final,
+    custo_fabrica, comissao_vendedor, comissao_gerente,
+    custo_medidor, custo_montador, custo_frete, margem_lucro,
+    config_snapshot, plano_pagamento, necessita_aprovacao, status_id, observacoes
+  )
+  select
+    r.numero, r.cliente_id, r.loja_id, r.vendedor_id,
+    r.medidor_selecionado_id, r.montador_selecionado_id, r.transportadora_selecionada_id,
+    r.valor_ambientes, r.desconto_percentual, r.valor_final,
+    r.custo_fabrica, r.comissao_vendedor, r.comissao_gerente,
+    r.custo_medidor, r.custo_montador, r.custo_frete, r.margem_lucro,
+    r.config_snapshot, r.plano_pagamento, r.necessita_aprovacao, r.status_id, r.observacoes
+  from jsonb_populate_record(null::public.c_orcamentos, p_orcamento) as r
+  returning * into v_orcamento;
+
+  -- vínculos com os ambientes selecionados
+  insert into public.c_orcamento_ambientes (orcamento_id, ambiente_id, incluido)
+  select v_orcamento.id, ambiente_id, true
+  from unnest(p_ambiente_ids) as ambiente_id;
+
+  -- custos adicionais, devolvidos com os ids gerados
+  with inseridos as (
+    insert into public.c_orcamento_custos_adicionais (orcamento_id, descricao_custo, valor_custo)
+    select v_orcamento.id, c.descricao_custo, c.valor_custo
+    from jsonb_to_recordset(coalesce(p_custos_adicionais, '[]'::jsonb))
+      as c(descricao_custo text, valor_custo numeric)
+    returning id, descricao_custo, valor_custo
+  )
+  select coalesce(jsonb_agg(to_jsonb(inseridos)), '[]'::jsonb)
+  into v_custos
+  from inseridos;
+
+  return to_jsonb(v_orcamento) || jsonb_build_object('custos_adicionais', v_custos);
+end;
+$$;
+
+comment on function public.criar_orcamento_atomico(jsonb, uuid[], jsonb, jsonb) is
+  'cria cabeçalho (reservando o número da loja quando p_orcamento não traz numero), vínculos com ambientes e custos adicionais em uma transação; retorna a linha de c_orcamentos com custos_adicionais';
+
+grant execute on function public.criar_orcamento_atomico(jsonb, uuid[], jsonb, jsonb) to authenticated;
@@ -0,0 +1,103 @@
+-- migration: definição única de cliente ativo e termos de busca literais
+-- propósito: buscar_clientes e a listagem tratavam como ativo "excluido is not true",
+--            enquanto o índice único de cpf/cnpj (migration 20261018090000) e o
+--            autocomplete usavam "excluido is null": um cliente com excluido = false
+--            aparecia na busca mas não contava na unicidade. a exclusão grava
+--            excluido = true, então "excluido is not true" passa a valer em todo lugar.
+--            buscar_clientes também passa a escapar % e _ do termo nos padrões like
+--            (antes "50%" ou "a_b" funcionavam como curinga)
+-- tabelas afetadas: public.c_clientes (índice uq_c_clientes_loja_cpf_cnpj recriado)
+-- observações: o índice passa a incluir clientes com excluido = false. se a loja tiver
+--              duplicados entre eles a migration falha com a lista de casos; resolver e
+--              executar de novo:
+--                select loja_id, regexp_replace(cpf_cnpj, '[^0-9]', '', 'g'), count(*)
+--                  from public.c_clientes
+--                 where excluido is not true
+--                 group by 1, 2 having count(*) > 1;
+
+do $$
+declare
+  v_duplicados text;
+begin
+  select string_agg(format('loja %s, cpf/cnpj %s (%s clientes)', loja_id, digitos, total), '; ')
+    into v_duplicados
+    from (
+      select loja_id, regexp_replace(cpf_cnpj, '[^0-9]', '', 'g') as digitos, count(*) as total
+        from public.c_clientes
+       where excluido is not true
+         and regexp_replace(coalesce(cpf_cnpj, ''), '[^0-9]', '', 'g') <> ''
+       group by 1, 2
+      having count(*) > 1
+       limit 20
+    ) d;
+
+  if v_duplicados is not null then
+    raise exception 'c_clientes tem cpf/cnpj duplicados ativos: %', v_duplicados;
+  end if;
+end;
+$$;
+
+drop index if exists public.uq_c_clientes_loja_cpf_cnpj;
+
+create unique index uq_c_clientes_loja_cpf_cnpj
+  on public.c_clientes (loja_id, (regexp_replace(cpf_cnpj, '[^0-9]', '', 'g')))
+  where excluido is not true
+    and regexp_replace(coalesce(cpf_cnpj, ''), '[^0-9]', '', 'g') <> '';
+
+comment on index public.uq_c_clientes_loja_cpf_cnpj is
+  'cpf/cnpj (apenas dígitos) único entre os clientes ativos da loja (excluido is not true)';
+
+
+create or replace function public.buscar_clientes(
+  p_loja_id uuid,
+  p_termo text,
+  p_limite integer default 20,
+  p_offset integer default 0
+)
+returns setof jsonb
+language sql
+stable
+security invoker
+set search_path = ''
+as $$
+  with termo as (
+    select
+      public.normalizar_busca(btrim(p_termo)) as texto,
+      -- % e _ digitados valem como texto nos padrões like (escape padrão: \)
+      replace(replace(replace(public.normalizar_busca(btrim(p_termo)), '\', '\\'), '%', '\%'), '_', '\_') as texto_like,
+      regexp_replace(coalesce(p_termo, ''), '[^0-9]', '', 'g') as digitos
+  )
+  select
+    to_jsonb(c) - array['nome_busca', 'telefone_digitos', 'cidade_busca', 'procedencia_busca']
+      || jsonb_build_object('relevancia', round(r.relevancia::numeric, 4))
+  from public.c_clientes c
+  cross join termo t
+  cross join lateral (
+    select greatest(
+      -- nome: similaridade da palavra + bônus para prefixo
+      extensions.word_similarity(t.texto, c.nome_busca)
+        + case when c.nome_busca like t.texto_like || '%' then 0.5 else 0 end,
+      -- telefone / documento: trecho de dígitos
+      case
+        when length(t.digitos) >= 4 and c.telefone_digitos like '%' || t.digitos || '%' then 1.0
+        when length(t.digitos) >= 11 and c.cpf_cnpj = t.digitos then 1.5
+        else 0
+      end
+    ) as relevancia
+  ) r
+  where c.loja_id = p_loja_id
+    and c.excluido is not true
+    and length(t.texto) >= 2
+    and (
+      t.texto operator(extensions.<%) c.nome_busca
+      or c.nome_busca like '%' || t.texto_like || '%'
+      or (length(t.digitos) >= 4 and c.telefone_digitos like '%' || t.digitos || '%')
+      or (length(t.digitos) >= 11 and c.cpf_cnpj = t.digitos)
+    )
+  order by r.relevancia desc, c.nome
+  limit least(greatest(coalesce(p_limite, 20), 1), 100)
+  offset greatest(coalesce(p_offset, 0), 0);
+$$;
+
+comment on function public.buscar_clientes(uuid, text, integer, integer) is
+  'busca clientes ativos da loja por nome, telefone ou cpf/cnpj, ordenados por relevância';